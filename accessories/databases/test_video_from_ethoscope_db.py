@@ -0,0 +1,321 @@
+"""
+Tests for video_from_ethoscope_db.py against a synthetic ethoscope database.
+
+Checks the numpy nearest-position lookup and the parallel renderer give the same
+result as the former list-based implementation, and that it is not slower.
+
+Usage:
+    python -m pytest accessories/databases/test_video_from_ethoscope_db.py
+"""
+
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import video_from_ethoscope_db as vdb  # noqa: E402
+
+N_ROIS = 10
+IMG_SIZE = (320, 240)
+RESOLUTION = (160, 120)
+
+
+def make_synthetic_db(
+    path,
+    duration_s=600,
+    tracking_period_ms=500,
+    snapshot_period_ms=5000,
+    gap=(200000, 300000),
+):
+    """
+    Write a small ethoscope-like database: METADATA, ROI_MAP, ROI_n and IMG_SNAPSHOTS.
+
+    No positions are recorded during ``gap`` (in ms), so some snapshots fall outside
+    the matching tolerance.
+    """
+    rng = np.random.default_rng(0)
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute("CREATE TABLE METADATA (field TEXT, value TEXT)")
+    c.execute("INSERT INTO METADATA VALUES ('date_time', '1700000000.0')")
+    c.execute(
+        "CREATE TABLE ROI_MAP (roi_idx SMALLINT, roi_value SMALLINT, x SMALLINT, y SMALLINT, w SMALLINT, h SMALLINT)"
+    )
+
+    for roi_idx in range(1, N_ROIS + 1):
+        offset_x, offset_y = 10 + (roi_idx - 1) % 2 * 150, 10 + (roi_idx - 1) // 2 * 45
+        c.execute(
+            "INSERT INTO ROI_MAP VALUES (?, ?, ?, ?, ?, ?)",
+            (roi_idx, roi_idx, offset_x, offset_y, 140, 40),
+        )
+        c.execute(
+            f"CREATE TABLE ROI_{roi_idx} (id INTEGER PRIMARY KEY, t INTEGER, x SMALLINT, y SMALLINT, "
+            f"w SMALLINT, h SMALLINT, phi SMALLINT, xy_dist_log10x1000 SMALLINT, is_inferred BOOLEAN)"
+        )
+        # each ROI has its own jitter, so ties and near-ties are exercised
+        ts = np.arange(0, duration_s * 1000, tracking_period_ms) + roi_idx * 37
+        ts = ts[(ts < gap[0]) | (ts >= gap[1])]
+        rows = [
+            (
+                None,
+                int(t),
+                int(rng.integers(0, 140)),
+                int(rng.integers(0, 40)),
+                int(rng.integers(5, 15)),
+                int(rng.integers(2, 6)),
+                int(rng.integers(0, 180)),
+                0,
+                0,
+            )
+            for t in ts
+        ]
+        c.executemany(
+            f"INSERT INTO ROI_{roi_idx} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+        )
+
+    c.execute(
+        "CREATE TABLE IMG_SNAPSHOTS (id INTEGER PRIMARY KEY, t INTEGER, img LONGBLOB)"
+    )
+    for t in range(0, duration_s * 1000, snapshot_period_ms):
+        img = np.full(
+            (IMG_SIZE[1], IMG_SIZE[0], 3),
+            (t // snapshot_period_ms) % 255,
+            dtype=np.uint8,
+        )
+        ok, jpg = cv2.imencode(".jpg", img)
+        c.execute(
+            "INSERT INTO IMG_SNAPSHOTS VALUES (NULL, ?, ?)",
+            (t, sqlite3.Binary(jpg.tobytes())),
+        )
+
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def synthetic_db(tmp_path):
+    return make_synthetic_db(str(tmp_path / "synthetic.db"))
+
+
+# The list-based implementation this tool replaced, kept as a reference
+
+
+def legacy_load_tracking_data(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT roi_idx, x, y FROM ROI_MAP")
+    roi_offsets = {int(row[0]): (int(row[1]), int(row[2])) for row in cursor.fetchall()}
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'ROI_%'"
+    )
+    roi_tables = [row[0] for row in cursor.fetchall() if row[0] != "ROI_MAP"]
+    tracking = {}
+    for table_name in roi_tables:
+        roi_idx = int(table_name.split("_")[1])
+        offset_x, offset_y = roi_offsets.get(roi_idx, (0, 0))
+        cursor.execute(f"SELECT t, x, y, w, h, phi FROM {table_name} ORDER BY t")
+        positions = [
+            (
+                int(row[0]),
+                int(row[1]) + offset_x,
+                int(row[2]) + offset_y,
+                int(row[3]),
+                int(row[4]),
+                int(row[5]),
+            )
+            for row in cursor.fetchall()
+        ]
+        if positions:
+            tracking[roi_idx] = positions
+    return tracking
+
+
+def legacy_find_nearest_positions(tracking, snap_t, tolerance_ms=30000):
+    results = []
+    for roi_idx, positions in tracking.items():
+        lo, hi = 0, len(positions) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if positions[mid][0] < snap_t:
+                lo = mid + 1
+            else:
+                hi = mid
+        best = lo
+        if best > 0 and abs(positions[best - 1][0] - snap_t) < abs(
+            positions[best][0] - snap_t
+        ):
+            best = best - 1
+        t, x, y, w, h, phi = positions[best]
+        if abs(t - snap_t) <= tolerance_ms:
+            results.append((roi_idx, x, y, w, h, phi))
+    return results
+
+
+def legacy_render(db_name, resolution=RESOLUTION):
+    conn = sqlite3.connect(db_name)
+    cursor = conn.cursor()
+    cursor.execute("SELECT value FROM METADATA WHERE field='date_time'")
+    start_time = datetime(1970, 1, 1) + timedelta(seconds=float(cursor.fetchone()[0]))
+    tracking = legacy_load_tracking_data(conn)
+    cursor.execute("SELECT img, t FROM IMG_SNAPSHOTS")
+    frames = []
+    for blob, t in cursor.fetchall():
+        decoded_img = cv2.imdecode(
+            np.frombuffer(blob, dtype=np.uint8), cv2.IMREAD_COLOR
+        )
+        original_size = (decoded_img.shape[1], decoded_img.shape[0])
+        resized_img = cv2.resize(decoded_img, resolution)
+        timestamp_text = (start_time + timedelta(milliseconds=int(t))).strftime(
+            "%Y-%m-%d %H:%M:%S"
+        )[:-3]
+        cv2.putText(
+            resized_img,
+            timestamp_text,
+            (10, 30),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.5,
+            (255, 255, 255),
+            1,
+            cv2.LINE_AA,
+        )
+        positions = legacy_find_nearest_positions(tracking, int(t))
+        vdb.draw_tracking_overlay(resized_img, positions, original_size, resolution)
+        frames.append(resized_img.tobytes())
+    conn.close()
+    return frames
+
+
+def render(db_name, workers):
+    conn = sqlite3.connect(db_name)
+    try:
+        tracking = vdb.load_tracking_data(conn)
+        return list(
+            vdb.iter_rendered_frames(
+                conn, RESOLUTION, tracking=tracking, workers=workers
+            )
+        )
+    finally:
+        conn.close()
+
+
+class TestNearestPositions:
+
+    def test_load_tracking_data_matches_legacy(self, synthetic_db):
+        conn = sqlite3.connect(synthetic_db)
+        legacy = legacy_load_tracking_data(conn)
+        tracking = vdb.load_tracking_data(conn)
+        conn.close()
+
+        assert sorted(tracking) == sorted(legacy) == list(range(1, N_ROIS + 1))
+        for roi_idx, (t_ms, positions) in tracking.items():
+            expected = np.array(legacy[roi_idx])
+            np.testing.assert_array_equal(t_ms, expected[:, 0])
+            np.testing.assert_array_equal(positions, expected[:, 1:])
+
+    def test_lookup_matches_legacy(self, synthetic_db):
+        conn = sqlite3.connect(synthetic_db)
+        legacy = legacy_load_tracking_data(conn)
+        tracking = vdb.load_tracking_data(conn)
+        conn.close()
+
+        # before, after, inside the gap, on exact timestamps and exact midpoints
+        snap_ts = list(range(-40000, 660000, 1237)) + [37, 537, 287, 1000000]
+        batch = vdb.find_nearest_positions_batch(tracking, snap_ts)
+        for snap_t, found in zip(snap_ts, batch, strict=True):
+            expected = legacy_find_nearest_positions(legacy, snap_t)
+            assert found == expected
+            assert vdb.find_nearest_positions(tracking, snap_t) == expected
+
+    def test_tolerance(self, synthetic_db):
+        conn = sqlite3.connect(synthetic_db)
+        tracking = vdb.load_tracking_data(conn)
+        conn.close()
+
+        # the gap runs from 200 s to 300 s
+        assert vdb.find_nearest_positions(tracking, 250000) == []
+        assert len(vdb.find_nearest_positions(tracking, 225000)) == N_ROIS
+        assert vdb.find_nearest_positions(tracking, 225000, tolerance_ms=1000) == []
+
+    def test_no_tracking_tables(self, tmp_path):
+        conn = sqlite3.connect(str(tmp_path / "empty.db"))
+        assert vdb.load_tracking_data(conn) == {}
+        conn.close()
+
+
+class TestRendering:
+
+    def test_frames_match_legacy_in_order(self, synthetic_db):
+        expected = legacy_render(synthetic_db)
+        assert len(expected) == 120
+        assert render(synthetic_db, workers=1) == expected
+        assert render(synthetic_db, workers=3) == expected
+
+    def test_frames_without_tracking(self, synthetic_db):
+        conn = sqlite3.connect(synthetic_db)
+        frames = list(
+            vdb.iter_rendered_frames(conn, RESOLUTION, tracking=None, workers=1)
+        )
+        conn.close()
+        assert len(frames) == 120
+        assert all(len(f) == RESOLUTION[0] * RESOLUTION[1] * 3 for f in frames)
+
+    def test_connect_and_extract_video_pipes_every_frame(self, synthetic_db):
+        ffmpeg = MagicMock()
+        with patch.object(vdb.subprocess, "Popen", return_value=ffmpeg) as popen:
+            vdb.connect_and_extract_video(
+                synthetic_db, resolution=RESOLUTION, track=True, workers=2
+            )
+
+        cmd = popen.call_args[0][0]
+        assert cmd[0] == "ffmpeg"
+        assert cmd[-1] == synthetic_db[:-3] + ".mp4"
+        written = [call.args[0] for call in ffmpeg.stdin.write.call_args_list]
+        assert written == legacy_render(synthetic_db)
+        ffmpeg.stdin.close.assert_called_once()
+        ffmpeg.wait.assert_called_once()
+
+
+def test_long_recording_matches_legacy(tmp_path):
+    """An hour of tracking at 10 Hz gives the same frames as the former script."""
+    db_name = make_synthetic_db(
+        str(tmp_path / "long.db"),
+        duration_s=3600,
+        tracking_period_ms=100,
+        snapshot_period_ms=10000,
+        gap=(0, 0),
+    )
+    workers = min(os.cpu_count() or 1, 4)
+    assert render(db_name, workers=workers) == legacy_render(db_name)
+
+
+@pytest.mark.slow
+def test_timing_comparison(tmp_path):
+    """The current script renders an hour-long recording no slower than the former."""
+    db_name = make_synthetic_db(
+        str(tmp_path / "long.db"),
+        duration_s=3600,
+        tracking_period_ms=100,
+        snapshot_period_ms=10000,
+        gap=(0, 0),
+    )
+    workers = min(os.cpu_count() or 1, 4)
+
+    start = time.perf_counter()
+    legacy_render(db_name)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    render(db_name, workers=workers)
+    new_time = time.perf_counter() - start
+
+    assert new_time <= legacy_time, (
+        f"numpy + {workers} workers {new_time:.2f}s, former script {legacy_time:.2f}s"
+    )
@@ -3,22 +3,32 @@ import subprocess
 import cv2
 import sqlite3
 import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 
 import argparse
 from tqdm import tqdm
 
+# Snapshots fetched from the database (and positions looked up) per batch
+SNAPSHOT_BATCH = 64
+
 
 def load_tracking_data(conn):
     """
     Load ROI map and all tracking positions from the database.
 
+    Each ROI table is streamed straight into numpy arrays, so no per-row
+    Python objects are created even for week-long recordings.
+
     Args:
         conn: SQLite connection object.
 
     Returns:
-        dict: Mapping of ROI index to list of (t_ms, abs_x, abs_y, w, h, phi)
-              tuples, sorted by timestamp. Returns empty dict if no tracking data.
+        dict: Mapping of ROI index to a (t_ms, positions) pair of arrays, sorted by
+              timestamp. ``t_ms`` is int64 of shape (n,), ``positions`` is int32 of
+              shape (n, 5) holding abs_x, abs_y, w, h, phi.
+              Returns empty dict if no tracking data.
     """
     cursor = conn.cursor()
 
@@ -36,61 +46,98 @@ def load_tracking_data(conn):
     cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'ROI_%'")
     roi_tables = [row[0] for row in cursor.fetchall() if row[0] != "ROI_MAP"]
 
+    row_dtype = np.dtype([("t", np.int64), ("x", np.int32), ("y", np.int32),
+                          ("w", np.int32), ("h", np.int32), ("phi", np.int32)])
+
     tracking = {}
     for table_name in roi_tables:
         roi_idx = int(table_name.split("_")[1])
         offset_x, offset_y = roi_offsets.get(roi_idx, (0, 0))
 
         try:
-            cursor.execute(f"SELECT t, x, y, w, h, phi FROM {table_name} ORDER BY t")
-            positions = [
-                (int(row[0]), int(row[1]) + offset_x, int(row[2]) + offset_y,
-                 int(row[3]), int(row[4]), int(row[5]))
-                for row in cursor.fetchall()
-            ]
-            if positions:
-                tracking[roi_idx] = positions
+            # rows are written in time order; sort in numpy only if they are not
+            cursor.execute(f"SELECT t, x, y, w, h, phi FROM {table_name}")
+            rows = np.fromiter(cursor, dtype=row_dtype)
         except sqlite3.OperationalError:
             continue
 
+        if len(rows) == 0:
+            continue
+        if np.any(np.diff(rows["t"]) < 0):
+            rows = rows[np.argsort(rows["t"], kind="stable")]
+
+        positions = np.empty((len(rows), 5), dtype=np.int32)
+        positions[:, 0] = rows["x"] + offset_x
+        positions[:, 1] = rows["y"] + offset_y
+        positions[:, 2] = rows["w"]
+        positions[:, 3] = rows["h"]
+        positions[:, 4] = rows["phi"]
+        tracking[roi_idx] = (np.ascontiguousarray(rows["t"]), positions)
+
     return tracking
 
 
-def find_nearest_positions(tracking, snap_t, tolerance_ms=30000):
+def nearest_position_indices(t_ms, snap_ts, tolerance_ms=30000):
     """
-    For each ROI, find the tracked position nearest to snap_t.
+    Vectorised nearest-timestamp lookup of many snapshots in one ROI.
+
+    Ties go to the later position, as in the original binary search.
 
     Args:
-        tracking (dict): ROI index -> list of (t_ms, abs_x, abs_y, w, h, phi).
-        snap_t (int): Snapshot timestamp in milliseconds.
+        t_ms (numpy.ndarray): Sorted position timestamps of one ROI.
+        snap_ts (numpy.ndarray): Snapshot timestamps in milliseconds.
         tolerance_ms (int): Max time difference to consider a match (default 30s).
 
     Returns:
-        list: List of (roi_idx, abs_x, abs_y, w, h, phi) for positions within tolerance.
+        tuple: (indices, valid) arrays, one entry per snapshot. ``valid`` is False
+               where the nearest position is further than ``tolerance_ms`` away.
     """
-    results = []
-    for roi_idx, positions in tracking.items():
-        # Binary search for nearest timestamp
-        lo, hi = 0, len(positions) - 1
-        while lo < hi:
-            mid = (lo + hi) // 2
-            if positions[mid][0] < snap_t:
-                lo = mid + 1
-            else:
-                hi = mid
+    snap_ts = np.asarray(snap_ts, dtype=np.int64)
+    last = len(t_ms) - 1
+    after = np.minimum(np.searchsorted(t_ms, snap_ts), last)
+    before = np.maximum(after - 1, 0)
+    use_before = np.abs(t_ms[before] - snap_ts) < np.abs(t_ms[after] - snap_ts)
+    best = np.where(use_before, before, after)
+    valid = np.abs(t_ms[best] - snap_ts) <= tolerance_ms
+    return best, valid
 
-        # Check the candidate and its neighbor for closest match
-        best = lo
-        if best > 0 and abs(positions[best - 1][0] - snap_t) < abs(positions[best][0] - snap_t):
-            best = best - 1
 
-        t, x, y, w, h, phi = positions[best]
-        if abs(t - snap_t) <= tolerance_ms:
-            results.append((roi_idx, x, y, w, h, phi))
+def find_nearest_positions_batch(tracking, snap_ts, tolerance_ms=30000):
+    """
+    For each snapshot and each ROI, find the tracked position nearest in time.
+
+    Args:
+        tracking (dict): ROI index -> (t_ms, positions) arrays, see load_tracking_data.
+        snap_ts (sequence): Snapshot timestamps in milliseconds.
+        tolerance_ms (int): Max time difference to consider a match (default 30s).
 
+    Returns:
+        list: One list per snapshot of (roi_idx, abs_x, abs_y, w, h, phi) for positions
+              within tolerance.
+    """
+    results = [[] for _ in range(len(snap_ts))]
+    for roi_idx, (t_ms, positions) in tracking.items():
+        best, valid = nearest_position_indices(t_ms, snap_ts, tolerance_ms)
+        for i in np.flatnonzero(valid):
+            results[i].append((roi_idx, *positions[best[i]].tolist()))
     return results
 
 
+def find_nearest_positions(tracking, snap_t, tolerance_ms=30000):
+    """
+    For each ROI, find the tracked position nearest to snap_t.
+
+    Args:
+        tracking (dict): ROI index -> (t_ms, positions) arrays, see load_tracking_data.
+        snap_t (int): Snapshot timestamp in milliseconds.
+        tolerance_ms (int): Max time difference to consider a match (default 30s).
+
+    Returns:
+        list: List of (roi_idx, abs_x, abs_y, w, h, phi) for positions within tolerance.
+    """
+    return find_nearest_positions_batch(tracking, [snap_t], tolerance_ms)[0]
+
+
 def draw_tracking_overlay(img, positions, original_size, display_size):
     """
     Draw fly position ellipses on the frame, matching the live tracking style.
@@ -115,8 +162,112 @@ def draw_tracking_overlay(img, positions, original_size, display_size):
         cv2.ellipse(img, ((disp_x, disp_y), (disp_w, disp_h), phi), (0, 0, 255), 1, cv2.LINE_AA)
 
 
+def render_frame(blob, timestamp_text, positions, resolution, font_scale, font_color):
+    """
+    Decode one snapshot and draw the timestamp and tracking overlay on it.
+
+    Runs in the worker processes, so it only takes picklable arguments.
+
+    Args:
+        blob (bytes): JPEG-encoded snapshot from IMG_SNAPSHOTS.
+        timestamp_text (str): Text to print in the top left corner.
+        positions (list): List of (roi_idx, abs_x, abs_y, w, h, phi), may be empty.
+        resolution (tuple): Output frame size (width, height).
+        font_scale (float): Font scale for timestamp text.
+        font_color (tuple): BGR color for timestamp text.
+
+    Returns:
+        bytes: The raw bgr24 frame, ready for the ffmpeg pipe.
+    """
+    decoded_img = cv2.imdecode(np.frombuffer(blob, dtype=np.uint8), cv2.IMREAD_COLOR)
+    original_size = (decoded_img.shape[1], decoded_img.shape[0])
+    # Resize the image to the desired video size
+    resized_img = cv2.resize(decoded_img, resolution)
+    cv2.putText(resized_img, timestamp_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, font_scale, font_color, 1, cv2.LINE_AA)
+
+    if positions:
+        draw_tracking_overlay(resized_img, positions, original_size, resolution)
+
+    return resized_img.tobytes()
+
+
+def iter_snapshots(conn, batch_size=SNAPSHOT_BATCH):
+    """
+    Stream snapshots from IMG_SNAPSHOTS, in recording order, without loading all blobs.
+
+    Args:
+        conn: SQLite connection object.
+        batch_size (int): Number of rows fetched at a time.
+
+    Yields:
+        list: Batches of (img_blob, t_ms) rows.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT img, t FROM IMG_SNAPSHOTS ORDER BY rowid")
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield rows
+
+
+def iter_rendered_frames(conn, resolution=(640, 480), font_scale: float = 0.5,
+                         font_color: tuple = (255, 255, 255), tracking=None, workers: int = 1):
+    """
+    Render every snapshot of an open database, yielding the frames in recording order.
+
+    Decoding and drawing are spread across ``workers`` processes. At most a few
+    batches of frames are in flight at any time, so memory does not grow with the
+    length of the recording.
+
+    Args:
+        conn: SQLite connection object.
+        resolution (tuple): Output video resolution (width, height).
+        font_scale (float): Font scale for timestamp text.
+        font_color (tuple): BGR color for timestamp text.
+        tracking (dict): Output of load_tracking_data, or None for no overlay.
+        workers (int): Number of rendering processes; 1 renders in this process.
+
+    Yields:
+        bytes: Raw bgr24 frames.
+    """
+    cursor = conn.cursor()
+    # Retrieve start_time from METADATA table, assuming date_time is in seconds since the epoch
+    cursor.execute("SELECT value FROM METADATA WHERE field='date_time'")
+    start_time_s = cursor.fetchone()[0]
+    start_time = datetime(1970, 1, 1) + timedelta(seconds=float(start_time_s))
+
+    def jobs():
+        for rows in iter_snapshots(conn):
+            snap_ts = [int(t) for _, t in rows]
+            if tracking:
+                positions = find_nearest_positions_batch(tracking, snap_ts)
+            else:
+                positions = [[] for _ in rows]
+            for (blob, _), t_ms, pos in zip(rows, snap_ts, positions, strict=True):
+                timestamp = start_time + timedelta(milliseconds=t_ms)
+                timestamp_text = timestamp.strftime('%Y-%m-%d %H:%M:%S')[:-3]
+                yield (blob, timestamp_text, pos, resolution, font_scale, font_color)
+
+    if workers <= 1:
+        for job in jobs():
+            yield render_frame(*job)
+        return
+
+    max_in_flight = workers * 4
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for job in jobs():
+            pending.append(pool.submit(render_frame, *job))
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
 def connect_and_extract_video(db_name, resolution=(640, 480), font_scale: float = 0.5,
-                              font_color: tuple = (255, 255, 255), track: bool = False) -> None:
+                              font_color: tuple = (255, 255, 255), track: bool = False,
+                              workers: int = None) -> None:
     """
     Extract snapshots from a .db file and compile them into a video.
 
@@ -126,28 +277,22 @@ def connect_and_extract_video(db_name, resolution=(640, 480), font_scale: float
         font_scale (float): Font scale for timestamp text.
         font_color (tuple): BGR color for timestamp text.
         track (bool): If True, overlay tracked fly positions on each frame.
+        workers (int): Number of rendering processes (default: one per CPU).
     """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
     # Connect to the SQLite database
     conn = sqlite3.connect(db_name)
     cursor = conn.cursor()
 
-    # Retrieve start_time from METADATA table, assuming date_time is in milliseconds since the epoch
-    cursor.execute("SELECT value FROM METADATA WHERE field='date_time'")
-    start_time_s = cursor.fetchone()[0]
-    start_time = datetime(1970, 1, 1) + timedelta(seconds=float(start_time_s))
-
     # Load tracking data if requested
     tracking = load_tracking_data(conn) if track else {}
     if track and not tracking:
         print("Warning: --track enabled but no tracking data found in database")
 
-    # Retrieve the image blobs from the IMG_SNAPSHOTS table
-    cursor.execute("SELECT img, t FROM IMG_SNAPSHOTS")
-    img_data = cursor.fetchall()
-
-    # Convert each image blob to a numpy array
-    images = [(np.frombuffer(data[0], dtype=np.uint8), int(data[1]),
-               start_time + timedelta(milliseconds=int(data[1]))) for data in img_data]
+    cursor.execute("SELECT COUNT(*) FROM IMG_SNAPSHOTS")
+    n_snapshots = cursor.fetchone()[0]
 
     # Create video via ffmpeg pipe for maximum compatibility (H.264 + MP4)
     base_name, _ = os.path.splitext(db_name)
@@ -166,24 +311,10 @@ def connect_and_extract_video(db_name, resolution=(640, 480), font_scale: float
     ffmpeg_proc = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE)
     count = 0
 
-    # Iterate through the images and write them to the video file
-    for img, t_ms, timestamp in tqdm(images):
-        # Decode the image from the numpy array
-        decoded_img = cv2.imdecode(img, cv2.IMREAD_COLOR)
-        original_size = (decoded_img.shape[1], decoded_img.shape[0])
-        # Resize the image to the desired video size
-        resized_img = cv2.resize(decoded_img, resolution)
-        # Put timestamp on the image
-        timestamp_text = timestamp.strftime('%Y-%m-%d %H:%M:%S')[:-3]
-        cv2.putText(resized_img, timestamp_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, font_scale, font_color, 1, cv2.LINE_AA)
-
-        # Draw tracked fly positions if enabled
-        if tracking:
-            positions = find_nearest_positions(tracking, t_ms)
-            draw_tracking_overlay(resized_img, positions, original_size, resolution)
-
+    frames = iter_rendered_frames(conn, resolution, font_scale, font_color, tracking, workers)
+    for frame in tqdm(frames, total=n_snapshots):
         # Write raw frame to ffmpeg stdin
-        ffmpeg_proc.stdin.write(resized_img.tobytes())
+        ffmpeg_proc.stdin.write(frame)
         count += 1
 
     # Finalize video and close database
@@ -199,6 +330,8 @@ if __name__ == '__main__':
     parser.add_argument('filename', help='The name of the ethoscope sqlite3 file to process')
     parser.add_argument('-t', '--track', action='store_true', default=False,
                         help='Overlay tracked fly positions (x,y) from ROI tables onto each frame')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='Number of processes used to decode and draw frames (default: one per CPU)')
     args = parser.parse_args()
 
-    connect_and_extract_video(args.filename, track=args.track)
+    connect_and_extract_video(args.filename, track=args.track, workers=args.workers)
@@ -23,12 +23,26 @@
 #
 
 
+import json
 import os
 import re
 import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from glob import glob
 from optparse import OptionParser
 
+# Bytes read from the chunks and written to ffmpeg at a time
+CHUNK_SIZE = 1024 * 1024
+# Name of the job ledger, kept in the root of the videos folder
+LEDGER_NAME = ".h264_to_mp4_jobs.json"
+# Folders failing this many times are skipped until --force is given
+MAX_ATTEMPTS = 3
+# Conversion speed assumed by the dry run before any job completed, in bytes/s
+DEFAULT_THROUGHPUT = 50 * 1024 * 1024
+
 def get_video_fps(video_file, user_fps=None):
     """
     Returns the frame rate of the video using ffprobe, or a user-defined FPS.
@@ -63,76 +77,229 @@ def get_video_fps(video_file, user_fps=None):
         print(f"Error getting FPS: {e}")
         return None
 
-def process_video(folder, extension="h264", user_fps=None):
+def chunk_number(filename):
     """
-    Process video in folder with detailed status updates and a progress bar.
+    Returns the chunk number encoded in the last 5 digits of a chunk filename.
     """
-    os.chdir(folder)
-    print(f"Processing folder: {folder}")
-    video_files = glob(f"*.{extension}")
+    return int(os.path.basename(filename).split('_')[-1].split('.')[0])
+
+def plan_folder(folder, extension="h264"):
+    """
+    Describe the conversion of one folder: its chunks in order, their size and the output file.
+    Returns None if the folder has no chunks.
+    """
+    folder = os.path.abspath(folder)
+    video_files = glob(os.path.join(folder, f"*.{extension}"))
     if not video_files:
-        print(f"No .{extension} files found in the folder.")
-        return
+        return None
 
     # Sort files based on the last 5 digits in the filename
-    video_files.sort(key=lambda f: int(f.split('_')[-1].split('.')[0]))
-    print(f"Number of .{extension} files: {len(video_files)}")
-
-    # Get the first video file to process and create the output filename
-    video_file = video_files[0]
-    prefix = os.path.splitext(video_file)[0]
+    video_files.sort(key=chunk_number)
+    prefix = os.path.splitext(os.path.basename(video_files[0]))[0]
     prefix = re.sub(r'_\d{5}$', '_merged', prefix)
-    tmp_file = f"{prefix}.tmp"
-    filename = f"{prefix}.mp4"
-    fps = get_video_fps(video_file, user_fps)
+
+    return {
+        "folder": folder,
+        "files": video_files,
+        "bytes": sum(os.path.getsize(f) for f in video_files),
+        "output": os.path.join(folder, f"{prefix}.mp4"),
+    }
+
+def plan_jobs(root_path, extension="h264", force=False, ledger=None):
+    """
+    Walk root_path once and return the conversion jobs, sorted by folder.
+
+    Folders that already contain an mp4 are skipped unless force is set, and so are
+    folders that failed MAX_ATTEMPTS times in previous runs.
+    """
+    jobs = []
+    for folder, _, files in sorted(os.walk(root_path)):
+        if not any(f.endswith(f".{extension}") for f in files):
+            continue
+        if not force and any(f.endswith(".mp4") for f in files):
+            continue
+        if not force and ledger is not None and ledger.attempts(folder) >= MAX_ATTEMPTS:
+            print(f"Skipping {folder}: failed {MAX_ATTEMPTS} times, use --force to retry")
+            continue
+        job = plan_folder(folder, extension)
+        if job is not None:
+            jobs.append(job)
+    return jobs
+
+class JobLedger:
+    """
+    Persistent record of conversion jobs, so that an interrupted run can be resumed.
+
+    The ledger is a JSON file mapping each folder to its status (running, done or failed),
+    the number of attempts, and the bytes and seconds it took. It is rewritten
+    atomically after every change, so it is never left half written.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._jobs = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self._jobs = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Could not read job ledger {path}, starting a new one: {e}")
+
+        # jobs still marked as running were interrupted
+        for entry in self._jobs.values():
+            if entry.get("status") == "running":
+                entry["status"] = "interrupted"
+
+    def _save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._jobs, f, indent=1, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def get(self, folder):
+        with self._lock:
+            return dict(self._jobs.get(os.path.abspath(folder), {}))
+
+    def attempts(self, folder):
+        entry = self.get(folder)
+        if entry.get("status") == "done":
+            return 0
+        return entry.get("attempts", 0)
+
+    def update(self, folder, **fields):
+        with self._lock:
+            entry = self._jobs.setdefault(os.path.abspath(folder), {})
+            entry.update(fields, updated=time.time())
+            self._save()
+
+    def start(self, job):
+        entry = self.get(job["folder"])
+        self.update(job["folder"], status="running", attempts=entry.get("attempts", 0) + 1,
+                    bytes=job["bytes"], output=job["output"])
+
+    def throughput(self):
+        """
+        Returns the average conversion speed of completed jobs in bytes/s, or None.
+        """
+        with self._lock:
+            done = [e for e in self._jobs.values() if e.get("status") == "done" and e.get("seconds")]
+        if not done:
+            return None
+        return sum(e["bytes"] for e in done) / sum(e["seconds"] for e in done)
+
+def convert(job, user_fps=None):
+    """
+    Remux the chunks of one job into its mp4 output.
+
+    Chunks are streamed to ffmpeg's stdin in order, and ffmpeg writes to a .part file
+    that is renamed only once the conversion succeeded, so an interrupted run never
+    leaves an incomplete mp4 behind. Raises RuntimeError on failure.
+    """
+    fps = get_video_fps(job["files"][0], user_fps)
     if fps is None:
-        print("Could not determine FPS.")
-        return
+        raise RuntimeError("Could not determine FPS.")
+
+    part_file = job["output"] + ".part"
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error",
+           "-f", "h264", "-r", str(fps), "-i", "pipe:0",
+           "-vcodec", "copy", "-f", "mp4", "-y", part_file]
+
+    # stderr goes to a file: a pipe nobody reads could fill up and stall ffmpeg
+    with tempfile.TemporaryFile() as errors:
+        process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=errors)
+        try:
+            for file in job["files"]:
+                with open(file, 'rb') as fd:
+                    while chunk := fd.read(CHUNK_SIZE):
+                        process.stdin.write(chunk)
+            process.stdin.close()
+        except BrokenPipeError:
+            # ffmpeg exited early, its return code and stderr tell why
+            pass
+        returncode = process.wait()
+        errors.seek(0)
+        message = errors.read().decode("utf-8", errors="replace").strip()
+
+    if returncode != 0:
+        if os.path.exists(part_file):
+            os.remove(part_file)
+        raise RuntimeError(f"ffmpeg exited with code {returncode}: {message[-500:]}")
+
+    os.replace(part_file, job["output"])
+
+def run_jobs(jobs, ledger, workers=None, user_fps=None):
+    """
+    Convert jobs with a pool of at most `workers` concurrent ffmpeg processes.
 
-    # Calculate total size of all video files for progress reporting
-    total_size = sum(os.path.getsize(f) for f in video_files)
-    readable_size = sizeof_fmt(total_size)
-    print(f"Total size of all .{extension} files: {readable_size}")
-
-    # Merge files into one big chunk
-    with open(tmp_file, 'wb') as wfd:
-        for i, file in enumerate(video_files):
-            with open(file, 'rb') as fd:
-                while chunk := fd.read(1024 * 1024):
-                    wfd.write(chunk)
-                    print_progress(i + 1, len(video_files), total_size, wfd.tell())
-
-    print("\nStarting ffmpeg conversion... Please wait.")
-
-    # Call ffmpeg and capture its output for progress
-    cmd = f"ffmpeg -f h264 -r {fps} -i {tmp_file} -vcodec copy -y {filename} -loglevel info"
-    process = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-
-    duration_regex = re.compile(r"time=(\d{2}:\d{2}:\d{2}\.\d{2})")
-    last_reported_time = None
-    while True:
-        output = process.stdout.readline()
-        if output == '' and process.poll() is not None:
-            break
-        if output:
-            time_match = duration_regex.search(output)
-            if time_match:
-                current_time = time_match.group(1)
-                if last_reported_time != current_time:
-                    print(f"ffmpeg processing time: {current_time}", end='\r')
-                    last_reported_time = current_time
-
-    process.poll()
-    print("\nffmpeg conversion completed.")
-    os.remove(tmp_file)
-
-def print_progress(current_file, total_files, total_size, current_size):
-    percent = (current_size / total_size) * 100
-    bar_length = 40
-    filled_length = int(round(bar_length * current_file / float(total_files)))
-    bar = '#' * filled_length + '-' * (bar_length - filled_length)
-    os.sys.stdout.write(f"\rMerging file {current_file}/{total_files} |{bar}| {percent:.2f}% Completed")
-    os.sys.stdout.flush()
+    Jobs are started in the order given. Returns the number of successful conversions.
+    """
+    workers = workers or os.cpu_count() or 1
+    total = len(jobs)
+    print(f"Converting {total} folders with {min(workers, total)} workers")
+
+    def work(index, job):
+        print(f"[{index}/{total}] Converting {len(job['files'])} files "
+              f"({sizeof_fmt(job['bytes'])}) in {job['folder']}")
+        ledger.start(job)
+        started = time.time()
+        try:
+            convert(job, user_fps)
+        except Exception as e:
+            ledger.update(job["folder"], status="failed", error=str(e))
+            print(f"[{index}/{total}] Failed {job['folder']}: {e}")
+            return False
+        seconds = time.time() - started
+        ledger.update(job["folder"], status="done", seconds=seconds, error=None)
+        print(f"[{index}/{total}] Done {job['output']} in {seconds:.1f}s")
+        return True
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(work, range(1, total + 1), jobs))
+
+    succeeded = sum(results)
+    print(f"Converted {succeeded}/{total} folders")
+    return succeeded
+
+def print_plan(jobs, ledger=None, workers=None):
+    """
+    Dry run: report what would be converted, the total size and an estimated duration.
+    Returns (total_bytes, estimated_seconds).
+    """
+    workers = workers or os.cpu_count() or 1
+    throughput = (ledger.throughput() if ledger is not None else None) or DEFAULT_THROUGHPUT
+    total_bytes = sum(job["bytes"] for job in jobs)
+
+    for job in jobs:
+        note = ""
+        if ledger is not None and ledger.get(job["folder"]).get("status") in ("failed", "interrupted"):
+            note = f" (resuming, {ledger.get(job['folder'])['status']})"
+        print(f"{sizeof_fmt(job['bytes']):>10}  {len(job['files']):5d} files  {job['folder']}{note}")
+
+    # ffmpeg only remuxes, so conversions are mostly bound by reading the chunks
+    estimated = total_bytes / throughput / max(1, min(workers, len(jobs)))
+    print(f"{len(jobs)} folders, {sizeof_fmt(total_bytes)} in total, estimated time "
+          f"{estimated / 60:.1f} min with {workers} workers at {sizeof_fmt(throughput)}/s each")
+    return total_bytes, estimated
+
+def process_video(folder, extension="h264", user_fps=None):
+    """
+    Convert the chunks in a single folder.
+    """
+    print(f"Processing folder: {folder}")
+    job = plan_folder(folder, extension)
+    if job is None:
+        print(f"No .{extension} files found in the folder.")
+        return
+    print(f"Number of .{extension} files: {len(job['files'])}, total size: {sizeof_fmt(job['bytes'])}")
+    try:
+        convert(job, user_fps)
+    except RuntimeError as e:
+        print(f"Conversion failed: {e}")
+        return
+    print(f"ffmpeg conversion completed: {job['output']}")
 
 def sizeof_fmt(num, suffix='B'):
     """
@@ -153,18 +320,16 @@ def list_mp4s(root_path):
 
     return have_mp4s
 
-def crawl(root_path, extension="h264", force=False, user_fps=None):
+def crawl(root_path, extension="h264", force=False, user_fps=None, workers=None, ledger_path=None, dry_run=False):
     """
-    Crawl all terminal folders in root_path.
+    Crawl all terminal folders in root_path and convert them, resuming from the job ledger.
     """
-    all_folders = [x[0] for x in os.walk(root_path)]
-    have_mp4s = [p for p in all_folders if glob(os.path.join(p, "*.mp4"))]
-    terminal_folders = [p for p in all_folders if glob(os.path.join(p, f"*.{extension}"))]
-
-    folders_to_process = terminal_folders if force else [folder for folder in terminal_folders if folder not in have_mp4s]
-    print(f"We have {len(folders_to_process)} new folders to process")
-    for folder in folders_to_process:
-        process_video(folder, extension, user_fps)
+    ledger = JobLedger(ledger_path or os.path.join(root_path, LEDGER_NAME))
+    jobs = plan_jobs(root_path, extension, force, ledger)
+    print(f"We have {len(jobs)} new folders to process")
+    if dry_run:
+        return print_plan(jobs, ledger, workers)
+    return run_jobs(jobs, ledger, workers, user_fps)
 
 def purge_h264_files(root_path, extension="h264"):
     """
@@ -204,6 +369,9 @@ if __name__ == '__main__':
     parser.add_option("--force", dest="force", default=False, help="Force recreating videos even when MP4s are present", action="store_true")
     parser.add_option("--fps", dest="fps", type="float", help="Override the auto-detection of FPS with a user-defined value")
     parser.add_option("--purge", dest="purge", default=False, help="Purge .h264 files in folders where .mp4 exists", action="store_true")
+    parser.add_option("-j", "--workers", dest="workers", type="int", default=None, help="Number of folders converted in parallel (default: one per CPU)")
+    parser.add_option("--ledger", dest="ledger", default=None, help=f"Job ledger used to resume interrupted runs (default: <path>/{LEDGER_NAME})")
+    parser.add_option("-n", "--dry-run", dest="dry_run", default=False, help="Only report the folders to convert, their size and the estimated time", action="store_true")
     (options, args) = parser.parse_args()
     option_dict = vars(options)
 
@@ -227,5 +395,8 @@ if __name__ == '__main__':
         option_dict['path'],
         extension=option_dict["extension"],
         force=option_dict["force"],
-        user_fps=option_dict.get("fps")
+        user_fps=option_dict.get("fps"),
+        workers=option_dict["workers"],
+        ledger_path=option_dict["ledger"],
+        dry_run=option_dict["dry_run"]
     )
@@ -0,0 +1,204 @@
+"""
+Tests for h264_to_mp4.py, using fake ffmpeg and ffprobe executables on PATH.
+
+The fake ffmpeg copies its stdin to the output file and logs when it starts and
+stops, so chunk ordering, the worker limit and resuming can be checked without
+real video files.
+
+Usage:
+    python -m pytest accessories/test_h264_to_mp4.py
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import h264_to_mp4  # noqa: E402
+
+FAKE_FFMPEG = """#!{python}
+import os, sys, time
+out = sys.argv[-1]
+log = os.environ["FAKE_FFMPEG_LOG"]
+with open(log, "a") as f:
+    f.write("start %s %f\\n" % (out, time.time()))
+data = sys.stdin.buffer.read()
+time.sleep(float(os.environ.get("FAKE_FFMPEG_DELAY", "0")))
+fail = os.environ.get("FAKE_FFMPEG_FAIL")
+if fail and fail in out:
+    sys.stderr.write("simulated failure\\n")
+    sys.exit(1)
+with open(out, "wb") as f:
+    f.write(data)
+with open(log, "a") as f:
+    f.write("stop %s %f\\n" % (out, time.time()))
+"""
+
+FAKE_FFPROBE = """#!{python}
+print("25/1")
+"""
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    for name, script in (("ffmpeg", FAKE_FFMPEG), ("ffprobe", FAKE_FFPROBE)):
+        path = bin_dir / name
+        path.write_text(script.format(python=sys.executable))
+        path.chmod(0o755)
+    log = tmp_path / "ffmpeg.log"
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_FFMPEG_LOG", str(log))
+    return log
+
+
+def make_folder(root, name, n_chunks=3):
+    """Create a folder of video chunks, each containing its own chunk number."""
+    folder = root / name
+    folder.mkdir(parents=True)
+    # written out of order, and with numbers that sort wrongly as strings
+    for i in reversed(range(1, n_chunks + 1)):
+        (folder / f"2024-01-01_12-00-00_{name}_{i * 5:05d}.h264").write_bytes(
+            f"<{i}>".encode() * 100
+        )
+    return folder
+
+
+def expected_content(n_chunks):
+    return b"".join(f"<{i}>".encode() * 100 for i in range(1, n_chunks + 1))
+
+
+def read_log(log):
+    events = []
+    for line in log.read_text().splitlines():
+        kind, out, t = line.split()
+        events.append((float(t), kind, out))
+    return sorted(events)
+
+
+def test_chunks_are_streamed_in_order(tmp_path, fake_ffmpeg):
+    root = tmp_path / "videos"
+    folder = make_folder(root, "a", n_chunks=12)
+
+    assert h264_to_mp4.crawl(str(root), workers=2) == 1
+
+    outputs = list(folder.glob("*.mp4"))
+    assert [p.name for p in outputs] == ["2024-01-01_12-00-00_a_merged.mp4"]
+    assert outputs[0].read_bytes() == expected_content(12)
+    assert not list(folder.glob("*.part"))
+    assert not list(folder.glob("*.tmp"))
+
+
+def test_parallelism_is_bounded(tmp_path, fake_ffmpeg, monkeypatch):
+    root = tmp_path / "videos"
+    for name in "abcdef":
+        make_folder(root, name)
+    monkeypatch.setenv("FAKE_FFMPEG_DELAY", "0.3")
+
+    assert h264_to_mp4.crawl(str(root), workers=2) == 6
+
+    running = max_running = 0
+    for _, kind, _ in read_log(fake_ffmpeg):
+        running += 1 if kind == "start" else -1
+        max_running = max(max_running, running)
+    assert max_running == 2
+    # jobs are dispatched in folder order, two at a time
+    starts = [
+        os.path.basename(os.path.dirname(out))
+        for _, kind, out in read_log(fake_ffmpeg)
+        if kind == "start"
+    ]
+    assert set(starts[:2]) == {"a", "b"}
+    assert set(starts[4:]) == {"e", "f"}
+
+
+def test_failed_jobs_are_resumed(tmp_path, fake_ffmpeg, monkeypatch):
+    root = tmp_path / "videos"
+    for name in "abc":
+        make_folder(root, name)
+
+    monkeypatch.setenv("FAKE_FFMPEG_FAIL", "_b_")
+    assert h264_to_mp4.crawl(str(root), workers=3) == 2
+
+    ledger = json.loads((root / h264_to_mp4.LEDGER_NAME).read_text())
+    assert ledger[str(root / "a")]["status"] == "done"
+    assert ledger[str(root / "b")]["status"] == "failed"
+    assert "simulated failure" in ledger[str(root / "b")]["error"]
+    assert not list((root / "b").glob("*.mp4*"))
+
+    # the second run only converts the folder that failed
+    monkeypatch.delenv("FAKE_FFMPEG_FAIL")
+    fake_ffmpeg.unlink()
+    assert h264_to_mp4.crawl(str(root), workers=3) == 1
+    assert [out for _, kind, out in read_log(fake_ffmpeg) if kind == "start"] == [
+        str(root / "b" / "2024-01-01_12-00-00_b_merged.mp4.part")
+    ]
+    ledger = json.loads((root / h264_to_mp4.LEDGER_NAME).read_text())
+    assert ledger[str(root / "b")]["status"] == "done"
+    assert ledger[str(root / "b")]["attempts"] == 2
+
+
+def test_interrupted_run_is_resumed(tmp_path, fake_ffmpeg):
+    root = tmp_path / "videos"
+    folder = make_folder(root, "a")
+    # a previous run was killed half way through this folder
+    (folder / "2024-01-01_12-00-00_a_merged.mp4.part").write_bytes(b"partial")
+    ledger_path = root / h264_to_mp4.LEDGER_NAME
+    ledger_path.write_text(
+        json.dumps({str(folder): {"status": "running", "attempts": 1}})
+    )
+
+    ledger = h264_to_mp4.JobLedger(str(ledger_path))
+    assert ledger.get(str(folder))["status"] == "interrupted"
+
+    assert h264_to_mp4.crawl(str(root)) == 1
+    assert (
+        folder / "2024-01-01_12-00-00_a_merged.mp4"
+    ).read_bytes() == expected_content(3)
+    assert not (folder / "2024-01-01_12-00-00_a_merged.mp4.part").exists()
+
+
+def test_repeatedly_failing_folders_are_skipped(tmp_path, fake_ffmpeg, monkeypatch):
+    root = tmp_path / "videos"
+    make_folder(root, "a")
+    monkeypatch.setenv("FAKE_FFMPEG_FAIL", "_a_")
+    for _ in range(h264_to_mp4.MAX_ATTEMPTS):
+        assert h264_to_mp4.crawl(str(root)) == 0
+
+    fake_ffmpeg.unlink()
+    assert h264_to_mp4.crawl(str(root)) == 0
+    assert not fake_ffmpeg.exists()
+    assert h264_to_mp4.crawl(str(root), force=True) == 0
+    assert fake_ffmpeg.exists()
+
+
+def test_dry_run_plans_without_converting(tmp_path, fake_ffmpeg, capsys):
+    root = tmp_path / "videos"
+    make_folder(root, "a", n_chunks=4)
+    make_folder(root, "b", n_chunks=2)
+    done = make_folder(root, "c")
+    (done / "c_merged.mp4").write_bytes(b"")
+
+    total_bytes, estimated = h264_to_mp4.crawl(str(root), workers=2, dry_run=True)
+
+    assert total_bytes == 6 * 300
+    assert estimated == pytest.approx(total_bytes / h264_to_mp4.DEFAULT_THROUGHPUT / 2)
+    assert not fake_ffmpeg.exists()
+    assert not list(root.glob("[ab]/*.mp4*"))
+    assert "2 folders" in capsys.readouterr().out
+
+
+def test_dry_run_uses_measured_throughput(tmp_path):
+    ledger = h264_to_mp4.JobLedger(str(tmp_path / "ledger.json"))
+    ledger.update("/videos/a", status="done", bytes=1000, seconds=2.0)
+    ledger.update("/videos/b", status="failed", bytes=5000, seconds=None)
+
+    jobs = [{"folder": "/videos/c", "files": ["x"], "bytes": 3000, "output": "x.mp4"}]
+    assert h264_to_mp4.print_plan(jobs, ledger, workers=4) == (3000, pytest.approx(6.0))
+
+    # the ledger survives a restart
+    assert h264_to_mp4.JobLedger(str(tmp_path / "ledger.json")).throughput() == 500
@@ -82,4 +82,17 @@ we developed an ``R`` package named `rethomics <https://github.com/gilestrolab/r
 
 """
 
-from . import control, core, hardware, roi_builders, stimulators, trackers, utils
+import importlib
+
+# core comes first: its modules and the base stimulator import each other
+from . import core, utils
+
+# Other subpackages are imported on first access, so that using one module does not
+# load every stimulator, tracker and hardware interface (see ethoscope.utils.plugins)
+_SUBPACKAGES = ("control", "hardware", "roi_builders", "stimulators", "trackers")
+
+
+def __getattr__(name):
+    if name in _SUBPACKAGES:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -2,6 +2,7 @@ import datetime
 import logging
 import os
 import pickle
+import queue
 
 # streaming socket
 import socket
@@ -23,6 +24,230 @@ from ethoscope.utils.description import DescribedObject
 STREAMING_PORT = 8887
 
 
+class _FrameStage(threading.Thread):
+    """
+    A processing stage of the recording pipeline, running in its own thread.
+
+    Items are handed over by the capture thread through a bounded queue with :meth:`submit`, which never blocks:
+    when the queue is full the item is dropped and counted, so that a slow consumer (disk, encoder, network)
+    can never stall frame acquisition.
+    """
+
+    _POLL_INTERVAL = 0.5
+
+    def __init__(self, max_queue_size=32, name=None):
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stop_event = threading.Event()
+        self.processed_items = 0
+        self.dropped_items = 0
+        self.error = None
+        super().__init__(name=name, daemon=True)
+
+    def submit(self, *item):
+        """
+        Queues an item for processing without blocking.
+
+        :return: whether the item was accepted. ``False`` means it was dropped.
+        :rtype: bool
+        """
+        if self._stop_event.is_set():
+            return False
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.dropped_items += 1
+            return False
+
+    def run(self):
+        try:
+            while True:
+                try:
+                    item = self._queue.get(timeout=self._POLL_INTERVAL)
+                except queue.Empty:
+                    if self._stop_event.is_set():
+                        break
+                    continue
+                self._process(*item)
+                self.processed_items += 1
+        except Exception as e:
+            self.error = e
+            logging.error(f"{self.name} stopped with an error: {e}")
+            logging.error(traceback.format_exc())
+        finally:
+            self._stop_event.set()
+            self._close()
+
+    def stop(self, timeout=10):
+        """
+        Stops the stage once every item already queued has been processed.
+        """
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    @property
+    def queue_size(self):
+        return self._queue.qsize()
+
+    def _process(self, *item):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+
+class ChunkedVideoWriter(_FrameStage):
+    """
+    Encoding stage of the local (non-pi camera) recording pipeline.
+
+    Frames are written with ``cv2.VideoWriter`` into consecutive chunks of ``chunk_duration`` seconds,
+    measured on the frame timestamps rather than on the wall clock. Every new chunk is appended to a
+    tab separated index file (``<video_prefix>_index.tsv``) with its number, the timestamp (ms) of its first frame,
+    the wall clock time at which it was opened and its file name, so the chunks can be realigned regardless of fps drift.
+
+    The first chunk is closed after ``warmup_frames`` frames so that the following chunks are encoded
+    with a better estimate of the actual camera fps.
+    """
+
+    _INDEX_HEADER = "chunk\tstart_ms\twall_time\tfps\tfilename\n"
+
+    def __init__(
+        self,
+        filename_factory,
+        fps_getter,
+        frame_size,
+        index_path=None,
+        chunk_duration=300,
+        warmup_frames=150,
+        fourcc="H264",
+        max_queue_size=64,
+    ):
+        """
+        :param filename_factory: a callable returning the path of the next chunk
+        :param fps_getter: a callable returning the fps to encode the next chunk at
+        :param frame_size: the (width, height) of the frames
+        :param index_path: where to write the chunk index. ``None`` disables the index.
+        :param chunk_duration: the duration of each chunk, in seconds
+        :param warmup_frames: the number of frames after which the first chunk is closed
+        :param fourcc: the four character code of the codec to use
+        :param max_queue_size: how many frames can wait to be encoded before new frames are dropped
+        """
+        self._filename_factory = filename_factory
+        self._fps_getter = fps_getter
+        self._frame_size = frame_size
+        self._index_path = index_path
+        self._chunk_duration_ms = chunk_duration * 1000
+        self._warmup_frames = warmup_frames
+        self._fourcc = cv2.VideoWriter_fourcc(*fourcc)
+
+        self._writer = None
+        self._chunk_start_ms = None
+        self._frames_in_chunk = 0
+        self.chunks = []
+
+        super().__init__(max_queue_size=max_queue_size, name="ChunkedVideoWriter")
+
+    def _chunk_due(self, t_ms):
+        if self._writer is None:
+            return True
+        if len(self.chunks) == 1 and self._frames_in_chunk >= self._warmup_frames:
+            return True
+        return t_ms - self._chunk_start_ms >= self._chunk_duration_ms
+
+    def _open_chunk(self, t_ms):
+        self._release_writer()
+
+        filename = self._filename_factory()
+        fps = self._fps_getter()
+        self._writer = cv2.VideoWriter(filename, self._fourcc, fps, self._frame_size)
+        if not self._writer.isOpened():
+            logging.error(
+                "Error: failed to open Video writer destination. The Video file cannot be saved."
+            )
+
+        self._chunk_start_ms = t_ms
+        self._frames_in_chunk = 0
+        self.chunks.append(filename)
+        self._write_index_entry(len(self.chunks), t_ms, fps, filename)
+
+    def _write_index_entry(self, chunk, t_ms, fps, filename):
+        if self._index_path is None:
+            return
+        new_file = not os.path.exists(self._index_path)
+        with open(self._index_path, "a") as f:
+            if new_file:
+                f.write(self._INDEX_HEADER)
+            f.write(
+                f"{chunk}\t{t_ms}\t{time.time():.3f}\t{fps:.2f}\t{os.path.basename(filename)}\n"
+            )
+
+    def _release_writer(self):
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+
+    def _process(self, t_ms, frame):
+        if self._chunk_due(t_ms):
+            self._open_chunk(t_ms)
+        if self._writer.isOpened():
+            self._writer.write(frame)
+        self._frames_in_chunk += 1
+
+    def _close(self):
+        self._release_writer()
+
+    @property
+    def stats(self):
+        return {
+            "frames_written": self.processed_items,
+            "dropped_frames": self.dropped_items,
+            "chunks": len(self.chunks),
+            "queue_size": self.queue_size,
+        }
+
+
+class _PreviewSaver(_FrameStage):
+    """
+    Annotates frames and saves them as the preview image served by the webserver.
+    Only the latest frame matters, so the queue holds a single item.
+    """
+
+    def __init__(self, img_path):
+        self._img_path = img_path
+        super().__init__(max_queue_size=1, name="PreviewSaver")
+
+    def _process(self, frame, text):
+        frame = cv2.resize(frame, (640, 480))
+        cv2.putText(frame, text, (20, 20), 1, 1, (255, 255, 255))
+        cv2.imwrite(self._img_path, frame)
+
+
+class _StreamSender(_FrameStage):
+    """
+    JPEG encodes frames and sends them to a connected streaming client.
+    """
+
+    def __init__(self, client_socket, max_queue_size=2):
+        self._client_socket = client_socket
+        super().__init__(max_queue_size=max_queue_size, name="StreamSender")
+
+    def _process(self, frame, text):
+        frame = cv2.resize(frame, (640, 480))
+        frame = cv2.putText(frame, text, (20, 20), 1, 1, (255, 255, 255))
+        _, frame = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 90])
+
+        data = pickle.dumps(frame)
+        message = struct.pack("Q", len(data)) + data
+        self._client_socket.sendall(message)
+
+    def _close(self):
+        try:
+            self._client_socket.close()
+        except OSError:
+            pass
+
+
 class cameraCaptureThread(threading.Thread):
     """
     This opens a camera process for recording or streaming video - this is not used during tracking
@@ -32,11 +257,17 @@ class cameraCaptureThread(threading.Thread):
     Otherwise one can use V4L2 recording and record images coming from the camera queue, but this is slow (1-8FPS depending on resolution)
     For recording, files are saved in chunks of time duration
 
+    This thread only acquires frames. Encoding to file, saving the preview and streaming each run in their own
+    stage (see :class:`ChunkedVideoWriter`), fed through bounded queues, so that none of them can stall acquisition.
+    Frames that cannot be queued are dropped and counted in :attr:`stats`.
+
     In principle, streaming and recording could be done simultaneously ( see https://picamera.readthedocs.io/en/release-1.12/recipes2.html#capturing-images-whilst-recording )
     but for now they are handled independently
     """
 
     _VIDEO_CHUNCK_DURATION = 30 * 10
+    _FPS_WARMUP_FRAMES = 150
+    _PREVIEW_REFRESH_TIME = 5
 
     def __init__(
         self,
@@ -91,6 +322,8 @@ class cameraCaptureThread(threading.Thread):
         )
 
         self.video_file_index = 0
+        self._video_writer = None
+        self._preview_saver = None
 
         super().__init__()
 
@@ -121,9 +354,8 @@ class cameraCaptureThread(threading.Thread):
         except OSError as e:
             raise e
 
-    def _save_preview_frame(self, frame, writing_status):
-        """ """
-        timestamp = (
+    def _preview_text(self, writing_status):
+        return (
             datetime.datetime.now().strftime("%m/%d/%Y, %H:%M:%S")
             + " FPS: "
             + str(round(self.camera.fps, 2))
@@ -131,21 +363,50 @@ class cameraCaptureThread(threading.Thread):
             + writing_status
         )
 
-        frame = cv2.resize(frame, (640, 480))
-        cv2.putText(frame, timestamp, (20, 20), 1, 1, (255, 255, 255))
+    def _save_preview_frame(self, frame, writing_status):
+        """
+        Hands a copy of the frame over to the preview stage, which annotates and saves it
+        """
         self.preview_time = time.time()
+        self._preview_saver.submit(frame.copy(), self._preview_text(writing_status))
+
+    def _start_video_writer(self):
+        self._video_writer = ChunkedVideoWriter(
+            filename_factory=lambda: self._get_video_chunk_filename(ext="h264"),
+            fps_getter=lambda: self.camera.fps,
+            frame_size=(self.camera.width, self.camera.height),
+            index_path=f"{self._video_prefix}_index.tsv",
+            chunk_duration=self._VIDEO_CHUNCK_DURATION,
+            warmup_frames=self._FPS_WARMUP_FRAMES,
+        )
+        self._video_writer.start()
 
-        # save the annotated frame for preview
-        cv2.imwrite(self._img_path, frame)
+    @property
+    def stats(self):
+        """
+        :return: frame accounting for the recording pipeline
+        :rtype: dict
+        """
+        stats = {"frames_captured": getattr(self, "frames_captured", 0)}
+        if self._video_writer is not None:
+            stats.update(self._video_writer.stats)
+        return stats
 
     def run(self):
         """
-        Iterates the camera object for images and writes them the to a video file, dividing the video in multiple AVI
-        Every 5 seconds, updates the preview frame served over the network by the webserver adding some info text on it
+        Iterates the camera object for images and dispatches them to the recording, preview and streaming stages.
+        Every 5 seconds, the preview frame served over the network by the webserver is updated with some info text on it
         """
 
         self.start_time = self.preview_time = time.time()
-        writer = None
+        self.frames_captured = 0
+
+        if self._local_recording:
+            self._start_video_writer()
+
+        if not self._stream:
+            self._preview_saver = _PreviewSaver(self._img_path)
+            self._preview_saver.start()
 
         if self._stream:
             server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -154,6 +415,7 @@ class cameraCaptureThread(threading.Thread):
             server_socket.listen(5)
             logging.info("Socket stream initiliased.")
 
+        stream_sender = None
         while not self.stop_camera_activity:
 
             # waiting for the streaming connection to be established
@@ -161,75 +423,59 @@ class cameraCaptureThread(threading.Thread):
                 logging.info("Waiting for a connection to start streaming")
                 client_socket, client_address = server_socket.accept()  # blocking call
                 logging.info("Connection established!")
+                stream_sender = _StreamSender(client_socket)
+                stream_sender.start()
 
             # processing images one by one
-            for ix, (_, frame) in enumerate(self.camera):
+            for t_ms, frame in self.camera:
 
                 if self.stop_camera_activity:
                     break
 
-                if self._local_recording:
-                    if writer and writer.isOpened():
-                        writer.write(frame)
-
-                    # Wait for the first 150 frames before opening the video writer object - this is done to calcualate a decent approximation of actual FPS
-                    if (
-                        (time.time() - self.start_time >= self._VIDEO_CHUNCK_DURATION)
-                        or ix == 150
-                        and writer
-                    ):
-                        writer.release()
-
-                    writer = cv2.VideoWriter(
-                        self._get_video_chunk_filename(ext="h264"),
-                        cv2.VideoWriter_fourcc(*"H264"),
-                        self.camera.fps,
-                        (self.camera.width, self.camera.height),
-                    )
-                    if not writer.isOpened():
-                        logging.error(
-                            "Error: failed to open Video writer destination. The Video file cannot be saved."
-                        )
-
-                    self.start_time = time.time()
-
-                if self._stream:
-
-                    # annotate frame for streaming
-                    frame = cv2.resize(frame, (640, 480))
-                    frame = cv2.putText(
-                        frame,
-                        "FPS: " + str(round(self.camera.fps, 2)),
-                        (20, 20),
-                        1,
-                        1,
-                        (255, 255, 255),
-                    )
-                    _, frame = cv2.imencode(
-                        ".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 90]
-                    )
+                self.frames_captured += 1
 
-                    # send it to stream
-                    data = pickle.dumps(frame)
-                    message = struct.pack("Q", len(data)) + data
-                    client_socket.sendall(message)
+                if self._video_writer is not None:
+                    # the encoder holds on to the frame, so it must own its copy
+                    self._video_writer.submit(t_ms, frame.copy())
 
-                # AFTER writing, annotates the frame for preview but only once every 5 seconds
-                if not self._stream and ((time.time() - self.preview_time) > 5):
+                if stream_sender is not None:
+                    if not stream_sender.is_alive():
+                        logging.info("Streaming client disconnected.")
+                        break
+                    stream_sender.submit(
+                        frame.copy(), "FPS: " + str(round(self.camera.fps, 2))
+                    )
+
+                # annotates a frame for preview but only once every 5 seconds
+                if not self._stream and (
+                    (time.time() - self.preview_time) > self._PREVIEW_REFRESH_TIME
+                ):
                     writing_status = (
-                        "CV2 Writing" if writer is not None else "PI Recording"
+                        "CV2 Writing"
+                        if self._video_writer is not None
+                        else "PI Recording"
                     )
                     self._save_preview_frame(frame, writing_status)
 
+            if stream_sender is not None:
+                stream_sender.stop()
+                stream_sender = None
+
+            if not self._stream:
+                break
+
         # out of the loop - exit signal received
         self.camera._close()
 
         if self._stream:
-            client_socket.close()
             server_socket.close()
 
-        if writer:
-            writer.release()
+        if self._video_writer is not None:
+            self._video_writer.stop()
+            logging.info(f"Video writer closed: {self._video_writer.stats}")
+
+        if self._preview_saver is not None:
+            self._preview_saver.stop()
 
 
 class GeneralVideoRecorder(DescribedObject):
@@ -315,6 +561,7 @@ class GeneralVideoRecorder(DescribedObject):
             bitrate,
             quality,
             stream,
+            record_video=record_video,
         )
 
     def start_recording(self):
@@ -522,7 +769,10 @@ class ControlThreadVideoRecording(ControlThread):
         try:
             from ethoscope.utils import pi
 
-            space_result = pi.manage_disk_space(ethoscope_dir)
+            # ethoscope_dir is the videos folder of the data directory here
+            space_result = pi.manage_disk_space(
+                os.path.dirname(os.path.normpath(ethoscope_dir))
+            )
             if space_result.get("cleanup_performed", False):
                 logging.info(
                     f"Disk space cleanup completed: {space_result.get('cleanup_summary', {}).get('files_deleted', 0)} files removed"
@@ -16,7 +16,7 @@ from threading import Thread
 import cv2
 
 from ethoscope.core.monitor import Monitor
-from ethoscope.drawers.drawers import DefaultDrawer, NullDrawer
+from ethoscope.drawers.drawers import DefaultDrawer
 from ethoscope.hardware.input.cameras import (
     MovieVirtualCamera,
     OurPiCameraAsync,
@@ -28,34 +28,10 @@ from ethoscope.io import (
     SQLiteResultWriter,
     create_metadata_cache,
 )
-from ethoscope.roi_builders.file_based_roi_builder import FileBasedROIBuilder
-from ethoscope.roi_builders.target_roi_builder import TargetGridROIBuilder
-from ethoscope.stimulators.composed_stimulator import ComposedStimulator
-from ethoscope.stimulators.multi_stimulator import MultiStimulator
-from ethoscope.stimulators.odour_stimulators import (
-    DynamicOdourSleepDepriver,
-    MiddleCrossingOdourStimulator,
-    MiddleCrossingOdourStimulatorFlushed,
-)
-from ethoscope.stimulators.optomotor_stimulators import OptoMidlineCrossStimulator
-from ethoscope.stimulators.sleep_depriver_stimulators import (
-    AGO,
-    ExperimentalSleepDepStimulator,
-    MiddleCrossingStimulator,
-    OptomotorSleepDepriver,
-    OptoSleepDepriver,
-    SleepDepStimulator,
-    mAGO,
-)
-from ethoscope.stimulators.sleep_restriction_stimulators import (
-    SimpleTimeRestrictedStimulator,
-    mAGOSleepRestriction,
-)
-from ethoscope.stimulators.stimulators import DefaultStimulator
-from ethoscope.trackers.adaptive_bg_tracker import AdaptiveBGModel
 from ethoscope.utils import pi
 from ethoscope.utils.debug import EthoscopeException
 from ethoscope.utils.description import DescribedObject
+from ethoscope.utils.plugins import REGISTRY
 
 
 class ExperimentalInformation(DescribedObject):
@@ -155,50 +131,12 @@ class ControlThread(Thread):
                     "possible_classes": [ExperimentalInformation],
                 },
             ),
-            (
-                "interactor",
-                {
-                    "possible_classes": [
-                        DefaultStimulator,
-                        ComposedStimulator,
-                        SleepDepStimulator,
-                        OptomotorSleepDepriver,
-                        MiddleCrossingStimulator,
-                        # SystematicSleepDepInteractor,
-                        ExperimentalSleepDepStimulator,
-                        # GearMotorSleepDepStimulator,
-                        # DynamicOdourDeliverer,
-                        DynamicOdourSleepDepriver,
-                        OptoMidlineCrossStimulator,
-                        OptoSleepDepriver,
-                        MiddleCrossingOdourStimulator,
-                        MiddleCrossingOdourStimulatorFlushed,
-                        mAGO,
-                        AGO,
-                        mAGOSleepRestriction,
-                        SimpleTimeRestrictedStimulator,
-                        MultiStimulator,
-                    ],
-                },
-            ),
-            (
-                "roi_builder",
-                {
-                    "possible_classes": [FileBasedROIBuilder, TargetGridROIBuilder],
-                },
-            ),
-            (
-                "tracker",
-                {
-                    "possible_classes": [AdaptiveBGModel],
-                },
-            ),
-            (
-                "drawer",
-                {
-                    "possible_classes": [DefaultDrawer, NullDrawer],
-                },
-            ),
+            # stimulators, ROI builders, trackers and drawers are registry plugins,
+            # imported only when a run uses them
+            ("interactor", {"plugins": "interactor"}),
+            ("roi_builder", {"plugins": "roi_builder"}),
+            ("tracker", {"plugins": "tracker"}),
+            ("drawer", {"plugins": "drawer"}),
             (
                 "camera",
                 {
@@ -227,10 +165,12 @@ class ControlThread(Thread):
     _hidden_options = {"camera", "tracker"}  # result_writer is now always available
 
     for k in _option_dict:
-        _option_dict[k]["class"] = _option_dict[k]["possible_classes"][0]
+        # plugin defaults are resolved when a run starts, see _parse_user_options()
+        _option_dict[k]["class"] = _option_dict[k].get("possible_classes", [None])[0]
         _option_dict[k]["kwargs"] = {}
 
     _tmp_last_img_file = "last_img.jpg"
+    _last_img_write_interval = 1.0  # seconds between two updates of the preview image
     _dbg_img_file = "dbg_img.png"
     _log_file = "ethoscope.log"
 
@@ -504,29 +444,25 @@ class ControlThread(Thread):
             # check if the options for the remote class will be visible
             # they will be visible only if they have a description, and if we are on a PC or they are not hidden
             if (
-                key not in self._hidden_options
-                or pi.isExperimental()
-                or not self._is_a_rPi
+                key in self._hidden_options
+                and not pi.isExperimental()
+                and self._is_a_rPi
             ):
-                out[key] = []
-                for p in value["possible_classes"]:
-                    try:
-                        if pi.isExperimental():
-                            d = p.__dict__["_description"]
-                            d["name"] = p.__name__
-                            out[key].append(d)
-
-                        elif (
-                            not pi.isExperimental()
-                            and "hidden" not in p.__dict__["_description"]
-                            or not p.__dict__["_description"]["hidden"]
-                        ):
-                            d = p.__dict__["_description"]
-                            d["name"] = p.__name__
-                            out[key].append(d)
-
-                    except KeyError:
-                        continue
+                continue
+
+            if "plugins" in value:
+                out[key] = REGISTRY.user_options(
+                    value["plugins"], include_hidden=pi.isExperimental()
+                )
+                continue
+
+            out[key] = []
+            for p in value["possible_classes"]:
+                d = p.__dict__.get("_description")
+                if d is None or (not pi.isExperimental() and d.get("hidden")):
+                    continue
+                d = dict(d, name=p.__name__)
+                out[key].append(d)
 
         out_curated = {}
         for key, value in list(out.items()):
@@ -543,10 +479,18 @@ class ControlThread(Thread):
             logging.warning(f"No field {field}, using default")
             return None, {}
 
-        Class = eval(subdata["name"])
+        name = subdata["name"]
         kwargs = subdata["arguments"]
+        option = self._option_dict[field]
 
-        return Class, kwargs
+        if "plugins" in option:
+            # raises ValueError on unknown classes and invalid arguments
+            return REGISTRY.validate(option["plugins"], name, kwargs), kwargs
+
+        for Class in option["possible_classes"]:
+            if Class.__name__ == name:
+                return Class, kwargs
+        raise ValueError(f"Unknown {field}: {name}")
 
     def _parse_user_options(self, data):
 
@@ -559,11 +503,12 @@ class ControlThread(Thread):
             # when no field is present in the JSON config, we get the default class
 
             if Class is None:
-
-                self._option_dict[key]["class"] = self._option_dict[key][
-                    "possible_classes"
-                ][0]
-                self._option_dict[key]["kwargs"] = {}
+                option = self._option_dict[key]
+                if "plugins" in option:
+                    option["class"] = REGISTRY.load(option["plugins"])
+                else:
+                    option["class"] = option["possible_classes"][0]
+                option["kwargs"] = {}
                 continue
 
             self._option_dict[key]["class"] = Class
@@ -598,7 +543,11 @@ class ControlThread(Thread):
 
         if self._drawer:
             frame = self._drawer.last_drawn_frame
-            if frame is not None and (wall_time - self._last_img_write_time) >= 1.0:
+            if (
+                frame is not None
+                and (wall_time - self._last_img_write_time)
+                >= self._last_img_write_interval
+            ):
                 cv2.imwrite(
                     self._info["last_drawn_img"],
                     frame,
@@ -779,6 +728,13 @@ class ControlThread(Thread):
 
         DrawerClass = self._option_dict["drawer"]["class"]
         drawer_kwargs = self._option_dict["drawer"]["kwargs"]
+        if issubclass(DrawerClass, DefaultDrawer):
+            # the annotated frame is only consumed by _update_info, so there is no need to draw every frame
+            drawer_kwargs = {
+                "render_interval": self._last_img_write_interval,
+                "roi_clip": True,
+                **drawer_kwargs,
+            }
         self._drawer = DrawerClass(**drawer_kwargs)
 
         try:
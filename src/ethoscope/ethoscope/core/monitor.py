@@ -158,6 +158,7 @@ class Monitor:
                         self._last_positions,
                         self._unit_trackers,
                         self._reference_points,
+                        t=t,
                     )
                 self._last_t = t
                 time.sleep(0.001)
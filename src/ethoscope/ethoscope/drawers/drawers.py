@@ -1,6 +1,8 @@
 __author__ = "quentin"
 
 import logging
+import threading
+import time
 
 import cv2
 
@@ -12,20 +14,35 @@ except ImportError:
 
 import os
 
+from ethoscope.utils.plugins import register_plugin
+
 
 class BaseDrawer:
+
+    # extra pixels refreshed around each ROI so thick contours and labels are fully redrawn
+    _ROI_CLIP_PADDING = 4
+
     def __init__(
         self,
         video_out=None,
         draw_frames=True,
         video_out_fourcc="DIVX",
         video_out_fps=25,
+        render_interval=None,
+        roi_clip=False,
+        full_refresh_every=10,
     ):
         """
         A template class to annotate and save the processed frames. It can also save the annotated frames in a video
         file and/or display them in a new window. The :meth:`~ethoscope.drawers.drawers.BaseDrawer._annotate_frame`
         abstract method defines how frames are annotated.
 
+        By default, every frame is drawn. When ``render_interval`` is set, frames are only drawn when a consumer is due:
+        the live window (every frame), the output video (every ``1 / video_out_fps`` seconds of frame time)
+        or the preview, read through :attr:`last_drawn_frame` (every ``render_interval`` seconds of wall time).
+        With ``roi_clip``, only the ROIs whose positions or stimulator state changed since the previous rendering
+        are redrawn in a persistent buffer, and the whole frame is refreshed every ``full_refresh_every`` renderings.
+
         :param video_out: The path to the output file (.avi)
         :type video_out: str
         :param draw_frames: Whether frames should be displayed on the screen (a new window will be created).
@@ -34,6 +51,12 @@ class BaseDrawer:
         :type video_out_fourcc: str
         :param video_out_fps: When setting ``video_out``, this defines the output fps. typically, the same as the input fps.
         :type video_out_fps: float
+        :param render_interval: The minimal time, in seconds, between two renderings for the preview. ``None`` draws every frame.
+        :type render_interval: float
+        :param roi_clip: Whether to only redraw the ROIs that changed since the last rendering.
+        :type roi_clip: bool
+        :param full_refresh_every: When using ``roi_clip``, the number of renderings after which the whole frame is redrawn.
+        :type full_refresh_every: int
         """
         self._video_out = video_out
         self._draw_frames = draw_frames
@@ -42,6 +65,15 @@ class BaseDrawer:
         self._video_out_fourcc = video_out_fourcc
         self._video_out_fps = video_out_fps
 
+        self._render_interval = render_interval
+        self._roi_clip = roi_clip
+        self._full_refresh_every = full_refresh_every
+        self._last_render_time = None
+        self._last_video_t = None
+        self._renders_since_full_refresh = 0
+        self._roi_signatures = {}
+        self._frame_lock = threading.Lock()
+
         if draw_frames:
             cv2.namedWindow(self._live_window_name, cv2.WINDOW_AUTOSIZE)
 
@@ -64,9 +96,105 @@ class BaseDrawer:
 
     @property
     def last_drawn_frame(self):
-        return self._last_drawn_frame
+        """
+        :return: a copy of the last annotated frame, safe to use from another thread
+        :rtype: :class:`~numpy.ndarray`
+        """
+        if self._last_drawn_frame is None:
+            return None
+        with self._frame_lock:
+            return self._last_drawn_frame.copy()
+
+    def _video_frame_due(self, t):
+        if self._video_out is None:
+            return False
+        if self._render_interval is None:
+            return True
+        if t is None:
+            t = time.time() * 1000
+        if (
+            self._last_video_t is None
+            or t - self._last_video_t >= 1000.0 / self._video_out_fps
+        ):
+            self._last_video_t = t
+            return True
+        return False
+
+    def _preview_due(self):
+        if self._render_interval is None:
+            return True
+        now = time.time()
+        if (
+            self._last_render_time is None
+            or now - self._last_render_time >= self._render_interval
+        ):
+            self._last_render_time = now
+            return True
+        return False
+
+    def _roi_signature(self, track_u, positions):
+        stimulator_state = None
+        if hasattr(track_u.stimulator, "get_stimulator_state"):
+            try:
+                stimulator_state = track_u.stimulator.get_stimulator_state()
+            except Exception:
+                stimulator_state = "error"
+        pos_list = positions.get(track_u.roi.idx, [])
+        return stimulator_state, tuple(tuple(pos.values()) for pos in pos_list)
+
+    def _refresh_buffer(self, img, positions, tracking_units):
+        """
+        Copies the new frame in the persistent BGR buffer.
+
+        :return: the tracking units that have to be annotated again
+        :rtype: list(:class:`~ethoscope.core.tracking_unit.TrackingUnit`)
+        """
+        buffer = self._last_drawn_frame
+        full_refresh = (
+            not self._roi_clip
+            or buffer is None
+            or buffer.shape[:2] != img.shape[:2]
+            or self._renders_since_full_refresh >= self._full_refresh_every
+        )
+
+        if buffer is None or buffer.shape[:2] != img.shape[:2]:
+            buffer = None
+        self._last_drawn_frame = (
+            cv2.cvtColor(img, cv2.COLOR_GRAY2BGR, dst=buffer)
+            if full_refresh
+            else buffer
+        )
+
+        if not self._roi_clip:
+            return tracking_units
+
+        if full_refresh:
+            self._renders_since_full_refresh = 1
+            self._roi_signatures = {
+                track_u.roi.idx: self._roi_signature(track_u, positions)
+                for track_u in tracking_units
+            }
+            return tracking_units
+
+        self._renders_since_full_refresh += 1
+        height, width = img.shape[:2]
+        pad = self._ROI_CLIP_PADDING
+        dirty_units = []
+        for track_u in tracking_units:
+            signature = self._roi_signature(track_u, positions)
+            if self._roi_signatures.get(track_u.roi.idx) == signature:
+                continue
+            self._roi_signatures[track_u.roi.idx] = signature
+
+            x, y, w, h = track_u.roi.rectangle
+            x0, y0 = max(0, x - pad), max(0, y - pad)
+            x1, y1 = min(width, x + w + pad), min(height, y + h + pad)
+            self._last_drawn_frame[y0:y1, x0:x1] = img[y0:y1, x0:x1, None]
+            dirty_units.append(track_u)
 
-    def draw(self, img, positions, tracking_units, reference_points=None):
+        return dirty_units
+
+    def draw(self, img, positions, tracking_units, reference_points=None, t=None):
         """
         Draw results on a frame.
 
@@ -76,21 +204,30 @@ class BaseDrawer:
         :type positions: list(:class:`~ethoscope.core.data_point.DataPoint`)
         :param tracking_units: the tracking units corresponding to the positions
         :type tracking_units: list(:class:`~ethoscope.core.tracking_unit.TrackingUnit`)
+        :param t: the time stamp of the frame, in ms. Used to pace the output video when ``render_interval`` is set.
+        :type t: int
         :return:
         """
 
-        # self._last_drawn_frame = img.copy()
-        self._last_drawn_frame = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        video_due = self._video_frame_due(t)
+        preview_due = self._preview_due()
+        if not (self._draw_frames or video_due or preview_due):
+            return
 
-        self._annotate_frame(
-            self._last_drawn_frame, positions, tracking_units, reference_points
-        )
+        with self._frame_lock:
+            units_to_annotate = self._refresh_buffer(img, positions, tracking_units)
+            self._annotate_frame(
+                self._last_drawn_frame,
+                positions,
+                units_to_annotate,
+                reference_points,
+            )
 
         if self._draw_frames:
             cv2.imshow(self._live_window_name, self._last_drawn_frame)
             cv2.waitKey(1)
 
-        if self._video_out is None:
+        if not video_due:
             return
 
         if self._video_writer is None:
@@ -112,6 +249,7 @@ class BaseDrawer:
             self._video_writer.release()
 
 
+@register_plugin("drawer")
 class NullDrawer(BaseDrawer):
     def __init__(self):
         """
@@ -121,10 +259,11 @@ class NullDrawer(BaseDrawer):
         """
         super().__init__(draw_frames=False)
 
-    def _annotate_frame(self, img, positions, tracking_units):
+    def _annotate_frame(self, img, positions, tracking_units, reference_points=None):
         pass
 
 
+@register_plugin("drawer", default=True)
 class DefaultDrawer(BaseDrawer):
     def __init__(self, video_out=None, draw_frames=False, **kwargs):
         """
@@ -173,15 +173,40 @@ class MovieVirtualCamera(BaseCamera):
         ],
     }
 
-    def __init__(self, path, use_wall_clock=False, *args, **kwargs):
+    # frames decoded ahead of the consumer, for callers that opt in to prefetching
+    PREFETCH_FRAMES = 4
+    # stands for a frame that was skipped with grab() and is not yielded
+    _skipped_frame = np.empty((0, 0), dtype=np.uint8)
+
+    def __init__(
+        self,
+        path,
+        use_wall_clock=False,
+        *args,
+        prefetch=0,
+        target_fps=None,
+        **kwargs,
+    ):
         """
         Class to acquire frames from a video file.
 
+        With ``prefetch`` > 0, frames are decoded and converted to grey in a background thread, up
+        to ``prefetch`` frames ahead of the consumer, into a ring of preallocated buffers. A returned
+        frame is then overwritten once three more frames have been read: only callers that copy the
+        frames they keep should opt in (e.g. with ``prefetch=MovieVirtualCamera.PREFETCH_FRAMES``).
+        Frames dropped because of ``drop_each`` are skipped with ``grab()`` and never decoded.
+
         :param path: the path of the video file
         :type path: str
         :param use_wall_clock: whether to use the real time from the machine (True) or from the video file (False).\
             The former can be useful for prototyping.
         :type use_wall_clock: bool
+        :param prefetch: number of frames decoded ahead of the consumer in a background thread. The
+            default, 0, decodes each frame in the calling thread and returns a new array every time.
+        :type prefetch: int
+        :param target_fps: keep about this many frames per second of video, by setting ``drop_each``
+            from the frame rate of the file.
+        :type target_fps: float
         :param args: additional arguments.
         :param kwargs: additional keyword arguments.
         """
@@ -193,6 +218,11 @@ class MovieVirtualCamera(BaseCamera):
         self._frame_idx = 0
         self._path = path
         self._use_wall_clock = use_wall_clock
+        self._prefetch = prefetch
+        self._target_fps = target_fps
+        self._prefetch_thread = None
+        self._prefetch_queue = None
+        self._stop_prefetch = threading.Event()
 
         if not (isinstance(path, str) or isinstance(path, str)):
             raise EthoscopeException("path to video must be a string")
@@ -212,6 +242,11 @@ class MovieVirtualCamera(BaseCamera):
 
         super().__init__(*args, **kwargs)
 
+        if target_fps:
+            video_fps = self.capture.get(CAP_PROP_FPS)
+            if video_fps > 0:
+                self._drop_each = max(1, int(round(video_fps / target_fps)))
+
         # emulates v4l2 (real time camera) from video file
         if self._use_wall_clock:
             self._start_time = time.time()
@@ -230,13 +265,41 @@ class MovieVirtualCamera(BaseCamera):
         return True
 
     def restart(self):
+        self._close()
         self.__init__(
             self._path,
             use_wall_clock=self._use_wall_clock,
             drop_each=self._drop_each,
             max_duration=self._max_duration,
+            prefetch=self._prefetch,
+            target_fps=self._target_fps,
         )
 
+    def _is_kept(self, frame_idx):
+        # BaseCamera.__iter__ yields a frame when its index, counted from 1, is a multiple of drop_each
+        return (frame_idx + 1) % self._drop_each == 0
+
+    def _next_time_image(self):
+        if not self._prefetch:
+            t = self._time_stamp()
+            im = (
+                self._next_image()
+                if self._is_kept(self._frame_idx)
+                else self._skip_image()
+            )
+            self._frame_idx += 1
+            return t, im
+
+        if self._prefetch_thread is None:
+            self._start_prefetch()
+        if self._use_wall_clock:
+            t = self._time_stamp()
+            _, im = self._prefetch_queue.get()
+        else:
+            t, im = self._prefetch_queue.get()
+        self._frame_idx += 1
+        return t, im
+
     def _next_image(self):
         ret, frame = self.capture.read()
         if not ret or frame is None:
@@ -244,6 +307,62 @@ class MovieVirtualCamera(BaseCamera):
             return None
         return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
 
+    def _skip_image(self):
+        """
+        Advances past a frame that will be dropped without decoding it.
+
+        :return: ``None`` at the end of the video, otherwise an empty array that is never yielded.
+        """
+        if not self.capture.grab():
+            return None
+        return self._skipped_frame
+
+    def _start_prefetch(self):
+        self._stop_prefetch.clear()
+        self._prefetch_queue = queue.Queue(maxsize=self._prefetch)
+        self._prefetch_thread = threading.Thread(
+            target=self._prefetch_frames,
+            name="MovieVirtualCameraPrefetch",
+            daemon=True,
+        )
+        self._prefetch_thread.start()
+
+    def _prefetch_frames(self):
+        """
+        Decodes frames ahead of the consumer. Each item of the queue is the time stamp of a frame and
+        its grey image, the skipped-frame marker, or ``None`` once the video cannot be read any more.
+        """
+        w, h = self._resolution
+        # the queue holds up to prefetch frames and this thread decodes one more, so the consumer
+        # can keep the frames it has read until three more are read
+        ring = [np.empty((h, w), dtype=np.uint8) for _ in range(self._prefetch + 4)]
+        colour = np.empty((h, w, 3), dtype=np.uint8)
+        frame_idx = self._frame_idx
+        n_decoded = 0
+        while not self._stop_prefetch.is_set():
+            t = self.capture.get(CAP_PROP_POS_MSEC) / 1e3
+            if self._is_kept(frame_idx):
+                ret, frame = self.capture.read(colour)
+                if not ret or frame is None:
+                    im = None
+                else:
+                    im = cv2.cvtColor(
+                        frame, cv2.COLOR_BGR2GRAY, dst=ring[n_decoded % len(ring)]
+                    )
+                    n_decoded += 1
+            else:
+                im = self._skip_image()
+            frame_idx += 1
+
+            while not self._stop_prefetch.is_set():
+                try:
+                    self._prefetch_queue.put((t, im), timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            if im is None:
+                return
+
     def _time_stamp(self):
         if self._use_wall_clock:
             now = time.time()
@@ -257,6 +376,10 @@ class MovieVirtualCamera(BaseCamera):
         return False
 
     def _close(self):
+        if self._prefetch_thread is not None:
+            self._stop_prefetch.set()
+            self._prefetch_thread.join()
+            self._prefetch_thread = None
         self.capture.release()
 
 
@@ -10,8 +10,16 @@ Hardware: GPIO -> BS170 MOSFET -> LED -> 100ohm -> 5Vdc.
 GPIO HIGH = MOSFET on = LED on, GPIO LOW = LED off.
 
 GPIO control uses the `pinctrl` command (available on Raspberry Pi OS Bookworm+).
+
+The daemon does not poll the schedule: it works out when the light next has to
+change and sleeps until then, unless a command arrives on the control socket or
+the config file changes (noticed through inotify if the optional inotify_simple
+package is installed, otherwise by checking the file's modification time every
+poll interval). Every change of the LED is appended to a small transition log,
+so the light cycle an experiment actually saw can be audited afterwards.
 """
 
+import collections
 import datetime
 import json
 import logging
@@ -23,10 +31,19 @@ import threading
 import time
 from optparse import OptionParser
 
+try:
+    from inotify_simple import INotify
+    from inotify_simple import flags as inotify_flags
+except ImportError:
+    INotify = None
+
 DEFAULT_CONFIG_FILE = "/run/ethoscope/light_schedule.json"
 DEFAULT_SOCKET_PATH = "/run/ethoscope/light_daemon.sock"
 DEFAULT_POLL_INTERVAL = 30
 DEFAULT_GPIO_PIN = 17
+DEFAULT_TRANSITION_LOG = "/ethoscope_data/light_transitions.log"
+# The transition log is trimmed to its newest half beyond this size
+TRANSITION_LOG_MAX_BYTES = 256 * 1024
 
 _CLIENT_TIMEOUT = 1.0
 _LISTENER_ACCEPT_TIMEOUT = 0.5
@@ -37,17 +54,65 @@ class LightDaemonUnavailable(RuntimeError):
     """Raised by LightDaemonClient when the daemon socket cannot be reached."""
 
 
+class PinctrlGPIO:
+    """
+    Drives the LED's GPIO pin with the `pinctrl` command.
+
+    Args:
+        pin: BCM GPIO pin number.
+    """
+
+    def __init__(self, pin=DEFAULT_GPIO_PIN):
+        self.pin = str(pin)
+
+    def set(self, on):
+        """
+        Drive the pin HIGH (LED on) or LOW (LED off).
+
+        Raises:
+            FileNotFoundError: pinctrl is not installed.
+            subprocess.CalledProcessError, subprocess.TimeoutExpired: pinctrl failed.
+        """
+        # GPIO -> BS170 MOSFET -> LED -> 100ohm -> 5Vdc
+        # GPIO HIGH (dh) = MOSFET on = LED on
+        # GPIO LOW (dl) = MOSFET off = LED off
+        drive = "dh" if on else "dl"
+        subprocess.run(
+            ["pinctrl", "set", self.pin, "op", drive],
+            check=True,
+            capture_output=True,
+            timeout=5,
+        )
+
+
+class SystemClock:
+    """Wall-clock time for the controller; waits on its condition variable."""
+
+    def time(self):
+        return time.time()
+
+    def wait(self, condition, timeout):
+        """Wait until the condition is notified or timeout seconds elapse."""
+        return condition.wait(timeout)
+
+
 class LightController:
     """
     Controls a GPIO-connected LED based on a time-of-day schedule.
 
-    Reads a JSON config file at regular intervals and toggles the LED
-    on or off depending on the current time and the schedule.
+    Sleeps until the next lights-on or lights-off time of the JSON config file,
+    a command on the control socket or a change of the config file, and toggles
+    the LED on or off depending on the current time and the schedule.
 
     Args:
         config_file: Path to the JSON schedule config file.
-        poll_interval: Seconds between config file checks.
+        poll_interval: Longest sleep in seconds; the config file's modification
+            time is checked at least this often.
         gpio_pin: BCM GPIO pin number (default 17).
+        socket_path: Path to the control socket, or None for no socket.
+        transition_log: File the LED changes are appended to, or None.
+        clock: Provides time() and wait(condition, timeout) (default: SystemClock).
+        gpio: Provides set(on) (default: PinctrlGPIO on gpio_pin).
     """
 
     def __init__(
@@ -56,50 +121,92 @@ class LightController:
         poll_interval=DEFAULT_POLL_INTERVAL,
         gpio_pin=DEFAULT_GPIO_PIN,
         socket_path=DEFAULT_SOCKET_PATH,
+        transition_log=DEFAULT_TRANSITION_LOG,
+        clock=None,
+        gpio=None,
     ):
         self.config_file = config_file
         self.poll_interval = poll_interval
         self.gpio_pin = str(gpio_pin)
         self.socket_path = socket_path
+        self.transition_log = transition_log
+        self.clock = clock or SystemClock()
+        self.gpio = gpio or PinctrlGPIO(gpio_pin)
         self._current_state = None  # None=unknown, True=on, False=off
         self._force = None  # None=follow schedule, True/False=forced
         self._running = True
         self._lock = threading.Lock()
+        self._led_lock = threading.Lock()
+        # the main loop sleeps on this until woken or the next transition
+        self._condition = threading.Condition()
+        self._woken = False
+        self._schedule = ("", "", False)
+        self._config_signature = None
+        self._next_transition = None
         self._server_sock = None
         self._listener_thread = None
+        self._watcher_thread = None
+        self.transitions = collections.deque(maxlen=20)
 
-    def set_led(self, on):
+    def set_led(self, on, reason="manual", scheduled=None):
         """
-        Set the LED state via pinctrl.
+        Set the LED state via the GPIO backend.
 
         Args:
-            on: True = LED on (GPIO driven LOW), False = LED off (GPIO driven HIGH).
+            on: True = LED on (GPIO driven HIGH), False = LED off (GPIO driven LOW).
+            reason: Why the LED changes, recorded in the transition log.
+            scheduled: Time the schedule asked for the change, if it did.
         """
-        if on == self._current_state:
-            return
+        with self._led_lock:
+            if on == self._current_state:
+                return
+
+            try:
+                self.gpio.set(on)
+            except FileNotFoundError:
+                logging.error("pinctrl command not found. Is this a Raspberry Pi?")
+                self._running = False
+                return
+            except subprocess.CalledProcessError as e:
+                logging.error("pinctrl failed: %s", e.stderr.decode().strip())
+                return
+            except subprocess.TimeoutExpired:
+                logging.error("pinctrl command timed out")
+                return
 
-        # GPIO -> BS170 MOSFET -> LED -> 100ohm -> 5Vdc
-        # GPIO HIGH (dh) = MOSFET on = LED on
-        # GPIO LOW (dl) = MOSFET off = LED off
-        drive = "dh" if on else "dl"
-        try:
-            subprocess.run(
-                ["pinctrl", "set", self.gpio_pin, "op", drive],
-                check=True,
-                capture_output=True,
-                timeout=5,
-            )
             self._current_state = on
             logging.info(
-                "LED %s (GPIO%s %s)", "ON" if on else "OFF", self.gpio_pin, drive
+                "LED %s (GPIO%s, %s)", "ON" if on else "OFF", self.gpio_pin, reason
             )
-        except FileNotFoundError:
-            logging.error("pinctrl command not found. Is this a Raspberry Pi?")
-            self._running = False
-        except subprocess.CalledProcessError as e:
-            logging.error("pinctrl failed: %s", e.stderr.decode().strip())
-        except subprocess.TimeoutExpired:
-            logging.error("pinctrl command timed out")
+            self._record_transition(on, reason, scheduled)
+
+    def _record_transition(self, on, reason, scheduled):
+        """Append an LED change to the transition log."""
+        now = self.clock.time()
+        entry = {"time": round(now, 3), "led": "on" if on else "off", "reason": reason}
+        if scheduled is not None:
+            entry["scheduled"] = round(scheduled, 3)
+            entry["delay"] = round(now - scheduled, 3)
+        self.transitions.append(entry)
+
+        if not self.transition_log:
+            return
+        try:
+            with open(self.transition_log, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+            if os.path.getsize(self.transition_log) > TRANSITION_LOG_MAX_BYTES:
+                self._trim_transition_log()
+        except OSError as e:
+            logging.warning("Could not write light transition log: %s", e)
+
+    def _trim_transition_log(self):
+        """Keep the newest half of the transition log."""
+        with open(self.transition_log) as f:
+            lines = f.readlines()
+        tmp_file = self.transition_log + ".tmp"
+        with open(tmp_file, "w") as f:
+            f.writelines(lines[len(lines) // 2 :])
+        os.replace(tmp_file, self.transition_log)
 
     def read_schedule(self):
         """
@@ -185,6 +292,33 @@ class LightController:
             # Midnight-crossing schedule (e.g., 22:00-06:00)
             return now >= on_time or now < off_time
 
+    @staticmethod
+    def next_transition(lights_on_str, lights_off_str, now):
+        """
+        Find when should_light_be_on() next changes its answer.
+
+        Args:
+            lights_on_str: HH:MM string for lights-on time.
+            lights_off_str: HH:MM string for lights-off time.
+            now: Local datetime.datetime to search from.
+
+        Returns:
+            Local datetime.datetime of the next lights-on or lights-off time
+            after now, or None if the light never changes (equal or invalid times).
+        """
+        on_time = LightController.parse_time(lights_on_str)
+        off_time = LightController.parse_time(lights_off_str)
+
+        if on_time is None or off_time is None or on_time == off_time:
+            return None
+
+        candidates = [
+            datetime.datetime.combine(now.date() + datetime.timedelta(days=day), t)
+            for day in (0, 1)
+            for t in (on_time, off_time)
+        ]
+        return min(c for c in candidates if c > now)
+
     def set_force(self, value):
         """
         Override the schedule. value=True forces ON, False forces OFF, None releases.
@@ -193,13 +327,40 @@ class LightController:
         with self._lock:
             self._force = value
         if value is not None:
-            self.set_led(value)
+            self.set_led(value, reason="forced")
+        self.wake()
+
+    def wake(self):
+        """Make the main loop re-evaluate the LED state now."""
+        with self._condition:
+            self._woken = True
+            self._condition.notify_all()
+
+    def current_schedule(self):
+        """
+        Return the schedule, re-reading the config file only if it changed.
+
+        Returns:
+            Tuple of (lights_on, lights_off, active) as read_schedule().
+        """
+        try:
+            stat = os.stat(self.config_file)
+            signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        except OSError:
+            signature = None
+
+        with self._lock:
+            if signature != self._config_signature:
+                self._schedule = self.read_schedule()
+                self._config_signature = signature
+            return self._schedule
 
     def _status_dict(self):
         with self._lock:
             force = self._force
             led = self._current_state
-        lights_on, lights_off, active = self.read_schedule()
+        lights_on, lights_off, active = self.current_schedule()
+        next_transition = self._next_transition
         return {
             "led": "on" if led is True else "off" if led is False else "unknown",
             "mode": "forced" if force is not None else "schedule",
@@ -207,6 +368,8 @@ class LightController:
             "schedule_active": active,
             "lights_on": lights_on,
             "lights_off": lights_off,
+            "next_transition": next_transition,
+            "last_transition": self.transitions[-1] if self.transitions else None,
         }
 
     def _handle_command(self, cmd):
@@ -263,7 +426,7 @@ class LightController:
         while self._running and self._server_sock is not None:
             try:
                 conn, _ = self._server_sock.accept()
-            except socket.timeout:
+            except TimeoutError:
                 continue
             except OSError:
                 break
@@ -300,10 +463,82 @@ class LightController:
             except OSError as e:
                 logging.warning("Could not remove socket on shutdown: %s", e)
 
+    def _start_config_watcher(self):
+        """Wake the main loop on changes of the config file, if inotify is available."""
+        if INotify is None:
+            return
+        try:
+            inotify = INotify()
+            inotify.add_watch(
+                os.path.dirname(self.config_file) or ".",
+                inotify_flags.CLOSE_WRITE
+                | inotify_flags.MOVED_TO
+                | inotify_flags.CREATE
+                | inotify_flags.DELETE,
+            )
+        except OSError as e:
+            logging.warning("inotify unavailable, checking the config file: %s", e)
+            return
+
+        self._watcher_thread = threading.Thread(
+            target=self._watcher_loop,
+            args=(inotify,),
+            name="light-daemon-watcher",
+            daemon=True,
+        )
+        self._watcher_thread.start()
+
+    def _watcher_loop(self, inotify):
+        name = os.path.basename(self.config_file)
+        try:
+            while self._running:
+                events = inotify.read(timeout=int(_LISTENER_ACCEPT_TIMEOUT * 1000))
+                if any(event.name == name for event in events):
+                    self.wake()
+        finally:
+            inotify.close()
+
+    def step(self):
+        """
+        Bring the LED to the state it should have now.
+
+        Returns:
+            Seconds until the LED next has to be looked at: the next transition
+            of the schedule, or poll_interval if that comes first.
+        """
+        now = self.clock.time()
+        with self._lock:
+            force = self._force
+        lights_on, lights_off, active = self.current_schedule()
+
+        transition = None
+        if force is not None:
+            self.set_led(force, reason="forced")
+        elif not active:
+            self.set_led(False, reason="no schedule")
+        else:
+            local = datetime.datetime.fromtimestamp(now)
+            scheduled = self._next_transition
+            if scheduled is not None and now < scheduled:
+                scheduled = None
+            self.set_led(
+                self.should_light_be_on(lights_on, lights_off, local.time()),
+                reason="schedule",
+                scheduled=scheduled,
+            )
+            next_time = self.next_transition(lights_on, lights_off, local)
+            if next_time is not None:
+                transition = next_time.timestamp()
+
+        self._next_transition = transition
+        if transition is None:
+            return self.poll_interval
+        return max(0.0, min(self.poll_interval, transition - now))
+
     def run(self):
         """
-        Main polling loop. Reads schedule and controls LED until stopped.
-        Honours any force override set via the control socket.
+        Main loop. Controls the LED until stopped, waking at each transition of
+        the schedule, on commands from the control socket and on config changes.
         """
         logging.info(
             "Light daemon started. Config: %s, Poll: %ds, GPIO: %s",
@@ -312,32 +547,22 @@ class LightController:
             self.gpio_pin,
         )
         self._start_socket_listener()
+        self._start_config_watcher()
 
         try:
             while self._running:
-                with self._lock:
-                    force = self._force
-
-                if force is not None:
-                    desired = force
-                else:
-                    lights_on, lights_off, active = self.read_schedule()
-                    desired = (
-                        self.should_light_be_on(lights_on, lights_off)
-                        if active
-                        else False
-                    )
-
-                self.set_led(desired)
-
-                # Sleep in small increments so we can respond to signals promptly
-                for _ in range(self.poll_interval):
-                    if not self._running:
-                        break
-                    time.sleep(1)
+                timeout = self.step()
+                with self._condition:
+                    if not self._woken and self._running:
+                        self.clock.wait(self._condition, timeout)
+                    self._woken = False
         finally:
+            self._running = False
             self._stop_socket_listener()
-            self.set_led(False)
+            if self._watcher_thread is not None:
+                self._watcher_thread.join(timeout=1.0)
+                self._watcher_thread = None
+            self.set_led(False, reason="shutdown")
             logging.info("Light daemon stopped.")
 
     def shutdown(self, signum=None, frame=None):
@@ -346,6 +571,7 @@ class LightController:
         """
         logging.info("Received signal %s, shutting down...", signum)
         self._running = False
+        self.wake()
 
 
 class LightDaemonClient:
@@ -379,7 +605,7 @@ class LightDaemonClient:
                 sock.close()
         except (FileNotFoundError, ConnectionRefusedError) as e:
             raise LightDaemonUnavailable(str(e)) from e
-        except socket.timeout as e:
+        except TimeoutError as e:
             raise LightDaemonUnavailable("timeout talking to light daemon") from e
         except OSError as e:
             raise LightDaemonUnavailable(str(e)) from e
@@ -423,7 +649,8 @@ def main():
         dest="poll_interval",
         type="int",
         default=DEFAULT_POLL_INTERVAL,
-        help=f"Seconds between schedule checks (default: {DEFAULT_POLL_INTERVAL})",
+        help="Longest sleep between checks of the schedule file "
+        f"(default: {DEFAULT_POLL_INTERVAL})",
     )
     parser.add_option(
         "-g",
@@ -441,6 +668,14 @@ def main():
         help=f"Path to the control socket (default: {DEFAULT_SOCKET_PATH}). "
         "Pass an empty string to disable the socket listener.",
     )
+    parser.add_option(
+        "-l",
+        "--transition-log",
+        dest="transition_log",
+        default=DEFAULT_TRANSITION_LOG,
+        help=f"File the LED transitions are appended to (default: {DEFAULT_TRANSITION_LOG}). "
+        "Pass an empty string to disable it.",
+    )
     parser.add_option(
         "-D",
         "--debug",
@@ -464,6 +699,7 @@ def main():
         poll_interval=options.poll_interval,
         gpio_pin=options.gpio_pin,
         socket_path=options.socket_path or None,
+        transition_log=options.transition_log or None,
     )
 
     # Register signal handlers for clean shutdown
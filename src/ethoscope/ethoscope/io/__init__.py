@@ -26,6 +26,7 @@ Class Hierarchy and Relationships:
 4. Utility Classes:
    Null (special NULL representation for SQLite)
    NpyAppendableFile (custom numpy array file format for incremental writes)
+   SpillLog (disk log of database commands kept while the async writer is down)
 
 Interaction Flow:
 ================
@@ -62,6 +63,7 @@ from .helpers import (
     Null,
     RawDataWriter,
     SensorDataHelper,
+    SpillLog,
 )
 from .mysql import AsyncMySQLWriter, MySQLResultWriter
 from .sqlite import AsyncSQLiteWriter, SQLiteResultWriter
@@ -79,6 +81,7 @@ __all__ = [
     "Null",
     "NpyAppendableFile",
     "RawDataWriter",
+    "SpillLog",
     # MySQL classes
     "AsyncMySQLWriter",
     "MySQLResultWriter",
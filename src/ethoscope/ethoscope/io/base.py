@@ -26,6 +26,7 @@ Class Hierarchy and Relationships:
 4. Utility Classes:
    Null (special NULL representation for SQLite)
    NpyAppendableFile (custom numpy array file format for incremental writes)
+   SpillLog (disk log of database commands kept while the async writer is down)
 
 Interaction Flow:
 ================
@@ -49,13 +50,20 @@ Key Design Patterns:
 import json
 import logging
 import multiprocessing
+import numbers
 import os
 import time
 import traceback
 from collections import deque
 
 # Import helper classes
-from .helpers import DAMFileHelper, ImgSnapshotHelper, SensorDataHelper
+from .helpers import (
+    DAMFileHelper,
+    ImgSnapshotHelper,
+    Null,
+    SensorDataHelper,
+    SpillLog,
+)
 
 # Character encoding for MariaDB/MySQL connections
 SQL_CHARSET = "latin1"
@@ -72,6 +80,11 @@ MAX_DB_RETRIES = 3  # Maximum number of retry attempts for database operations
 RETRY_BASE_DELAY = 1.0  # Base delay in seconds for exponential backoff
 MAX_RETRY_DELAY = 30.0  # Maximum delay between retries
 MAX_BUFFERED_COMMANDS = 10000  # Maximum commands to buffer in memory during failures
+SPILL_BASE_DIR = (
+    "/ethoscope_data/spill"  # Where commands are spilled during writer outages
+)
+SPILL_REPLAY_BATCH = 500  # Maximum spilled commands replayed per write
+SPILL_QUEUE_BACKLOG = 5000  # Queued commands above which new commands are spilled
 DAM_DEFAULT_PERIOD = 60.0  # Default DAM activity sampling period in seconds
 METADATA_MAX_VALUE_LENGTH = (
     60000  # Maximum length for metadata values before truncation
@@ -79,6 +92,14 @@ METADATA_MAX_VALUE_LENGTH = (
 QUEUE_CHECK_INTERVAL = 0.1  # Interval for checking queue status in seconds
 
 
+def _identity(value):
+    return value
+
+
+def _to_null(value):
+    return None
+
+
 class BaseAsyncSQLWriter(multiprocessing.Process):
     """
     Abstract base class for asynchronous SQL database writers.
@@ -151,6 +172,9 @@ class BaseAsyncSQLWriter(multiprocessing.Process):
                     c = db.cursor()
                     if args is None:
                         c.execute(command)
+                    elif isinstance(args, list):
+                        # a batch of rows sharing one INSERT template, in a single transaction
+                        c.executemany(command, args)
                     else:
                         c.execute(command, args)
                     db.commit()
@@ -166,9 +190,12 @@ class BaseAsyncSQLWriter(multiprocessing.Process):
                             % command
                         )
                         logging.error(f"Error details: {str(e)}")
-                        logging.error(
-                            f"Arguments: {str(args)}" if "args" in locals() else "None"
-                        )
+                        if "args" not in locals():
+                            logging.error("None")
+                        elif isinstance(args, list):
+                            logging.error(f"Arguments: batch of {len(args)} rows")
+                        else:
+                            logging.error(f"Arguments: {str(args)}")
                         logging.error(f"Traceback: {traceback.format_exc()}")
 
                         # Allow subclasses to handle specific error types
@@ -257,8 +284,12 @@ class BaseResultWriter:
     including helper classes, metadata handling, and database table creation. Subclasses
     implement database-specific async writer creation and any specialized behavior.
 
+    Tracking data are buffered per ROI table as typed row tuples. Once a table holds
+    ``_max_insert_rows`` rows, they are sent to the async writer as a single
+    ``(template, [rows])`` command, which it runs with ``executemany`` in one transaction.
+
     Attributes:
-        _max_insert_string_len (int): Maximum length for batched INSERT commands
+        _max_insert_rows (int): Number of buffered rows per ROI table that triggers an insert
         _async_writing_class: Class to use for async database writes (set by subclasses)
         _null: Value to use for NULL in database (set by subclasses)
     """
@@ -266,7 +297,15 @@ class BaseResultWriter:
     # Subclasses must define these class attributes
     _async_writing_class = None
     _null = None
-    _max_insert_string_len = 1000
+    _max_insert_rows = 50
+    # conversion functions of variable types, see _value_converter
+    _value_converters = {}
+    # disk spill log, used when the async writer is down or lagging behind
+    _spill_log = None
+    _spill_replayed = 0
+    _spill_replay_started = None
+    _salvaged_writer = None
+    _spill_replay_batch = SPILL_REPLAY_BATCH
 
     def __init__(
         self,
@@ -277,6 +316,7 @@ class BaseResultWriter:
         take_frame_shots=False,
         erase_old_db=True,
         sensor=None,
+        spill_dir=None,
         **kwargs,
     ):
         """
@@ -290,6 +330,8 @@ class BaseResultWriter:
             take_frame_shots (bool): Whether to periodically save image snapshots
             erase_old_db (bool): Whether to drop and recreate database
             sensor: Optional sensor object for environmental data collection
+            spill_dir (str): Directory of the disk spill log. Defaults to a directory
+                named after the database in SPILL_BASE_DIR
             **kwargs: Additional arguments passed to subclasses
         """
         # Create async writer using subclass-specific method
@@ -312,10 +354,16 @@ class BaseResultWriter:
         self._failed_commands_buffer = deque(maxlen=MAX_BUFFERED_COMMANDS)
         self._writer_restart_count = 0
         self._last_restart_time = 0
+        self._spill_dir = spill_dir or os.path.join(
+            SPILL_BASE_DIR, os.path.basename(str(db_credentials["name"]))
+        )
+        self._spill_log = self._open_spill_log(self._spill_dir, erase_old_db)
 
         # Initialize helper classes
         if make_dam_like_table:
-            self._dam_file_helper = DAMFileHelper(n_rois=len(rois))
+            self._dam_file_helper = DAMFileHelper(
+                n_rois=len(rois), database_type=self._database_type
+            )
         else:
             self._dam_file_helper = None
         if take_frame_shots:
@@ -404,16 +452,8 @@ class BaseResultWriter:
         shuts down the async writer process.
         """
         logging.info("Closing result writer...")
-        for k, v in list(self._insert_dict.items()):
-            # Check if v is a string (command) or a list (data)
-            if isinstance(v, str):
-                # Original behavior for string commands
-                self._write_async_command(v)
-                self._insert_dict[k] = ""
-            elif isinstance(v, list):
-                # For list-based data (e.g., SQLiteResultWriter), do nothing here
-                # The subclass should handle flushing lists appropriately
-                pass
+        self._flush_insert_buffers()
+        self._drain_spill_log()
         try:
             command = "INSERT INTO METADATA VALUES (%s, %s)"
             self._write_async_command(
@@ -436,6 +476,8 @@ class BaseResultWriter:
                 logging.info("Joined OK")
             else:
                 logging.info("Process was not started, skipping join")
+            if self._spill_log is not None:
+                self._spill_log.close()
 
     def append(self):
         """
@@ -470,6 +512,9 @@ class BaseResultWriter:
         # Remove non-serializable multiprocessing objects
         state.pop("_queue", None)
         state.pop("_async_writer", None)
+        state.pop("_salvaged_writer", None)
+        # the spill log holds an open file, it is reopened from its directory
+        state.pop("_spill_log", None)
 
         return state
 
@@ -492,6 +537,8 @@ class BaseResultWriter:
             **getattr(self, "_pickle_extra_kwargs", {}),
         )
         # Note: async writer is not started automatically - the calling code should handle this
+        if "_spill_dir" in state:
+            self._spill_log = self._open_spill_log(self._spill_dir, False)
 
     @property
     def metadata(self):
@@ -538,9 +585,8 @@ class BaseResultWriter:
             bool: Always returns False
         """
         if self._dam_file_helper is not None:
-            out = self._dam_file_helper.flush(t)
-            for c in out:
-                self._write_async_command(c)
+            for c_args in self._dam_file_helper.flush(t):
+                self._write_async_command(*c_args)
         if self._shot_saver is not None and img is not None:
             c_args = self._shot_saver.flush(t, img)
             if c_args is not None:
@@ -549,19 +595,76 @@ class BaseResultWriter:
             c_args = self._sensor_saver.flush(t)
             if c_args is not None:
                 self._write_async_command(*c_args)
-        for k, v in list(self._insert_dict.items()):
-            if len(v) > self._max_insert_string_len:
-                # Check if v is a string (command) or a list (data)
-                if isinstance(v, str):
-                    # Original behavior for string commands
-                    self._write_async_command(v)
-                    self._insert_dict[k] = ""
-                elif isinstance(v, list):
-                    # For list-based data (e.g., SQLiteResultWriter), do nothing here
-                    # The subclass should handle flushing lists appropriately
-                    pass
+        self._flush_insert_buffers(self._max_insert_rows)
         return False
 
+    def _flush_insert_buffers(self, min_rows=1):
+        """
+        Send the buffered rows of each ROI table as one batched insert.
+
+        Args:
+            min_rows (int): Only flush the tables holding at least this many rows
+        """
+        for roi_id, rows in list(self._insert_dict.items()):
+            if rows and len(rows) >= min_rows:
+                self._write_async_command(
+                    self._insert_template(roi_id, len(rows[0])), rows
+                )
+                self._insert_dict[roi_id] = []
+
+    @staticmethod
+    def _insert_template(roi_id, n_values):
+        """
+        Build the parameterised INSERT statement for a ROI table.
+
+        Args:
+            roi_id (int): ROI index
+            n_values (int): Number of values per row
+
+        Returns:
+            str: The INSERT template, with MySQL-style placeholders
+        """
+        placeholders = ", ".join(["%s"] * n_values)
+        return f"INSERT INTO ROI_{roi_id} VALUES ({placeholders})"
+
+    @staticmethod
+    def _value_converter(value_type):
+        """
+        Get the function converting values of a type to plain Python values
+        the database drivers accept.
+
+        Variables subclass ``int``, which the MySQL connector cannot convert,
+        and ``Null`` objects stand for SQL NULL.
+
+        Args:
+            value_type (type): The type of a variable value
+
+        Returns:
+            callable: The conversion function
+        """
+        if value_type in (int, float, str, bytes):
+            return _identity
+        if value_type is type(None) or issubclass(value_type, Null):
+            return _to_null
+        if issubclass(value_type, numbers.Integral):
+            return int
+        if issubclass(value_type, numbers.Real):
+            return float
+        return _identity
+
+    @classmethod
+    def _typed_value(cls, value):
+        """
+        Convert a variable value to a plain Python value (see ``_value_converter``).
+        """
+        value_type = type(value)
+        convert = cls._value_converters.get(value_type)
+        if convert is None:
+            convert = cls._value_converters[value_type] = cls._value_converter(
+                value_type
+            )
+        return convert(value)
+
     def _add(self, t, roi, data_rows):
         """
         Add tracking data to the batch insert buffer.
@@ -572,13 +675,19 @@ class BaseResultWriter:
             data_rows (list): Tracking data points
         """
         roi_id = roi.idx
+        rows = self._insert_dict.setdefault(roi_id, [])
+        null = self._typed_value(self._null)
+        # converters are looked up by type inline: this runs for every value of every frame
+        converters = self._value_converters
         for dr in data_rows:
-            tp = (self._null, t) + tuple(dr.values())
-            if roi_id not in self._insert_dict or self._insert_dict[roi_id] == "":
-                command = f"INSERT INTO ROI_{roi_id} VALUES {str(tp)}"
-                self._insert_dict[roi_id] = command
-            else:
-                self._insert_dict[roi_id] += "," + str(tp)
+            row = [null, t]
+            for v in dr.values():
+                convert = converters.get(type(v))
+                if convert is None:
+                    row.append(self._typed_value(v))
+                else:
+                    row.append(convert(v))
+            rows.append(tuple(row))
 
         # now this is irrelevant when tracking multiple animals
         if self._dam_file_helper is not None:
@@ -631,6 +740,10 @@ class BaseResultWriter:
             try:
                 # Check if async writer is alive
                 if not self._async_writer.is_alive():
+                    if self._salvaged_writer is not self._async_writer:
+                        # commands it had not run yet are kept ahead of the new ones
+                        self._salvaged_writer = self._async_writer
+                        self._salvage_queue()
                     if attempt < MAX_DB_RETRIES:
                         self.log_io_diagnostics(
                             f"Writer died during attempt {attempt + 1}/{MAX_DB_RETRIES}"
@@ -652,6 +765,13 @@ class BaseResultWriter:
                         )
                         return self._buffer_command(command, args)
 
+                if self._spill_log is not None:
+                    # spilled commands go first, to keep the order of commands
+                    if len(self._spill_log):
+                        self._retry_buffered_commands()
+                    if len(self._spill_log) or self._queue_backlogged():
+                        return self._buffer_command(command, args)
+
                 # Send command to queue
                 self._queue.put((command, args))
                 return True
@@ -723,10 +843,93 @@ class BaseResultWriter:
             logging.error(f"Failed to restart async writer: {e}")
             return False
 
+    def _open_spill_log(self, directory, erase_old_db):
+        """
+        Open the disk spill log, replaying commands left by a previous run.
+
+        Args:
+            directory (str): Directory of the spill log
+            erase_old_db (bool): Whether the database was erased, in which case
+                commands left by a previous run are discarded
+
+        Returns:
+            SpillLog or None: The spill log, None if it cannot be used
+        """
+        try:
+            spill_log = SpillLog(directory)
+        except Exception as e:
+            logging.warning(
+                f"Cannot spill database commands to {directory}, they will be buffered in memory: {e}"
+            )
+            return None
+        if len(spill_log):
+            if erase_old_db:
+                logging.warning(
+                    f"Discarding {len(spill_log)} commands spilled for a previous database"
+                )
+                spill_log.clear()
+            else:
+                logging.warning(
+                    f"Found {len(spill_log)} commands spilled by a previous run, they will be replayed"
+                )
+        return spill_log
+
+    def _queue_backlogged(self):
+        """
+        Returns:
+            bool: True if the async writer is too far behind to take more commands
+        """
+        try:
+            return self._queue.qsize() >= SPILL_QUEUE_BACKLOG
+        except NotImplementedError:
+            # qsize is not available on every platform
+            return False
+
+    def _spill_replay_room(self):
+        """
+        Returns:
+            int: How many spilled commands may be replayed now: none until the queue of the
+                async writer is down to half the backlog mark, then up to that mark
+        """
+        try:
+            queued = self._queue.qsize()
+        except NotImplementedError:
+            # qsize is not available on every platform
+            return self._spill_replay_batch
+        if queued > SPILL_QUEUE_BACKLOG // 2:
+            return 0
+        return SPILL_QUEUE_BACKLOG - queued
+
+    def _salvage_queue(self):
+        """
+        Move the commands a dead async writer had not run from its queue to the spill log.
+
+        This is best effort: a writer killed while reading the queue keeps it locked,
+        and the commands left in it cannot be recovered.
+        """
+        if self._spill_log is None:
+            return
+        n_salvaged = 0
+        while True:
+            try:
+                msg = self._queue.get(timeout=QUEUE_CHECK_INTERVAL)
+            except Exception:
+                break
+            if msg == "DONE":
+                continue
+            self._spill_log.append(*msg)
+            n_salvaged += 1
+        if n_salvaged:
+            logging.warning(
+                f"Moved {n_salvaged} commands left by the dead async writer to the spill log"
+            )
+
     def _buffer_command(self, command, args=None):
         """
         Buffer a failed database command for later retry.
 
+        Commands are appended to the disk spill log, or kept in memory if it cannot be written.
+
         Args:
             command (str): SQL command to buffer
             args (tuple): Optional command arguments
@@ -734,6 +937,16 @@ class BaseResultWriter:
         Returns:
             bool: False (indicates command was buffered, not executed)
         """
+        if self._spill_log is not None:
+            try:
+                if not len(self._spill_log):
+                    logging.warning(
+                        f"Spilling database commands to {self._spill_log.directory}"
+                    )
+                self._spill_log.append(command, args)
+                return False
+            except Exception as e:
+                logging.error(f"Failed to spill command to disk: {e}")
         try:
             self._failed_commands_buffer.append((command, args, time.time()))
             if len(self._failed_commands_buffer) >= MAX_BUFFERED_COMMANDS:
@@ -748,7 +961,14 @@ class BaseResultWriter:
     def _retry_buffered_commands(self):
         """
         Attempt to execute all buffered commands after writer recovery.
+
+        Spilled commands are replayed in order, at most _spill_replay_batch at a time
+        so a long outage does not stall tracking: the rest are replayed by the next writes,
+        once the queue of the async writer is down to half the backlog mark.
         """
+        if self._spill_log is not None and len(self._spill_log):
+            self._replay_spill_log()
+
         if not self._failed_commands_buffer:
             return
 
@@ -793,6 +1013,93 @@ class BaseResultWriter:
         else:
             logging.info("All buffered commands successfully retried")
 
+    def _replay_spill_log(self, max_records=None):
+        """
+        Send a batch of spilled commands to the async writer, oldest first.
+
+        Args:
+            max_records (int): Maximum number of commands to replay,
+                ``_spill_replay_batch`` by default
+
+        Returns:
+            int: The number of commands replayed
+        """
+        if max_records is None:
+            max_records = self._spill_replay_batch
+        # reading the spill log is only worth it if the writer can take the commands
+        if not self._async_writer.is_alive():
+            return 0
+        max_records = min(max_records, self._spill_replay_room())
+        if max_records <= 0:
+            return 0
+        if self._spill_replay_started is None:
+            self._spill_replay_started = time.time()
+            self._spill_replayed = 0
+
+        replayed = 0
+        try:
+            records = self._spill_log.read(max_records)
+            for _, command, args in records:
+                if not self._async_writer.is_alive() or self._queue_backlogged():
+                    break
+                self._queue.put((command, args))
+                replayed += 1
+        except Exception as e:
+            logging.error(f"Failed to replay spilled commands: {e}")
+        finally:
+            self._spill_log.ack(replayed)
+
+        self._spill_replayed += replayed
+        if not len(self._spill_log):
+            elapsed = time.time() - self._spill_replay_started
+            logging.info(
+                f"Replayed {self._spill_replayed} spilled commands in {elapsed:.1f}s"
+            )
+            self._spill_replay_started = None
+        return replayed
+
+    def _drain_spill_log(self):
+        """
+        Replay every spilled command before closing, while the async writer is alive.
+        """
+        while (
+            self._spill_log is not None
+            and len(self._spill_log)
+            and self._async_writer.is_alive()
+        ):
+            if not self._replay_spill_log():
+                time.sleep(QUEUE_CHECK_INTERVAL)
+
+    def get_spill_status(self):
+        """
+        Get the state of the disk spill log.
+
+        Returns:
+            dict: Number and size of the spilled commands waiting for replay, how fast
+                they are replayed (commands per second) and how old the oldest one is (seconds)
+        """
+        spill_log = self._spill_log
+        if spill_log is None:
+            return {
+                "spill_records": 0,
+                "spill_bytes": 0,
+                "spill_replay_rate": None,
+                "spill_lag": 0.0,
+            }
+        now = time.time()
+        oldest = spill_log.oldest_timestamp
+        replay_rate = None
+        if self._spill_replay_started is not None:
+            elapsed = now - self._spill_replay_started
+            if elapsed > 0:
+                replay_rate = self._spill_replayed / elapsed
+        return {
+            "spill_records": len(spill_log),
+            "spill_bytes": spill_log.size_bytes,
+            "spill_replay_rate": replay_rate,
+            "spill_lag": now - oldest if oldest is not None else 0.0,
+        }
+
     def get_resilience_status(self):
         """
         Get current status of database resilience features.
@@ -814,6 +1121,7 @@ class BaseResultWriter:
                 if self._last_restart_time > 0
                 else None
             ),
+            **self.get_spill_status(),
         }
 
     def log_io_diagnostics(self, error_context=""):
@@ -831,6 +1139,10 @@ class BaseResultWriter:
             logging.error(f"  Database path: {db_path}")
             logging.error(f"  Writer alive: {status['writer_alive']}")
             logging.error(f"  Buffered commands: {status['buffered_commands']}")
+            logging.error(
+                f"  Spilled commands: {status['spill_records']} ({status['spill_bytes']} bytes, "
+                f"oldest {status['spill_lag']:.1f}s ago)"
+            )
             logging.error(f"  Writer restarts: {status['restart_count']}")
             logging.error(
                 f"  Time since last restart: {status['time_since_last_restart']:.1f}s"
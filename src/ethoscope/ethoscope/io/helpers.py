@@ -1,9 +1,11 @@
 import datetime
 import logging
 import os
+import pickle
+import struct
 import tempfile
 import time
-from collections import OrderedDict
+import zlib
 
 import numpy as np
 from cv2 import IMWRITE_JPEG_QUALITY, imwrite
@@ -14,6 +16,9 @@ IMG_SNAPSHOT_DEFAULT_PERIOD = (
     300.0  # Default image snapshot period in seconds (5 minutes)
 )
 DAM_DEFAULT_PERIOD = 60.0  # Default DAM activity sampling period in seconds
+SPILL_SEGMENT_SIZE = (
+    16 * 1024 * 1024
+)  # Size in bytes after which a spill segment is rotated
 
 
 class SensorDataHelper:
@@ -248,25 +253,47 @@ class DAMFileHelper:
     This class tracks movement activity for each ROI and formats it in a way
     compatible with the DAM file format, allowing integration with existing
     Drosophila activity analysis tools.
+
+    Activity is accumulated in a ring of ticks x ROIs numpy arrays. Positions
+    received for a frame are buffered and the distances for all ROIs are
+    computed at once when the frame is complete, so the cost per frame does not
+    grow with the number of ROIs.
     """
 
-    def __init__(self, period=DAM_DEFAULT_PERIOD, n_rois=32):
+    _table_name = "CSV_DAM_ACTIVITY"
+    _ring_ticks = 8  # initial number of ticks the ring can hold before being flushed
+    _sqlite_max_variables = 999
+
+    def __init__(self, period=DAM_DEFAULT_PERIOD, n_rois=32, database_type="MySQL"):
         """
         Initialize the DAM file helper.
 
         Args:
             period (float): Activity sampling period in seconds (default: 60s)
             n_rois (int): Number of regions of interest (default: 32)
+            database_type (str): Database type - "MySQL" or "SQLite3" (default: "MySQL")
         """
         self._period = period
-        self._activity_accum = OrderedDict()
         self._n_rois = n_rois
-        self._distance_map = {}
-        self._last_positions = {}
+        self._database_type = database_type
         self._scale = 100  # multiply by this factor before converting to int activity
-        for i in range(1, self._n_rois + 1):
-            self._distance_map[i] = 0
-            self._last_positions[i] = None
+
+        # arrays are indexed by ROI idx, so column 0 is unused
+        self._last_positions = np.full((n_rois + 1, 2), np.nan)
+        self._longest_axes = np.ones(n_rois + 1)
+        self._activity_ring = np.zeros((self._ring_ticks, n_rois + 1))
+        self._first_tick = None  # oldest tick not flushed yet
+        self._last_tick = None  # newest tick with data
+
+        # positions of the frame being received, committed all at once
+        self._frame_t = None
+        self._frame_positions = np.full((n_rois + 1, 2), np.nan)
+        self._frame_rois = set()
+
+    @property
+    def table_name(self):
+        """Get the DAM activity table name."""
+        return self._table_name
 
     def make_dam_file_sql_fields(self):
         """
@@ -285,65 +312,104 @@ class DAMFileHelper:
         fields = ",".join(fields)
         return fields
 
-    def _compute_distance_for_roi(self, roi, data):
+    def _tick(self, t):
+        return int(round((t / 1000.0) / self._period))
+
+    def _ring_rows(self, first, last):
+        """Ring row indices for ticks ``first`` to ``last`` (excluded)."""
+        return np.arange(first, last) % len(self._activity_ring)
+
+    def _grow_ring(self, n_ticks):
+        """
+        Enlarge the ring so it can hold ``n_ticks`` pending ticks, keeping their data.
         """
-        Calculate normalized movement distance for a single ROI.
+        capacity = len(self._activity_ring)
+        while capacity < n_ticks:
+            capacity *= 2
+        ring = np.zeros((capacity, self._n_rois + 1))
+        if self._last_tick is not None:
+            ticks = np.arange(self._first_tick, self._last_tick + 1)
+            ring[ticks % capacity] = self._activity_ring[
+                ticks % len(self._activity_ring)
+            ]
+        self._activity_ring = ring
 
-        Args:
-            roi: ROI object with idx and longest_axis properties
-            data (dict): Position data with 'x' and 'y' coordinates
+    def _commit_frame(self):
+        """
+        Compute the distances moved in all ROIs of the buffered frame and add them to its tick.
+        """
+        if not self._frame_rois:
+            return
 
-        Returns:
-            float: Normalized distance moved since last position
-        """
-        last_pos = self._last_positions[roi.idx]
-        current_pos = data["x"] + 1j * data["y"]
-        if last_pos is None:
-            self._last_positions[roi.idx] = current_pos
-            return 0
-        dist = abs(current_pos - last_pos)
-        dist /= roi.longest_axis
-        self._last_positions[roi.idx] = current_pos
-        return dist
+        tick = self._tick(self._frame_t)
+        rois = np.fromiter(self._frame_rois, dtype=int)
+        current = self._frame_positions[rois]
+        dist = np.hypot(*(current - self._last_positions[rois]).T)
+        dist = np.nan_to_num(dist / self._longest_axes[rois])
+        self._last_positions[rois] = current
+
+        self._frame_t = None
+        self._frame_rois.clear()
+
+        if self._first_tick is None:
+            self._first_tick = tick
+        if tick < self._first_tick:
+            logging.debug(f"DAM file writer ignoring data for flushed tick {tick}")
+            return
+        last_tick = tick if self._last_tick is None else max(self._last_tick, tick)
+        if last_tick - self._first_tick >= len(self._activity_ring):
+            self._grow_ring(last_tick - self._first_tick + 1)
+        self._last_tick = last_tick
+
+        self._activity_ring[tick % len(self._activity_ring), rois] += dist
 
     def input_roi_data(self, t, roi, data):
         """
         Record activity data for a specific ROI at given time.
 
+        Positions are buffered until the frame is complete, that is until data
+        for another time, or a second position for the same ROI, are received,
+        or until :meth:`flush` is called.
+
         Args:
             t (int): Time in milliseconds
             roi: ROI object
             data (dict): Position data for the ROI
         """
-        tick = int(round((t / 1000.0) / self._period))
-        act = self._compute_distance_for_roi(roi, data)
-        if tick not in self._activity_accum:
-            self._activity_accum[tick] = OrderedDict()
-            for r in range(1, self._n_rois + 1):
-                self._activity_accum[tick][r] = 0
-        self._activity_accum[tick][roi.idx] += act
+        if t != self._frame_t or roi.idx in self._frame_rois:
+            self._commit_frame()
+            self._frame_t = t
 
-    def _make_sql_command(self, vals):
+        if roi.idx not in self._frame_rois:
+            self._longest_axes[roi.idx] = roi.longest_axis
+        self._frame_rois.add(roi.idx)
+        self._frame_positions[roi.idx] = (data["x"], data["y"])
+
+    def _make_sql_command(self, activity):
         """
-        Create SQL INSERT command for activity data.
+        Create a parameterised, multi-row SQL INSERT command for activity data.
 
         Args:
-            vals (dict): Activity values for each ROI
+            activity (np.ndarray): Activity values, one row per tick and one column per ROI
 
         Returns:
-            str: SQL INSERT command
+            tuple: (SQL command, args)
         """
         dt = datetime.datetime.fromtimestamp(int(time.time()))
         date_time_fields = dt.strftime("%d %b %Y,%H:%M:%S").split(",")
-        values = date_time_fields
-        for i in range(1, self._n_rois + 1):
-            values.append(int(round(self._scale * vals[i])))
+        values = np.round(self._scale * np.round(activity, 5)).astype(int)
+
+        placeholder = "?" if self._database_type == "SQLite3" else "%s"
+        row_placeholders = "(" + ", ".join([placeholder] * (self._n_rois + 2)) + ")"
+        columns = ", ".join([f"ROI_{i}" for i in range(1, self._n_rois + 1)])
         command = (
-            """INSERT INTO CSV_DAM_ACTIVITY (date, time, """
-            + ", ".join([f"ROI_{i}" for i in range(1, self._n_rois + 1)])
-            + f""") VALUES {str(tuple(values))}"""
+            f"INSERT INTO {self._table_name} (date, time, {columns}) VALUES "
+            + ", ".join([row_placeholders] * len(values))
         )
-        return command
+        args = []
+        for row in values.tolist():
+            args.extend(date_time_fields + row)
+        return command, tuple(args)
 
     def flush(self, t):
         """
@@ -353,36 +419,41 @@ class DAMFileHelper:
             t (int): Current time in milliseconds
 
         Returns:
-            list: SQL INSERT commands for accumulated data
+            list: (SQL command, args) tuples for accumulated data, normally a single bulk insert
         """
-        out = OrderedDict()
-        tick = int(round((t / 1000.0) / self._period))
-        if len(self._activity_accum) < 1:
-            self._activity_accum[tick] = OrderedDict()
-            for r in range(1, self._n_rois + 1):
-                self._activity_accum[tick][r] = 0
+        self._commit_frame()
+        tick = self._tick(t)
+        if self._first_tick is None:
+            self._first_tick = tick
+            return []
+
+        first = self._first_tick
+        if tick <= first:
             return []
 
-        m = min(self._activity_accum.keys())
-        todel = []
-        for i in range(m, tick):
-            if i not in list(self._activity_accum.keys()):
-                self._activity_accum[i] = OrderedDict()
-                for r in range(1, self._n_rois + 1):
-                    self._activity_accum[i][r] = 0
-            out[i] = self._activity_accum[i].copy()
-            todel.append(i)
-            for r in range(1, self._n_rois + 1):
-                out[i][r] = round(out[i][r], 5)
-
-        for i in todel:
-            del self._activity_accum[i]
-
-        if tick - m > 1:
+        if tick - first > len(self._activity_ring):
+            self._grow_ring(tick - first)
+
+        rows = self._ring_rows(first, tick)
+        activity = self._activity_ring[rows, 1:].copy()
+        self._activity_ring[rows] = 0
+        self._first_tick = tick
+        if self._last_tick is not None and self._last_tick < tick:
+            self._last_tick = None
+
+        if tick - first > 1:
             logging.warning(
                 "DAM file writer skipping a tick. No data for more than one period!"
             )
-        out = [self._make_sql_command(v) for v in list(out.values())]
+
+        out = []
+        if self._database_type == "SQLite3":
+            # stay below the maximum number of host parameters of a SQLite statement
+            ticks_per_command = max(1, self._sqlite_max_variables // (self._n_rois + 2))
+        else:
+            ticks_per_command = len(activity)
+        for i in range(0, len(activity), ticks_per_command):
+            out.append(self._make_sql_command(activity[i : i + ticks_per_command]))
         return out
 
 
@@ -522,6 +593,260 @@ class NpyAppendableFile:
         return version, {"descr": dtype, "fortran_order": fortran, "shape": shape}
 
 
+class SpillLog:
+    """
+    Segmented, append-only log of database commands kept on local disk.
+
+    Result writers spill commands here while their async writer cannot take them,
+    and replay them in order once it can. Each record is a little-endian
+    ``(length, crc32)`` header followed by the pickled ``(timestamp, command, args)``.
+    Records are appended to ``spill_<n>.log`` segments, rotated after ``segment_size``
+    bytes and deleted once fully replayed. The read position is saved on every
+    acknowledgement, so a log reopened after a crash resumes where replay stopped.
+    A truncated or corrupted record ends its segment: the rest of it cannot be
+    trusted, and later segments are still replayed. The directory is only created
+    when a first record is appended, and removed once every record is replayed.
+    """
+
+    _HEADER = struct.Struct("<II")
+    _POSITION_FILE = "position"
+
+    def __init__(self, directory, segment_size=SPILL_SEGMENT_SIZE):
+        """
+        Open (or create) a spill log.
+
+        Args:
+            directory (str): Directory holding the segments
+            segment_size (int): Size in bytes after which a new segment is started
+        """
+        self._directory = directory
+        self._segment_size = segment_size
+        files = os.listdir(directory) if os.path.isdir(directory) else []
+        self._segments = sorted(
+            int(f[6:-4]) for f in files if f.startswith("spill_") and f.endswith(".log")
+        )
+        self._read_position = self._load_position()
+        # a reopened log never appends to an old segment, whose tail may be torn
+        self._next_segment = max(
+            self._segments[-1] + 1 if self._segments else 0, self._read_position[0]
+        )
+        self._write_fh = None
+        self._write_segment = None
+        self._batch = []
+        self._oldest_timestamp = None
+
+        # counting pending records needs a pass over the log, done once when reopening
+        self._n_records = 0
+        position = self._read_position
+        while True:
+            records, positions = self._read_from(position, 1000)
+            if not records:
+                break
+            self._n_records += len(records)
+            position = positions[-1]
+
+    def __len__(self):
+        """Number of records not replayed yet."""
+        return self._n_records
+
+    @property
+    def directory(self):
+        return self._directory
+
+    @property
+    def size_bytes(self):
+        """
+        Returns:
+            int: Size on disk of the records not replayed yet
+        """
+        total = 0
+        for segment in self._segments:
+            try:
+                total += os.path.getsize(self._segment_path(segment))
+            except OSError:
+                pass
+        if self._segments and self._read_position[0] == self._segments[0]:
+            total -= self._read_position[1]
+        return max(total, 0)
+
+    @property
+    def oldest_timestamp(self):
+        """
+        Returns:
+            float or None: When the oldest record not replayed yet was spilled
+        """
+        if self._n_records == 0:
+            return None
+        if self._oldest_timestamp is None:
+            records, _ = self._read_from(self._read_position, 1)
+            if records:
+                self._oldest_timestamp = records[0][0]
+        return self._oldest_timestamp
+
+    def _segment_path(self, segment):
+        return os.path.join(self._directory, f"spill_{segment:08d}.log")
+
+    def _load_position(self):
+        try:
+            with open(os.path.join(self._directory, self._POSITION_FILE)) as f:
+                segment, offset = (int(v) for v in f.read().split())
+        except (OSError, ValueError):
+            segment, offset = (self._segments[0] if self._segments else 0), 0
+        if self._segments and segment < self._segments[0]:
+            segment, offset = self._segments[0], 0
+        return segment, offset
+
+    def _save_position(self):
+        path = os.path.join(self._directory, self._POSITION_FILE)
+        tmp_path = path + ".tmp"
+        segment, offset = self._read_position
+        with open(tmp_path, "w") as f:
+            f.write(f"{segment} {offset}")
+        os.replace(tmp_path, path)
+
+    def append(self, command, args=None):
+        """
+        Append a command to the log.
+
+        Args:
+            command (str): SQL command
+            args: Arguments of the command, if any
+        """
+        payload = pickle.dumps(
+            (time.time(), command, args), protocol=pickle.HIGHEST_PROTOCOL
+        )
+        if self._write_fh is None or self._write_fh.tell() >= self._segment_size:
+            self._rotate()
+        self._write_fh.write(
+            self._HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        )
+        self._write_fh.flush()
+        self._n_records += 1
+
+    def _rotate(self):
+        self._close_segment()
+        os.makedirs(self._directory, exist_ok=True)
+        segment = self._next_segment
+        self._next_segment += 1
+        self._write_fh = open(self._segment_path(segment), "ab")
+        self._write_segment = segment
+        self._segments.append(segment)
+
+    def _close_segment(self):
+        if self._write_fh is not None:
+            os.fsync(self._write_fh.fileno())
+            self._write_fh.close()
+            self._write_fh = None
+            self._write_segment = None
+
+    def _read_from(self, position, max_records):
+        records = []
+        positions = []
+        segment, offset = position
+        for seg in self._segments:
+            if seg < segment:
+                continue
+            if seg > segment:
+                offset = 0
+            path = self._segment_path(seg)
+            try:
+                fh = open(path, "rb")
+            except OSError:
+                continue
+            with fh:
+                fh.seek(offset)
+                while len(records) < max_records:
+                    header = fh.read(self._HEADER.size)
+                    if len(header) < self._HEADER.size:
+                        if header:
+                            logging.error(f"Truncated record at the end of {path}")
+                        break
+                    length, crc = self._HEADER.unpack(header)
+                    payload = fh.read(length)
+                    if len(payload) < length or zlib.crc32(payload) != crc:
+                        logging.error(
+                            f"Corrupted record in {path} at offset {offset}, "
+                            "skipping the rest of the segment"
+                        )
+                        break
+                    offset += self._HEADER.size + length
+                    records.append(pickle.loads(payload))
+                    positions.append((seg, offset))
+            if len(records) >= max_records:
+                break
+        return records, positions
+
+    def read(self, max_records):
+        """
+        Read the next records from the read position, without consuming them.
+
+        Args:
+            max_records (int): Maximum number of records to read
+
+        Returns:
+            list: ``(timestamp, command, args)`` tuples, oldest first.
+                Call :meth:`ack` once they have been handed over.
+        """
+        records, self._batch = self._read_from(self._read_position, max_records)
+        if not records and max_records > 0 and self._n_records > 0:
+            # only corrupted records are left
+            logging.error(
+                f"{self._n_records} spilled records in {self._directory} cannot be read, discarding them"
+            )
+            self.clear()
+        return records
+
+    def ack(self, n_records):
+        """
+        Consume the first records returned by the last :meth:`read`.
+
+        Args:
+            n_records (int): Number of records that were handed over
+        """
+        if n_records <= 0:
+            return
+        self._read_position = self._batch[n_records - 1]
+        self._batch = self._batch[n_records:]
+        self._n_records -= n_records
+        self._oldest_timestamp = None
+
+        if self._n_records == 0:
+            self._remove_log()
+            return
+        # segments entirely replayed are deleted
+        while self._segments and self._segments[0] < self._read_position[0]:
+            os.remove(self._segment_path(self._segments.pop(0)))
+        self._save_position()
+
+    def _remove_log(self):
+        self._close_segment()
+        for name in [self._segment_path(s) for s in self._segments] + [
+            os.path.join(self._directory, self._POSITION_FILE)
+        ]:
+            try:
+                os.remove(name)
+            except OSError:
+                pass
+        try:
+            os.rmdir(self._directory)
+        except OSError:
+            pass
+        self._segments = []
+        self._next_segment = 0
+        self._read_position = (0, 0)
+
+    def clear(self):
+        """Discard every record."""
+        self._remove_log()
+        self._batch = []
+        self._n_records = 0
+        self._oldest_timestamp = None
+
+    def close(self):
+        """Flush the segment being written to disk and close it."""
+        self._close_segment()
+
+
 class RawDataWriter:
     """
     Writer for saving raw tracking data for offline analysis.
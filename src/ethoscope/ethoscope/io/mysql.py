@@ -232,7 +232,7 @@ class MySQLResultWriter(BaseResultWriter):
     - Experimental metadata
 
     Attributes:
-        _max_insert_string_len (int): Maximum length for batched INSERT commands
+        _max_insert_rows (int): Number of buffered rows per ROI table that triggers an insert
         _async_writing_class: Class to use for async database writes
         _null: Value to use for NULL in database
     """
@@ -264,7 +264,6 @@ class MySQLResultWriter(BaseResultWriter):
 
     _database_type = "MySQL"
     # _flush_every_ns = 30 # flush every 10s of data
-    _max_insert_string_len = 1000
     _async_writing_class = AsyncMySQLWriter
     _null = 0
 
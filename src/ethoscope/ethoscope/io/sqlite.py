@@ -143,6 +143,7 @@ class SQLiteResultWriter(BaseResultWriter):
     _database_type = "SQLite3"
     _async_writing_class = AsyncSQLiteWriter
     _null = Null()
+    _max_insert_rows = 1000
 
     def __init__(
         self,
@@ -328,20 +329,30 @@ class SQLiteResultWriter(BaseResultWriter):
             sqlite_command = command
 
         # Convert Null() objects to None for SQLite compatibility
-        if args is not None:
-            sqlite_args = []
-            for arg in args:
-                if isinstance(arg, Null):
-                    sqlite_args.append(None)  # SQLite expects None for NULL
-                else:
-                    sqlite_args.append(arg)
-            sqlite_args = tuple(sqlite_args)
-        else:
+        if args is None:
             sqlite_args = None
+        elif isinstance(args, list):
+            # a batch of rows run with executemany, already typed by _add
+            sqlite_args = args
+        else:
+            sqlite_args = self._sqlite_row(args)
 
         # Use the resilient write method from parent class
         return self._write_async_command_resilient(sqlite_command, sqlite_args)
 
+    @staticmethod
+    def _sqlite_row(args):
+        """
+        Replace Null() objects by None, which SQLite expects for NULL.
+
+        Args:
+            args (tuple): Arguments of a parameterized query
+
+        Returns:
+            tuple: The converted arguments
+        """
+        return tuple(None if isinstance(arg, Null) else arg for arg in args)
+
     def _create_table(self, name, fields, engine=None):
         """
         Create SQLite table (ignores engine parameter).
@@ -383,74 +394,7 @@ class SQLiteResultWriter(BaseResultWriter):
         Uses parameterized queries to prevent SQL injection and preserve data types.
         Converts booleans to integers (0/1) for SQLite storage.
         """
-        t = int(round(t))
-        roi_id = roi.idx
-
-        # Initialize insert data list for this ROI if not exists
-        if roi_id not in self._insert_dict:
-            self._insert_dict[roi_id] = []
-
-        for dr in data_rows:
-            # Build values tuple with proper type handling
-            values = [None if isinstance(self._null, Null) else self._null, t] + list(
-                dr.values()
-            )
-
-            # Convert values to proper SQLite types
-            sqlite_values = []
-            for val in values:
-                if val is None or isinstance(val, Null):
-                    sqlite_values.append(None)  # SQLite NULL
-                elif isinstance(val, bool):
-                    sqlite_values.append(1 if val else 0)  # Convert bool to int
-                else:
-                    sqlite_values.append(val)  # Keep original type
-
-            # Store as tuple for parameterized query
-            self._insert_dict[roi_id].append(tuple(sqlite_values))
-
-        # now this is irrelevant when tracking multiple animals
-        if self._dam_file_helper is not None:
-            for dr in data_rows:
-                self._dam_file_helper.input_roi_data(t, roi, dr)
-
-    def flush(self, t, img=None):
-        """
-        Flush accumulated data to database using parameterized queries.
-
-        Overrides base class flush to handle list-based insert data with proper types.
-        """
-        # Handle helper flushes (dam, shots, sensors) same as base class
-        if self._dam_file_helper is not None:
-            out = self._dam_file_helper.flush(t)
-            for c in out:
-                self._write_async_command(c)
-        if self._shot_saver is not None and img is not None:
-            c_args = self._shot_saver.flush(t, img)
-            if c_args is not None:
-                self._write_async_command(*c_args)
-        if self._sensor_saver is not None:
-            c_args = self._sensor_saver.flush(t)
-            if c_args is not None:
-                self._write_async_command(*c_args)
-
-        # Handle ROI data inserts with parameterized queries
-        for roi_id, value_list in list(self._insert_dict.items()):
-            if len(value_list) >= self._max_insert_string_len:
-                # Execute batch insert with parameterized query
-                if value_list:  # Only if we have data
-                    placeholders = ", ".join(
-                        ["?" for _ in value_list[0]]
-                    )  # Create ? placeholders
-                    command = f"INSERT INTO ROI_{roi_id} VALUES ({placeholders})"
-
-                    # Execute each row as individual parameterized query
-                    for values in value_list:
-                        self._write_async_command(command, values)
-
-                    # Clear the list after flushing
-                    self._insert_dict[roi_id] = []
-        return False
+        super()._add(int(round(t)), roi, data_rows)
 
     def close(self):
         """
@@ -459,19 +403,7 @@ class SQLiteResultWriter(BaseResultWriter):
         Ensures all accumulated data is written before shutdown.
         """
         # Final flush of any remaining data
-        for roi_id, value_list in list(self._insert_dict.items()):
-            if value_list:  # Only if we have data
-                placeholders = ", ".join(
-                    ["?" for _ in value_list[0]]
-                )  # Create ? placeholders
-                command = f"INSERT INTO ROI_{roi_id} VALUES ({placeholders})"
-
-                # Execute each row as individual parameterized query
-                for values in value_list:
-                    self._write_async_command(command, values)
-
-                # Clear the list after flushing
-                self._insert_dict[roi_id] = []
+        self._flush_insert_buffers()
 
         # Call parent close method
         super().close()
@@ -12,8 +12,10 @@ from typing import Any
 from ethoscope.core.roi import ROI
 from ethoscope.roi_builders.roi_builders import BaseROIBuilder
 from ethoscope.roi_builders.template import ROITemplate, ROITemplateValidationError
+from ethoscope.utils.plugins import register_plugin
 
 
+@register_plugin("roi_builder", default=True)
 class FileBasedROIBuilder(BaseROIBuilder):
     """
     ROI builder that loads configurations from external JSON template files.
@@ -154,7 +156,8 @@ class FileBasedROIBuilder(BaseROIBuilder):
         # Acquire frames and build reference image (similar to BaseROIBuilder)
         accum = []
         for i, (_, frame) in enumerate(camera):
-            accum.append(frame)
+            # cameras may reuse the buffer of a frame for later ones
+            accum.append(frame.copy())
             if i >= 5:
                 break
 
@@ -33,7 +33,8 @@ class BaseROIBuilder(DescribedObject):
 
         else:
             for i, (_, frame) in enumerate(input):
-                accum.append(frame)
+                # cameras may reuse the buffer of a frame for later ones
+                accum.append(frame.copy())
                 if i >= 5:
                     break
 
@@ -26,8 +26,10 @@ from ethoscope.roi_builders.roi_builders import BaseROIBuilder
 from ethoscope.roi_builders.target_detection_diagnostics import (
     TargetDetectionDiagnostics,
 )
+from ethoscope.utils.plugins import register_plugin
 
 
+@register_plugin("roi_builder")
 class TargetGridROIBuilder(BaseROIBuilder):
 
     _adaptive_med_rad = 0.10
@@ -540,6 +542,25 @@ class TargetGridROIBuilder(BaseROIBuilder):
             logging.warning("ROI building failed: could not detect required targets")
             return None, None
 
+        rois = self.rois_from_targets(reference_points)
+        for roi in rois:
+            cv2.drawContours(img, [roi.polygon], -1, (255, 0, 0), 1, LINE_AA)
+
+        # rois is an array of ROI objects
+        # reference points is an array containing the abslolute coordinates of the three refs
+
+        return reference_points, rois
+
+    def rois_from_targets(self, reference_points):
+        """
+        Lay the grid of ROIs out from the coordinates of the three targets.
+
+        :param reference_points: the coordinates of the targets A (upper-right), B (lower-right) and C (lower-left)
+        :type reference_points: :class:`~numpy.ndarray`
+        :return: list(:class:`~ethoscope.core.roi.ROI`)
+        """
+        reference_points = np.asarray(reference_points, dtype=np.float32)
+
         # point 1 is the reference point at coords A,B; point 0 will be A,y and point 2 x,B
         # we then transform the ROIS on the assumption that those points are aligned perpendicularly in this way
         dst_points = np.array([(0, -1), (0, 0), (-1, 0)], dtype=np.float32)
@@ -567,10 +588,5 @@ class TargetGridROIBuilder(BaseROIBuilder):
             mapped_rectangle = np.dot(wrap_mat, r.T).T
             mapped_rectangle -= shift
             ct = mapped_rectangle.reshape((1, 4, 2)).astype(np.int32)
-            cv2.drawContours(img, [ct], -1, (255, 0, 0), 1, LINE_AA)
             rois.append(ROI(ct, idx=i + 1))
-
-        # rois is an array of ROI objects
-        # reference points is an array containing the abslolute coordinates of the three refs
-
-        return reference_points, rois
+        return rois
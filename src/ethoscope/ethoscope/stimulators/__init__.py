@@ -1,2 +1,13 @@
 __author__ = "quentin"
-from . import actions, channel_maps, composed_stimulator, stimulators, triggers
+
+import importlib
+
+# Modules are imported on first access: stimulators pull in their hardware
+# interfaces, and are only loaded when a run uses them (see ethoscope.utils.plugins)
+_MODULES = ("actions", "channel_maps", "composed_stimulator", "stimulators", "triggers")
+
+
+def __getattr__(name):
+    if name in _MODULES:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -16,8 +16,10 @@ from ethoscope.stimulators.actions import ACTION_REGISTRY
 from ethoscope.stimulators.channel_maps import get_channel_map
 from ethoscope.stimulators.stimulators import BaseStimulator, HasInteractedVariable
 from ethoscope.stimulators.triggers import TRIGGER_REGISTRY
+from ethoscope.utils.plugins import register_plugin
 
 
+@register_plugin("interactor")
 class ComposedStimulator(BaseStimulator):
     """
     Configurable stimulator that composes a trigger condition with a stimulus action.
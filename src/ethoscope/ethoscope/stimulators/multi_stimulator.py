@@ -9,12 +9,14 @@ import logging
 
 from ethoscope.hardware.interfaces.interfaces import DefaultInterface
 from ethoscope.stimulators.stimulators import BaseStimulator, HasInteractedVariable
+from ethoscope.utils.plugins import register_plugin
 from ethoscope.utils.scheduler import Scheduler
 
 # Global flag to track if MultiStimulator has been logged before
 _MULTISTIMULATOR_LOGGED = set()
 
 
+@register_plugin("interactor")
 class MultiStimulator(BaseStimulator):
     """
     A meta-stimulator that manages multiple stimulators with individual date/time ranges.
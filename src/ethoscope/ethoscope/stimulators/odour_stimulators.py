@@ -9,6 +9,7 @@ from ethoscope.hardware.interfaces.odour_delivery_device import (  # noqa: F811
     OdourDepriverInterface,
 )
 from ethoscope.stimulators.stimulators import BaseStimulator, HasInteractedVariable
+from ethoscope.utils.plugins import register_plugin
 from ethoscope.utils.scheduler import Scheduler
 
 from . import sleep_depriver_stimulators
@@ -123,6 +124,7 @@ class DynamicOdourDeliverer(HasChangedSideStimulator):
         }
 
 
+@register_plugin("interactor")
 class DynamicOdourSleepDepriver(sleep_depriver_stimulators.SleepDepStimulator):
     _description = {
         "overview": "An stimulator to sleep deprive an animal using servo motor. See http://todo/fixme.html",
@@ -205,6 +207,7 @@ class DynamicOdourSleepDepriver(sleep_depriver_stimulators.SleepDepStimulator):
         return decide, args
 
 
+@register_plugin("interactor")
 class MiddleCrossingOdourStimulator(
     sleep_depriver_stimulators.MiddleCrossingStimulator
 ):
@@ -278,6 +281,7 @@ class MiddleCrossingOdourStimulator(
         return decide, args
 
 
+@register_plugin("interactor")
 class MiddleCrossingOdourStimulatorFlushed(MiddleCrossingOdourStimulator):
     _description = {
         "overview": "A stimulator to send odour to an animal as it crosses the midline, and then flush it",
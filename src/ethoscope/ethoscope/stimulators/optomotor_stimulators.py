@@ -1,7 +1,9 @@
 from ethoscope.hardware.interfaces.optomotor import OptoMotor
 from ethoscope.stimulators.sleep_depriver_stimulators import MiddleCrossingStimulator
+from ethoscope.utils.plugins import register_plugin
 
 
+@register_plugin("interactor")
 class OptoMidlineCrossStimulator(MiddleCrossingStimulator):
     """
     Shine LED light when animals cross the midline.
@@ -1,5 +1,6 @@
 """
-any new class added here need to be added to web_utils/control_thread.py too
+Stimulators offered to users are declared with @register_plugin("interactor"),
+see ethoscope.utils.plugins.
 """
 
 __author__ = "quentin"
@@ -15,6 +16,8 @@ from ethoscope.hardware.interfaces.sleep_depriver_interface import (
     SleepDepriverInterfaceCR,
 )
 from ethoscope.stimulators.stimulators import BaseStimulator, HasInteractedVariable
+from ethoscope.trackers.trackers import TrackerFeatures
+from ethoscope.utils.plugins import register_plugin
 
 
 class IsMovingStimulator(BaseStimulator):
@@ -39,35 +42,9 @@ class IsMovingStimulator(BaseStimulator):
         super().__init__(hardware_connection, date_range, roi_template_config)
 
     def _has_moved(self):
-
-        positions = self._tracker.positions
-
-        if len(positions) < 2:
-            return False
-
-        if len(positions[-1]) != 1:
-            raise Exception(
-                "This stimulator can only work with a single animal per ROI"
-            )
-        tail_m = positions[-1][0]
-
-        times = self._tracker.times
-        last_time_for_position = times[-1]
-        last_time = self._tracker.last_time_point
-
-        # we assume no movement if the animal was not spotted
-        if last_time != last_time_for_position:
-            return False
-
-        dt_s = abs(times[-1] - times[-2]) / 1000.0
-        dist = 10.0 ** (tail_m["xy_dist_log10x1000"] / 1000.0)
-        velocity = dist / dt_s
-
-        velocity_corrected = velocity * dt_s / self._velocity_correction_coef
-
-        if velocity_corrected > 1.0:
-            return True
-        return False
+        # shared with the other stimulators and triggers bound to this ROI, computed once per frame
+        features = TrackerFeatures.of(self._tracker)
+        return features.has_moved(self._velocity_correction_coef)
 
     def _decide(self):
 
@@ -81,6 +58,7 @@ class IsMovingStimulator(BaseStimulator):
         return HasInteractedVariable(True), {}
 
 
+@register_plugin("interactor")
 class SleepDepStimulator(IsMovingStimulator):
     _description = {
         "overview": "A stimulator to sleep deprive an animal using servo motor.",
@@ -262,6 +240,7 @@ class SleepDepStimulatorCR(SleepDepStimulator):
         )
 
 
+@register_plugin("interactor")
 class OptomotorSleepDepriver(SleepDepStimulator):
     """
     MODULE 3: 10 motors (odd channels) + 10 LEDs (even channels).
@@ -441,6 +420,7 @@ class OptomotorSleepDepriver(SleepDepStimulator):
         return out, dic
 
 
+@register_plugin("interactor")
 class ExperimentalSleepDepStimulator(SleepDepStimulator):
     _description = {
         "overview": "A stimulator to sleep deprive an animal using servo motor.",
@@ -509,6 +489,7 @@ class ExperimentalSleepDepStimulator(SleepDepStimulator):
             pass
 
 
+@register_plugin("interactor")
 class MiddleCrossingStimulator(BaseStimulator):
     _description = {
         "overview": "A stimulator to disturb animal as they cross the midline",
@@ -575,23 +556,10 @@ class MiddleCrossingStimulator(BaseStimulator):
         except KeyError:
             return HasInteractedVariable(False), {}
 
-        positions = self._tracker.positions
-
-        if len(positions) < 2:
+        if len(self._tracker.positions) < 2:
             return HasInteractedVariable(False), {}
 
-        if len(positions[-1]) != 1:
-            raise Exception(
-                "This stimulator can only work with a single animal per ROI"
-            )
-
-        roi_w = float(self._tracker._roi.longest_axis)
-        x_t_zero = positions[-1][0]["x"] / roi_w - 0.5
-        x_t_minus_one = positions[-2][0]["x"] / roi_w - 0.5
-
-        # if roi_id == 12:
-        #     print (roi_id, channel, roi_w, positions[-1][0]["x"], positions[-2][0]["x"], x_t_zero, x_t_minus_one)
-        if (x_t_zero > 0) ^ (x_t_minus_one > 0):  # this is a change of sign
+        if TrackerFeatures.of(self._tracker).crossed_midline():
 
             if random.uniform(0, 1) < self._p:
                 self._last_stimulus_time = now
@@ -603,6 +571,7 @@ class MiddleCrossingStimulator(BaseStimulator):
         return HasInteractedVariable(False), {"channel": channel}
 
 
+@register_plugin("interactor")
 class OptoSleepDepriver(SleepDepStimulator):
     """
     MODULE 4: 20 LEDs only (no motors).
@@ -813,6 +782,7 @@ class OptoSleepDepriver(SleepDepStimulator):
         return HasInteractedVariable(0), {}
 
 
+@register_plugin("interactor")
 class mAGO(SleepDepStimulator):
     """
     Motors are connected to odd channels (1-19) while valves are connected to even channels (0-18).
@@ -943,6 +913,7 @@ class mAGO(SleepDepStimulator):
         return out, dic
 
 
+@register_plugin("interactor")
 class AGO(SleepDepStimulator):
     """
     Valves are connected to even channels (0-18).
@@ -12,9 +12,11 @@ import os
 
 from ethoscope.stimulators.sleep_depriver_stimulators import mAGO
 from ethoscope.stimulators.stimulators import HasInteractedVariable
+from ethoscope.utils.plugins import register_plugin
 from ethoscope.utils.scheduler import DailyScheduleError, DailyScheduler
 
 
+@register_plugin("interactor")
 class mAGOSleepRestriction(mAGO):
     """
     Sleep restriction stimulator using mAGO hardware with daily time limitations.
@@ -205,8 +207,7 @@ class mAGOSleepRestriction(mAGO):
             )
 
             # Update daily scheduler with state file path
-            self._daily_scheduler._state_file_path = self._state_file_path
-            self._daily_scheduler._state = self._daily_scheduler._load_state()
+            self._daily_scheduler.set_state_file(self._state_file_path)
 
             logging.info(
                 f"Sleep restriction state file set for ROI {roi_id}: {self._state_file_path}"
@@ -283,6 +284,7 @@ class mAGOSleepRestriction(mAGO):
         }
 
 
+@register_plugin("interactor")
 class SimpleTimeRestrictedStimulator(mAGOSleepRestriction):
     """
     Simplified version of sleep restriction stimulator with preset configurations.
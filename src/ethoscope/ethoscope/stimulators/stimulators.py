@@ -5,6 +5,7 @@ import time
 from ethoscope.core.variables import BaseIntVariable
 from ethoscope.hardware.interfaces.interfaces import DefaultInterface
 from ethoscope.utils.description import DescribedObject
+from ethoscope.utils.plugins import register_plugin
 from ethoscope.utils.scheduler import Scheduler
 
 
@@ -181,6 +182,7 @@ class BaseStimulator(DescribedObject):
             self._roi_to_channel = {int(k): v for k, v in default_mapping.items()}
 
 
+@register_plugin("interactor", default=True)
 class DefaultStimulator(BaseStimulator):
     """
     Default interactor. Simply never interacts
@@ -9,6 +9,7 @@ called via check() to determine if a stimulus should fire.
 import logging
 import random
 
+from ethoscope.trackers.trackers import TrackerFeatures
 from ethoscope.utils.scheduler import DailyScheduleError, DailyScheduler
 
 
@@ -61,35 +62,9 @@ class InactivityTrigger(BaseTrigger):
         self._p = p
 
     def _has_moved(self):
-        """Check if the animal has moved. Extracted from IsMovingStimulator."""
-        positions = self._tracker.positions
-
-        if len(positions) < 2:
-            return False
-
-        if len(positions[-1]) != 1:
-            raise Exception(
-                "This stimulator can only work with a single animal per ROI"
-            )
-        tail_m = positions[-1][0]
-
-        times = self._tracker.times
-        last_time_for_position = times[-1]
-        last_time = self._tracker.last_time_point
-
-        # Assume no movement if the animal was not spotted
-        if last_time != last_time_for_position:
-            return False
-
-        dt_s = abs(times[-1] - times[-2]) / 1000.0
-        dist = 10.0 ** (tail_m["xy_dist_log10x1000"] / 1000.0)
-        velocity = dist / dt_s
-
-        velocity_corrected = velocity * dt_s / self._velocity_correction_coef
-
-        if velocity_corrected > 1.0:
-            return True
-        return False
+        """Check if the animal has moved, using the features shared by all stimulators of the ROI."""
+        features = TrackerFeatures.of(self._tracker)
+        return features.has_moved(self._velocity_correction_coef)
 
     def check(self):
         now = self._tracker.last_time_point
@@ -135,22 +110,7 @@ class MidlineCrossingTrigger(BaseTrigger):
         if now - self._last_stimulus_time < self._refractory_period_ms:
             return 0, {}
 
-        positions = self._tracker.positions
-
-        if len(positions) < 2:
-            return 0, {}
-
-        if len(positions[-1]) != 1:
-            raise Exception(
-                "This stimulator can only work with a single animal per ROI"
-            )
-
-        roi_w = float(self._tracker._roi.longest_axis)
-        x_t_zero = positions[-1][0]["x"] / roi_w - 0.5
-        x_t_minus_one = positions[-2][0]["x"] / roi_w - 0.5
-
-        # XOR detects sign change = midline crossing
-        if (x_t_zero > 0) ^ (x_t_minus_one > 0):
+        if TrackerFeatures.of(self._tracker).crossed_midline():
             if random.uniform(0, 1) < self._p:
                 self._last_stimulus_time = now
                 return 1, {}
@@ -0,0 +1,324 @@
+"""
+Tests for the paginated reading of the device logs.
+
+Synthetic log files are paged through backwards to check that pages follow each
+other without gaps or repeats, that filters give the entries a full read would, and
+that the newest page comes back as fast from a huge file as from a small one. A fake
+journalctl checks the journal pages the same way.
+"""
+
+import datetime
+import json
+import os
+import time
+
+import pytest
+
+from ethoscope.utils import logs
+from ethoscope.utils.logs import (
+    FileLogReader,
+    JournalLogReader,
+    log_reader,
+    parse_level,
+    parse_line,
+    parse_time,
+)
+
+MB = 1024 * 1024
+T0 = datetime.datetime(2025, 3, 1, 8, 0, 0).timestamp()
+LEVELS = ["INFO", "INFO", "DEBUG", "WARNING", "INFO", "ERROR"]
+
+
+def log_line(i, t0=T0):
+    """Line i of a log written by the logging module, an entry every 10 seconds."""
+    when = datetime.datetime.fromtimestamp(t0 + 10 * i)
+    level = LEVELS[i % len(LEVELS)]
+    return f"{when:%Y-%m-%d %H:%M:%S},{i % 1000:03d} - {level} - event {i}\n"
+
+
+def write_log(path, count, traceback_every=0):
+    """Write a log of `count` entries; returns the entries, oldest first."""
+    expected = []
+    with open(path, "w") as f:
+        for i in range(count):
+            line = log_line(i)
+            if traceback_every and i % traceback_every == 0:
+                line += (
+                    'Traceback (most recent call last):\n  File "x.py"\nKeyError: 1\n'
+                )
+            f.write(line)
+            expected.append(parse_line(line.splitlines()[0]) | {"message": line[:-1]})
+    return expected
+
+
+def read_all(reader, **filters):
+    """Every entry, newest first, following the cursors; and the number of pages."""
+    entries, cursor, pages = [], None, 0
+    while True:
+        page = reader.page(cursor=cursor, **filters)
+        entries.extend(page["entries"])
+        pages += 1
+        cursor = page["cursor"]
+        if cursor is None:
+            return entries, pages
+
+
+class TestParsing:
+    """Test the parsing of levels, times and lines."""
+
+    def test_levels(self):
+        assert parse_level("WARNING") == parse_level("warn") == parse_level(4) == 4
+        assert parse_level("error") == parse_level("3") == 3
+        assert parse_level("") is None
+        with pytest.raises(ValueError):
+            parse_level("loud")
+
+    def test_times(self):
+        assert parse_time("1700000000.5") == 1700000000.5
+        assert parse_time("2025-03-01 08:00:00") == T0
+        assert parse_time("2025-03-01T08:00:00") == T0
+        assert parse_time(None) is None
+        with pytest.raises(ValueError):
+            parse_time("yesterday")
+
+    def test_lines(self):
+        entry = parse_line("2025-03-01 08:00:00,123 - ERROR - failed")
+        assert entry["time"] == pytest.approx(T0 + 0.123)
+        assert entry["level"] == "err"
+        assert parse_line("[2025-03-01T08:00:00] something")["level"] is None
+        assert parse_line('  File "x.py", line 1') is None
+
+        light = parse_line(json.dumps({"time": T0, "led": "on", "reason": "schedule"}))
+        assert light["time"] == T0 and light["level"] is None
+
+
+class TestFileLogReader:
+    """Test the pages of a log file."""
+
+    def test_pages_cover_the_log(self, tmp_path):
+        path = tmp_path / "ethoscope.log"
+        expected = write_log(path, 1000, traceback_every=7)
+        # small blocks, so that lines and entries span several blocks
+        reader = FileLogReader(str(path), block_size=100)
+
+        entries, pages = read_all(reader, limit=30)
+        assert pages == 34
+        assert entries == expected[::-1]
+        assert entries[0]["message"].endswith("KeyError: 1") is (999 % 7 == 0)
+
+    def test_first_page(self, tmp_path):
+        path = tmp_path / "ethoscope.log"
+        expected = write_log(path, 100)
+        page = FileLogReader(str(path)).page(limit=10)
+        assert page["entries"] == expected[:-11:-1]
+        assert page["cursor"] is not None
+
+    @pytest.mark.parametrize(
+        "filters",
+        [
+            {"level": "warning"},
+            {"grep": "event 1"},
+            {"grep": "Event 1"},
+            {"since": T0 + 5000},
+            {"until": T0 + 5000},
+            {"since": "2025-03-01 08:30:00", "until": "2025-03-01 09:00:00"},
+            {"until": T0 + 5000, "level": "err", "grep": "7"},
+            {"until": T0 - 1},
+            {"since": T0 + 10**6},
+        ],
+    )
+    def test_filters(self, tmp_path, filters):
+        path = tmp_path / "ethoscope.log"
+        expected = write_log(path, 2000, traceback_every=11)
+        since, until, priority, pattern, _ = logs._parse_filters(
+            filters.get("since"),
+            filters.get("until"),
+            filters.get("level"),
+            filters.get("grep"),
+            None,
+        )
+        wanted = [
+            entry
+            for entry in expected[::-1]
+            if logs._matches(entry, since, until, priority, pattern)
+        ]
+
+        entries, _ = read_all(FileLogReader(str(path), block_size=512), **filters)
+        assert entries == wanted
+
+    def test_json_lines(self, tmp_path):
+        path = tmp_path / "light_transitions.log"
+        with open(path, "w") as f:
+            for i in range(50):
+                led = "on" if i % 2 else "off"
+                f.write(json.dumps({"time": T0 + 3600 * i, "led": led}) + "\n")
+        page = FileLogReader(str(path)).page(since=T0 + 3600 * 40, grep='"on"')
+        assert [entry["time"] for entry in page["entries"]] == [
+            T0 + 3600 * i for i in (49, 47, 45, 43, 41)
+        ]
+
+    def test_missing_file(self, tmp_path):
+        page = FileLogReader(str(tmp_path / "nothing.log")).page()
+        assert page["entries"] == [] and page["cursor"] is None
+
+    def test_rotated_file(self, tmp_path):
+        path = tmp_path / "ethoscope.log"
+        write_log(path, 100)
+        cursor = FileLogReader(str(path)).page(limit=10)["cursor"]
+        os.rename(path, tmp_path / "ethoscope.log.1")
+        write_log(path, 100)
+        with pytest.raises(ValueError, match="rotated"):
+            FileLogReader(str(path)).page(limit=10, cursor=cursor)
+
+    def test_entries_written_after_a_page(self, tmp_path):
+        path = tmp_path / "ethoscope.log"
+        write_log(path, 20)
+        reader = FileLogReader(str(path))
+        first = reader.page(limit=10)
+        with open(path, "a") as f:
+            f.write(log_line(20))
+        second = reader.page(limit=10, cursor=first["cursor"])
+        assert [e["message"] for e in second["entries"]] == [
+            log_line(i)[:-1] for i in range(9, -1, -1)
+        ]
+
+    @pytest.mark.parametrize(
+        "filters", [{"limit": 0}, {"limit": 10**6}, {"grep": "("}, {"level": "x"}]
+    )
+    def test_invalid_filters(self, tmp_path, filters):
+        with pytest.raises(ValueError):
+            FileLogReader(str(tmp_path / "ethoscope.log")).page(**filters)
+
+    @pytest.mark.slow
+    def test_tail_latency_does_not_depend_on_size(self, tmp_path):
+        """The newest page of a 500 MB log takes as long as that of a 1 MB one."""
+        chunk = "".join(log_line(i) for i in range(MB // len(log_line(0))))
+        small, large = tmp_path / "small.log", tmp_path / "large.log"
+        small.write_text(chunk)
+        with open(large, "w") as f:
+            for _ in range(500):
+                f.write(chunk)
+        assert os.path.getsize(large) >= 500 * small.stat().st_size
+
+        def latency(path, **filters):
+            reader = FileLogReader(str(path))
+            timings = []
+            for _ in range(20):
+                start = time.perf_counter()
+                page = reader.page(limit=200, **filters)
+                timings.append(time.perf_counter() - start)
+                assert len(page["entries"]) == 200
+            return sorted(timings)[len(timings) // 2]
+
+        last = log_line(len(chunk.splitlines()) - 1)
+        until = parse_line(last[:-1])["time"] - 3600
+        results = {
+            "tail": (latency(small), latency(large)),
+            "level": (latency(small, level="err"), latency(large, level="err")),
+            "until": (latency(small, until=until), latency(large, until=until)),
+        }
+        for name, (small_time, large_time) in results.items():
+            assert large_time < 5 * small_time + 0.005, name
+
+
+class FakeJournalctl:
+    """Stands for subprocess.run(journalctl ...) over a list of journal records."""
+
+    def __init__(self, count):
+        self.records = [
+            {
+                "__CURSOR": f"s=1;i={i:x}",
+                "__REALTIME_TIMESTAMP": str(int((T0 + i) * 1e6)),
+                "PRIORITY": str(3 if i % 10 == 0 else 6),
+                "_SYSTEMD_UNIT": "ethoscope_device.service",
+                "MESSAGE": f"event {i}",
+            }
+            for i in range(count)
+        ]
+        self.records[5]["MESSAGE"] = list(b"caf\xc3\xa9 \xff")
+        self.commands = []
+
+    def __call__(self, command, **kwargs):
+        self.commands.append(command)
+        options = dict(
+            arg[2:].split("=", 1)
+            for arg in command[1:]
+            if arg.startswith("--") and "=" in arg
+        )
+        records = self.records[::-1]
+        if "cursor" in options:
+            cursors = [r["__CURSOR"] for r in records]
+            records = records[cursors.index(options["cursor"]) :]
+        if "priority" in options:
+            records = [
+                r for r in records if int(r["PRIORITY"]) <= int(options["priority"])
+            ]
+        records = records[: int(options["lines"])]
+        stdout = "".join(json.dumps(r) + "\n" for r in records)
+        return logs.subprocess.CompletedProcess(command, 0, stdout, "")
+
+
+class TestJournalLogReader:
+    """Test the pages of the journal."""
+
+    @pytest.fixture
+    def journal(self, monkeypatch):
+        journal = FakeJournalctl(95)
+        monkeypatch.setattr(logs.subprocess, "run", journal)
+        return journal
+
+    def test_pages_cover_the_journal(self, journal):
+        entries, pages = read_all(JournalLogReader(), limit=10)
+        assert pages == 10
+        assert [entry["time"] for entry in entries] == [
+            T0 + i for i in range(94, -1, -1)
+        ]
+        assert entries[-6]["message"] == "café �"
+        assert entries[0] == {
+            "time": T0 + 94,
+            "level": "info",
+            "unit": "ethoscope_device.service",
+            "message": "event 94",
+        }
+
+    def test_command(self, journal):
+        JournalLogReader().page(
+            since=T0 + 0.5, until=T0 + 10.5, level="warning", grep="event", limit=5
+        )
+        command = journal.commands[0]
+        assert command[0] == "journalctl"
+        assert "--reverse" in command and "--output=json" in command
+        assert "--unit=ethoscope_listener.service" in command
+        assert f"--since=@{int(T0)}" in command
+        assert f"--until=@{int(T0) + 11}" in command
+        assert "--priority=4" in command and "--grep=event" in command
+        assert "--lines=6" in command
+
+    def test_times_are_filtered_to_the_second(self, journal):
+        page = JournalLogReader().page(since=T0 + 80.5)
+        assert [entry["time"] for entry in page["entries"]] == [
+            T0 + i for i in range(94, 80, -1)
+        ]
+
+    def test_level(self, journal):
+        entries, _ = read_all(JournalLogReader(), level="err", limit=3)
+        assert [entry["message"] for entry in entries] == [
+            f"event {i}" for i in range(90, -1, -10)
+        ]
+
+    def test_journalctl_error(self, monkeypatch):
+        def run(command, **kwargs):
+            return logs.subprocess.CompletedProcess(
+                command, 1, "", "Failed to add filter for units"
+            )
+
+        monkeypatch.setattr(logs.subprocess, "run", run)
+        with pytest.raises(RuntimeError, match="Failed to add filter"):
+            JournalLogReader().page()
+
+
+def test_log_reader():
+    assert isinstance(log_reader(), JournalLogReader)
+    assert log_reader("light").path == logs.LOG_FILES["light"]
+    with pytest.raises(ValueError):
+        log_reader("/etc/shadow")
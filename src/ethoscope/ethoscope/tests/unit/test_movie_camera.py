@@ -0,0 +1,192 @@
+"""
+Tests for the prefetching MovieVirtualCamera.
+
+Checks frames, time stamps and the end of iteration against the former serial
+read-and-convert loop on a generated AVI, and reports frames per second of both.
+"""
+
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from ethoscope.hardware.input.cameras import (
+    CAP_PROP_FRAME_COUNT,
+    CAP_PROP_POS_MSEC,
+    MovieVirtualCamera,
+)
+from ethoscope.roi_builders.file_based_roi_builder import FileBasedROIBuilder
+from ethoscope.roi_builders.roi_builders import BaseROIBuilder
+
+FPS = 25
+
+
+def _make_video(path, n_frames, size=(320, 240)):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), FPS, size)
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+    for i in range(n_frames):
+        frame = background.copy()
+        x = (i * 7) % (size[0] - 20)
+        cv2.rectangle(frame, (x, 40), (x + 20, 60), (255, 255, 255), -1)
+        cv2.putText(frame, str(i), (10, 200), cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 0), 3)
+        writer.write(frame)
+    writer.release()
+    return str(path)
+
+
+def _serial_frames(path, drop_each=1, max_duration=None):
+    """The former MovieVirtualCamera iteration: read and convert every frame in the caller."""
+    capture = cv2.VideoCapture(path)
+    total = capture.get(CAP_PROP_FRAME_COUNT)
+    frame_idx = 0
+    out = []
+    while not (total and frame_idx >= total):
+        t = capture.get(CAP_PROP_POS_MSEC) / 1e3
+        ret, frame = capture.read()
+        if not ret or frame is None:
+            break
+        im = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        frame_idx += 1
+        if frame_idx % drop_each == 0:
+            out.append((int(1000 * t), im))
+        if max_duration is not None and t > max_duration:
+            break
+    capture.release()
+    return out
+
+
+@pytest.fixture(scope="module")
+def video(tmp_path_factory):
+    return _make_video(tmp_path_factory.mktemp("video") / "arena.avi", 60)
+
+
+def _camera_frames(camera):
+    out = [(t, frame.copy()) for t, frame in camera]
+    camera._close()
+    return out
+
+
+def _assert_same(frames, expected):
+    assert [t for t, _ in frames] == [t for t, _ in expected]
+    for (_, frame), (_, expected_frame) in zip(frames, expected, strict=True):
+        assert np.array_equal(frame, expected_frame)
+
+
+class TestMovieVirtualCamera:
+    """Compare the serial and prefetching camera with the former iteration."""
+
+    @pytest.mark.parametrize("prefetch", [0, 1, 4])
+    @pytest.mark.parametrize("drop_each", [1, 3])
+    def test_same_frames_and_time_stamps(self, video, prefetch, drop_each):
+        expected = _serial_frames(video, drop_each=drop_each)
+        camera = MovieVirtualCamera(video, prefetch=prefetch, drop_each=drop_each)
+
+        _assert_same(_camera_frames(camera), expected)
+        assert camera.is_last_frame()
+        assert len(expected) == 60 // drop_each
+
+    def test_max_duration_stops_early(self, video):
+        expected = _serial_frames(video, max_duration=1.0)
+        camera = MovieVirtualCamera(video, max_duration=1.0)
+
+        _assert_same(_camera_frames(camera), expected)
+        assert not camera.is_last_frame()
+        assert camera._prefetch_thread is None
+
+    def test_frames_stay_valid_while_the_next_two_are_read(self, video):
+        expected = _serial_frames(video)
+        camera = MovieVirtualCamera(video, prefetch=2)
+        held = []
+        for i, (_, frame) in enumerate(camera):
+            held.append(frame)
+            for j in range(max(0, i - 2), i + 1):
+                assert np.array_equal(held[j], expected[j][1])
+        camera._close()
+
+    def test_frames_of_the_default_camera_can_be_kept(self, video):
+        camera = MovieVirtualCamera(video)
+        frames = list(camera)
+        assert camera._prefetch_thread is None
+        _assert_same(frames, _serial_frames(video))
+
+    def test_builders_keep_frames_of_a_prefetching_camera(self, video):
+        """ROI builders hold six frames, more than a prefetching camera keeps valid."""
+        expected = np.median(
+            np.array([im for _, im in _serial_frames(video)[:6]]), 0
+        ).astype(np.uint8)
+
+        def ahead(camera):
+            # let the prefetch thread fill its queue, as when the consumer is busy
+            for item in camera:
+                deadline = time.monotonic() + 5
+                while not camera._prefetch_queue.full() and time.monotonic() < deadline:
+                    time.sleep(0.001)
+                yield item
+
+        class ReferenceBuilder(BaseROIBuilder):
+            def _rois_from_img(self, img):
+                self.reference = img
+                return img, []
+
+        builder = ReferenceBuilder()
+        camera = MovieVirtualCamera(video, prefetch=MovieVirtualCamera.PREFETCH_FRAMES)
+        builder.build(ahead(camera))
+        camera._close()
+        assert np.array_equal(builder.reference, expected)
+
+        camera = MovieVirtualCamera(video, prefetch=MovieVirtualCamera.PREFETCH_FRAMES)
+        reference = FileBasedROIBuilder()._generate_basic_reference_points(
+            ahead(camera)
+        )
+        camera._close()
+        assert np.array_equal(reference, expected)
+
+    def test_target_fps_sets_drop_each(self, video):
+        camera = MovieVirtualCamera(video, target_fps=5)
+        assert camera._drop_each == FPS // 5
+        _assert_same(_camera_frames(camera), _serial_frames(video, drop_each=5))
+
+    def test_restart(self, video):
+        camera = MovieVirtualCamera(video)
+        next(iter(camera))
+        camera.restart()
+        _assert_same(_camera_frames(camera), _serial_frames(video))
+
+    @pytest.mark.slow
+    def test_frames_per_second(self, tmp_path):
+        """Report frames per second of the serial loop and the prefetching camera."""
+        path = _make_video(tmp_path / "large.avi", 300, size=(1280, 960))
+        results = {}
+        for label, read in (
+            ("former serial", lambda: _serial_frames(path)),
+            ("serial", lambda: list(MovieVirtualCamera(path, prefetch=0))),
+            (
+                "prefetch",
+                lambda: list(
+                    MovieVirtualCamera(
+                        path, prefetch=MovieVirtualCamera.PREFETCH_FRAMES
+                    )
+                ),
+            ),
+            ("former serial, drop_each=5", lambda: _serial_frames(path, drop_each=5)),
+            (
+                "prefetch, drop_each=5",
+                lambda: list(
+                    MovieVirtualCamera(
+                        path,
+                        prefetch=MovieVirtualCamera.PREFETCH_FRAMES,
+                        drop_each=5,
+                    )
+                ),
+            ),
+        ):
+            start = time.perf_counter()
+            read()
+            results[label] = 300 / (time.perf_counter() - start)
+
+        print()
+        for label, fps in results.items():
+            print(f"{label}: {fps:.0f} frames/s of video")
+        assert all(fps > 0 for fps in results.values())
@@ -0,0 +1,296 @@
+"""
+Tests for the registry of stimulators, ROI builders, trackers and drawers.
+
+Checks that the options offered to the node are read from the sources without
+importing the plugin modules, that plugins of other packages are found through
+entry points, and that user arguments are validated before a run starts.
+"""
+
+import json
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from ethoscope.control.tracking import ControlThread
+from ethoscope.stimulators.stimulators import BaseStimulator
+from ethoscope.utils import plugins
+from ethoscope.utils.plugins import (
+    REGISTRY,
+    PluginRegistry,
+    check_arguments,
+    register_plugin,
+)
+
+DUMMY_DESCRIPTION = {
+    "overview": "A stimulator for the tests",
+    "arguments": [
+        {
+            "type": "number",
+            "name": "min_inactive_time",
+            "min": 1,
+            "max": 3600 * 12,
+            "default": 120,
+        },
+        {
+            "type": "select",
+            "name": "mode",
+            "default": "motor",
+            "options": [{"value": "motor"}, {"value": "led"}],
+        },
+        {"type": "date_range", "name": "date_range", "default": ""},
+    ],
+}
+
+DUMMY_MODULE = """
+from ethoscope.stimulators.stimulators import BaseStimulator
+from ethoscope.utils.plugins import register_plugin
+
+
+@register_plugin("interactor")
+class ExternalStimulator(BaseStimulator):
+    _description = {
+        "overview": "A stimulator from another package",
+        "arguments": [{"type": "number", "name": "delay", "min": 0, "max": 60 * 60}],
+    }
+
+    def __init__(self, hardware_connection=None, delay=0):
+        super().__init__(hardware_connection)
+"""
+
+
+class DummyStimulator(BaseStimulator):
+    _description = DUMMY_DESCRIPTION
+
+    def __init__(
+        self,
+        hardware_connection=None,
+        min_inactive_time=120,
+        mode="motor",
+        date_range="",
+    ):
+        super().__init__(hardware_connection, date_range)
+
+
+@pytest.fixture
+def dummy():
+    yield register_plugin("interactor")(DummyStimulator)
+    REGISTRY.unregister("interactor", "DummyStimulator")
+
+
+def _parse_option(field, data):
+    """ControlThread._parse_one_user_option() without starting a control thread."""
+    return ControlThread._parse_one_user_option(ControlThread, field, data)
+
+
+def _run_python(code):
+    """Run code in a fresh interpreter and return what it prints as JSON."""
+    result = subprocess.run(
+        [sys.executable, "-c", textwrap.dedent(code)],
+        capture_output=True,
+        text=True,
+        timeout=120,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class TestDiscovery:
+    """Test that built-in plugins are found and described from their sources."""
+
+    def test_builtin_plugins(self):
+        names = {c: [p.name for p in REGISTRY.plugins(c)] for c in REGISTRY.categories}
+        assert names["interactor"][0] == "DefaultStimulator"
+        assert {"mAGO", "AGO", "ComposedStimulator", "MultiStimulator"} <= set(
+            names["interactor"]
+        )
+        assert names["roi_builder"] == ["FileBasedROIBuilder", "TargetGridROIBuilder"]
+        assert names["tracker"] == ["AdaptiveBGModel"]
+        assert names["drawer"][0] == "DefaultDrawer"
+
+    def test_descriptions_match_classes(self):
+        for category in REGISTRY.categories:
+            for plugin in REGISTRY.plugins(category):
+                static = plugin.describe()
+                assert static == plugin.load().__dict__.get("_description"), plugin
+
+    def test_defaults_are_valid(self):
+        for category in REGISTRY.categories:
+            for plugin in REGISTRY.plugins(category):
+                arguments = (plugin.describe() or {}).get("arguments", [])
+                kwargs = {a["name"]: a.get("default") for a in arguments}
+                REGISTRY.validate(category, plugin.name, kwargs)
+
+    def test_user_options_are_copies(self):
+        options = REGISTRY.user_options("roi_builder", include_hidden=True)
+        options[0].setdefault("arguments", []).append({"name": "template_name"})
+        assert REGISTRY.plugins("roi_builder")[0].describe() == {}
+
+    def test_hidden_plugins(self):
+        visible = [o["name"] for o in REGISTRY.user_options("interactor")]
+        everything = [
+            o["name"] for o in REGISTRY.user_options("interactor", include_hidden=True)
+        ]
+        assert "DefaultStimulator" not in visible
+        assert "DefaultStimulator" in everything
+        assert set(visible) < set(everything)
+
+
+class TestLazyLoading:
+    """Test that plugin modules are only imported when a run uses them."""
+
+    def test_options_do_not_import_plugins(self):
+        loaded = _run_python("""
+            import json, sys
+            from ethoscope.control.tracking import ControlThread
+            ControlThread.user_options()
+            print(json.dumps(sorted(sys.modules)))
+            """)
+        assert "ethoscope.stimulators.sleep_depriver_stimulators" not in loaded
+        assert "ethoscope.trackers.adaptive_bg_tracker" not in loaded
+        assert "ethoscope.roi_builders.target_roi_builder" not in loaded
+        assert "scipy" not in loaded
+
+    def test_import_time(self):
+        """Listing the options lazily is faster than importing every plugin."""
+        lazy = _run_python("""
+            import json, sys, time
+            start = time.perf_counter()
+            from ethoscope.utils.plugins import REGISTRY
+            for category in REGISTRY.categories:
+                REGISTRY.user_options(category, include_hidden=True)
+            elapsed = time.perf_counter() - start
+            print(json.dumps({"time": elapsed, "modules": len(sys.modules)}))
+            """)
+
+        # as the former ControlThread._option_dict: import every plugin module and
+        # read the descriptions from the classes
+        classes = [
+            (plugin.module, plugin.name)
+            for category in REGISTRY.categories
+            for plugin in REGISTRY.plugins(category)
+            if plugin.module.startswith("ethoscope.")
+        ]
+        eager = _run_python(f"""
+            import importlib, json, sys, time
+            start = time.perf_counter()
+            for module, name in {classes!r}:
+                getattr(importlib.import_module(module), name).__dict__.get(
+                    "_description"
+                )
+            elapsed = time.perf_counter() - start
+            print(json.dumps({{"time": elapsed, "modules": len(sys.modules)}}))
+            """)
+
+        assert eager["modules"] > lazy["modules"]
+        assert lazy["time"] < eager["time"], (lazy, eager)
+
+
+class TestRegistration:
+    """Test plugins registered from outside the built-in packages."""
+
+    def test_register_dummy_plugin(self, dummy):
+        assert dummy is DummyStimulator
+        assert REGISTRY.get("interactor", "DummyStimulator").loaded
+        assert REGISTRY.load("interactor", "DummyStimulator") is DummyStimulator
+
+        options = ControlThread.user_options()["interactor"]
+        offered = [o for o in options if o["name"] == "DummyStimulator"]
+        assert offered and offered[0]["overview"] == DUMMY_DESCRIPTION["overview"]
+
+        data = {"interactor": {"name": "DummyStimulator", "arguments": {"mode": "led"}}}
+        assert _parse_option("interactor", data) == (DummyStimulator, {"mode": "led"})
+
+    def test_unregister(self, dummy):
+        REGISTRY.unregister("interactor", "DummyStimulator")
+        with pytest.raises(ValueError):
+            REGISTRY.get("interactor", "DummyStimulator")
+
+    def test_same_name_from_another_module_is_ignored(self):
+        registry = PluginRegistry(entry_points=False)
+        first = registry.register("interactor", DummyStimulator)
+        impostor = type("DummyStimulator", (BaseStimulator,), {"__module__": "other"})
+        assert registry.register("interactor", impostor) is first
+        assert registry.load("interactor", "DummyStimulator") is DummyStimulator
+
+    def test_unknown_category(self):
+        with pytest.raises(ValueError):
+            REGISTRY.plugins("coffee_machine")
+
+    def test_entry_point_plugin(self, tmp_path, monkeypatch):
+        (tmp_path / "external_plugins.py").write_text(DUMMY_MODULE)
+        monkeypatch.syspath_prepend(str(tmp_path))
+        entry_point = plugins.importlib.metadata.EntryPoint(
+            name="ExternalStimulator",
+            value="external_plugins:ExternalStimulator",
+            group="ethoscope.interactor",
+        )
+
+        def entry_points(group):
+            return [entry_point] if group == "ethoscope.interactor" else []
+
+        monkeypatch.setattr(plugins.importlib.metadata, "entry_points", entry_points)
+        monkeypatch.delitem(sys.modules, "external_plugins", raising=False)
+
+        registry = PluginRegistry()
+        options = registry.user_options("interactor", include_hidden=True)
+        external = [o for o in options if o["name"] == "ExternalStimulator"]
+        assert external[0]["arguments"][0]["max"] == 3600
+        assert "external_plugins" not in sys.modules
+
+        cls = registry.validate("interactor", "ExternalStimulator", {"delay": 5})
+        assert "external_plugins" in sys.modules
+        assert cls.__name__ == "ExternalStimulator"
+        with pytest.raises(ValueError, match="delay"):
+            registry.validate("interactor", "ExternalStimulator", {"delay": 7200})
+
+
+class TestValidation:
+    """Test the checks of user arguments before a run starts."""
+
+    def test_valid_arguments(self):
+        check_arguments(
+            DummyStimulator,
+            {"min_inactive_time": "300", "mode": "motor", "date_range": ""},
+        )
+
+    @pytest.mark.parametrize(
+        "kwargs, problem",
+        [
+            ({"min_inactive_time": 0}, "lower than 1"),
+            ({"min_inactive_time": 50000}, "greater than 43200"),
+            ({"min_inactive_time": "soon"}, "not a number"),
+            ({"min_inactive_time": True}, "not a number"),
+            ({"mode": "valve"}, "is not one of"),
+            ({"date_range": 5}, "not a string"),
+            ({"velocity": 3}, "velocity is not an argument"),
+        ],
+    )
+    def test_invalid_arguments(self, kwargs, problem):
+        with pytest.raises(ValueError, match=problem):
+            check_arguments(DummyStimulator, kwargs)
+
+    def test_every_problem_is_reported(self):
+        with pytest.raises(ValueError) as error:
+            check_arguments(DummyStimulator, {"min_inactive_time": 0, "mode": "valve"})
+        assert "min_inactive_time" in str(error.value)
+        assert "mode" in str(error.value)
+
+    def test_run_with_invalid_options_is_refused(self):
+        data = {
+            "interactor": {
+                "name": "mAGO",
+                "arguments": {"min_inactive_time": -1},
+            }
+        }
+        with pytest.raises(ValueError, match="mAGO"):
+            _parse_option("interactor", data)
+
+        with pytest.raises(ValueError, match="Unknown interactor"):
+            _parse_option("interactor", {"interactor": {"name": "os", "arguments": {}}})
+        with pytest.raises(ValueError, match="Unknown camera"):
+            _parse_option("camera", {"camera": {"name": "os", "arguments": {}}})
+
+    def test_missing_option_uses_default(self):
+        assert _parse_option("tracker", {}) == (None, {})
@@ -0,0 +1,123 @@
+"""
+Micro-benchmark of the ROI insert path of the result writers.
+
+Compares the former string-building INSERTs with the batched, parameterised rows
+sent to the async writer, for 20 ROIs over 10k frames.
+"""
+
+import pickle
+import time
+from collections import deque
+
+import pytest
+
+from ethoscope.core.data_point import DataPoint
+from ethoscope.core.roi import ROI
+from ethoscope.core.variables import (
+    HeightVariable,
+    IsInferredVariable,
+    PhiVariable,
+    WidthVariable,
+    XPosVariable,
+    XYDistance,
+    YPosVariable,
+)
+from ethoscope.io.base import BaseResultWriter
+
+N_ROIS = 20
+N_FRAMES = 10000
+
+
+def _string_path(frames, rois, max_insert_string_len=1000):
+    """The former BaseResultWriter._add/flush: one growing SQL string per ROI."""
+    insert_dict = {}
+    sent = []
+    for t, data_row in frames:
+        for roi in rois:
+            tp = (0, t) + tuple(data_row.values())
+            if insert_dict.get(roi.idx, "") == "":
+                insert_dict[roi.idx] = f"INSERT INTO ROI_{roi.idx} VALUES {str(tp)}"
+            else:
+                insert_dict[roi.idx] += "," + str(tp)
+        for k, v in list(insert_dict.items()):
+            if len(v) > max_insert_string_len:
+                sent.append((v, None))
+                insert_dict[k] = ""
+    return sent
+
+
+def _batched_path(frames, rois):
+    sent = []
+    writer = object.__new__(BaseResultWriter)
+    writer._null = 0
+    writer._insert_dict = {}
+    writer._dam_file_helper = writer._shot_saver = writer._sensor_saver = None
+    writer._failed_commands_buffer = deque()
+    writer._write_async_command = lambda command, args=None: sent.append(
+        (command, args)
+    )
+    for t, data_row in frames:
+        for roi in rois:
+            writer._add(t, roi, [data_row])
+        writer.flush(t)
+    return sent
+
+
+class TestResultWriterInsertBenchmark:
+    """Benchmark the string and batched insert paths."""
+
+    @pytest.fixture
+    def workload(self):
+        rois = [
+            ROI(polygon=((0, 0), (100, 0), (100, 50), (0, 50)), idx=i)
+            for i in range(1, N_ROIS + 1)
+        ]
+        frames = [
+            (
+                t * 66,
+                DataPoint(
+                    [
+                        XPosVariable(t % 97),
+                        YPosVariable(t % 13),
+                        WidthVariable(9),
+                        HeightVariable(4),
+                        PhiVariable(t % 180),
+                        XYDistance(-(t % 1500)),
+                        IsInferredVariable(False),
+                    ]
+                ),
+            )
+            for t in range(N_FRAMES)
+        ]
+        return frames, rois
+
+    @pytest.mark.slow
+    def test_string_vs_batched_inserts(self, workload):
+        """Time both paths and check they carry the same number of rows."""
+        frames, rois = workload
+
+        start = time.perf_counter()
+        string_commands = _string_path(frames, rois)
+        string_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batched_commands = _batched_path(frames, rois)
+        batched_time = time.perf_counter() - start
+
+        # what goes through the queue to the async writer
+        string_bytes = sum(len(pickle.dumps(c)) for c in string_commands)
+        batched_bytes = sum(len(pickle.dumps(c)) for c in batched_commands)
+
+        batched_rows = sum(len(rows) for _, rows in batched_commands)
+        # rows still buffered at the end are not counted by either path
+        assert batched_rows <= N_ROIS * N_FRAMES
+        assert batched_rows > N_ROIS * (N_FRAMES - BaseResultWriter._max_insert_rows)
+        assert all(isinstance(rows, list) for _, rows in batched_commands)
+        assert len(batched_commands) < len(string_commands)
+        assert batched_bytes < string_bytes, (
+            f"{N_ROIS} ROIs x {N_FRAMES} frames: "
+            f"string INSERTs {string_time:.2f}s, {len(string_commands)} commands, "
+            f"{string_bytes / 1e6:.1f} MB queued; "
+            f"batched rows {batched_time:.2f}s, {len(batched_commands)} commands, "
+            f"{batched_bytes / 1e6:.1f} MB queued"
+        )
@@ -0,0 +1,264 @@
+"""
+Tests for the backup-aware retention of device data.
+
+A temporary data folder stands for /ethoscope_data and a fake node confirms the
+backups it holds, to check that only backed up, unchanged files are ever deleted,
+oldest first, and never those of the running experiment.
+"""
+
+import functools
+import os
+
+import pytest
+
+from ethoscope.utils import pi
+from ethoscope.utils.retention import DATA_FOLDERS, RetentionManager, file_checksum
+
+MB = 1024 * 1024
+DAY = 24 * 3600
+T0 = 1_700_000_000
+
+EXPERIMENT = "results/001aaa/ETHOSCOPE_001/{0}/{0}_001aaa.db"
+VIDEO = "videos/001aaa/ETHOSCOPE_001/{0}/{0}_001aaa_NA_{1:05d}.h264"
+
+
+class FakeDisk:
+    """Disk usage of a data folder: the size of its data on a disk of `total` bytes."""
+
+    def __init__(self, data_dir, total):
+        self.data_dir = data_dir
+        self.total = total
+
+    def __call__(self, path):
+        used = sum(
+            os.path.getsize(os.path.join(root, name))
+            for folder in DATA_FOLDERS
+            for root, _dirs, names in os.walk(os.path.join(self.data_dir, folder))
+            for name in names
+        )
+        return self.total, used, self.total - used
+
+
+class FakeNode:
+    """Keeps copies of device files and confirms them, as the node does after rsync."""
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.copies = {}
+
+    def backup(self, *paths):
+        for path in paths:
+            stat = os.stat(os.path.join(self.data_dir, path))
+            self.copies[path] = {"size": stat.st_size, "mtime": stat.st_mtime}
+
+    def confirm(self, retention, **extra):
+        return retention.confirm_backups(
+            [{"path": path, **copy, **extra} for path, copy in self.copies.items()]
+        )
+
+
+def write(data_dir, path, size, age_days):
+    """Create a file of `size` MB, last modified `age_days` before T0 + 100 days."""
+    full = os.path.join(data_dir, path)
+    os.makedirs(os.path.dirname(full), exist_ok=True)
+    with open(full, "wb") as f:
+        f.write(b"\0" * int(size * MB))
+    mtime = T0 + (100 - age_days) * DAY
+    os.utime(full, (mtime, mtime))
+    return path
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    return str(tmp_path / "ethoscope_data")
+
+
+@pytest.fixture
+def files(data_dir):
+    """Five experiments of 2 MB, from 50 days old (first) to 10 days old (last)."""
+    paths = []
+    for i, age in enumerate((50, 40, 30, 20, 10)):
+        stamp = f"2024-01-0{i + 1}_10-00-00"
+        if i % 2:
+            paths.append(write(data_dir, VIDEO.format(stamp, 0), 2, age))
+        else:
+            paths.append(write(data_dir, EXPERIMENT.format(stamp), 2, age))
+    return paths
+
+
+@pytest.fixture
+def retention(data_dir, files):
+    # 10 MB of data on a 12 MB disk: 83% used
+    retention = RetentionManager(data_dir, disk_usage=FakeDisk(data_dir, 12 * MB))
+    yield retention
+    retention.close()
+
+
+@pytest.fixture
+def node(data_dir):
+    return FakeNode(data_dir)
+
+
+def exists(data_dir, path):
+    return os.path.exists(os.path.join(data_dir, path))
+
+
+class TestRetentionPlan:
+    """Test the choice of files to delete."""
+
+    def test_unbacked_files_are_never_deleted(self, data_dir, files, retention, node):
+        node.backup(files[1], files[3])
+        assert node.confirm(retention) == {"confirmed": 2, "rejected": 0}
+
+        # reaching 10% would need every file gone
+        plan = retention.plan(target_percent=10)
+        assert [f["path"] for f in plan["files"]] == [files[1], files[3]]
+        assert not plan["target_met"]
+        assert plan["kept"]["not_backed_up"] == 3
+
+        summary = retention.apply(plan)
+        assert summary["files_deleted"] == 2
+        assert [exists(data_dir, p) for p in files] == [True, False, True, False, True]
+
+    def test_oldest_first_until_target(self, data_dir, files, retention, node):
+        node.backup(*files)
+        node.confirm(retention)
+
+        # 10 MB used of 12 MB; 50% is 6 MB, so two 2 MB files are enough
+        plan = retention.plan(target_percent=50)
+        assert plan["usage_percent"] == pytest.approx(83.3)
+        assert plan["bytes_to_free"] == 4 * MB
+        assert [f["path"] for f in plan["files"]] == files[:2]
+        assert plan["target_met"]
+
+        retention.apply(plan)
+        assert retention.plan(target_percent=50)["files"] == []
+
+    def test_dry_run_deletes_nothing(self, data_dir, files, retention, node):
+        node.backup(*files)
+        node.confirm(retention)
+        assert len(retention.plan(target_percent=0)["files"]) == 5
+        assert all(exists(data_dir, p) for p in files)
+
+    def test_files_changed_since_backup_are_kept(
+        self, data_dir, files, retention, node
+    ):
+        node.backup(*files)
+        node.confirm(retention)
+        # the database grows after its backup
+        with open(os.path.join(data_dir, files[0]), "ab") as f:
+            f.write(b"\0")
+
+        plan = retention.plan(target_percent=0)
+        assert files[0] not in [f["path"] for f in plan["files"]]
+        assert plan["kept"]["changed_since_backup"] == 1
+
+    def test_active_experiment_is_protected(self, data_dir, files, retention, node):
+        node.backup(*files)
+        node.confirm(retention)
+
+        experiment = os.path.dirname(os.path.join(data_dir, files[0]))
+        plan = retention.plan(target_percent=0, protect=[experiment])
+        assert [f["path"] for f in plan["files"]] == files[1:]
+        assert plan["kept"]["protected"] == 1
+
+    def test_apply_rechecks_files(self, data_dir, files, retention, node):
+        node.backup(*files)
+        node.confirm(retention)
+        plan = retention.plan(target_percent=50)
+
+        with open(os.path.join(data_dir, files[0]), "ab") as f:
+            f.write(b"\0")
+        summary = retention.apply(plan)
+        assert summary["deleted_files"] == [os.path.join(data_dir, files[1])]
+        assert exists(data_dir, files[0])
+
+
+class TestBackupConfirmation:
+    """Test the confirmations sent by the node."""
+
+    def test_mismatches_are_rejected(self, data_dir, files, retention, node):
+        node.backup(files[0], files[1], files[2])
+        node.copies[files[0]]["size"] += 1
+        node.copies[files[1]]["mtime"] -= 60
+        write(data_dir, "results/001aaa/notes.txt", 0.001, 1)
+        node.backup("results/001aaa/notes.txt")
+        outside = write(data_dir, "upload/masks/mask.db", 0.001, 1)
+        node.backup(outside)
+
+        assert node.confirm(retention) == {"confirmed": 1, "rejected": 4}
+        assert [f["path"] for f in retention.plan(0)["files"]] == [files[2]]
+
+    def test_checksum(self, data_dir, files, retention, node):
+        node.backup(files[0])
+        path = os.path.join(data_dir, files[0])
+        assert node.confirm(retention, checksum="0" * 32)["confirmed"] == 0
+        assert node.confirm(retention, checksum=file_checksum(path))["confirmed"] == 1
+
+    def test_confirmations_persist(self, data_dir, files, retention, node):
+        node.backup(files[0])
+        node.confirm(retention)
+        retention.close()
+
+        reopened = RetentionManager(data_dir, disk_usage=FakeDisk(data_dir, 12 * MB))
+        assert [f["path"] for f in reopened.plan(0)["files"]] == [files[0]]
+        reopened.close()
+
+
+class TestInventory:
+    """Test the incremental scan of the data folders."""
+
+    def test_only_changed_folders_are_listed(self, data_dir, files, retention, node):
+        folders = retention.scan()
+        assert folders >= len(files)
+        assert retention.scan() == 0
+
+        new = write(data_dir, VIDEO.format("2024-01-02_10-00-00", 1), 1, 5)
+        assert retention.scan() == 1
+        node.backup(new)
+        assert node.confirm(retention)["confirmed"] == 1
+
+        os.remove(os.path.join(data_dir, new))
+        assert retention.scan() == 1
+        assert new not in [f["path"] for f in retention.plan(0)["files"]]
+
+    def test_removed_folders_are_forgotten(self, data_dir, files, retention):
+        retention.scan()
+        folder = os.path.dirname(os.path.join(data_dir, files[0]))
+        os.remove(os.path.join(data_dir, files[0]))
+        os.rmdir(folder)
+        retention.scan()
+        count = retention._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        assert count == len(files) - 1
+
+
+class TestManageDiskSpace:
+    """Test pi.manage_disk_space() on top of the retention manager."""
+
+    def test_only_backed_up_files_are_deleted(
+        self, data_dir, files, retention, node, monkeypatch
+    ):
+        node.backup(files[0], files[4])
+        node.confirm(retention)
+        retention.close()
+
+        monkeypatch.setattr(
+            pi,
+            "RetentionManager",
+            functools.partial(RetentionManager, disk_usage=FakeDisk(data_dir, 12 * MB)),
+        )
+        monkeypatch.setattr(
+            pi,
+            "check_disk_space",
+            lambda path, threshold: {
+                "usage_percent": 83,
+                "available_gb": 0,
+                "needs_cleanup": True,
+            },
+        )
+
+        result = pi.manage_disk_space(data_dir, target_percent=10)
+        assert result["cleanup_performed"]
+        assert result["cleanup_summary"]["files_deleted"] == 2
+        assert result["kept"]["not_backed_up"] == 3
+        assert [exists(data_dir, p) for p in files] == [False, True, True, True, False]
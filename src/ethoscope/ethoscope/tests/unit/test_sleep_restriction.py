@@ -6,6 +6,7 @@ Tests for DailyScheduler and mAGOSleepRestriction stimulator classes.
 
 import json
 import os
+import random
 import tempfile
 import time
 import unittest
@@ -188,6 +189,10 @@ class TestDailyScheduler(unittest.TestCase):
         base_date = 1704067200 + 9 * 3600  # 2024-01-01 09:00:00 UTC (active)
         scheduler.is_active_period(base_date)
 
+        # State is written in the background, after a delay
+        self.assertFalse(os.path.exists(self.state_file))
+        scheduler.flush()
+
         # Check that state file was created
         self.assertTrue(os.path.exists(self.state_file))
 
@@ -224,6 +229,185 @@ class TestDailyScheduler(unittest.TestCase):
         self.assertEqual(info["daily_start_time"], "09:00:00")
 
 
+def reference_is_active(t, start_time_seconds, interval_hours, duration_hours):
+    """DailyScheduler.is_active_period() as computed before the window table."""
+    days_since_epoch = int(t // 86400)
+    start_timestamp = days_since_epoch * 86400 + start_time_seconds
+    interval_seconds = interval_hours * 3600
+    active_seconds = duration_hours * 3600
+
+    periods_since_start = int((t - start_timestamp) // interval_seconds)
+    if t < start_timestamp:
+        periods_since_start = -1
+
+    current_period_start = start_timestamp + (periods_since_start * interval_seconds)
+    current_period_end = current_period_start + active_seconds
+    return current_period_start <= t < current_period_end, current_period_end
+
+
+class TestDailySchedulerEquivalence(unittest.TestCase):
+    """Property tests of the window table against the per-call computation."""
+
+    # (duration, interval, start): daily, several per day, multi-day and odd intervals
+    SCHEDULES = [
+        (8, 24, "09:00:00"),
+        (4, 12, "06:00:00"),
+        (1, 1, "00:00:00"),
+        (2, 10, "21:30:00"),
+        (0.5, 1.5, "23:45:10"),
+        (12, 36, "08:00:00"),
+        (24, 48, "00:00:00"),
+        (6, 168, "18:00:00"),
+        (24, 24, "12:00:00"),
+    ]
+    # DST transitions in Europe and the US, 2024
+    TRANSITIONS = [1711846800, 1729990800, 1710054000, 1730613600]
+    TIMEZONES = ["Europe/London", "America/New_York", "UTC"]
+
+    def setUp(self):
+        self._tz = os.environ.get("TZ")
+        self.addCleanup(self._restore_tz)
+
+    def _restore_tz(self):
+        if self._tz is None:
+            os.environ.pop("TZ", None)
+        else:
+            os.environ["TZ"] = self._tz
+        time.tzset()
+
+    def _timestamps(self, rng):
+        """Random times within a few days of DST transitions, and period edges."""
+        for transition in self.TRANSITIONS:
+            for _ in range(300):
+                yield transition + rng.uniform(-3 * 86400, 3 * 86400)
+            for _ in range(100):
+                yield transition + rng.randint(-3 * 86400, 3 * 86400)
+            # every quarter hour, hitting period starts and ends exactly
+            for offset in range(-2 * 86400, 2 * 86400, 900):
+                yield transition + offset
+
+    def test_equivalence_across_dst(self):
+        rng = random.Random(45)
+        mismatches = []
+        for tz in self.TIMEZONES:
+            os.environ["TZ"] = tz
+            time.tzset()
+            for duration, interval, start in self.SCHEDULES:
+                scheduler = DailyScheduler(duration, interval, start)
+                start_seconds = scheduler._start_time_seconds
+                timestamps = list(self._timestamps(rng))
+                # in time order, and shuffled to defeat the cached answer
+                for t in sorted(timestamps) + timestamps:
+                    expected, end = reference_is_active(
+                        t, start_seconds, interval, duration
+                    )
+                    remaining = max(0, end - t) if expected else 0
+                    if (
+                        scheduler.is_active_period(t) != expected
+                        or scheduler.get_remaining_active_time(t) != remaining
+                    ):
+                        mismatches.append((tz, duration, interval, start, t))
+        self.assertEqual(mismatches, [])
+
+    def test_long_runs(self):
+        """A month of frames at 1 fps, crossing several window tables."""
+        for duration, interval, start in self.SCHEDULES:
+            scheduler = DailyScheduler(duration, interval, start)
+            start_seconds = scheduler._start_time_seconds
+            t0 = self.TRANSITIONS[0] - 15 * 86400
+            for t in range(t0, t0 + 30 * 86400, 7):
+                expected, _ = reference_is_active(t, start_seconds, interval, duration)
+                if scheduler.is_active_period(t) != expected:
+                    self.fail(f"{(duration, interval, start)} differs at {t}")
+
+    def test_answer_is_cached_until_next_edge(self):
+        scheduler = DailyScheduler(8, 24, "09:00:00")
+        base_date = 1704067200  # 2024-01-01 00:00:00 UTC
+
+        with patch.object(scheduler, "_locate", wraps=scheduler._locate) as locate:
+            for second in range(10 * 3600, 17 * 3600):
+                self.assertTrue(scheduler.is_active_period(base_date + second))
+            self.assertEqual(locate.call_count, 1)
+            self.assertFalse(scheduler.is_active_period(base_date + 17 * 3600))
+            self.assertEqual(locate.call_count, 2)
+
+
+class TestDailySchedulerState(unittest.TestCase):
+    """Test the debounced persistence of the scheduler state."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.state_file = os.path.join(self.temp_dir, "state", "roi_1.json")
+        self.base_date = 1704067200  # 2024-01-01 00:00:00 UTC
+
+    def tearDown(self):
+        import shutil
+
+        shutil.rmtree(self.temp_dir)
+
+    def _read_state(self):
+        with open(self.state_file) as f:
+            return json.load(f)
+
+    def test_periods_are_saved_in_the_background(self):
+        scheduler = DailyScheduler(4, 12, "06:00:00", self.state_file, save_delay=0.05)
+        scheduler.is_active_period(self.base_date + 7 * 3600)
+        scheduler.is_active_period(self.base_date + 19 * 3600)
+
+        deadline = time.monotonic() + 5
+        while not os.path.exists(self.state_file) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(
+            self._read_state(),
+            {
+                f"period_{self.base_date + 6 * 3600}": {
+                    "start_time": self.base_date + 6 * 3600,
+                    "end_time": self.base_date + 10 * 3600,
+                    "first_activity": self.base_date + 7 * 3600,
+                },
+                f"period_{self.base_date + 18 * 3600}": {
+                    "start_time": self.base_date + 18 * 3600,
+                    "end_time": self.base_date + 22 * 3600,
+                    "first_activity": self.base_date + 19 * 3600,
+                },
+            },
+        )
+        self.assertEqual(os.listdir(os.path.dirname(self.state_file)), ["roi_1.json"])
+
+    def test_writes_are_debounced(self):
+        scheduler = DailyScheduler(1, 1, "00:00:00", self.state_file, save_delay=60)
+        with patch.object(
+            scheduler, "_save_state", wraps=scheduler._save_state
+        ) as save:
+            for hour in range(24):
+                scheduler.is_active_period(self.base_date + hour * 3600 + 1)
+            self.assertEqual(save.call_count, 0)
+            scheduler.flush()
+            scheduler.flush()
+            self.assertEqual(save.call_count, 1)
+        self.assertEqual(len(self._read_state()), 24)
+
+    def test_state_is_reloaded(self):
+        scheduler = DailyScheduler(8, 24, "09:00:00", self.state_file)
+        scheduler.is_active_period(self.base_date + 10 * 3600)
+        scheduler.flush()
+
+        reloaded = DailyScheduler(8, 24, "09:00:00", self.state_file)
+        with patch.object(reloaded, "_schedule_save") as schedule_save:
+            reloaded.is_active_period(self.base_date + 11 * 3600)
+        schedule_save.assert_not_called()
+
+    def test_set_state_file(self):
+        scheduler = DailyScheduler(8, 24, "09:00:00")
+        scheduler.is_active_period(self.base_date + 10 * 3600)
+        scheduler.set_state_file(self.state_file)
+        scheduler.is_active_period(self.base_date + 10 * 3600 + 1)
+        scheduler.flush()
+        self.assertEqual(
+            list(self._read_state()), [f"period_{self.base_date + 9 * 3600}"]
+        )
+
+
 class TestmAGOSleepRestriction(unittest.TestCase):
     """Test cases for mAGOSleepRestriction stimulator."""
 
@@ -0,0 +1,182 @@
+"""
+Tests for the synthetic arena videos and the tracker benchmark.
+
+Checks that videos are reproducible, that the grid ROI builder finds the ROIs the
+flies were placed in, that the scoring counts errors, misses and identity swaps,
+and that a short benchmark writes the expected JSON.
+"""
+
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from ethoscope.roi_builders.target_roi_builder import TargetGridROIBuilder
+from ethoscope.utils import tracker_benchmark
+from ethoscope.utils.synthetic_arena import (
+    FLY_LENGTH,
+    SyntheticArena,
+    load_grid_template,
+)
+
+
+@pytest.fixture(scope="module")
+def arena():
+    return SyntheticArena(n_frames=20, flies_per_roi=2, seed=3)
+
+
+class TestSyntheticArena:
+    """Test the generated videos and their ground truth."""
+
+    def test_same_seed_same_video(self, arena):
+        other = SyntheticArena(n_frames=20, flies_per_roi=2, seed=3)
+        assert np.array_equal(arena.trajectories, other.trajectories)
+        for frame, other_frame in zip(arena.frames(), other.frames(), strict=True):
+            assert np.array_equal(frame, other_frame)
+
+        different = SyntheticArena(n_frames=20, flies_per_roi=2, seed=4)
+        assert not np.array_equal(arena.trajectories, different.trajectories)
+
+    def test_builder_finds_the_arena_rois(self, arena):
+        frame = cv2.cvtColor(next(arena.frames()), cv2.COLOR_GRAY2BGR)
+        builder = TargetGridROIBuilder(**load_grid_template())
+        reference_points, rois = builder._rois_from_img(frame)
+
+        assert np.allclose(
+            np.sort(reference_points, axis=0),
+            np.sort(arena.reference_points, axis=0),
+            atol=2,
+        )
+        assert len(rois) == len(arena.rois) == 20
+        for roi, expected in zip(rois, arena.rois, strict=True):
+            assert roi.idx == expected.idx
+            assert np.abs(roi.polygon - expected.polygon).max() <= 2
+
+    def test_flies_stay_in_their_roi(self, arena):
+        ground_truth = arena.ground_truth()
+        assert arena.trajectories.shape == (20, 40, 2)
+        assert len(ground_truth["flies"]) == 40
+
+        rois = {roi.idx: roi for roi in arena.rois}
+        for fly in ground_truth["flies"]:
+            assert len(fly["positions"]) == len(fly["states"]) == 20
+            assert set(fly["states"]) <= set("wrsj")
+            polygon = rois[fly["roi"]].polygon
+            for x, y in fly["positions"]:
+                assert cv2.pointPolygonTest(polygon, (x, y), False) >= 0
+
+    def test_write(self, tmp_path):
+        path = str(tmp_path / "arena.avi")
+        ground_truth = SyntheticArena(n_frames=10, seed=1).write(path)
+
+        with open(f"{path}.json") as f:
+            assert json.load(f) == json.loads(json.dumps(ground_truth))
+        capture = cv2.VideoCapture(path)
+        assert int(capture.get(cv2.CAP_PROP_FRAME_COUNT)) == 10
+        capture.release()
+
+
+def _ground_truth(positions):
+    """Two flies in ROI 1, over len(positions) frames at 25 fps."""
+    return {
+        "fps": 25,
+        "n_frames": len(positions),
+        "fly_size": [10.0, 4.0],
+        "flies": [
+            {"id": fly, "roi": 1, "positions": [p[fly] for p in positions]}
+            for fly in range(2)
+        ],
+    }
+
+
+class TestScore:
+    """Test the scoring of tracked positions against the ground truth."""
+
+    def test_perfect_tracking(self):
+        truth = [[(10, 10), (50, 50)]] * 3
+        positions = {i * 40: {1: [(10, 10, False), (50, 50, False)]} for i in range(3)}
+        result = tracker_benchmark.score(_ground_truth(truth), positions)
+        assert result["positional_error_px"] == {"mean": 0.0, "median": 0.0, "p95": 0.0}
+        assert result["matched"] == 6
+        assert (
+            result["missed"],
+            result["false_positives"],
+            result["identity_swaps"],
+        ) == (
+            0,
+            0,
+            0,
+        )
+
+    def test_errors_misses_and_swaps(self):
+        truth = [[(10, 10), (50, 50)]] * 4
+        positions = {
+            # 3 px off
+            0: {1: [(13, 10, False), (50, 50, False)]},
+            # one fly missed, and a detection far from both
+            40: {1: [(10, 10, False), (200, 200, True)]},
+            # detections swap slots
+            80: {1: [(50, 50, False), (10, 10, False)]},
+            # frame 3 has no position at all
+        }
+        result = tracker_benchmark.score(_ground_truth(truth), positions)
+        assert result["matched"] == 5
+        assert result["positional_error_px"]["mean"] == pytest.approx(3 / 5)
+        assert result["missed"] == 1 + 2
+        assert result["missed_fraction"] == pytest.approx(3 / 8)
+        assert result["false_positives"] == 1
+        assert result["inferred"] == 1
+        assert result["identity_swaps"] == 2
+        assert result["frames_with_positions"] == 3
+
+
+class TestTrackerBenchmark:
+    """Run the benchmark on short videos."""
+
+    def test_cli_writes_results(self, tmp_path):
+        output = tmp_path / "benchmark.json"
+        status = tracker_benchmark.main(
+            [
+                "-o",
+                str(output),
+                "--frames",
+                "30",
+                "--flies",
+                "1",
+                "--trackers",
+                "AdaptiveBGModel",
+                "HaarTracker",
+                "--resolution",
+                "480x360",
+            ]
+        )
+        assert status == 0
+
+        with open(output) as f:
+            results = json.load(f)
+        trackers = results["scenarios"]["1_fly_per_roi"]["trackers"]
+        assert trackers["HaarTracker"] == {"skipped": "no Haar cascade given"}
+        result = trackers["AdaptiveBGModel"]
+        assert result["frames"] == 30
+        assert result["fps"] > 0
+        for key in (
+            "positional_error_px",
+            "missed",
+            "identity_swaps",
+            "false_positives",
+        ):
+            assert key in result
+
+    @pytest.mark.slow
+    def test_adaptive_bg_model_accuracy(self):
+        """AdaptiveBGModel follows a single fly to within a fly length."""
+        results = tracker_benchmark.run_benchmark(
+            flies=(1,), trackers=("AdaptiveBGModel",), n_frames=500
+        )
+        result = results["scenarios"]["1_fly_per_roi"]["trackers"]["AdaptiveBGModel"]
+        # resting flies fade into the adaptive background within seconds, so the error
+        # is of the order of a few pixels rather than the precision of the fitted ellipse
+        fly_length = FLY_LENGTH * 960
+        assert result["positional_error_px"]["median"] < fly_length
+        assert result["missed_fraction"] < 0.75
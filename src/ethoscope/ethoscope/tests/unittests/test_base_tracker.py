@@ -6,14 +6,20 @@ and error handling.
 """
 
 import unittest
+import unittest.mock
 from unittest.mock import Mock
 
 import numpy as np
 
 from ethoscope.core.data_point import DataPoint
 from ethoscope.core.roi import ROI
-from ethoscope.core.variables import XPosVariable, YPosVariable
-from ethoscope.trackers.trackers import BaseTracker, NoPositionError
+from ethoscope.core.variables import XPosVariable, XYDistance, YPosVariable
+from ethoscope.trackers.trackers import (
+    BaseTracker,
+    NoPositionError,
+    PositionHistory,
+    TrackerFeatures,
+)
 
 
 class ConcreteTracker(BaseTracker):
@@ -167,5 +173,181 @@ class TestBaseTracker(unittest.TestCase):
         self.assertEqual(times[1], 2000)
 
 
+class ScriptedTracker(BaseTracker):
+    """Tracker returning a scripted sequence of (x, log10 distance) positions."""
+
+    def __init__(self, roi, script):
+        super().__init__(roi)
+        self._script = iter(script)
+
+    def _find_position(self, img, mask, t):
+        step = next(self._script)
+        if step is None:
+            raise NoPositionError()
+        x, log_dist = step
+        return [DataPoint([XPosVariable(x), YPosVariable(10), XYDistance(log_dist)])]
+
+
+class TestTrackerFeatures(unittest.TestCase):
+    """Test suite for the derived features shared by stimulators."""
+
+    def setUp(self):
+        contour = np.array([[0, 0], [0, 100], [100, 100], [100, 0]])
+        self.roi = ROI(contour, idx=1)
+        self.img = np.zeros((200, 200), dtype=np.uint8)
+
+    def _run(self, script, dt=100):
+        tracker = ScriptedTracker(self.roi, script)
+        for i in range(len(script)):
+            tracker.track(i * dt, self.img)
+        return tracker
+
+    def test_features_are_shared(self):
+        tracker = self._run([(10, 0)])
+        self.assertIs(TrackerFeatures.of(tracker), tracker.features)
+        self.assertIs(TrackerFeatures.of(tracker), TrackerFeatures.of(tracker))
+
+    def test_of_mock_tracker_gives_private_features(self):
+        self.assertIsInstance(TrackerFeatures.of(Mock()), TrackerFeatures)
+
+    def test_distance_velocity_and_movement(self):
+        # 10 ** (1000 / 1000) = 10 px in 100 ms
+        tracker = self._run([(10, 0), (20, 1000)])
+        features = tracker.features
+
+        self.assertAlmostEqual(features.distance, 10.0)
+        self.assertAlmostEqual(features.dt, 0.1)
+        self.assertAlmostEqual(features.velocity, 100.0)
+        self.assertTrue(features.has_moved(3.0))
+        self.assertFalse(features.has_moved(30.0))
+
+    def test_not_moved_when_not_spotted(self):
+        tracker = ScriptedTracker(self.roi, [(10, 0), (20, 1000), None])
+        tracker.track(0, self.img)
+        tracker.track(100, self.img)
+        self.assertTrue(tracker.features.has_moved(3.0))
+
+        # the position is inferred, so last_time_point is appended with the old point
+        tracker._last_non_inferred_time = -(10**9)
+        tracker.track(200, self.img)
+        self.assertFalse(tracker.features.has_moved(3.0))
+
+    def test_features_computed_once_per_frame(self):
+        tracker = self._run([(10, 0), (20, 1000)])
+        features = tracker.features
+        features.has_moved(3.0)
+
+        with unittest.mock.patch.object(
+            TrackerFeatures, "_distance_of", side_effect=AssertionError
+        ):
+            # cached for this frame
+            features.has_moved(3.0)
+            self.assertAlmostEqual(features.distance, 10.0)
+
+    def test_cache_invalidated_on_new_frame(self):
+        tracker = ScriptedTracker(self.roi, [(10, 0), (20, 1000), (21, 0)])
+        tracker.track(0, self.img)
+        tracker.track(100, self.img)
+        self.assertTrue(tracker.features.has_moved(3.0))
+        tracker.track(200, self.img)
+        self.assertFalse(tracker.features.has_moved(3.0))
+
+    def test_midline(self):
+        tracker = self._run([(40, 0), (60, 0)])
+        features = tracker.features
+        self.assertEqual(features.midline_side(), 1)
+        self.assertTrue(features.crossed_midline())
+        self.assertFalse(features.crossed_midline(middle_line=0.7))
+
+    def test_multiple_animals_raise(self):
+        tracker = self._run([(40, 0), (60, 0)])
+        tracker.positions[-1] = tracker.positions[-1] * 2
+        with self.assertRaisesRegex(Exception, "single animal"):
+            tracker.features.has_moved(3.0)
+
+    def test_running_features_catch_up(self):
+        # 1 px, 10 px, 1 px, 100 px moves
+        tracker = ScriptedTracker(
+            self.roi, [(10, 0), (11, 0), (21, 1000), (22, 0), (99, 2000)]
+        )
+        features = tracker.features
+        tracker.track(0, self.img)
+        self.assertEqual(features.time_since_movement(3.0), 0)
+        self.assertEqual(features.time_since_movement(200.0), 0)
+
+        for i in range(1, 5):
+            tracker.track(i * 100, self.img)
+        # not queried in between, yet nothing was missed
+        self.assertAlmostEqual(features.cumulative_distance, 1 + 10 + 1 + 100)
+        self.assertEqual(features.time_since_movement(3.0), 0)
+        self.assertEqual(features.time_since_movement(200.0), 400)
+
+
+class TestPositionHistory(unittest.TestCase):
+    """Test suite for the array-backed position history."""
+
+    @staticmethod
+    def _point(x, log_dist=0):
+        return DataPoint([XPosVariable(x), YPosVariable(10), XYDistance(log_dist)])
+
+    def test_append_and_window(self):
+        history = PositionHistory(capacity=16)
+        for i in range(10):
+            history.append(i * 100, self._point(i))
+
+        self.assertEqual(len(history), 10)
+        self.assertEqual(history.last_time, 900)
+        rows = history.window(300, 500)
+        np.testing.assert_array_equal(rows[:, 0], [300, 400, 500])
+        np.testing.assert_array_equal(history.column("x", 300, 500), [3, 4, 5])
+        np.testing.assert_array_equal(history.column("t", end=100), [0, 100])
+
+    def test_missing_variables_are_nan(self):
+        history = PositionHistory(capacity=4)
+        history.append(0, self._point(5, 1000))
+        row = history.last()[0]
+        self.assertAlmostEqual(row[PositionHistory.COLUMNS.index("xy_dist")], 10.0)
+        self.assertTrue(np.isnan(row[PositionHistory.COLUMNS.index("phi")]))
+
+    def test_wraps_around_when_full(self):
+        history = PositionHistory(capacity=4)
+        for i in range(10):
+            history.append(i * 100, self._point(i))
+
+        self.assertEqual(len(history), 4)
+        np.testing.assert_array_equal(history.column("x"), [6, 7, 8, 9])
+        # the window spans both segments of the ring
+        np.testing.assert_array_equal(history.column("x", 650, 850), [7, 8])
+        np.testing.assert_array_equal(history.since(200)[:, 0], [700, 800, 900])
+        np.testing.assert_array_equal(history.last(2)[:, 1], [8, 9])
+
+    def test_empty(self):
+        history = PositionHistory(capacity=4)
+        self.assertIsNone(history.last_time)
+        self.assertEqual(history.window().shape, (0, len(PositionHistory.COLUMNS)))
+        self.assertEqual(len(history.since(1000)), 0)
+        self.assertEqual(len(history.last(3)), 0)
+
+    def test_invalid_capacity(self):
+        with self.assertRaisesRegex(ValueError, "capacity"):
+            PositionHistory(capacity=0)
+
+    def test_tracker_history_matches_positions(self):
+        contour = np.array([[0, 0], [0, 100], [100, 100], [100, 0]])
+        tracker = ScriptedTracker(
+            ROI(contour, idx=1), [(10, 0), (20, 1000), None, (30, 0)]
+        )
+        img = np.zeros((200, 200), dtype=np.uint8)
+        for i in range(4):
+            tracker.track(i * 100, img)
+
+        rows = tracker.history.window()
+        np.testing.assert_array_equal(rows[:, 0], list(tracker.times))
+        np.testing.assert_array_equal(
+            rows[:, 1], [p[0]["x"] for p in tracker.positions]
+        )
+        np.testing.assert_array_equal(rows[:, 7], [0, 0, 1, 0])
+
+
 if __name__ == "__main__":
     unittest.main()
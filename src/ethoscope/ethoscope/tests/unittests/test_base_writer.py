@@ -16,7 +16,17 @@ from unittest.mock import MagicMock, Mock, PropertyMock, patch
 
 import numpy as np
 
+from ethoscope.core.data_point import DataPoint
 from ethoscope.core.roi import ROI
+from ethoscope.core.variables import (
+    HeightVariable,
+    IsInferredVariable,
+    PhiVariable,
+    WidthVariable,
+    XPosVariable,
+    XYDistance,
+    YPosVariable,
+)
 from ethoscope.io.base import (
     ASYNC_WRITER_TIMEOUT,
     MAX_BUFFERED_COMMANDS,
@@ -32,6 +42,7 @@ from ethoscope.io.helpers import (
     NpyAppendableFile,
     Null,
     SensorDataHelper,
+    SpillLog,
 )
 
 # ===========================================================================
@@ -253,7 +264,7 @@ class TestDAMFileHelper(unittest.TestCase):
     def test_init(self):
         helper = DAMFileHelper(n_rois=10)
         self.assertEqual(helper._n_rois, 10)
-        self.assertEqual(len(helper._distance_map), 10)
+        self.assertEqual(helper._activity_ring.shape[1], 11)
 
     def test_make_dam_file_sql_fields(self):
         """Test SQL field generation."""
@@ -446,6 +457,41 @@ class TestBaseResultWriterResilience(unittest.TestCase):
         # Should not raise
         writer.log_io_diagnostics("test error")
 
+    def test_buffer_command_spills_to_disk(self):
+        """Test commands are spilled to disk rather than kept in memory."""
+        writer = self._make_writer_shell()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            writer._spill_log = SpillLog(os.path.join(tmpdir, "spill"))
+            writer._buffer_command("INSERT INTO t VALUES (%s)", (1,))
+
+            self.assertEqual(len(writer._failed_commands_buffer), 0)
+            status = writer.get_resilience_status()
+            self.assertEqual(status["spill_records"], 1)
+            self.assertGreater(status["spill_bytes"], 0)
+
+    def test_spill_replayed_in_bounded_batches(self):
+        """Test each write replays a bounded batch of spilled commands first."""
+        writer = self._make_writer_shell()
+        writer._queue.qsize.return_value = 0
+        with tempfile.TemporaryDirectory() as tmpdir:
+            writer._spill_log = SpillLog(os.path.join(tmpdir, "spill"))
+            for i in range(5):
+                writer._spill_log.append("CMD", (i,))
+
+            writer._spill_replay_batch = 3
+            # still behind: the new command is spilled after the old ones
+            self.assertFalse(writer._write_async_command_resilient("NEW"))
+            self.assertEqual(writer._queue.put.call_count, 3)
+            self.assertIsNotNone(writer.get_spill_status()["spill_replay_rate"])
+
+            self.assertTrue(writer._write_async_command_resilient("NEWER"))
+
+            sent = [c.args[0] for c in writer._queue.put.call_args_list]
+            self.assertEqual(
+                sent,
+                [("CMD", (i,)) for i in range(5)] + [("NEW", None), ("NEWER", None)],
+            )
+
     def test_restart_async_writer_throttle(self):
         """Test restart is throttled (min 30s between attempts)."""
         writer = self._make_writer_shell()
@@ -552,7 +598,7 @@ class TestBaseResultWriterWriteFlush(unittest.TestCase):
         writer._shot_saver = None
         writer._sensor_saver = None
         writer._var_map_initialised = False
-        writer._max_insert_string_len = 1000
+        writer._max_insert_rows = 50
         writer._last_t = 0
         writer._rois = []
         return writer
@@ -606,11 +652,13 @@ class TestBaseResultWriterWriteFlush(unittest.TestCase):
         """Test flush calls DAM helper."""
         writer = self._make_writer_shell()
         mock_dam = Mock()
-        mock_dam.flush.return_value = ["INSERT cmd1", "INSERT cmd2"]
+        mock_dam.flush.return_value = [("INSERT cmd1", (1, 2))]
         writer._dam_file_helper = mock_dam
+        writer._write_async_command = Mock()
 
         writer.flush(1000)
         mock_dam.flush.assert_called_once_with(1000)
+        writer._write_async_command.assert_any_call("INSERT cmd1", (1, 2))
 
     def test_flush_triggers_sensor_helper(self):
         """Test flush calls sensor helper."""
@@ -622,19 +670,175 @@ class TestBaseResultWriterWriteFlush(unittest.TestCase):
         writer.flush(1000)
         mock_sensor.flush.assert_called_once_with(1000)
 
-    def test_add_creates_insert_command(self):
-        """Test _add builds INSERT command string."""
+    def test_add_buffers_typed_rows(self):
+        """Test _add buffers one plain-typed row tuple per data point."""
         writer = self._make_writer_shell()
         roi = ROI(polygon=((0, 0), (100, 0), (100, 50), (0, 50)), idx=1)
 
-        mock_var = Mock()
-        mock_var.__int__ = Mock(return_value=42)
-        data_row = Mock()
-        data_row.values.return_value = [mock_var]
+        data_row = DataPoint([XPosVariable(42), IsInferredVariable(True)])
 
-        writer._add(1000, roi, [data_row])
-        self.assertIn(1, writer._insert_dict)
-        self.assertIn("INSERT INTO ROI_1 VALUES", writer._insert_dict[1])
+        writer._add(1000, roi, [data_row, data_row])
+        rows = writer._insert_dict[1]
+        self.assertEqual(rows, [(None, 1000, 42, 1), (None, 1000, 42, 1)])
+        self.assertIs(type(rows[0][2]), int)
+
+    def test_flush_sends_batch_once_threshold_reached(self):
+        """Test flush sends the buffered rows as one (template, rows) command."""
+        writer = self._make_writer_shell()
+        writer._max_insert_rows = 2
+        writer._write_async_command = Mock()
+        roi = ROI(polygon=((0, 0), (100, 0), (100, 50), (0, 50)), idx=1)
+
+        writer._add(1000, roi, [DataPoint([XPosVariable(1)])])
+        writer.flush(1000)
+        writer._write_async_command.assert_not_called()
+
+        writer._add(2000, roi, [DataPoint([XPosVariable(2)])])
+        writer.flush(2000)
+        writer._write_async_command.assert_called_once_with(
+            "INSERT INTO ROI_1 VALUES (%s, %s, %s)",
+            [(None, 1000, 1), (None, 2000, 2)],
+        )
+        self.assertEqual(writer._insert_dict[1], [])
+
+
+class InProcessSQLiteWriter(BaseAsyncSQLWriter):
+    """Async writer running on SQLite in the test process, standing in for MySQL."""
+
+    class _Cursor:
+        def __init__(self, cursor):
+            self._cursor = cursor
+
+        def execute(self, command, args=()):
+            return self._cursor.execute(command.replace("%s", "?"), args)
+
+        def executemany(self, command, rows):
+            return self._cursor.executemany(command.replace("%s", "?"), rows)
+
+    class _Connection:
+        def __init__(self, path):
+            self._db = sqlite3.connect(path)
+
+        def cursor(self):
+            return InProcessSQLiteWriter._Cursor(self._db.cursor())
+
+        def commit(self):
+            self._db.commit()
+
+        def close(self):
+            self._db.close()
+
+    def __init__(self, path, queue):
+        super().__init__(queue)
+        self._path = path
+
+    def _initialize_database(self):
+        pass
+
+    def _get_connection(self):
+        return self._Connection(self._path)
+
+    def _get_db_type_name(self):
+        return "SQLite stand-in"
+
+    def _should_retry_on_error(self, error):
+        return False
+
+
+class TestBaseResultWriterBatchedInserts(unittest.TestCase):
+    """Test batched inserts reach the database unchanged."""
+
+    SCHEMA = (
+        "CREATE TABLE ROI_1 (id INTEGER PRIMARY KEY AUTOINCREMENT, t INTEGER, "
+        "x INTEGER, y INTEGER, w INTEGER, h INTEGER, phi INTEGER, "
+        "xy_dist_log10x1000 INTEGER, is_inferred INTEGER)"
+    )
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.roi = ROI(polygon=((0, 0), (100, 0), (100, 50), (0, 50)), idx=1)
+        self.data = [
+            (
+                t,
+                DataPoint(
+                    [
+                        XPosVariable(t % 97),
+                        YPosVariable(t % 13),
+                        WidthVariable(9),
+                        HeightVariable(4),
+                        PhiVariable(t % 180),
+                        XYDistance(-(t % 1500)),
+                        IsInferredVariable(t % 3 == 0),
+                    ]
+                ),
+            )
+            for t in range(0, 12000, 40)
+        ]
+
+    def _db(self, name):
+        path = os.path.join(self.tmpdir, name)
+        db = sqlite3.connect(path)
+        db.execute(self.SCHEMA)
+        db.commit()
+        db.close()
+        return path
+
+    @staticmethod
+    def _rows(path):
+        db = sqlite3.connect(path)
+        try:
+            return db.execute("SELECT * FROM ROI_1 ORDER BY id").fetchall()
+        finally:
+            db.close()
+
+    def test_round_trip_matches_string_inserts(self):
+        """Test batched rows store the same values as the former string INSERTs."""
+        # the former path: one SQL string built from str() of each row tuple
+        legacy_path = self._db("legacy.db")
+        db = sqlite3.connect(legacy_path)
+        values = ",".join(str((Null(), t) + tuple(dr.values())) for t, dr in self.data)
+        db.execute(f"INSERT INTO ROI_1 VALUES {values}")
+        db.commit()
+        db.close()
+
+        batched_path = self._db("batched.db")
+        queue = Queue()
+        writer = object.__new__(BaseResultWriter)
+        writer._queue = queue
+        writer._async_writer = Mock()
+        writer._async_writer.is_alive.return_value = True
+        writer._failed_commands_buffer = deque(maxlen=MAX_BUFFERED_COMMANDS)
+        writer._null = Null()
+        writer._insert_dict = {}
+        writer._dam_file_helper = writer._shot_saver = writer._sensor_saver = None
+        writer._max_insert_rows = 64
+
+        for t, dr in self.data:
+            writer._add(t, self.roi, [dr])
+            writer.flush(t)
+        writer._flush_insert_buffers()
+        queue.put("DONE")
+
+        with patch("ethoscope.io.base.time.sleep"):
+            InProcessSQLiteWriter(batched_path, queue).run()
+
+        legacy_rows = self._rows(legacy_path)
+        self.assertEqual(len(legacy_rows), len(self.data))
+        self.assertEqual(self._rows(batched_path), legacy_rows)
+
+    def test_batch_error_logs_row_count(self):
+        """Test a failed batch is reported by size rather than content."""
+        queue = Queue()
+        queue.put(("INSERT INTO MISSING VALUES (%s)", [(1,), (2,)]))
+        queue.put("DONE")
+        writer = InProcessSQLiteWriter(self._db("error.db"), queue)
+
+        with (
+            patch("ethoscope.io.base.time.sleep"),
+            self.assertLogs(level="ERROR") as logs,
+        ):
+            writer.run()
+        self.assertIn("Arguments: batch of 2 rows", "\n".join(logs.output))
 
 
 # ===========================================================================
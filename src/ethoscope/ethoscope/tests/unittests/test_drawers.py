@@ -184,5 +184,102 @@ class TestBaseDrawerProperties(unittest.TestCase):
             self.assertIsNone(drawer.last_drawn_frame)
 
 
+class TestDrawerRenderCadence(unittest.TestCase):
+    """Test frame-decimated, ROI-clipped rendering."""
+
+    def setUp(self):
+        self.frame = np.full((200, 300), 50, dtype=np.uint8)
+        self.units = []
+        for idx, x in enumerate((10, 160), start=1):
+            tu = Mock()
+            tu.roi = ROI(
+                polygon=((x, 10), (x + 130, 10), (x + 130, 80), (x, 80)), idx=idx
+            )
+            tu.stimulator = None
+            self.units.append(tu)
+
+    @staticmethod
+    def _positions(x1, x2):
+        def pos(x):
+            return [{"x": x, "y": 40, "w": 10, "h": 5, "phi": 0}]
+
+        return {1: pos(x1), 2: pos(x2)}
+
+    def test_default_draws_every_frame(self):
+        drawer = DefaultDrawer(draw_frames=False)
+        with patch.object(drawer, "_annotate_frame") as annotate:
+            for _ in range(5):
+                drawer.draw(self.frame, {}, self.units)
+        self.assertEqual(annotate.call_count, 5)
+
+    def test_render_interval_skips_frames(self):
+        drawer = DefaultDrawer(draw_frames=False, render_interval=1.0)
+        with (
+            patch.object(drawer, "_annotate_frame") as annotate,
+            patch("ethoscope.drawers.drawers.time.time") as now,
+        ):
+            for i in range(30):
+                now.return_value = 1000 + i * 0.1
+                drawer.draw(self.frame, {}, self.units, t=i * 100)
+        # renders at t = 0, 1, 2 s
+        self.assertEqual(annotate.call_count, 3)
+
+    def test_video_output_paced_on_frame_time(self):
+        drawer = DefaultDrawer(
+            video_out="unused.avi",
+            draw_frames=False,
+            video_out_fps=5,
+            render_interval=3600,
+        )
+        drawer._video_writer = Mock()
+        for i in range(20):
+            drawer.draw(self.frame, {}, self.units, t=i * 100)
+        # one frame every 200 ms of frame time
+        self.assertEqual(drawer._video_writer.write.call_count, 10)
+
+    def test_buffer_is_reused(self):
+        drawer = DefaultDrawer(draw_frames=False)
+        drawer.draw(self.frame, {}, self.units)
+        buffer = drawer._last_drawn_frame
+        drawer.draw(self.frame, {}, self.units)
+        self.assertIs(drawer._last_drawn_frame, buffer)
+
+    def test_last_drawn_frame_is_a_copy(self):
+        drawer = DefaultDrawer(draw_frames=False)
+        drawer.draw(self.frame, {}, self.units)
+        self.assertIsNot(drawer.last_drawn_frame, drawer._last_drawn_frame)
+        np.testing.assert_array_equal(drawer.last_drawn_frame, drawer._last_drawn_frame)
+
+    def test_roi_clip_only_redraws_dirty_rois(self):
+        drawer = DefaultDrawer(draw_frames=False, roi_clip=True)
+        drawer.draw(self.frame, self._positions(50, 200), self.units)
+
+        # only ROI 2 moves, and the background changes everywhere
+        new_frame = np.full((200, 300), 90, dtype=np.uint8)
+        with patch.object(drawer, "_annotate_frame") as annotate:
+            drawer.draw(new_frame, self._positions(50, 210), self.units)
+
+        annotated_units = annotate.call_args[0][2]
+        self.assertEqual([tu.roi.idx for tu in annotated_units], [2])
+        # ROI 2 was refreshed from the new frame, ROI 1 and the background were not
+        self.assertEqual(drawer._last_drawn_frame[150, 220, 0], 50)
+        self.assertEqual(drawer._last_drawn_frame[60, 250, 0], 90)
+        self.assertEqual(drawer._last_drawn_frame[60, 100, 0], 50)
+
+    def test_roi_clip_full_refresh(self):
+        drawer = DefaultDrawer(draw_frames=False, roi_clip=True, full_refresh_every=2)
+        positions = self._positions(50, 200)
+        for value in (10, 20, 30):
+            drawer.draw(
+                np.full((200, 300), value, dtype=np.uint8), positions, self.units
+            )
+        # nothing moved, but the third rendering refreshes the whole frame
+        self.assertEqual(drawer._last_drawn_frame[150, 220, 0], 30)
+
+    def test_null_drawer_draw(self):
+        drawer = NullDrawer()
+        drawer.draw(self.frame, {}, self.units)
+
+
 if __name__ == "__main__":
     unittest.main()
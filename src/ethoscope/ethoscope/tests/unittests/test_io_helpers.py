@@ -7,10 +7,12 @@ Tests helper classes for periodic data collection and storage:
 - DAMFileHelper: DAM-compatible activity monitoring
 - NpyAppendableFile: Appendable numpy file format
 - RawDataWriter: Raw tracking data writer
+- SpillLog: Disk spill log of database commands
 - Null: SQLite NULL representation
 """
 
 import os
+import shutil
 import tempfile
 import unittest
 from collections import OrderedDict
@@ -26,6 +28,7 @@ from ethoscope.io.helpers import (
     Null,
     RawDataWriter,
     SensorDataHelper,
+    SpillLog,
 )
 
 
@@ -327,17 +330,17 @@ class TestImgSnapshotHelper(unittest.TestCase):
 class TestDAMFileHelper(unittest.TestCase):
     """Test suite for DAMFileHelper."""
 
-    def test_init_creates_distance_map(self):
-        """Test initialization creates distance map for all ROIs."""
+    def test_init_creates_activity_arrays(self):
+        """Test initialization creates activity arrays for all ROIs."""
         helper = DAMFileHelper(period=60, n_rois=5)
 
         self.assertEqual(helper._period, 60)
         self.assertEqual(helper._n_rois, 5)
-        self.assertEqual(len(helper._distance_map), 5)
-        self.assertEqual(len(helper._last_positions), 5)
-        for i in range(1, 6):
-            self.assertEqual(helper._distance_map[i], 0)
-            self.assertIsNone(helper._last_positions[i])
+        # arrays are indexed by ROI idx
+        self.assertEqual(helper._activity_ring.shape[1], 6)
+        self.assertEqual(helper._last_positions.shape, (6, 2))
+        self.assertFalse(helper._activity_ring.any())
+        self.assertTrue(np.isnan(helper._last_positions).all())
 
     def test_make_dam_file_sql_fields(self):
         """Test make_dam_file_sql_fields generates correct SQL."""
@@ -352,33 +355,30 @@ class TestDAMFileHelper(unittest.TestCase):
         self.assertIn("ROI_2 SMALLINT", fields)
         self.assertIn("ROI_3 SMALLINT", fields)
 
-    def test_compute_distance_returns_zero_on_first_call(self):
-        """Test _compute_distance_for_roi returns 0 for first position."""
-        helper = DAMFileHelper()
+    def test_first_position_adds_no_activity(self):
+        """Test the first position of a ROI adds no activity."""
+        helper = DAMFileHelper(period=60)
         roi = ROI(polygon=((0, 0), (100, 0), (100, 100), (0, 100)), idx=1, value=1)
-        data = {"x": 50, "y": 50}
 
-        distance = helper._compute_distance_for_roi(roi, data)
+        helper.input_roi_data(0, roi, {"x": 50, "y": 50})
+        helper._commit_frame()
 
-        self.assertEqual(distance, 0)
-        self.assertIsNotNone(helper._last_positions[roi.idx])
+        self.assertFalse(helper._activity_ring.any())
+        self.assertFalse(np.isnan(helper._last_positions[roi.idx]).any())
 
-    def test_compute_distance_calculates_normalized_movement(self):
-        """Test _compute_distance_for_roi calculates correct normalized distance."""
-        helper = DAMFileHelper()
+    def test_activity_is_movement_normalized_by_longest_axis(self):
+        """Test the activity of a frame is the distance moved over the ROI longest axis."""
+        helper = DAMFileHelper(period=60)
         roi = ROI(polygon=((0, 0), (100, 0), (100, 100), (0, 100)), idx=1, value=1)
 
-        # First position
-        data1 = {"x": 0, "y": 0}
-        helper._compute_distance_for_roi(roi, data1)
-
-        # Second position - moved 100 pixels horizontally
-        data2 = {"x": 100, "y": 0}
-        distance = helper._compute_distance_for_roi(roi, data2)
+        helper.input_roi_data(0, roi, {"x": 0, "y": 0})
+        # moved 100 pixels horizontally
+        helper.input_roi_data(1000, roi, {"x": 100, "y": 0})
+        helper._commit_frame()
 
-        # Distance should be normalized by longest_axis
-        self.assertGreater(distance, 0)
-        self.assertLess(distance, 2)  # Should be around 1.0
+        self.assertAlmostEqual(
+            helper._activity_ring[0, roi.idx], 100 / roi.longest_axis
+        )
 
     def test_input_roi_data_accumulates_activity(self):
         """Test input_roi_data accumulates activity data."""
@@ -389,9 +389,10 @@ class TestDAMFileHelper(unittest.TestCase):
         data = {"x": 50, "y": 50}
         helper.input_roi_data(120000, roi, data)
 
-        # Verify activity was recorded
-        self.assertIn(2, helper._activity_accum)
-        self.assertIsInstance(helper._activity_accum[2], OrderedDict)
+        # The frame is committed to tick 2 once complete
+        helper._commit_frame()
+        self.assertEqual(helper._first_tick, 2)
+        self.assertEqual(helper._last_tick, 2)
 
     def test_flush_returns_empty_list_when_no_data(self):
         """Test flush returns empty list when no activity accumulated."""
@@ -415,13 +416,17 @@ class TestDAMFileHelper(unittest.TestCase):
         # Flush at tick=3 (should output tick=1,2)
         result = helper.flush(180000)
 
-        # Should have 2 SQL commands (tick 1 and tick 2)
-        self.assertGreater(len(result), 0)
-        for cmd in result:
-            self.assertIn("INSERT INTO CSV_DAM_ACTIVITY", cmd)
-            self.assertIn("date", cmd)
-            self.assertIn("time", cmd)
-            self.assertIn("ROI_1", cmd)
+        # A single bulk insert with 2 rows (tick 1 and tick 2)
+        self.assertEqual(len(result), 1)
+        cmd, args = result[0]
+        self.assertIn("INSERT INTO CSV_DAM_ACTIVITY", cmd)
+        self.assertIn("date", cmd)
+        self.assertIn("time", cmd)
+        self.assertIn("ROI_1", cmd)
+        self.assertEqual(len(args), 2 * 4)
+        # 10 px in a 100 px ROI during tick 1, scaled by 100
+        self.assertEqual(args[2], 10)
+        self.assertEqual(args[6], 0)
 
     def test_flush_clears_accumulated_data(self):
         """Test flush clears accumulated activity data."""
@@ -433,23 +438,83 @@ class TestDAMFileHelper(unittest.TestCase):
         helper.flush(180000)
 
         # Activity for past ticks should be cleared
-        self.assertNotIn(1, helper._activity_accum)
+        self.assertEqual(helper._first_tick, 3)
+        self.assertFalse(helper._activity_ring.any())
 
     def test_make_sql_command_formats_correctly(self):
         """Test _make_sql_command generates well-formatted SQL."""
         helper = DAMFileHelper(n_rois=2)
 
-        vals = OrderedDict({1: 0.5, 2: 1.2})
-        command = helper._make_sql_command(vals)
+        activity = np.array([[0.5, 1.2]])
+        command, args = helper._make_sql_command(activity)
 
         self.assertIn("INSERT INTO CSV_DAM_ACTIVITY", command)
         self.assertIn("date", command)
         self.assertIn("time", command)
         self.assertIn("ROI_1", command)
         self.assertIn("ROI_2", command)
+        self.assertEqual(command.count("%s"), 4)
         # Check scaled integer values
-        self.assertIn("50", command)  # 0.5 * 100
-        self.assertIn("120", command)  # 1.2 * 100
+        self.assertEqual(args[2:], (50, 120))  # 0.5 * 100, 1.2 * 100
+        self.assertIsInstance(args[2], int)
+
+    def test_make_sql_command_sqlite_placeholders(self):
+        """Test SQLite commands use ? placeholders, one row per tick."""
+        helper = DAMFileHelper(n_rois=2, database_type="SQLite3")
+
+        command, args = helper._make_sql_command(np.zeros((3, 2)))
+
+        self.assertEqual(command.count("?"), 12)
+        self.assertNotIn("%s", command)
+        self.assertEqual(len(args), 12)
+
+    def test_matches_reference_accumulation(self):
+        """Test array accumulation matches a per-row reference computation."""
+        n_rois = 6
+        helper = DAMFileHelper(period=1, n_rois=n_rois)
+        rois = [
+            ROI(polygon=((0, 0), (80, 0), (80, 40), (0, 40)), idx=i, value=i)
+            for i in range(1, n_rois + 1)
+        ]
+        rng = np.random.default_rng(0)
+        expected = {}
+        last = {}
+        results = []
+
+        for frame in range(100):
+            t = frame * 150
+            tick = int(round(t / 1000.0))
+            for roi in rois:
+                x, y = rng.uniform(0, 80), rng.uniform(0, 40)
+                if roi.idx in last:
+                    d = abs((x + 1j * y) - last[roi.idx]) / roi.longest_axis
+                    expected.setdefault(tick, np.zeros(n_rois))[roi.idx - 1] += d
+                last[roi.idx] = x + 1j * y
+                helper.input_roi_data(t, roi, {"x": x, "y": y})
+            results.extend(helper.flush(t))
+
+        rows = []
+        for _cmd, args in results:
+            for i in range(0, len(args), n_rois + 2):
+                rows.append(args[i + 2 : i + 2 + n_rois])
+
+        ticks = sorted(expected)[:-1]  # the last tick is not flushed yet
+        for row, tick in zip(rows, ticks, strict=True):
+            ref = np.round(100 * np.round(expected[tick], 5)).astype(int)
+            self.assertEqual(list(row), ref.tolist())
+
+    def test_ring_grows_with_pending_ticks(self):
+        """Test data is kept when more ticks than the ring size are pending."""
+        helper = DAMFileHelper(period=1, n_rois=1)
+        roi = ROI(polygon=((0, 0), (100, 0), (100, 100), (0, 100)), idx=1, value=1)
+
+        helper.flush(0)
+        for tick in range(20):
+            helper.input_roi_data(tick * 1000, roi, {"x": tick % 2 * 10, "y": 0})
+
+        ((cmd, args),) = helper.flush(20000)
+        activity = args[2::3]
+        self.assertEqual(list(activity), [0] + [10] * 19)
 
 
 class TestNpyAppendableFile(unittest.TestCase):
@@ -702,5 +767,118 @@ class TestRawDataWriter(unittest.TestCase):
             self.assertTrue(os.path.exists(npy_file.fname))
 
 
+class TestSpillLog(unittest.TestCase):
+    """Test suite for the disk spill log."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.directory = os.path.join(self.tmpdir, "spill")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _fill(self, log, n):
+        for i in range(n):
+            log.append("INSERT INTO ROI_1 VALUES (%s, %s)", [(None, i)])
+
+    def test_directory_created_lazily(self):
+        log = SpillLog(self.directory)
+        self.assertEqual(len(log), 0)
+        self.assertFalse(os.path.exists(self.directory))
+        self._fill(log, 1)
+        self.assertTrue(os.path.isdir(self.directory))
+
+    def test_read_and_ack_in_order(self):
+        log = SpillLog(self.directory)
+        self._fill(log, 5)
+
+        records = log.read(3)
+        self.assertEqual([r[2][0][1] for r in records], [0, 1, 2])
+        # reading does not consume
+        self.assertEqual(len(log), 5)
+        log.ack(2)
+        self.assertEqual(len(log), 3)
+        self.assertEqual([r[2][0][1] for r in log.read(10)], [2, 3, 4])
+
+    def test_segments_rotate_and_are_deleted_once_replayed(self):
+        log = SpillLog(self.directory, segment_size=100)
+        self._fill(log, 10)
+        segments = [f for f in os.listdir(self.directory) if f.endswith(".log")]
+        self.assertGreater(len(segments), 1)
+
+        log.ack(len(log.read(6)))
+        remaining = [f for f in os.listdir(self.directory) if f.endswith(".log")]
+        self.assertLess(len(remaining), len(segments))
+        self.assertEqual([r[2][0][1] for r in log.read(10)], [6, 7, 8, 9])
+
+        log.ack(4)
+        self.assertEqual(len(log), 0)
+        self.assertFalse(os.path.exists(self.directory))
+
+    def test_reopened_log_resumes_from_acknowledged_position(self):
+        log = SpillLog(self.directory, segment_size=100)
+        self._fill(log, 6)
+        log.ack(len(log.read(4)))
+        log.close()
+
+        reopened = SpillLog(self.directory, segment_size=100)
+        self.assertEqual(len(reopened), 2)
+        self._fill(reopened, 1)
+        self.assertEqual([r[2][0][1] for r in reopened.read(10)], [4, 5, 0])
+
+    def test_torn_record_ends_segment(self):
+        log = SpillLog(self.directory)
+        self._fill(log, 3)
+        log.close()
+        segment = os.path.join(self.directory, "spill_00000000.log")
+        with open(segment, "r+b") as f:
+            f.truncate(os.path.getsize(segment) - 3)
+
+        with self.assertLogs(level="ERROR"):
+            reopened = SpillLog(self.directory)
+        self.assertEqual(len(reopened), 2)
+
+        # new records go to a new segment, after the torn one
+        self._fill(reopened, 1)
+        with self.assertLogs(level="ERROR"):
+            records = reopened.read(10)
+        self.assertEqual([r[2][0][1] for r in records], [0, 1, 0])
+
+    def test_corrupted_record_detected_by_checksum(self):
+        log = SpillLog(self.directory)
+        self._fill(log, 2)
+        log.close()
+        segment = os.path.join(self.directory, "spill_00000000.log")
+        with open(segment, "r+b") as f:
+            f.seek(-1, os.SEEK_END)
+            last = f.read(1)
+            f.seek(-1, os.SEEK_END)
+            f.write(bytes([last[0] ^ 0xFF]))
+
+        with self.assertLogs(level="ERROR"):
+            reopened = SpillLog(self.directory)
+        self.assertEqual(len(reopened), 1)
+
+    def test_status_properties(self):
+        log = SpillLog(self.directory)
+        self.assertIsNone(log.oldest_timestamp)
+        self.assertEqual(log.size_bytes, 0)
+
+        self._fill(log, 3)
+        size = log.size_bytes
+        self.assertGreater(size, 0)
+        self.assertIsNotNone(log.oldest_timestamp)
+        log.ack(len(log.read(1)))
+        self.assertLess(log.size_bytes, size)
+
+    def test_clear(self):
+        log = SpillLog(self.directory)
+        self._fill(log, 3)
+        log.clear()
+        self.assertEqual(len(log), 0)
+        self.assertEqual(log.read(10), [])
+        self.assertFalse(os.path.exists(self.directory))
+
+
 if __name__ == "__main__":
     unittest.main()
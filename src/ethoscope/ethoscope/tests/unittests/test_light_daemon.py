@@ -1,5 +1,9 @@
 """
 Tests for the LED daylight controller daemon.
+
+The main loop is driven by a fake clock, which jumps straight to the time the
+controller asks to be woken at, and a fake GPIO backend recording when the LED
+changed, so days of schedule can be checked to the second in a few milliseconds.
 """
 
 import datetime
@@ -12,12 +16,96 @@ from unittest.mock import call, patch
 
 import pytest
 
+from ethoscope.hardware.interfaces import light_daemon
 from ethoscope.hardware.interfaces.light_daemon import (
     LightController,
     LightDaemonClient,
     LightDaemonUnavailable,
 )
 
+DAY = 24 * 3600
+
+
+class FakeGPIO:
+    """Records (time, state) each time the LED is driven."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.changes = []
+
+    def set(self, on):
+        self.changes.append((self.clock.time(), on))
+
+
+class FakeClock:
+    """
+    Jumps to the end of each wait, running the events scheduled before it.
+
+    An event that wakes the controller ends the wait early, like a notification
+    of the condition variable; the clock stops the controller at `end`.
+    """
+
+    def __init__(self, start, end):
+        self.now = start
+        self.end = end
+        self.events = []
+        self.waits = 0
+        self.controller = None
+
+    def time(self):
+        return self.now
+
+    def at(self, when, action):
+        self.events.append((when, action))
+        self.events.sort(key=lambda event: event[0])
+
+    def wait(self, condition, timeout):
+        self.waits += 1
+        deadline = min(self.now + timeout, self.end)
+        while self.events and self.events[0][0] <= deadline:
+            when, action = self.events.pop(0)
+            self.now = max(self.now, when)
+            action()
+            if self.controller._woken:
+                return True
+        self.now = deadline
+        if self.now >= self.end:
+            self.controller.shutdown()
+        return False
+
+
+def local(day, hour, minute=0):
+    """Timestamp of a local time, `day` days after 2024-03-28."""
+    date = datetime.date(2024, 3, 28) + datetime.timedelta(days=day)
+    return datetime.datetime.combine(date, datetime.time(hour, minute)).timestamp()
+
+
+def write_schedule(path, lights_on, lights_off, active=True):
+    tmp = str(path) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(
+            {"lights_on": lights_on, "lights_off": lights_off, "active": active}, f
+        )
+    os.replace(tmp, path)
+
+
+def simulate(tmp_path, start, end, schedule=("07:00", "19:00"), poll_interval=30):
+    """Build a controller on a fake clock and GPIO, to be run() until `end`."""
+    config_file = tmp_path / "light_schedule.json"
+    if schedule is not None:
+        write_schedule(config_file, *schedule)
+    clock = FakeClock(start, end)
+    controller = LightController(
+        config_file=str(config_file),
+        poll_interval=poll_interval,
+        socket_path=None,
+        transition_log=str(tmp_path / "light_transitions.log"),
+        clock=clock,
+        gpio=FakeGPIO(clock),
+    )
+    clock.controller = controller
+    return controller, clock
+
 
 class TestShouldLightBeOn:
     """Tests for the time-based schedule logic."""
@@ -439,3 +527,223 @@ class TestClientUnavailable:
         client = LightDaemonClient(socket_path=str(tmp_path / "does_not_exist.sock"))
         with pytest.raises(LightDaemonUnavailable):
             client.status()
+
+
+class TestNextTransition:
+    """Tests for the time of the next schedule change."""
+
+    def test_normal_schedule(self):
+        now = datetime.datetime(2024, 1, 1, 12, 0)
+        assert LightController.next_transition("07:00", "19:00", now) == (
+            datetime.datetime(2024, 1, 1, 19, 0)
+        )
+
+    def test_after_lights_off(self):
+        now = datetime.datetime(2024, 1, 1, 19, 0)
+        assert LightController.next_transition("07:00", "19:00", now) == (
+            datetime.datetime(2024, 1, 2, 7, 0)
+        )
+
+    def test_midnight_crossing(self):
+        now = datetime.datetime(2024, 1, 1, 23, 0)
+        assert LightController.next_transition("22:00", "06:00", now) == (
+            datetime.datetime(2024, 1, 2, 6, 0)
+        )
+
+    def test_no_transition(self):
+        now = datetime.datetime(2024, 1, 1, 12, 0)
+        assert LightController.next_transition("07:00", "07:00", now) is None
+        assert LightController.next_transition("bad", "19:00", now) is None
+
+    @pytest.mark.parametrize(
+        "lights_on, lights_off", [("07:00", "19:00"), ("22:30", "06:15")]
+    )
+    def test_answer_changes_at_transition(self, lights_on, lights_off):
+        now = datetime.datetime(2024, 1, 1, 0, 0)
+        for _ in range(10):
+            transition = LightController.next_transition(lights_on, lights_off, now)
+            before = transition - datetime.timedelta(seconds=1)
+            assert LightController.should_light_be_on(
+                lights_on, lights_off, before.time()
+            ) != LightController.should_light_be_on(
+                lights_on, lights_off, transition.time()
+            )
+            now = transition
+
+
+class TestEventDrivenLoop:
+    """Tests for the main loop on a fake clock and GPIO backend."""
+
+    def test_transitions_are_on_time(self, tmp_path):
+        controller, clock = simulate(tmp_path, local(0, 12), local(10, 12))
+        controller.run()
+
+        changes = controller.gpio.changes
+        # on at noon, then 10 lights-off and lights-on, then off at shutdown
+        assert changes[0] == (local(0, 12), True)
+        expected = []
+        for day in range(10):
+            expected.append((local(day, 19), False))
+            expected.append((local(day + 1, 7), True))
+        for (actual, state), (scheduled, expected_state) in zip(
+            changes[1:-1], expected, strict=True
+        ):
+            assert state == expected_state
+            assert abs(actual - scheduled) < 1
+
+    def test_schedule_is_read_once(self, tmp_path, monkeypatch):
+        controller, clock = simulate(tmp_path, local(0, 12), local(2, 12))
+        reads = []
+        read_schedule = controller.read_schedule
+        monkeypatch.setattr(
+            controller, "read_schedule", lambda: reads.append(1) or read_schedule()
+        )
+        controller.run()
+        assert len(reads) == 1
+        # the config file is still checked every poll interval
+        assert clock.waits >= 2 * DAY / controller.poll_interval
+
+    def test_sleeps_until_transition(self, tmp_path):
+        controller, clock = simulate(
+            tmp_path, local(0, 12), local(1, 12), poll_interval=DAY
+        )
+        controller.run()
+        # 19:00, 07:00 and the end of the run
+        assert clock.waits == 3
+
+    def test_config_change_is_picked_up(self, tmp_path):
+        controller, clock = simulate(tmp_path, local(0, 12), local(1, 12))
+        config_file = tmp_path / "light_schedule.json"
+        clock.at(local(0, 13), lambda: write_schedule(config_file, "06:00", "13:30"))
+        controller.run()
+
+        changes = controller.gpio.changes
+        assert [state for _, state in changes] == [True, False, True, False]
+        assert abs(changes[1][0] - local(0, 13, 30)) < 1
+        assert abs(changes[2][0] - local(1, 6)) < 1
+
+    def test_removed_config_turns_light_off(self, tmp_path):
+        controller, clock = simulate(tmp_path, local(0, 12), local(0, 18))
+        config_file = tmp_path / "light_schedule.json"
+        clock.at(local(0, 14), lambda: os.remove(config_file))
+        controller.run()
+        assert controller.gpio.changes[1][1] is False
+        # noticed at the next check of the file
+        assert local(0, 14) <= controller.gpio.changes[1][0] <= local(0, 14) + 30
+
+    def test_force_and_release(self, tmp_path):
+        controller, clock = simulate(tmp_path, local(0, 12), local(1, 12))
+        clock.at(local(0, 14), lambda: controller._handle_command("FORCE OFF"))
+        clock.at(local(0, 20), lambda: controller._handle_command("FORCE ON"))
+        clock.at(local(0, 21), lambda: controller._handle_command("RELEASE"))
+        controller.run()
+
+        assert controller.gpio.changes[:-1] == [
+            (local(0, 12), True),
+            (local(0, 14), False),
+            (local(0, 20), True),
+            (local(0, 21), False),
+            (local(1, 7), True),
+        ]
+
+    def test_no_schedule(self, tmp_path):
+        controller, clock = simulate(
+            tmp_path, local(0, 12), local(1, 12), schedule=None
+        )
+        controller.run()
+        assert controller.gpio.changes == [(local(0, 12), False)]
+
+    def test_release_wakes_real_loop(self, tmp_path):
+        """A command wakes the loop at once, however long the poll interval."""
+        config_file = tmp_path / "light_schedule.json"
+        write_schedule(config_file, "07:00", "07:00")
+        controller = LightController(
+            config_file=str(config_file),
+            poll_interval=3600,
+            socket_path=None,
+            transition_log=None,
+        )
+        controller.gpio = FakeGPIO(controller.clock)
+        controller.set_force(False)
+        thread = threading.Thread(target=controller.run)
+        thread.start()
+        try:
+            time.sleep(0.05)
+            released = time.time()
+            controller._handle_command("RELEASE")
+            deadline = time.time() + 5
+            while controller._current_state is not True and time.time() < deadline:
+                time.sleep(0.01)
+            assert controller._current_state is True
+            assert controller.gpio.changes[-1][0] - released < 1
+        finally:
+            controller.shutdown()
+            thread.join(timeout=5)
+        assert not thread.is_alive()
+
+
+class TestTransitionLog:
+    """Tests for the audit log of LED transitions."""
+
+    def test_log_records_delays(self, tmp_path):
+        controller, clock = simulate(tmp_path, local(0, 12), local(2, 12))
+        controller.run()
+
+        with open(controller.transition_log) as f:
+            entries = [json.loads(line) for line in f]
+        assert [e["reason"] for e in entries] == (["schedule"] * 5 + ["shutdown"])
+        scheduled = [e for e in entries if "scheduled" in e]
+        assert [e["scheduled"] for e in scheduled] == [
+            local(0, 19),
+            local(1, 7),
+            local(1, 19),
+            local(2, 7),
+        ]
+        assert all(abs(e["delay"]) < 1 for e in scheduled)
+        assert controller.transitions[-1] == entries[-1]
+
+    def test_log_is_trimmed(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(light_daemon, "TRANSITION_LOG_MAX_BYTES", 2000)
+        controller, clock = simulate(
+            tmp_path, local(0, 12), local(60, 12), poll_interval=DAY
+        )
+        controller.run()
+
+        size = os.path.getsize(controller.transition_log)
+        assert 0 < size <= 2000
+        with open(controller.transition_log) as f:
+            entries = [json.loads(line) for line in f]
+        assert entries[-1]["reason"] == "shutdown"
+
+    def test_unwritable_log_does_not_stop_the_light(self, tmp_path):
+        controller, clock = simulate(tmp_path, local(0, 12), local(1, 12))
+        controller.transition_log = str(tmp_path / "missing" / "transitions.log")
+        controller.run()
+        assert len(controller.gpio.changes) == 4
+
+    def test_status_reports_transitions(self, tmp_path):
+        controller, clock = simulate(tmp_path, local(0, 12), local(1, 12))
+        controller.step()
+        status = controller._status_dict()
+        assert status["next_transition"] == local(0, 19)
+        assert status["last_transition"]["led"] == "on"
+
+
+class TestConfigWatcher:
+    """Tests for the inotify watcher of the config file."""
+
+    def test_change_wakes_loop(self, tmp_path):
+        pytest.importorskip("inotify_simple")
+        config_file = tmp_path / "light_schedule.json"
+        controller = LightController(
+            config_file=str(config_file), socket_path=None, transition_log=None
+        )
+        controller._start_config_watcher()
+        try:
+            time.sleep(0.05)
+            write_schedule(config_file, "07:00", "19:00")
+            with controller._condition:
+                assert controller._condition.wait_for(lambda: controller._woken, 5)
+        finally:
+            controller._running = False
+            controller._watcher_thread.join(timeout=5)
@@ -0,0 +1,159 @@
+"""
+Unit tests for the recording pipeline in control/record.py.
+
+Tests ChunkedVideoWriter chunk rotation, chunk index and drop-frame accounting,
+and the capture thread dispatching frames to its stages.
+"""
+
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import Mock
+
+import cv2
+import numpy as np
+
+from ethoscope.control.record import ChunkedVideoWriter, cameraCaptureThread
+
+
+def _make_writer(tmpdir, **kwargs):
+    counter = {"n": 0}
+
+    def next_filename():
+        counter["n"] += 1
+        return os.path.join(tmpdir, f"chunk_{counter['n']:05d}.avi")
+
+    defaults = {
+        "filename_factory": next_filename,
+        "fps_getter": lambda: 10.0,
+        "frame_size": (64, 48),
+        "index_path": os.path.join(tmpdir, "video_index.tsv"),
+        "chunk_duration": 1,
+        "warmup_frames": 1000,
+        "fourcc": "MJPG",
+    }
+    defaults.update(kwargs)
+    return ChunkedVideoWriter(**defaults)
+
+
+def _frame(value=0):
+    return np.full((48, 64, 3), value, dtype=np.uint8)
+
+
+class TestChunkedVideoWriter(unittest.TestCase):
+    """Test suite for the encoding stage."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def test_chunks_rotate_on_frame_time(self):
+        """Test a new chunk is opened every chunk_duration of frame time."""
+        writer = _make_writer(self.tmpdir)
+        writer.start()
+        for i in range(30):
+            self.assertTrue(writer.submit(i * 100, _frame(i)))
+        writer.stop()
+
+        self.assertEqual(len(writer.chunks), 3)
+        self.assertEqual(writer.stats["frames_written"], 30)
+        self.assertEqual(writer.stats["dropped_frames"], 0)
+        for path in writer.chunks:
+            cap = cv2.VideoCapture(path)
+            self.assertEqual(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), 10)
+            cap.release()
+
+    def test_index_file_records_chunk_start_times(self):
+        """Test each chunk is listed in the index with its first frame time."""
+        writer = _make_writer(self.tmpdir)
+        writer.start()
+        for i in range(25):
+            writer.submit(i * 100, _frame())
+        writer.stop()
+
+        with open(os.path.join(self.tmpdir, "video_index.tsv")) as f:
+            lines = f.read().splitlines()
+
+        self.assertEqual(
+            lines[0].split("\t"), ["chunk", "start_ms", "wall_time", "fps", "filename"]
+        )
+        rows = [line.split("\t") for line in lines[1:]]
+        self.assertEqual([r[0] for r in rows], ["1", "2", "3"])
+        self.assertEqual([r[1] for r in rows], ["0", "1000", "2000"])
+        self.assertEqual(rows[0][4], "chunk_00001.avi")
+
+    def test_first_chunk_closed_after_warmup(self):
+        """Test the warmup chunk is closed after warmup_frames frames."""
+        writer = _make_writer(self.tmpdir, warmup_frames=5, chunk_duration=300)
+        writer.start()
+        for i in range(12):
+            writer.submit(i * 100, _frame())
+        writer.stop()
+
+        self.assertEqual(len(writer.chunks), 2)
+
+    def test_full_queue_drops_frames_without_blocking(self):
+        """Test frames are dropped and counted when the encoder lags behind."""
+        writer = _make_writer(self.tmpdir, max_queue_size=4)
+        # the stage is not started, so nothing is consumed
+        accepted = [writer.submit(i * 100, _frame()) for i in range(10)]
+
+        self.assertEqual(sum(accepted), 4)
+        self.assertEqual(writer.stats["dropped_frames"], 6)
+
+        writer.start()
+        writer.stop()
+        self.assertEqual(writer.stats["frames_written"], 4)
+
+    def test_submit_after_stop_is_rejected(self):
+        """Test no frame is accepted once the stage is stopping."""
+        writer = _make_writer(self.tmpdir)
+        writer.start()
+        writer.stop()
+        self.assertFalse(writer.submit(0, _frame()))
+
+
+class TestCameraCaptureThread(unittest.TestCase):
+    """Test the capture thread hands frames to the pipeline stages."""
+
+    def test_local_recording_dispatches_every_frame(self):
+        tmpdir = tempfile.mkdtemp()
+        frames = [(i * 100, _frame(i)) for i in range(20)]
+
+        camera = Mock()
+        camera.isPiCamera = False
+        camera.fps = 10.0
+        camera.width, camera.height = 64, 48
+        camera.__iter__ = Mock(return_value=iter(frames))
+
+        thread = cameraCaptureThread(
+            Mock(return_value=camera),
+            {},
+            os.path.join(tmpdir, "last_img.jpg"),
+            os.path.join(tmpdir, "videos", "prefix"),
+            64,
+            48,
+            10,
+            200000,
+            20,
+            record_video=True,
+        )
+        thread._VIDEO_CHUNCK_DURATION = 1
+
+        runner = threading.Thread(target=thread.run)
+        runner.start()
+        runner.join(10)
+
+        self.assertFalse(runner.is_alive())
+        self.assertEqual(thread.stats["frames_captured"], 20)
+        self.assertEqual(
+            thread.stats["frames_written"] + thread.stats["dropped_frames"], 20
+        )
+        self.assertTrue(
+            os.path.exists(os.path.join(tmpdir, "videos", "prefix_index.tsv"))
+        )
+        camera._close.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -813,7 +813,8 @@ class TestDailyScheduler(unittest.TestCase):
             is_active = scheduler.is_active_period(current_time)
 
             if is_active:
-                # State file should be updated
+                # State file should be updated once pending writes are flushed
+                scheduler.flush()
                 self.assertTrue(os.path.exists(state_file))
                 # State should contain period information
                 self.assertGreater(len(scheduler._state), 0)
@@ -934,6 +935,7 @@ class TestDailyScheduler(unittest.TestCase):
                 self.assertGreater(len(scheduler._state), 0)
 
                 # Verify state file was created
+                scheduler.flush()
                 self.assertTrue(os.path.exists(state_file))
 
                 # Check that period info was saved
@@ -7,17 +7,21 @@ Tests SQLiteResultWriter and AsyncSQLiteWriter operations including:
 - Timestamp retrieval from databases
 - Error handling and resilience
 - Placeholder conversion (MySQL %s to SQLite ?)
+- Spilling to disk while the async writer is down
 """
 
 import os
 import shutil
 import sqlite3
 import tempfile
+import time
 import unittest
 from multiprocessing import Queue
 from unittest.mock import Mock, patch
 
+from ethoscope.core.data_point import DataPoint
 from ethoscope.core.roi import ROI
+from ethoscope.core.variables import XPosVariable, YPosVariable
 from ethoscope.io.sqlite import AsyncSQLiteWriter, SQLiteResultWriter
 
 
@@ -673,7 +677,7 @@ class TestSQLiteResultWriterAddAndFlush(unittest.TestCase):
     def test_flush_clears_insert_dict(self):
         """Test flush empties insert dict for ROIs that exceed threshold."""
         writer = self._create_result_writer()
-        writer._max_insert_string_len = 1  # Force flush on any data
+        writer._max_insert_rows = 1  # Force flush on any data
 
         roi = self.rois[0]
         mock_var = Mock()
@@ -726,5 +730,129 @@ class TestSQLiteResultWriterAddAndFlush(unittest.TestCase):
         self.assertEqual(writer._insert_dict[1], [])
 
 
+class TestSQLiteResultWriterSpill(unittest.TestCase):
+    """Test no tracking data is lost while the async writer is down."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmpdir, "results.db")
+        self.spill_dir = os.path.join(self.tmpdir, "spill")
+        self.roi = ROI(polygon=((0, 0), (100, 0), (100, 100), (0, 100)), idx=1)
+        self.writer = SQLiteResultWriter(
+            {"name": self.db_path},
+            [self.roi],
+            metadata={"machine_name": "test"},
+            erase_old_db=True,
+            spill_dir=self.spill_dir,
+        )
+        self.writer._max_insert_rows = 5
+
+    def tearDown(self):
+        writer = self.writer
+        if writer._async_writer.is_alive():
+            writer._queue.put("DONE")
+            writer._queue.cancel_join_thread()
+            writer._async_writer.join(timeout=2)
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _write_frames(self, start, stop):
+        for i in range(start, stop):
+            t = i * 100
+            data_point = DataPoint([XPosVariable(i), YPosVariable(1)])
+            self.writer.write(t, self.roi, [data_point])
+            self.writer.flush(t)
+
+    def _kill_writer(self, n_rows):
+        # once the rows are committed, the writer is idle
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            try:
+                if len(self._stored_x()) == n_rows:
+                    break
+            except sqlite3.OperationalError:
+                pass
+            time.sleep(0.05)
+        self.writer._async_writer.kill()
+        self.writer._async_writer.join()
+
+    def _stored_x(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return [r[0] for r in conn.execute("SELECT x FROM ROI_1 ORDER BY id")]
+        finally:
+            conn.close()
+
+    def test_no_rows_lost_when_writer_killed(self):
+        self._write_frames(0, 50)
+        self._kill_writer(50)
+
+        # restarts are throttled, so the writer stays down for a while
+        self.writer._last_restart_time = time.time()
+        self._write_frames(50, 100)
+        status = self.writer.get_resilience_status()
+        self.assertFalse(status["writer_alive"])
+        self.assertEqual(status["spill_records"], 10)
+        self.assertGreater(status["spill_bytes"], 0)
+        self.assertGreaterEqual(status["spill_lag"], 0)
+        self.assertEqual(len(self.writer._failed_commands_buffer), 0)
+
+        # the writer restarts, replays the spill log, then takes new rows
+        self.writer._last_restart_time = 0
+        self._write_frames(100, 150)
+        self.assertTrue(self.writer._async_writer.is_alive())
+        self.assertEqual(self.writer.get_resilience_status()["spill_records"], 0)
+
+        self.writer.__exit__(None, None, None)
+        self.assertEqual(self._stored_x(), list(range(150)))
+        self.assertFalse(os.path.exists(self.spill_dir))
+
+    def test_spill_replayed_after_crash(self):
+        self._write_frames(0, 20)
+        self._kill_writer(20)
+        self.writer._last_restart_time = time.time()
+        self._write_frames(20, 40)
+        self.assertEqual(len(self.writer._spill_log), 4)
+        self.writer._spill_log.close()
+
+        # a new writer appending to the same database replays what was spilled
+        self.writer = SQLiteResultWriter(
+            {"name": self.db_path},
+            [self.roi],
+            metadata={"machine_name": "test"},
+            erase_old_db=False,
+            spill_dir=self.spill_dir,
+        )
+        self.writer.__exit__(None, None, None)
+        self.assertEqual(self._stored_x(), list(range(40)))
+
+    def test_backlog_spills_instead_of_queueing(self):
+        with patch("ethoscope.io.base.SPILL_QUEUE_BACKLOG", 0):
+            self._write_frames(0, 10)
+            # the ROI table creation, variable map and 2 batches of rows
+            self.assertEqual(len(self.writer._spill_log), 6)
+
+        self.writer.__exit__(None, None, None)
+        self.assertEqual(self._stored_x(), list(range(10)))
+
+    def test_no_replay_while_backlogged(self):
+        with patch("ethoscope.io.base.SPILL_QUEUE_BACKLOG", 0):
+            self._write_frames(0, 10)
+        spilled = len(self.writer._spill_log)
+
+        # the queue is still above half the backlog mark: the spill log is not read
+        with (
+            patch.object(self.writer._queue, "qsize", return_value=3000),
+            patch.object(
+                self.writer._spill_log, "read", wraps=self.writer._spill_log.read
+            ) as read,
+        ):
+            self._write_frames(10, 20)
+        read.assert_not_called()
+        self.assertGreater(len(self.writer._spill_log), spilled)
+
+        self.writer.__exit__(None, None, None)
+        self.assertEqual(self._stored_x(), list(range(20)))
+
+
 if __name__ == "__main__":
     unittest.main()
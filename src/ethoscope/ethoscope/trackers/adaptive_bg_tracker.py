@@ -26,6 +26,7 @@ from ethoscope.core.variables import (
     YPosVariable,
 )
 from ethoscope.trackers.trackers import BaseTracker, NoPositionError
+from ethoscope.utils.plugins import register_plugin
 
 
 class ObjectModel:
@@ -285,6 +286,7 @@ class BackgroundModel:
         self.last_t = t
 
 
+@register_plugin("tracker", default=True)
 class AdaptiveBGModel(BaseTracker):
     _description = {
         "overview": "The default tracker for fruit flies. One animal per ROI.",
@@ -2,6 +2,8 @@ __author__ = "quentin"
 
 from collections import deque
 
+import numpy as np
+
 from ethoscope.core.variables import IsInferredVariable
 from ethoscope.utils.description import DescribedObject
 
@@ -14,8 +16,365 @@ class NoPositionError(Exception):
     pass
 
 
+class PositionHistory:
+    """
+    A fixed-capacity ring buffer of the positions found by a tracker, stored as a numpy array.
+
+    Each row holds one data point, as ``(t, x, y, w, h, phi, xy_dist, is_inferred)``.
+    Trackers that find several animals per frame add one row per animal, sharing the same ``t``.
+    ``xy_dist`` is the linear distance moved since the previous position
+    (i.e. ``10 ** (xy_dist_log10x1000 / 1000)``), so it can be summed directly.
+    Variables a tracker does not provide are stored as ``NaN``.
+    Appending is O(1): once the buffer is full, the oldest row is overwritten.
+    Rows are kept in time order, so time windows are found by binary search.
+    """
+
+    COLUMNS = ("t", "x", "y", "w", "h", "phi", "xy_dist", "is_inferred")
+    _COLUMN_INDEX = {name: i for i, name in enumerate(COLUMNS)}
+
+    def __init__(self, capacity=8192):
+        """
+        :param capacity: the maximal number of rows kept
+        :type capacity: int
+        """
+        if capacity < 1:
+            raise ValueError("The capacity of a position history must be positive")
+        self._data = np.full((capacity, len(self.COLUMNS)), np.nan)
+        self._capacity = capacity
+        self._head = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def last_time(self):
+        """
+        :return: the time of the most recent row, ``None`` if the history is empty
+        :rtype: int
+        """
+        if self._size == 0:
+            return None
+        return int(self._data[(self._head - 1) % self._capacity, 0])
+
+    def append(self, t, data_point):
+        """
+        Add a data point found at time ``t``.
+
+        :param t: time in ms
+        :type t: int
+        :param data_point: the position of one animal
+        :type data_point: :class:`~ethoscope.core.data_point.DataPoint`
+        """
+        row = self._data[self._head]
+        row[0] = t
+        for i, name in enumerate(("x", "y", "w", "h", "phi"), start=1):
+            row[i] = data_point.get(name, np.nan)
+        xy_dist = data_point.get("xy_dist_log10x1000")
+        row[6] = np.nan if xy_dist is None else 10.0 ** (xy_dist / 1000.0)
+        row[7] = data_point.get("is_inferred", np.nan)
+
+        self._head = (self._head + 1) % self._capacity
+        if self._size < self._capacity:
+            self._size += 1
+
+    def _segments(self):
+        """
+        :return: the rows as (at most) two views, oldest first
+        """
+        if self._size < self._capacity:
+            return (self._data[: self._size],)
+        return self._data[self._head :], self._data[: self._head]
+
+    def window(self, start=None, end=None):
+        """
+        Get the rows between two time points (both inclusive).
+
+        :param start: the first time, in ms. ``None`` means since the oldest row
+        :type start: int
+        :param end: the last time, in ms. ``None`` means until the latest row
+        :type end: int
+        :return: a copy of the matching rows, in time order. Columns are named in ``COLUMNS``
+        :rtype: :class:`~numpy.ndarray`
+        """
+        parts = []
+        for segment in self._segments():
+            times = segment[:, 0]
+            lo = 0 if start is None else np.searchsorted(times, start, side="left")
+            hi = (
+                len(times) if end is None else np.searchsorted(times, end, side="right")
+            )
+            parts.append(segment[lo:hi])
+        if len(parts) == 1:
+            return parts[0].copy()
+        return np.concatenate(parts)
+
+    def since(self, duration):
+        """
+        :param duration: a duration, in ms
+        :type duration: int
+        :return: the rows of the last ``duration`` ms, relative to the latest row
+        :rtype: :class:`~numpy.ndarray`
+        """
+        if self._size == 0:
+            return self.window()
+        return self.window(start=self.last_time - duration)
+
+    def last(self, n=1):
+        """
+        :param n: the number of rows
+        :type n: int
+        :return: a copy of the last ``n`` rows (or fewer, if the history is shorter), in time order
+        :rtype: :class:`~numpy.ndarray`
+        """
+        n = min(n, self._size)
+        indices = np.arange(self._head - n, self._head) % self._capacity
+        return self._data[indices]
+
+    def column(self, name, start=None, end=None):
+        """
+        :param name: a column name, from ``COLUMNS``
+        :type name: str
+        :return: the values of one column between ``start`` and ``end`` (see :meth:`window`)
+        :rtype: :class:`~numpy.ndarray`
+        """
+        return self.window(start, end)[:, self._COLUMN_INDEX[name]]
+
+    def clear(self):
+        self._head = 0
+        self._size = 0
+
+
+class TrackerFeatures:
+    """
+    Features derived from the position history of a tracker (distance, velocity, movement, midline side...).
+
+    Stimulators and triggers bound to the same ROI share the :class:`TrackerFeatures` of its tracker
+    (see :meth:`of`). Features are computed on first use and cached until the tracker processes a new frame,
+    so evaluating several stimulation rules on a ROI does not repeat the same arithmetic.
+    Running features (cumulative distance, time of last movement) catch up on the history
+    they have not seen yet, so they stay exact even if they are not queried on every frame.
+    """
+
+    def __init__(self, tracker):
+        """
+        :param tracker: the tracker to derive features from
+        :type tracker: :class:`~ethoscope.trackers.trackers.BaseTracker`
+        """
+        self._tracker = tracker
+        self._frame_key = None
+        self._cache = {}
+        self._cumulative_distance = 0.0
+        self._last_processed_time = None
+        self._last_movement_times = {}
+
+    @staticmethod
+    def of(tracker):
+        """
+        :return: the shared features of ``tracker``, or private ones if it does not provide any
+        :rtype: :class:`~ethoscope.trackers.trackers.TrackerFeatures`
+        """
+        features = getattr(tracker, "features", None)
+        if isinstance(features, TrackerFeatures):
+            return features
+        return TrackerFeatures(tracker)
+
+    def _cached(self, name, compute):
+        times = self._tracker.times
+        positions = self._tracker.positions
+        key = (
+            self._tracker.last_time_point,
+            len(times),
+            times[-1] if len(times) else None,
+            id(positions[-1]) if len(positions) else None,
+        )
+        if key != self._frame_key:
+            self._frame_key = key
+            self._cache = {}
+        try:
+            return self._cache[name]
+        except KeyError:
+            value = self._cache[name] = compute()
+            return value
+
+    def _single_animal_positions(self):
+        positions = self._tracker.positions
+        if len(positions) < 2:
+            return None
+        if len(positions[-1]) != 1:
+            raise Exception(
+                "This stimulator can only work with a single animal per ROI"
+            )
+        return positions
+
+    @staticmethod
+    def _distance_of(data_point):
+        return 10.0 ** (data_point["xy_dist_log10x1000"] / 1000.0)
+
+    @property
+    def is_spotted(self):
+        """
+        :return: whether the animal was found (or inferred) in the last frame processed by the tracker
+        :rtype: bool
+        """
+        times = self._tracker.times
+        return len(times) > 0 and self._tracker.last_time_point == times[-1]
+
+    @property
+    def distance(self):
+        """
+        :return: the distance moved between the last two positions, ``None`` if there are fewer than two positions
+        :rtype: float
+        """
+
+        def compute():
+            positions = self._single_animal_positions()
+            if positions is None:
+                return None
+            return self._distance_of(positions[-1][0])
+
+        return self._cached("distance", compute)
+
+    @property
+    def dt(self):
+        """
+        :return: the time between the last two positions, in seconds
+        :rtype: float
+        """
+        times = self._tracker.times
+        if len(times) < 2:
+            return None
+        return abs(times[-1] - times[-2]) / 1000.0
+
+    @property
+    def velocity(self):
+        """
+        :return: the velocity between the last two positions, in distance units per second
+        :rtype: float
+        """
+
+        def compute():
+            distance, dt = self.distance, self.dt
+            if distance is None or not dt:
+                return None
+            return distance / dt
+
+        return self._cached("velocity", compute)
+
+    def has_moved(self, velocity_correction_coef):
+        """
+        Whether the animal moved between the last two frames.
+        The animal is assumed not to have moved if it was not spotted in the last frame.
+
+        :param velocity_correction_coef: the correction coefficient for computing velocity at various fps.
+        :type velocity_correction_coef: float
+        :rtype: bool
+        """
+
+        def compute():
+            distance = self.distance
+            if distance is None or not self.is_spotted:
+                return False
+            # the velocity corrected for fps, ``velocity * dt / coef``, simplifies to ``distance / coef``
+            return distance / velocity_correction_coef > 1.0
+
+        return self._cached(("has_moved", velocity_correction_coef), compute)
+
+    def x_fraction(self, index=-1):
+        """
+        :return: the x position of the animal relative to the ROI longest axis, for the ``index``'th position
+        :rtype: float
+        """
+
+        def compute():
+            positions = self._single_animal_positions()
+            if positions is None:
+                return None
+            roi_w = float(self._tracker._roi.longest_axis)
+            return positions[index][0]["x"] / roi_w
+
+        return self._cached(("x_fraction", index), compute)
+
+    def midline_side(self, middle_line=0.5):
+        """
+        :return: ``1`` if the animal is past the midline, ``0`` otherwise, ``None`` if unknown
+        :rtype: int
+        """
+        x = self.x_fraction(-1)
+        if x is None:
+            return None
+        return int(x - middle_line > 0)
+
+    def crossed_midline(self, middle_line=0.5):
+        """
+        :return: whether the animal changed side of the midline between the last two positions
+        :rtype: bool
+        """
+        x = self.x_fraction(-1)
+        if x is None:
+            return False
+        x_before = self.x_fraction(-2)
+        return (x - middle_line > 0) ^ (x_before - middle_line > 0)
+
+    def _catch_up(self):
+        """
+        Accumulates the running features over the positions added since the last call.
+        """
+        times = self._tracker.times
+        positions = self._tracker.positions
+        new = 0
+        while new < len(times) and (
+            self._last_processed_time is None
+            or times[-1 - new] > self._last_processed_time
+        ):
+            new += 1
+
+        for i in range(len(times) - new, len(times)):
+            if i == 0 or len(positions[i]) != 1:
+                continue
+            distance = self._distance_of(positions[i][0])
+            self._cumulative_distance += distance
+            for coef in self._last_movement_times:
+                if distance / coef > 1.0:
+                    self._last_movement_times[coef] = times[i]
+
+        if len(times):
+            self._last_processed_time = times[-1]
+
+    @property
+    def cumulative_distance(self):
+        """
+        :return: the sum of the distances moved between consecutive single-animal positions
+            (see :meth:`distance`), over the positions in the history of the tracker when the features
+            were first queried and all the positions tracked since
+        :rtype: float
+        """
+        self._catch_up()
+        return self._cumulative_distance
+
+    def time_since_movement(self, velocity_correction_coef):
+        """
+        :param velocity_correction_coef: see :meth:`has_moved`
+        :return: the time since the animal was last seen moving, in ms. Counted from the first query
+            for this coefficient if it has not moved since.
+        :rtype: int
+        """
+        self._catch_up()
+        last = self._last_movement_times.setdefault(
+            velocity_correction_coef, self._tracker.last_time_point
+        )
+        return self._tracker.last_time_point - last
+
+
 class BaseTracker(DescribedObject):
     # data_point = None
+    # rows of the array-backed history: 250 s at 30 fps, for one animal
+    _history_capacity = 8192
+
     def __init__(self, roi, data=None):
         """
         Template class for video trackers.
@@ -35,6 +394,8 @@ class BaseTracker(DescribedObject):
         self._last_non_inferred_time = 0
         self._last_time_point = 0
         self._max_history_length = 250 * 1000  # in milliseconds
+        self._history = PositionHistory(self._history_capacity)
+        self._features = TrackerFeatures(self)
 
         # self._max_history_length = 500   # in milliseconds
         # if self.data_point is None:
@@ -85,6 +446,8 @@ class BaseTracker(DescribedObject):
 
         self._positions.append(points)
         self._times.append(t)
+        for p in points:
+            self._history.append(t, p)
 
         if (
             len(self._times) > 2
@@ -111,6 +474,24 @@ class BaseTracker(DescribedObject):
         """
         return self._positions
 
+    @property
+    def history(self):
+        """
+        :return: The array-backed history of positions, for vectorised queries over time windows.\
+            It holds the same data as :class:`~ethoscope.trackers.trackers.BaseTracker.positions`,
+            but is bounded by a number of rows rather than by a duration.
+        :rtype: :class:`~ethoscope.trackers.trackers.PositionHistory`
+        """
+        return self._history
+
+    @property
+    def features(self):
+        """
+        :return: derived features of the position history, shared by all stimulators bound to this tracker
+        :rtype: :class:`~ethoscope.trackers.trackers.TrackerFeatures`
+        """
+        return self._features
+
     def xy_pos(self, i):
         return self._positions[i][0]
 
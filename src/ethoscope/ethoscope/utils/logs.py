@@ -0,0 +1,444 @@
+"""
+Paginated reading of the ethoscope logs, newest entries first.
+
+The node asks for one page of log entries at a time, optionally filtered by time
+(since/until), minimum severity (level) and a regular expression (grep). Each page
+comes with a cursor: passing it back returns the page of older entries that follows,
+and it is None once there are no more. Only what a page needs is read:
+
+- JournalLogReader asks journalctl for the page, resuming at the journal cursor of
+  the last entry returned;
+- FileLogReader reads a text log file backwards from its end (or from the cursor, a
+  byte offset) one block at a time, so the newest entries come back in the same time
+  whatever the size of the file.
+
+Entries are dicts with "time" (seconds since the epoch, or None), "level" (a syslog
+level name, or None) and "message", plus "unit" for journal entries.
+"""
+
+import datetime
+import json
+import math
+import os
+import re
+import subprocess
+
+from ethoscope.hardware.interfaces.light_daemon import DEFAULT_TRANSITION_LOG
+
+# Syslog priorities, as used by journalctl --priority
+LEVEL_NAMES = ("emerg", "alert", "crit", "err", "warning", "notice", "info", "debug")
+LEVELS = {
+    **{name: priority for priority, name in enumerate(LEVEL_NAMES)},
+    "critical": 2,
+    "error": 3,
+    "warn": 4,
+}
+DEFAULT_LIMIT = 200
+MAX_LIMIT = 5000
+# Services whose journal is read by default
+SERVICES = ("ethoscope_listener", "ethoscope_device")
+# Log files that can be read instead of the journal
+LOG_FILES = {"light": DEFAULT_TRANSITION_LOG}
+# Lines without a timestamp are joined to the line above, up to this many
+MAX_ENTRY_LINES = 200
+
+# Start of a text log line: ISO date and time, then optionally a level name
+_LINE_HEADER = re.compile(
+    r"\[?(\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?)\]?(?:\W+([A-Za-z]+))?"
+)
+
+
+def parse_level(level):
+    """
+    Syslog priority of a level.
+
+    Args:
+        level (str or int): Level name (e.g. "warning", "ERROR") or priority (0-7)
+
+    Returns:
+        int: Priority, or None if level is empty
+    """
+    if level is None or level == "":
+        return None
+    if str(level).isdigit() and int(level) < len(LEVEL_NAMES):
+        return int(level)
+    try:
+        return LEVELS[str(level).lower()]
+    except KeyError:
+        raise ValueError(f"Unknown log level {level!r}") from None
+
+
+def parse_time(value):
+    """
+    Seconds since the epoch of a time given as a number or an ISO date.
+
+    Args:
+        value (str or float): Epoch seconds, or e.g. "2025-01-31 12:00:00" (local time)
+
+    Returns:
+        float: Epoch seconds, or None if value is empty
+    """
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.datetime.fromisoformat(str(value).replace(",", ".")).timestamp()
+    except ValueError:
+        raise ValueError(f"Invalid time {value!r}") from None
+
+
+def _parse_filters(since, until, level, grep, limit):
+    """Validated filters of a page request."""
+    limit = DEFAULT_LIMIT if limit in (None, "") else int(limit)
+    if not 0 < limit <= MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+    pattern = None
+    if grep:
+        # like journalctl --grep: case insensitive unless there are capitals
+        flags = re.IGNORECASE if grep == grep.lower() else 0
+        try:
+            pattern = re.compile(grep, flags)
+        except re.error as e:
+            raise ValueError(f"Invalid grep pattern {grep!r}: {e}") from None
+    return parse_time(since), parse_time(until), parse_level(level), pattern, limit
+
+
+def _matches(entry, since, until, priority, pattern):
+    """Whether an entry passes the filters."""
+    time = entry["time"]
+    if time is not None:
+        if since is not None and time < since:
+            return False
+        if until is not None and time > until:
+            return False
+    if priority is not None and LEVELS.get(entry["level"], 99) > priority:
+        return False
+    return pattern is None or bool(pattern.search(entry["message"]))
+
+
+def _level_name(level):
+    """Syslog name of a level name or priority, None if unknown."""
+    try:
+        return LEVEL_NAMES[parse_level(level)]
+    except (ValueError, TypeError):
+        return None
+
+
+def parse_line(text):
+    """
+    Entry of a log file line.
+
+    Lines starting with an ISO timestamp (as written by the logging module) and JSON
+    objects with a "time" or "timestamp" field are entries; other lines, such as
+    those of a traceback, continue the entry above and give None.
+
+    Args:
+        text (str): Line, without its line break
+
+    Returns:
+        dict: Entry, or None for a continuation line
+    """
+    if text.startswith("{"):
+        try:
+            data = json.loads(text)
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            try:
+                time = parse_time(data.get("time", data.get("timestamp")))
+            except ValueError:
+                time = None
+            return {
+                "time": time,
+                "level": _level_name(data.get("level")),
+                "message": text,
+            }
+
+    match = _LINE_HEADER.match(text)
+    if match is None:
+        return None
+    try:
+        time = parse_time(match.group(1))
+    except ValueError:
+        return None
+    return {"time": time, "level": _level_name(match.group(2)), "message": text}
+
+
+class FileLogReader:
+    """
+    Pages of a text log file, read backwards from its end.
+
+    The cursor of a page is the inode of the file and the byte offset of the oldest
+    entry returned, so a rotated file is noticed.
+
+    Args:
+        path (str): Log file
+        block_size (int): Bytes read at a time
+    """
+
+    def __init__(self, path, block_size=1 << 16):
+        self.path = path
+        self.block_size = block_size
+
+    def page(
+        self, since=None, until=None, level=None, grep=None, limit=None, cursor=None
+    ):
+        """
+        Read a page of entries, newest first.
+
+        Args:
+            since (str or float): Only entries from this time
+            until (str or float): Only entries up to this time
+            level (str or int): Only entries of this level or more severe
+            grep (str): Only entries matching this regular expression
+            limit (int): Maximum number of entries (default: DEFAULT_LIMIT)
+            cursor (str): Cursor of the previous page, to read older entries
+
+        Returns:
+            dict: {"entries": list, "cursor": str or None, "source": path}
+        """
+        since, until, priority, pattern, limit = _parse_filters(
+            since, until, level, grep, limit
+        )
+        result = {"entries": [], "cursor": None, "source": self.path}
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return result
+
+        with f:
+            stat = os.fstat(f.fileno())
+            end = stat.st_size
+            if cursor:
+                try:
+                    inode, offset = (int(part) for part in cursor.split(":"))
+                except ValueError:
+                    raise ValueError(f"Invalid cursor {cursor!r}") from None
+                if inode != stat.st_ino:
+                    raise ValueError(
+                        f"{self.path} was rotated, start from the newest page"
+                    )
+                end = min(offset, end)
+            elif until is not None:
+                end = self._offset_after(f, end, until)
+
+            entries = result["entries"]
+            oldest = None
+            for offset, entry in self._entries(f, end):
+                if (
+                    since is not None
+                    and entry["time"] is not None
+                    and entry["time"] < since
+                ):
+                    break
+                if not _matches(entry, since, until, priority, pattern):
+                    continue
+                if len(entries) == limit:
+                    result["cursor"] = f"{stat.st_ino}:{oldest}"
+                    break
+                entries.append(entry)
+                oldest = offset
+        return result
+
+    def _lines_backwards(self, f, end):
+        """Yield (offset, line) of the lines before offset end, last first."""
+        position = end
+        tail = b""
+        while position > 0:
+            size = min(self.block_size, position)
+            position -= size
+            f.seek(position)
+            block = f.read(size) + tail
+            lines = block.split(b"\n")
+            # the first line may start in the previous block
+            tail = lines.pop(0)
+            line_end = position + len(block)
+            for line in reversed(lines):
+                start = line_end - len(line)
+                if line:
+                    yield start, line
+                line_end = start - 1
+        if tail:
+            yield 0, tail
+
+    def _entries(self, f, end):
+        """Yield (offset, entry) of the entries before offset end, last first."""
+        continuation = []
+        for offset, line in self._lines_backwards(f, end):
+            text = line.decode("utf-8", "replace").rstrip("\r")
+            entry = parse_line(text)
+            if entry is None:
+                continuation.append(text)
+                if len(continuation) < MAX_ENTRY_LINES:
+                    continue
+                entry = {"time": None, "level": None, "message": continuation.pop()}
+            if continuation:
+                entry["message"] = "\n".join(
+                    [entry["message"], *reversed(continuation)]
+                )
+                continuation = []
+            yield offset, entry
+        if continuation:
+            message = "\n".join(reversed(continuation))
+            yield offset, {"time": None, "level": None, "message": message}
+
+    def _first_entry_after(self, f, position, size):
+        """(offset, time) of the first timed line starting at or after position."""
+        f.seek(position)
+        if position > 0:
+            # skip the rest of the line position falls in
+            position += len(f.readline())
+        while position < size:
+            line = f.readline()
+            entry = parse_line(line.decode("utf-8", "replace").rstrip("\r\n"))
+            if entry is not None and entry["time"] is not None:
+                return position, entry["time"]
+            position += len(line)
+        return size, None
+
+    def _offset_after(self, f, size, until):
+        """Offset of the first entry later than until, found by bisection."""
+        low, high = 0, size
+        while high - low > self.block_size:
+            middle = (low + high) // 2
+            offset, time = self._first_entry_after(f, middle, size)
+            if time is None or time > until:
+                high = middle
+            else:
+                low = offset + 1
+        # the entry is at most a block and a few lines away
+        position = low
+        while position < size:
+            offset, time = self._first_entry_after(f, position, size)
+            if time is None or time > until:
+                return offset
+            position = offset + 1
+        return size
+
+
+class JournalLogReader:
+    """
+    Pages of the systemd journal of the ethoscope services, read with journalctl.
+
+    The cursor of a page is the journal cursor of the oldest entry returned.
+
+    Args:
+        services (iterable): Services whose entries are read
+        journalctl (str): journalctl executable
+        timeout (float): Seconds to wait for journalctl
+    """
+
+    def __init__(self, services=SERVICES, journalctl="journalctl", timeout=30):
+        self.services = tuple(services)
+        self.journalctl = journalctl
+        self.timeout = timeout
+
+    def command(self, since, until, priority, grep, limit, cursor):
+        """journalctl arguments for a page (times in epoch seconds)."""
+        command = [self.journalctl, "--output=json", "--reverse", "--no-pager"]
+        for service in self.services:
+            command.append(f"--unit={service}.service")
+        # the entry at the cursor is returned again, and one more tells if there
+        # are older entries
+        command.append(f"--lines={limit + (2 if cursor else 1)}")
+        if cursor:
+            command.append(f"--cursor={cursor}")
+        if since is not None:
+            command.append(f"--since=@{math.floor(since)}")
+        if until is not None:
+            command.append(f"--until=@{math.ceil(until)}")
+        if priority is not None:
+            command.append(f"--priority={priority}")
+        if grep:
+            command.append(f"--grep={grep}")
+        return command
+
+    def page(
+        self, since=None, until=None, level=None, grep=None, limit=None, cursor=None
+    ):
+        """
+        Read a page of entries, newest first.
+
+        Args:
+            since (str or float): Only entries from this time
+            until (str or float): Only entries up to this time
+            level (str or int): Only entries of this level or more severe
+            grep (str): Only entries matching this regular expression
+            limit (int): Maximum number of entries (default: DEFAULT_LIMIT)
+            cursor (str): Cursor of the previous page, to read older entries
+
+        Returns:
+            dict: {"entries": list, "cursor": str or None, "source": "journal"}
+        """
+        since, until, priority, pattern, limit = _parse_filters(
+            since, until, level, grep, limit
+        )
+        process = subprocess.run(
+            self.command(since, until, priority, grep, limit, cursor),
+            capture_output=True,
+            text=True,
+            timeout=self.timeout,
+        )
+        # journalctl exits with 1 when --grep matches nothing
+        if process.returncode != 0 and process.stderr.strip():
+            raise RuntimeError(f"journalctl failed: {process.stderr.strip()}")
+
+        result = {"entries": [], "cursor": None, "source": "journal"}
+        entries = result["entries"]
+        oldest = None
+        for line in process.stdout.splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if cursor and record.get("__CURSOR") == cursor:
+                continue
+            entry = self._entry(record)
+            # journalctl only filters whole seconds
+            if not _matches(entry, since, until, None, None):
+                continue
+            if len(entries) == limit:
+                result["cursor"] = oldest
+                break
+            entries.append(entry)
+            oldest = record.get("__CURSOR")
+        return result
+
+    @staticmethod
+    def _entry(record):
+        """Entry of a journal record."""
+        message = record.get("MESSAGE", "")
+        if isinstance(message, list):
+            # messages that are not valid UTF-8 are given as byte arrays
+            message = bytes(message).decode("utf-8", "replace")
+        try:
+            time = int(record["__REALTIME_TIMESTAMP"]) / 1e6
+        except (KeyError, ValueError):
+            time = None
+        return {
+            "time": time,
+            "level": _level_name(record.get("PRIORITY")),
+            "unit": record.get("_SYSTEMD_UNIT") or record.get("SYSLOG_IDENTIFIER"),
+            "message": message or "",
+        }
+
+
+def log_reader(source="journal"):
+    """
+    Reader of a log source.
+
+    Args:
+        source (str): "journal", or the name of one of the LOG_FILES
+
+    Returns:
+        JournalLogReader or FileLogReader
+    """
+    if source == "journal":
+        return JournalLogReader()
+    try:
+        return FileLogReader(LOG_FILES[source])
+    except KeyError:
+        raise ValueError(f"Unknown log source {source!r}") from None
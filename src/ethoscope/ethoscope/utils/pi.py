@@ -10,6 +10,7 @@ from uuid import uuid4
 import git
 import netifaces
 
+from ethoscope.utils.retention import USAGE_TARGET, USAGE_THRESHOLD, RetentionManager
 from ethoscope.utils.rpi_bad_power import powerChecker
 
 PERSISTENT_STATE = "/var/cache/ethoscope/persistent_state.pkl"
@@ -1132,106 +1133,27 @@ def check_disk_space(ethoscope_dir, threshold_percent=85):
         }
 
 
-def cleanup_old_data(ethoscope_dir, max_age_days=60, dry_run=False):
-    """
-    Clean up old data files from videos and tracking directories.
-
-    Args:
-        ethoscope_dir (str): Path to ethoscope data directory
-        max_age_days (int): Delete files older than this many days
-        dry_run (bool): If True, only simulate cleanup without deleting
-
-    Returns:
-        dict: Summary of cleanup actions
+def manage_disk_space(
+    data_dir, threshold_percent=USAGE_THRESHOLD, target_percent=USAGE_TARGET, protect=()
+):
     """
-    import glob
-
-    cleanup_summary = {
-        "files_deleted": 0,
-        "space_freed_mb": 0,
-        "errors": [],
-        "deleted_files": [],
-    }
-
-    try:
-        # Define data directories to clean
-        data_dirs = [
-            os.path.join(ethoscope_dir, "videos"),
-            os.path.join(ethoscope_dir, "tracking"),
-        ]
-
-        # Calculate cutoff time (files older than this will be deleted)
-        cutoff_time = time.time() - (max_age_days * 24 * 60 * 60)
-
-        # Collect all files with their modification times
-        files_to_check = []
-        for data_dir in data_dirs:
-            if os.path.exists(data_dir):
-                # Look for common ethoscope file patterns
-                patterns = ["*.db", "*.h264", "*.mp4", "*.avi", "*.sql", "*.log"]
-                for pattern in patterns:
-                    for file_path in glob.glob(
-                        os.path.join(data_dir, "**", pattern), recursive=True
-                    ):
-                        try:
-                            mtime = os.path.getmtime(file_path)
-                            file_size = os.path.getsize(file_path)
-                            files_to_check.append((file_path, mtime, file_size))
-                        except OSError as e:
-                            cleanup_summary["errors"].append(
-                                f"Cannot access {file_path}: {e}"
-                            )
-
-        # Sort files by modification time (oldest first)
-        files_to_check.sort(key=lambda x: x[1])
-
-        # Delete old files
-        for file_path, mtime, file_size in files_to_check:
-            if mtime < cutoff_time:
-                try:
-                    if not dry_run:
-                        os.remove(file_path)
-                        logging.info(f"Deleted old file: {file_path}")
-                    else:
-                        logging.info(f"Would delete: {file_path}")
-
-                    cleanup_summary["files_deleted"] += 1
-                    cleanup_summary["space_freed_mb"] += file_size / (1024 * 1024)
-                    cleanup_summary["deleted_files"].append(file_path)
-
-                except OSError as e:
-                    cleanup_summary["errors"].append(f"Cannot delete {file_path}: {e}")
-                    logging.error(f"Failed to delete {file_path}: {e}")
-
-        action = "Would delete" if dry_run else "Deleted"
-        logging.info(
-            f"{action} {cleanup_summary['files_deleted']} old files, "
-            f"freed {cleanup_summary['space_freed_mb']:.2f} MB"
-        )
-
-    except Exception as e:
-        error_msg = f"Error during cleanup: {e}"
-        cleanup_summary["errors"].append(error_msg)
-        logging.error(error_msg)
-
-    return cleanup_summary
+    Manage disk space by deleting backed up data files when usage is too high.
 
-
-def manage_disk_space(ethoscope_dir, threshold_percent=85, max_age_days=60):
-    """
-    Manage disk space by checking usage and cleaning up old files if needed.
+    Only files the node confirmed to hold a copy of are deleted, oldest first, until
+    disk usage is back to target_percent; see ethoscope.utils.retention.
 
     Args:
-        ethoscope_dir (str): Path to ethoscope data directory
+        data_dir (str): Ethoscope data directory, holding the results and videos folders
         threshold_percent (int): Disk usage percentage that triggers cleanup
-        max_age_days (int): Delete files older than this many days
+        target_percent (int): Disk usage percentage to bring the partition back to
+        protect (iterable): Files or folders of the running experiment
 
     Returns:
         dict: Summary of space management actions
     """
     try:
         # Check current disk space
-        space_info = check_disk_space(ethoscope_dir, threshold_percent)
+        space_info = check_disk_space(data_dir, threshold_percent)
 
         if "error" in space_info:
             logging.warning(f"Disk space check failed: {space_info['error']}")
@@ -1247,18 +1169,28 @@ def manage_disk_space(ethoscope_dir, threshold_percent=85, max_age_days=60):
         if space_info["needs_cleanup"]:
             logging.warning(
                 f"Disk usage at {space_info['usage_percent']:.1f}%, "
-                f"triggering cleanup of files older than {max_age_days} days"
+                f"deleting backed up files down to {target_percent}%"
             )
 
-            # Perform cleanup
-            cleanup_result = cleanup_old_data(
-                ethoscope_dir, max_age_days, dry_run=False
-            )
+            retention = RetentionManager(data_dir)
+            try:
+                plan = retention.plan(target_percent, protect)
+                cleanup_result = retention.apply(plan)
+            finally:
+                retention.close()
             result["cleanup_performed"] = True
             result["cleanup_summary"] = cleanup_result
+            result["kept"] = plan["kept"]
+
+            if not plan["target_met"]:
+                logging.warning(
+                    f"Cannot free enough space: {plan['kept']['not_backed_up']} files "
+                    f"not backed up, {plan['kept']['changed_since_backup']} changed "
+                    "since their backup"
+                )
 
             # Check space again after cleanup
-            new_space_info = check_disk_space(ethoscope_dir, threshold_percent)
+            new_space_info = check_disk_space(data_dir, threshold_percent)
             if "error" not in new_space_info:
                 result["usage_after_cleanup"] = new_space_info["usage_percent"]
                 result["available_after_cleanup"] = new_space_info["available_gb"]
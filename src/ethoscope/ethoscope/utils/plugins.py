@@ -0,0 +1,517 @@
+"""
+Registry of the classes users can choose from to run an experiment.
+
+Stimulators, ROI builders, trackers and drawers declare themselves with the
+register_plugin() decorator::
+
+    @register_plugin("interactor")
+    class MyStimulator(BaseStimulator):
+        _description = {...}
+
+The registry finds them without importing their modules: the source files of the
+package of each category are parsed, and the decorated classes and their
+``_description`` read from the syntax tree. A module is only imported when one of
+its classes is used to start a run, so the options offered to the node can be
+listed without loading every stimulator and its hardware dependencies.
+
+Classes of other packages are registered through entry points, in the groups
+``ethoscope.interactor``, ``ethoscope.roi_builder``, ``ethoscope.tracker`` and
+``ethoscope.drawer``, e.g. ``MyStimulator = "my_package.stimulators:MyStimulator"``.
+
+Before a run starts, the arguments sent by the user are checked against the
+description of the class and the signature of its constructor (see validate()).
+"""
+
+import ast
+import copy
+import importlib
+import importlib.metadata
+import importlib.util
+import inspect
+import logging
+import operator
+import os
+import threading
+
+# Subpackage of ethoscope holding the built-in classes of each category
+CATEGORIES = {
+    "interactor": "stimulators",
+    "roi_builder": "roi_builders",
+    "tracker": "trackers",
+    "drawer": "drawers",
+}
+ENTRY_POINT_GROUP = "ethoscope.{category}"
+
+_PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Argument types of descriptions that are checked, and the values they accept
+_TEXT_TYPES = ("str", "string", "date_range", "time", "filepath", "dropdown")
+_BOOLEAN_STRINGS = ("true", "false")
+
+_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+    ast.Not: operator.not_,
+}
+
+
+class _NotLiteral(Exception):
+    """A description that cannot be read without running the module."""
+
+
+def _evaluate(node):
+    """Value of a constant expression: literals and arithmetic on them."""
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.Dict):
+        if None in node.keys:
+            raise _NotLiteral("dict unpacking")
+        return {
+            _evaluate(k): _evaluate(v)
+            for k, v in zip(node.keys, node.values, strict=True)
+        }
+    if isinstance(node, ast.List):
+        return [_evaluate(e) for e in node.elts]
+    if isinstance(node, ast.Tuple):
+        return tuple(_evaluate(e) for e in node.elts)
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _OPERATORS:
+        return _OPERATORS[type(node.op)](_evaluate(node.operand))
+    if isinstance(node, ast.BinOp) and type(node.op) in _OPERATORS:
+        return _OPERATORS[type(node.op)](_evaluate(node.left), _evaluate(node.right))
+    raise _NotLiteral(ast.dump(node))
+
+
+def _decorator_category(decorator):
+    """Category of a register_plugin() decorator node, or None for other decorators."""
+    if not isinstance(decorator, ast.Call):
+        return None
+    func = decorator.func
+    name = func.attr if isinstance(func, ast.Attribute) else getattr(func, "id", None)
+    if name != "register_plugin" or not decorator.args:
+        return None
+    try:
+        category = _evaluate(decorator.args[0])
+        default = any(
+            kw.arg == "default" and _evaluate(kw.value) for kw in decorator.keywords
+        )
+    except _NotLiteral:
+        return None
+    return category, default
+
+
+_UNDESCRIBED = object()
+
+
+def _class_description(class_node):
+    """The literal _description of a class node; None if it has none of its own."""
+    for statement in class_node.body:
+        if isinstance(statement, ast.Assign):
+            targets = statement.targets
+        elif isinstance(statement, ast.AnnAssign) and statement.value is not None:
+            targets = [statement.target]
+        else:
+            continue
+        if any(getattr(t, "id", None) == "_description" for t in targets):
+            try:
+                return _evaluate(statement.value)
+            except (_NotLiteral, TypeError, ArithmeticError):
+                return _UNDESCRIBED
+    return None
+
+
+def _module_source(module):
+    """Path of the source file of a module, found without importing it if possible."""
+    parts = module.split(".")
+    if parts[0] == "ethoscope":
+        path = os.path.join(_PACKAGE_DIR, *parts[1:]) + ".py"
+        if os.path.isfile(path):
+            return path
+    try:
+        spec = importlib.util.find_spec(module)
+    except (ImportError, ValueError):
+        return None
+    return spec.origin if spec and spec.origin and spec.origin.endswith(".py") else None
+
+
+def _read_module(module, path=None):
+    """
+    Parse a module for the register_plugin() classes it defines.
+
+    Returns:
+        dict: {class name: (category, default, description)}; description is
+            _UNDESCRIBED when it is not a literal
+    """
+    path = path or _module_source(module)
+    if path is None:
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=path)
+    except (OSError, SyntaxError, ValueError) as e:
+        logging.warning(f"Cannot read plugins of {module}: {e}")
+        return {}
+
+    classes = {}
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        for decorator in node.decorator_list:
+            declared = _decorator_category(decorator)
+            if declared:
+                classes[node.name] = (*declared, _class_description(node))
+    return classes
+
+
+class Plugin:
+    """
+    A class of the registry, imported on first use.
+
+    Args:
+        category (str): One of CATEGORIES
+        name (str): Class name, as sent by the node
+        module (str): Module defining the class
+        default (bool): Whether the class is used when the user chooses none
+        description (dict): The class _description, if already known
+    """
+
+    def __init__(self, category, name, module, default=False, description=_UNDESCRIBED):
+        self.category = category
+        self.name = name
+        self.module = module
+        self.default = default
+        self._description = description
+        self._class = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._class is not None
+
+    def load(self):
+        """
+        Import the module of the class, if needed, and return the class.
+
+        Returns:
+            type: The plugin class
+        """
+        with self._lock:
+            if self._class is None:
+                cls = getattr(importlib.import_module(self.module), self.name, None)
+                if not isinstance(cls, type):
+                    raise ImportError(f"{self.module} does not define {self.name}")
+                self._class = cls
+            return self._class
+
+    def describe(self):
+        """
+        The _description of the class, read without importing it when possible.
+
+        Returns:
+            dict: The description; None if the class has none of its own
+        """
+        if self._description is _UNDESCRIBED:
+            self._description = self.load().__dict__.get("_description")
+        return self._description
+
+    def __repr__(self):
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<Plugin {self.category}:{self.module}.{self.name} ({state})>"
+
+
+class PluginRegistry:
+    """
+    The classes of each category, discovered on first use.
+
+    Args:
+        categories (dict): {category: subpackage of ethoscope to scan}
+        entry_points (bool): Whether to look for plugins of other packages
+    """
+
+    def __init__(self, categories=CATEGORIES, entry_points=True):
+        self._categories = dict(categories)
+        self._entry_points = entry_points
+        self._plugins = {category: {} for category in self._categories}
+        self._discovered = False
+        self._lock = threading.RLock()
+
+    @property
+    def categories(self):
+        return list(self._categories)
+
+    def _check_category(self, category):
+        if category not in self._categories:
+            raise ValueError(f"Unknown plugin category: {category}")
+
+    def _add(self, plugin):
+        """Add a plugin, unless one of that name is registered. Called with the lock held."""
+        plugins = self._plugins[plugin.category]
+        existing = plugins.get(plugin.name)
+        if existing is not None:
+            if existing.module != plugin.module:
+                logging.warning(
+                    f"Ignoring {plugin.module}.{plugin.name}: {plugin.category} "
+                    f"{plugin.name} is already registered from {existing.module}"
+                )
+            return existing
+        plugins[plugin.name] = plugin
+        return plugin
+
+    def discover(self):
+        """Find the built-in and entry point plugins, once."""
+        with self._lock:
+            if self._discovered:
+                return
+            self._discovered = True
+            for category, package in self._categories.items():
+                folder = os.path.join(_PACKAGE_DIR, package)
+                for filename in sorted(os.listdir(folder)):
+                    if not filename.endswith(".py") or filename == "__init__.py":
+                        continue
+                    module = f"ethoscope.{package}.{filename[:-3]}"
+                    found = _read_module(module, os.path.join(folder, filename))
+                    for name, (in_category, default, description) in found.items():
+                        if in_category == category:
+                            self._add(
+                                Plugin(category, name, module, default, description)
+                            )
+            if self._entry_points:
+                self._discover_entry_points()
+
+    def _discover_entry_points(self):
+        for category in self._categories:
+            group = ENTRY_POINT_GROUP.format(category=category)
+            try:
+                entry_points = importlib.metadata.entry_points(group=group)
+            except TypeError:  # Python < 3.10
+                entry_points = importlib.metadata.entry_points().get(group, [])
+            for entry_point in entry_points:
+                module, _, name = entry_point.value.partition(":")
+                if not name:
+                    logging.warning(f"Entry point {entry_point.value} is not a class")
+                    continue
+                description = _read_module(module).get(name, (None, None, _UNDESCRIBED))
+                self._add(Plugin(category, name, module, description=description[2]))
+
+    def register(self, category, cls, default=False):
+        """
+        Register a class that is already imported.
+
+        Args:
+            category (str): One of the categories of the registry
+            cls (type): The class; its name is the one sent by the node
+            default (bool): Whether the class is used when the user chooses none
+
+        Returns:
+            Plugin: The registry entry
+        """
+        self._check_category(category)
+        with self._lock:
+            plugin = self._plugins[category].get(cls.__name__)
+            if plugin is None or plugin.module != cls.__module__:
+                plugin = self._add(
+                    Plugin(
+                        category,
+                        cls.__name__,
+                        cls.__module__,
+                        default,
+                        cls.__dict__.get("_description"),
+                    )
+                )
+            if plugin.module == cls.__module__:
+                plugin._class = cls
+            return plugin
+
+    def unregister(self, category, name):
+        """Remove a plugin from the registry."""
+        self._check_category(category)
+        with self._lock:
+            self._plugins[category].pop(name, None)
+
+    def plugins(self, category):
+        """
+        The plugins of a category, the default one first.
+
+        Returns:
+            list: Plugin objects
+        """
+        self._check_category(category)
+        self.discover()
+        with self._lock:
+            plugins = list(self._plugins[category].values())
+        return sorted(plugins, key=lambda plugin: not plugin.default)
+
+    def get(self, category, name=None):
+        """
+        A plugin by name.
+
+        Args:
+            category (str): One of the categories of the registry
+            name (str): Class name (default: the default plugin of the category)
+
+        Returns:
+            Plugin: The registry entry
+        """
+        plugins = self.plugins(category)
+        if name is None:
+            if not plugins:
+                raise ValueError(f"No {category} is registered")
+            return plugins[0]
+        for plugin in plugins:
+            if plugin.name == name:
+                return plugin
+        raise ValueError(f"Unknown {category}: {name}")
+
+    def load(self, category, name=None):
+        """The class of a plugin, importing its module if needed."""
+        return self.get(category, name).load()
+
+    def user_options(self, category, include_hidden=False):
+        """
+        Descriptions of the plugins a user can choose from, as sent to the node.
+
+        Plugins without a description of their own are not offered, and hidden
+        ones only if include_hidden is set.
+
+        Returns:
+            list: Copies of the descriptions, with the class name under "name"
+        """
+        options = []
+        for plugin in self.plugins(category):
+            try:
+                description = plugin.describe()
+            except Exception as e:
+                logging.error(f"Cannot describe {plugin!r}: {e}")
+                continue
+            if description is None:
+                continue
+            if not include_hidden and description.get("hidden"):
+                continue
+            option = copy.deepcopy(description)
+            option["name"] = plugin.name
+            options.append(option)
+        return options
+
+    def validate(self, category, name, kwargs):
+        """
+        Load a plugin and check the arguments a run will pass to it.
+
+        Args:
+            category (str): One of the categories of the registry
+            name (str): Class name
+            kwargs (dict): Arguments chosen by the user
+
+        Returns:
+            type: The plugin class
+
+        Raises:
+            ValueError: If the plugin is unknown or an argument is invalid
+        """
+        plugin = self.get(category, name)
+        cls = plugin.load()
+        check_arguments(cls, kwargs, plugin.describe())
+        return cls
+
+
+def _check_value(spec, value):
+    """Reason why a value does not match an argument of a description, or None."""
+    kind = spec.get("type")
+    if value is None:
+        return None
+    if kind == "number":
+        if isinstance(value, bool):
+            return "is not a number"
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            return "is not a number"
+        if "min" in spec and number < spec["min"]:
+            return f"is lower than {spec['min']}"
+        if "max" in spec and number > spec["max"]:
+            return f"is greater than {spec['max']}"
+    elif kind == "boolean":
+        if not isinstance(value, (bool, int)) and str(value).lower() not in (
+            _BOOLEAN_STRINGS
+        ):
+            return "is not a boolean"
+    elif kind == "select":
+        values = [
+            option.get("value") if isinstance(option, dict) else option
+            for option in spec.get("options", [])
+        ]
+        if values and value not in values:
+            return f"is not one of {values}"
+    elif kind in _TEXT_TYPES:
+        if not isinstance(value, str):
+            return "is not a string"
+    return None
+
+
+def check_arguments(cls, kwargs, description=None):
+    """
+    Check user arguments against a class description and constructor.
+
+    Arguments the description declares must have the right type and range, and
+    every argument must be accepted by the constructor.
+
+    Args:
+        cls (type): The class to instantiate
+        kwargs (dict): Arguments chosen by the user
+        description (dict): The class description (default: cls._description)
+
+    Raises:
+        ValueError: Listing every invalid argument
+    """
+    if not isinstance(kwargs, dict):
+        raise ValueError(f"Arguments of {cls.__name__} must be a dictionary")
+    if description is None:
+        description = cls.__dict__.get("_description") or {}
+
+    problems = []
+    specs = {spec.get("name"): spec for spec in description.get("arguments", [])}
+    for name, value in kwargs.items():
+        if name in specs:
+            reason = _check_value(specs[name], value)
+            if reason:
+                problems.append(f"{name}={value!r} {reason}")
+
+    try:
+        parameters = inspect.signature(cls).parameters
+    except (TypeError, ValueError):
+        parameters = None
+    if parameters is not None and not any(
+        p.kind == p.VAR_KEYWORD for p in parameters.values()
+    ):
+        unexpected = sorted(set(kwargs) - set(parameters))
+        problems.extend(f"{name} is not an argument" for name in unexpected)
+
+    if problems:
+        raise ValueError(f"Invalid arguments for {cls.__name__}: {'; '.join(problems)}")
+
+
+REGISTRY = PluginRegistry()
+
+
+def register_plugin(category, default=False):
+    """
+    Class decorator adding a class to the registry.
+
+    The registry finds decorated classes of the ethoscope package without
+    importing them; the decorator ties the entry to the class once it is.
+
+    Args:
+        category (str): One of CATEGORIES
+        default (bool): Whether the class is used when the user chooses none
+    """
+
+    def decorator(cls):
+        REGISTRY.register(category, cls, default=default)
+        return cls
+
+    return decorator
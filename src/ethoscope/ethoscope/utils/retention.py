@@ -0,0 +1,344 @@
+"""
+Backup-aware retention of the data stored on the ethoscope.
+
+The data folder fills up with tracking databases and videos. When space runs
+low, files are deleted to free it, but only files the node has confirmed to hold
+a copy of: after each backup, the node reports the size and modification time of
+the files it received (see confirm_backups()), and a file can be deleted for as
+long as it still matches what the node reported. Files that were never backed up,
+changed since their backup or belong to the running experiment are kept, even if
+the free space target cannot be met without them.
+
+The files of the data folder are listed in a small SQLite inventory, together with
+their last backup confirmation. Folders are only listed again when their
+modification time changes, so checking the disk does not walk every file each time.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+# Folders of the data directory holding experimental data
+DATA_FOLDERS = ("results", "videos")
+# Files the retention manager may delete
+DATA_EXTENSIONS = (".db", ".h264", ".mp4", ".avi", ".sql", ".log")
+# Disk usage (%) that triggers a cleanup, and usage to bring it back to
+USAGE_THRESHOLD = 85
+USAGE_TARGET = 75
+
+
+def file_checksum(path, chunk_size=1 << 20):
+    """
+    Compute the MD5 checksum of a file.
+
+    Args:
+        path (str): File to read
+        chunk_size (int): Bytes read at a time
+
+    Returns:
+        str: Hexadecimal digest
+    """
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RetentionManager:
+    """
+    Inventory of the data files and of their backups, deciding what can be deleted.
+
+    Args:
+        data_dir (str): Ethoscope data directory, e.g. /ethoscope_data
+        db_path (str): SQLite inventory (default: <data_dir>/cache/retention.db)
+        disk_usage (callable): Returns (total, used, free) bytes of a path;
+            shutil.disk_usage by default
+    """
+
+    def __init__(self, data_dir, db_path=None, disk_usage=shutil.disk_usage):
+        self.data_dir = os.path.abspath(data_dir)
+        self.db_path = db_path or os.path.join(self.data_dir, "cache", "retention.db")
+        self._disk_usage = disk_usage
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        # the device server and the listener share the inventory
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS folders (
+                    path TEXT PRIMARY KEY,
+                    mtime_ns INTEGER NOT NULL
+                )""")
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    folder TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime INTEGER NOT NULL,
+                    backup_size INTEGER,
+                    backup_mtime INTEGER,
+                    backup_checksum TEXT,
+                    backup_time REAL
+                )""")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS files_folder ON files (folder)"
+            )
+
+    def _relative(self, path):
+        """Path relative to the data directory; ValueError if outside of it."""
+        path = os.path.abspath(os.path.join(self.data_dir, path))
+        relative = os.path.relpath(path, self.data_dir)
+        if relative.split(os.sep)[0] not in DATA_FOLDERS:
+            raise ValueError(f"{path} is not in a data folder of {self.data_dir}")
+        return relative
+
+    def scan(self):
+        """
+        Bring the inventory up to date with the data folders.
+
+        Only folders whose modification time changed since the last scan are
+        listed; files growing in place are stat'ed again when a plan is made.
+
+        Returns:
+            int: Number of folders listed
+        """
+        with self._lock, self._conn:
+            known = dict(self._conn.execute("SELECT path, mtime_ns FROM folders"))
+            seen = set()
+            listed = 0
+            stack = [
+                os.path.join(self.data_dir, folder)
+                for folder in DATA_FOLDERS
+                if os.path.isdir(os.path.join(self.data_dir, folder))
+            ]
+            while stack:
+                folder = stack.pop()
+                relative = os.path.relpath(folder, self.data_dir)
+                try:
+                    mtime_ns = os.stat(folder).st_mtime_ns
+                    entries = list(os.scandir(folder))
+                except OSError as e:
+                    logging.warning(f"Cannot list {folder}: {e}")
+                    continue
+                seen.add(relative)
+                stack.extend(
+                    entry.path
+                    for entry in entries
+                    if entry.is_dir(follow_symlinks=False)
+                )
+                if known.get(relative) == mtime_ns:
+                    continue
+
+                listed += 1
+                files = {}
+                for entry in entries:
+                    if entry.is_file(follow_symlinks=False) and entry.name.endswith(
+                        DATA_EXTENSIONS
+                    ):
+                        try:
+                            stat = entry.stat()
+                        except OSError:
+                            continue
+                        files[os.path.join(relative, entry.name)] = stat
+                self._conn.executemany(
+                    """INSERT INTO files (path, folder, size, mtime) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (path) DO UPDATE SET
+                        size = excluded.size, mtime = excluded.mtime""",
+                    [
+                        (path, relative, stat.st_size, int(stat.st_mtime))
+                        for path, stat in files.items()
+                    ],
+                )
+                stale = [
+                    (path,)
+                    for (path,) in self._conn.execute(
+                        "SELECT path FROM files WHERE folder = ?", (relative,)
+                    )
+                    if path not in files
+                ]
+                self._conn.executemany("DELETE FROM files WHERE path = ?", stale)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO folders VALUES (?, ?)", (relative, mtime_ns)
+                )
+
+            for folder in set(known) - seen:
+                self._conn.execute("DELETE FROM folders WHERE path = ?", (folder,))
+                self._conn.execute("DELETE FROM files WHERE folder = ?", (folder,))
+        return listed
+
+    def confirm_backups(self, files, now=None):
+        """
+        Record the files the node holds a copy of.
+
+        A confirmation is only recorded if the file still has the size (and, when
+        given, modification time and MD5 checksum) of the copy on the node.
+
+        Args:
+            files (list): Dicts with "path" (relative to the data directory), "size",
+                and optionally "mtime" and "checksum" of the node's copy
+            now (float): Time of the confirmation (default: time.time())
+
+        Returns:
+            dict: Numbers of files confirmed and rejected
+        """
+        now = time.time() if now is None else now
+        confirmed, rejected = [], 0
+        for entry in files:
+            try:
+                relative = self._relative(entry["path"])
+                if not relative.endswith(DATA_EXTENSIONS):
+                    raise ValueError("not a data file")
+                path = os.path.join(self.data_dir, relative)
+                stat = os.stat(path)
+                if stat.st_size != int(entry["size"]):
+                    raise ValueError("size differs")
+                if "mtime" in entry and int(stat.st_mtime) != int(entry["mtime"]):
+                    raise ValueError("modification time differs")
+                checksum = entry.get("checksum")
+                if checksum and file_checksum(path) != checksum:
+                    raise ValueError("checksum differs")
+            except (KeyError, TypeError, ValueError, OSError) as e:
+                logging.debug(f"Backup of {entry!r} not confirmed: {e}")
+                rejected += 1
+                continue
+            confirmed.append(
+                (
+                    relative,
+                    os.path.dirname(relative),
+                    stat.st_size,
+                    int(stat.st_mtime),
+                    checksum,
+                    now,
+                )
+            )
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (path) DO UPDATE SET
+                    size = excluded.size, mtime = excluded.mtime,
+                    backup_size = excluded.backup_size,
+                    backup_mtime = excluded.backup_mtime,
+                    backup_checksum = excluded.backup_checksum,
+                    backup_time = excluded.backup_time""",
+                [
+                    (path, folder, size, mtime, size, mtime, checksum, t)
+                    for path, folder, size, mtime, checksum, t in confirmed
+                ],
+            )
+        return {"confirmed": len(confirmed), "rejected": rejected}
+
+    def plan(self, target_percent=USAGE_TARGET, protect=()):
+        """
+        Choose the files to delete to bring disk usage down to a target.
+
+        Only files whose backup was confirmed and which did not change since are
+        candidates, oldest first. Files under a protected path never are.
+
+        Args:
+            target_percent (float): Disk usage (%) to bring the partition back to
+            protect (iterable): Files or folders of the running experiment
+
+        Returns:
+            dict: Disk usage, the files to delete in order, and the files kept
+        """
+        self.scan()
+        total, used, free = self._disk_usage(self.data_dir)
+        to_free = max(0, int(used - total * target_percent / 100))
+        protect = [os.path.abspath(path) for path in protect]
+
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT path, backup_size, backup_mtime, backup_time
+                FROM files ORDER BY mtime, path"""
+            ).fetchall()
+
+        kept = {"not_backed_up": 0, "changed_since_backup": 0, "protected": 0}
+        files = []
+        freed = 0
+        for path, backup_size, backup_mtime, backup_time in rows:
+            absolute = os.path.join(self.data_dir, path)
+            if any(absolute == p or absolute.startswith(p + os.sep) for p in protect):
+                kept["protected"] += 1
+                continue
+            if backup_size is None:
+                kept["not_backed_up"] += 1
+                continue
+            try:
+                stat = os.stat(absolute)
+            except OSError:
+                continue
+            if stat.st_size != backup_size or int(stat.st_mtime) != backup_mtime:
+                kept["changed_since_backup"] += 1
+                continue
+            if freed >= to_free:
+                continue
+            files.append(
+                {
+                    "path": path,
+                    "size": stat.st_size,
+                    "mtime": int(stat.st_mtime),
+                    "backup_time": backup_time,
+                }
+            )
+            freed += stat.st_size
+
+        return {
+            "usage_percent": round(100 * used / total, 1) if total else 0,
+            "target_percent": target_percent,
+            "bytes_to_free": to_free,
+            "bytes_freed": freed,
+            "target_met": freed >= to_free,
+            "files": files,
+            "kept": kept,
+        }
+
+    def apply(self, plan):
+        """
+        Delete the files of a plan that still match their backup.
+
+        Args:
+            plan (dict): As returned by plan()
+
+        Returns:
+            dict: {"files_deleted": int, "space_freed_mb": float, "deleted_files": list,
+                "errors": list}
+        """
+        summary = {
+            "files_deleted": 0,
+            "space_freed_mb": 0,
+            "deleted_files": [],
+            "errors": [],
+        }
+        for entry in plan["files"]:
+            path = os.path.join(self.data_dir, entry["path"])
+            try:
+                # the file may have been written to since the plan was made
+                stat = os.stat(path)
+                if (
+                    stat.st_size != entry["size"]
+                    or int(stat.st_mtime) != entry["mtime"]
+                ):
+                    continue
+                os.remove(path)
+            except OSError as e:
+                summary["errors"].append(f"Cannot delete {path}: {e}")
+                logging.error(f"Failed to delete {path}: {e}")
+                continue
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM files WHERE path = ?", (entry["path"],))
+            logging.info(f"Deleted backed up file: {path}")
+            summary["files_deleted"] += 1
+            summary["space_freed_mb"] += entry["size"] / (1024 * 1024)
+            summary["deleted_files"].append(path)
+        return summary
+
+    def close(self):
+        """Close the inventory database."""
+        with self._lock:
+            self._conn.close()
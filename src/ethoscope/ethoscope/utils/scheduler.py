@@ -1,9 +1,29 @@
+import atexit
 import datetime
 import json
 import logging
 import os
 import re
+import threading
 import time
+import weakref
+
+import numpy as np
+
+DAY = 86400
+# Days of active windows DailyScheduler computes at a time
+TABLE_DAYS = 7
+# Seconds between a DailyScheduler state change and its write to the state file
+STATE_SAVE_DELAY = 5.0
+
+# Schedulers with state changes not yet written to their state file
+_pending_saves = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_pending_saves():
+    for scheduler in list(_pending_saves):
+        scheduler.flush()
 
 
 class DateRangeError(Exception):
@@ -133,6 +153,12 @@ class DailyScheduler:
 
     This scheduler supports operations that run for N hours per day at specified intervals,
     designed for sleep restriction experiments that inherit from mAGO stimulators.
+
+    Periods are counted from the start time on each UTC day. The active windows of
+    the coming days are computed once into a table, and the answer of the last
+    query is kept with the time until which it holds, so that checking the
+    schedule on every frame is mostly a single comparison. The periods seen are
+    written to the state file in the background, a few seconds after they start.
     """
 
     def __init__(
@@ -141,6 +167,7 @@ class DailyScheduler:
         interval_hours=24,
         daily_start_time="00:00:00",
         state_file_path=None,
+        save_delay=STATE_SAVE_DELAY,
     ):
         """
         Initialize daily scheduler for time-restricted operations.
@@ -150,6 +177,7 @@ class DailyScheduler:
             interval_hours (float): Hours between the start of active periods
             daily_start_time (str): Daily start time in HH:MM:SS format
             state_file_path (str): Path to state persistence file (optional)
+            save_delay (float): Seconds between a state change and its write to the state file
 
         Example:
             # 8 hours active every 24 hours starting at 9 AM
@@ -173,11 +201,27 @@ class DailyScheduler:
         self._interval_hours = interval_hours
         self._daily_start_time = daily_start_time
         self._state_file_path = state_file_path
+        self._save_delay = save_delay
 
         # Parse start time
         self._start_time_seconds = self._parse_time_string(daily_start_time)
+        self._interval_seconds = interval_hours * 3600
+        self._active_seconds = daily_duration_hours * 3600
+
+        # Active windows of the table: edges alternate window start and end
+        self._edges = np.empty(0)
+        self._periods = []
+        self._table_start = self._table_end = 0
+        # Last answer, valid for valid_from <= t < valid_until
+        self._valid_from = float("inf")
+        self._valid_until = float("-inf")
+        self._active = False
+        self._period = None
 
         # State tracking
+        self._state_lock = threading.Lock()
+        self._save_timer = None
+        self._dirty = False
         self._state = self._load_state() if state_file_path else {}
 
         logging.info(
@@ -202,6 +246,21 @@ class DailyScheduler:
                 f"Invalid time format: {time_str}. Expected HH:MM:SS"
             ) from e
 
+    def set_state_file(self, state_file_path):
+        """
+        Persist the scheduler state to another file, loading the state it holds.
+
+        Args:
+            state_file_path (str): Path to state persistence file
+        """
+        self.flush()
+        with self._state_lock:
+            self._state_file_path = state_file_path
+            self._state = self._load_state()
+        # periods already seen are recorded again in the new state
+        self._valid_from = float("inf")
+        self._valid_until = float("-inf")
+
     def _load_state(self):
         """Load scheduler state from file."""
         if not self._state_file_path or not os.path.exists(self._state_file_path):
@@ -215,17 +274,109 @@ class DailyScheduler:
             return {}
 
     def _save_state(self):
-        """Save scheduler state to file."""
+        """Save scheduler state to file, replacing it atomically."""
         if not self._state_file_path:
             return
 
+        tmp_path = f"{self._state_file_path}.tmp"
         try:
             os.makedirs(os.path.dirname(self._state_file_path), exist_ok=True)
-            with open(self._state_file_path, "w") as f:
+            with open(tmp_path, "w") as f:
                 json.dump(self._state, f, indent=2)
+            os.replace(tmp_path, self._state_file_path)
         except OSError as e:
             logging.error(f"Could not save scheduler state: {e}")
 
+    def _schedule_save(self):
+        """Write the state after save_delay seconds. Called with the state lock held."""
+        self._dirty = True
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(self._save_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+            _pending_saves.add(self)
+
+    def flush(self):
+        """Write pending state changes to the state file now."""
+        with self._state_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            _pending_saves.discard(self)
+            if self._dirty:
+                self._save_state()
+                self._dirty = False
+
+    def _build_table(self, t):
+        """
+        Compute the active windows from the day before t to TABLE_DAYS days later.
+
+        Each UTC day counts periods from its own start time; before it, the period
+        that started one interval earlier applies. Windows are clipped to the day
+        they are counted in, as the next day starts counting again.
+        """
+        first_day = int(t // DAY) - 1
+        edges = []
+        periods = []
+
+        def add(lo, hi, period_start):
+            if lo < hi:
+                edges.extend((lo, hi))
+                periods.append((period_start, period_start + self._active_seconds))
+
+        for day in range(first_day, first_day + TABLE_DAYS + 1):
+            day_start = day * DAY
+            day_end = day_start + DAY
+            start_timestamp = day_start + self._start_time_seconds
+
+            previous_start = start_timestamp + (-1 * self._interval_seconds)
+            add(
+                max(previous_start, day_start),
+                min(previous_start + self._active_seconds, start_timestamp),
+                previous_start,
+            )
+            k = 0
+            period_start = start_timestamp
+            while period_start < day_end:
+                add(
+                    period_start,
+                    min(period_start + self._active_seconds, day_end),
+                    period_start,
+                )
+                k += 1
+                period_start = start_timestamp + (k * self._interval_seconds)
+
+        self._edges = np.array(edges, dtype=np.float64)
+        self._periods = periods
+        self._table_start = first_day * DAY
+        self._table_end = (first_day + TABLE_DAYS + 1) * DAY
+
+    def _locate(self, t):
+        """Find the window of t in the table and cache the answer until its next edge."""
+        if not self._table_start <= t < self._table_end:
+            self._build_table(t)
+
+        i = int(np.searchsorted(self._edges, t, side="right"))
+        self._active = i % 2 == 1
+        self._period = i // 2 if self._active else None
+        self._valid_from = self._edges[i - 1] if i > 0 else self._table_start
+        self._valid_until = self._edges[i] if i < len(self._edges) else self._table_end
+
+        if self._active and self._state_file_path:
+            self._record_period(t)
+
+    def _record_period(self, t):
+        period_start, period_end = self._periods[self._period]
+        period_key = f"period_{int(period_start)}"
+        with self._state_lock:
+            if period_key not in self._state:
+                self._state[period_key] = {
+                    "start_time": period_start,
+                    "end_time": period_end,
+                    "first_activity": t,
+                }
+                self._schedule_save()
+
     def is_active_period(self, t=None):
         """
         Check if current time is within an active period.
@@ -239,43 +390,9 @@ class DailyScheduler:
         if t is None:
             t = time.time()
 
-        # Get current time components
-        dt = datetime.datetime.fromtimestamp(t)
-        dt.hour * 3600 + dt.minute * 60 + dt.second
-
-        # Calculate time since the most recent start time
-        days_since_epoch = int(t // 86400)  # 86400 seconds per day
-        start_timestamp = days_since_epoch * 86400 + self._start_time_seconds
-
-        # Handle interval periods (multiple periods per day or multi-day intervals)
-        interval_seconds = self._interval_hours * 3600
-        active_seconds = self._daily_duration_hours * 3600
-
-        # Find the most recent period start
-        periods_since_start = int((t - start_timestamp) // interval_seconds)
-        if t < start_timestamp:
-            periods_since_start = -1
-
-        current_period_start = start_timestamp + (
-            periods_since_start * interval_seconds
-        )
-        current_period_end = current_period_start + active_seconds
-
-        # Check if we're in the active window
-        is_active = current_period_start <= t < current_period_end
-
-        # Update state tracking
-        if is_active and self._state_file_path:
-            period_key = f"period_{int(current_period_start)}"
-            if period_key not in self._state:
-                self._state[period_key] = {
-                    "start_time": current_period_start,
-                    "end_time": current_period_end,
-                    "first_activity": t,
-                }
-                self._save_state()
-
-        return is_active
+        if not self._valid_from <= t < self._valid_until:
+            self._locate(t)
+        return self._active
 
     def get_next_active_period(self, t=None):
         """
@@ -334,25 +451,13 @@ class DailyScheduler:
         Returns:
             float: Remaining seconds in active period, 0 if not active
         """
-        if not self.is_active_period(t):
-            return 0
-
         if t is None:
             t = time.time()
 
-        # Calculate current period end
-        days_since_epoch = int(t // 86400)
-        start_timestamp = days_since_epoch * 86400 + self._start_time_seconds
-
-        interval_seconds = self._interval_hours * 3600
-        active_seconds = self._daily_duration_hours * 3600
-
-        periods_since_start = int((t - start_timestamp) // interval_seconds)
-        current_period_start = start_timestamp + (
-            periods_since_start * interval_seconds
-        )
-        current_period_end = current_period_start + active_seconds
+        if not self.is_active_period(t):
+            return 0
 
+        _, current_period_end = self._periods[self._period]
         return max(0, current_period_end - t)
 
     def get_schedule_info(self):
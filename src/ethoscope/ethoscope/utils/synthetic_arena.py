@@ -0,0 +1,358 @@
+"""
+Synthetic Arena Videos
+
+Renders videos of fly arenas with known fly positions, to measure trackers
+without real recordings.
+
+The arena follows a grid ROI template (see ``roi_builders/roi_templates``): three
+black targets are drawn where :class:`~ethoscope.roi_builders.target_roi_builder.TargetGridROIBuilder`
+expects them, and the tubes are laid out by the same builder, so the ROIs found on
+the video match the ones the flies were placed in.
+
+Each fly moves according to a small locomotion model with four states: walking
+(a correlated random walk bouncing off the tube walls), resting and sleeping
+(immobile, for short and long bouts) and jumping (a single-frame displacement of
+several body lengths). The brightness of the whole image drifts slowly and
+Gaussian noise is added to every frame.
+
+Example:
+    >>> from ethoscope.utils.synthetic_arena import SyntheticArena
+    >>> arena = SyntheticArena(n_frames=250, flies_per_roi=1, seed=1)
+    >>> ground_truth = arena.write("/tmp/arena.avi")
+
+The ground truth is written next to the video, as ``<video>.json``.
+"""
+
+import json
+import logging
+import math
+import os
+
+import cv2
+import numpy as np
+
+from ethoscope.roi_builders.target_roi_builder import TargetGridROIBuilder
+from ethoscope.roi_builders.template import ROITemplate
+
+TEMPLATES_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)),
+    "roi_builders",
+    "roi_templates",
+    "builtin",
+)
+DEFAULT_TEMPLATE = "sleep_monitor_20tube"
+
+# Per-frame probabilities of leaving a state, and where to go
+DEFAULT_LOCOMOTION = {
+    "walk": {"rest": 0.02, "sleep": 0.002, "jump": 0.003},
+    "rest": {"walk": 0.05},
+    "sleep": {"walk": 0.004},
+    "jump": {"walk": 1.0},
+}
+
+# Body size relative to the frame width; 18x7 pixels at 960 pixels, the size of a fly
+# in the standard ethoscope field of view
+FLY_LENGTH = 0.019
+FLY_WIDTH = 0.0073
+FLY_INTENSITY = 40
+# Walking speed in body lengths per second, and turning noise in radians per frame
+WALK_SPEED = (1.0, 4.0)
+TURN_NOISE = 0.25
+JUMP_DISTANCE = (3.0, 8.0)
+
+
+def load_grid_template(name=DEFAULT_TEMPLATE):
+    """
+    Return the TargetGridROIBuilder parameters of a grid ROI template.
+
+    :param name: the name of a builtin template (e.g. ``sleep_monitor_20tube``), or the path of a template file
+    :type name: str
+    :return: keyword arguments of :class:`~ethoscope.roi_builders.target_roi_builder.TargetGridROIBuilder`
+    :rtype: dict
+    """
+    path = name if os.path.exists(name) else os.path.join(TEMPLATES_DIR, f"{name}.json")
+    params = ROITemplate.load(path).to_legacy_params()
+    if not params:
+        raise ValueError(f"{name} is not a grid template with targets")
+    return params
+
+
+class SyntheticArena:
+    def __init__(
+        self,
+        template=DEFAULT_TEMPLATE,
+        resolution=(960, 720),
+        fps=25,
+        n_frames=500,
+        flies_per_roi=1,
+        locomotion=None,
+        light_drift=0.1,
+        light_drift_period=60.0,
+        noise=4.0,
+        seed=0,
+    ):
+        """
+        A fly arena, its flies and their trajectories.
+
+        :param template: name or path of a grid ROI template
+        :type template: str
+        :param resolution: width and height of the frames
+        :type resolution: (int, int)
+        :param fps: frame rate of the video
+        :type fps: float
+        :param n_frames: number of frames
+        :type n_frames: int
+        :param flies_per_roi: number of flies in each ROI
+        :type flies_per_roi: int
+        :param locomotion: per-frame transition probabilities between the ``walk``, ``rest``, ``sleep``
+            and ``jump`` states (default: :data:`DEFAULT_LOCOMOTION`)
+        :type locomotion: dict
+        :param light_drift: relative amplitude of the slow change of brightness
+        :type light_drift: float
+        :param light_drift_period: period of the change of brightness, in seconds
+        :type light_drift_period: float
+        :param noise: standard deviation of the pixel noise, in grey levels
+        :type noise: float
+        :param seed: seed of the random number generator; the same parameters and seed render the same video
+        :type seed: int
+        """
+        self._template = template
+        self._resolution = tuple(resolution)
+        self._fps = fps
+        self._n_frames = n_frames
+        self._flies_per_roi = flies_per_roi
+        self._locomotion = locomotion or DEFAULT_LOCOMOTION
+        self._light_drift = light_drift
+        self._light_drift_period = light_drift_period
+        self._noise = noise
+        self._seed = seed
+        self._rng = np.random.default_rng(seed)
+
+        w, h = self._resolution
+        self._fly_length = FLY_LENGTH * w
+        self._fly_width = FLY_WIDTH * w
+
+        self._grid_params = load_grid_template(template)
+        self._reference_points = self._target_positions()
+        builder = TargetGridROIBuilder(**self._grid_params)
+        self._rois = builder.rois_from_targets(self._reference_points)
+        self._background = self._render_background()
+        self._trajectories, self._states = self._simulate()
+
+    @property
+    def rois(self):
+        """
+        :return: the ROIs the flies live in, as the grid ROI builder lays them out
+        :rtype: list(:class:`~ethoscope.core.roi.ROI`)
+        """
+        return self._rois
+
+    @property
+    def reference_points(self):
+        """
+        :return: the centres of the targets A (upper-right), B (lower-right) and C (lower-left)
+        :rtype: :class:`~numpy.ndarray`
+        """
+        return self._reference_points
+
+    @property
+    def trajectories(self):
+        """
+        :return: the position of each fly at each frame, shape ``(n_frames, n_flies, 2)``; flies are ordered by ROI
+        :rtype: :class:`~numpy.ndarray`
+        """
+        return self._trajectories
+
+    def _target_positions(self):
+        w, h = self._resolution
+        # the same inset as the targets printed on the arenas, leaving room for the tubes
+        # that extend past them when the template margins are negative
+        x_inset, y_inset = 0.08 * w, 0.06 * h
+        return np.array(
+            [
+                (w - x_inset, y_inset),
+                (w - x_inset, h - y_inset),
+                (x_inset, h - y_inset),
+            ],
+            dtype=np.float32,
+        )
+
+    def _render_background(self):
+        w, h = self._resolution
+        background = np.full((h, w), 190, dtype=np.uint8)
+        for roi in self._rois:
+            # tubes are slightly brighter than the arena, with darker walls
+            cv2.drawContours(background, [roi.polygon], 0, 215, -1)
+            cv2.drawContours(background, [roi.polygon], 0, 150, 1)
+        radius = int(round(0.018 * w))
+        for x, y in self._reference_points:
+            cv2.circle(
+                background, (int(round(x)), int(round(y))), radius, 0, -1, cv2.LINE_AA
+            )
+        return background
+
+    def _walkable_box(self, roi):
+        x, y, w, h = roi.rectangle
+        margin = self._fly_length / 2 + 2
+        return x + margin, y + margin, x + w - margin, y + h - margin
+
+    def _next_state(self, state):
+        draw = self._rng.random()
+        for target, probability in self._locomotion.get(state, {}).items():
+            if draw < probability:
+                return target
+            draw -= probability
+        return state
+
+    def _simulate(self):
+        rng = self._rng
+        n_flies = len(self._rois) * self._flies_per_roi
+        positions = np.zeros((self._n_frames, n_flies, 2))
+        states = np.empty((self._n_frames, n_flies), dtype="<U5")
+        speed_range = np.array(WALK_SPEED) * self._fly_length / self._fps
+
+        for roi_i, roi in enumerate(self._rois):
+            x0, y0, x1, y1 = self._walkable_box(roi)
+            for k in range(self._flies_per_roi):
+                fly = roi_i * self._flies_per_roi + k
+                pos = np.array([rng.uniform(x0, x1), rng.uniform(y0, y1)])
+                heading = rng.uniform(0, 2 * math.pi)
+                speed = rng.uniform(*speed_range)
+                state = "walk" if rng.random() < 0.7 else "rest"
+                for i in range(self._n_frames):
+                    if state == "walk":
+                        heading += rng.normal(0, TURN_NOISE)
+                        pos = pos + speed * np.array(
+                            [math.cos(heading), math.sin(heading)]
+                        )
+                    elif state == "jump":
+                        heading = rng.uniform(0, 2 * math.pi)
+                        distance = rng.uniform(*JUMP_DISTANCE) * self._fly_length
+                        pos = pos + distance * np.array(
+                            [math.cos(heading), math.sin(heading)]
+                        )
+                    # bounce off the walls of the tube
+                    for axis, (low, high) in enumerate(((x0, x1), (y0, y1))):
+                        if pos[axis] < low:
+                            pos[axis] = min(2 * low - pos[axis], high)
+                        elif pos[axis] > high:
+                            pos[axis] = max(2 * high - pos[axis], low)
+                        else:
+                            continue
+                        heading = math.pi - heading if axis == 0 else -heading
+                    positions[i, fly] = pos
+                    states[i, fly] = state
+                    state = self._next_state(state)
+                    if state == "walk" and states[i, fly] != "walk":
+                        speed = rng.uniform(*speed_range)
+        return positions, states
+
+    def frames(self):
+        """
+        Render the video, frame by frame.
+
+        :return: an iterator of grey frames
+        :rtype: iterator(:class:`~numpy.ndarray`)
+        """
+        noise = np.empty(self._background.shape, dtype=np.float32)
+        axes = (
+            max(1, int(round(self._fly_length / 2))),
+            max(1, int(round(self._fly_width / 2))),
+        )
+        previous = self._trajectories[0]
+        angles = np.zeros(self._trajectories.shape[1])
+        for i in range(self._n_frames):
+            frame = self._background.copy()
+            current = self._trajectories[i]
+            moved = np.hypot(*(current - previous).T) > 0.5
+            # flies face where they walk, and keep their orientation when they stop
+            angles[moved] = np.degrees(np.arctan2(*(current - previous)[moved].T[::-1]))
+            for (x, y), angle in zip(current, angles, strict=True):
+                cv2.ellipse(
+                    frame,
+                    (int(round(x)), int(round(y))),
+                    axes,
+                    float(angle),
+                    0,
+                    360,
+                    FLY_INTENSITY,
+                    -1,
+                    cv2.LINE_AA,
+                )
+            previous = current
+
+            light = 1 + self._light_drift * math.sin(
+                2 * math.pi * i / (self._fps * self._light_drift_period)
+            )
+            frame = frame.astype(np.float32) * light
+            if self._noise:
+                # OpenCV's generator is several times faster than numpy's for whole frames;
+                # it is global, so it is seeded for each frame
+                cv2.setRNGSeed(self._seed * 1000003 + i)
+                cv2.randn(noise, 0, self._noise)
+                frame += noise
+            yield np.clip(frame, 0, 255).astype(np.uint8)
+
+    def ground_truth(self):
+        """
+        :return: the parameters of the arena, its ROIs and the trajectory of each fly, as JSON-serialisable data
+        :rtype: dict
+        """
+        flies = []
+        for fly in range(self._trajectories.shape[1]):
+            flies.append(
+                {
+                    "id": fly,
+                    "roi": self._rois[fly // self._flies_per_roi].idx,
+                    "positions": np.round(self._trajectories[:, fly], 2).tolist(),
+                    "states": "".join(s[0] for s in self._states[:, fly]),
+                }
+            )
+        return {
+            "template": self._template,
+            "grid": self._grid_params,
+            "resolution": list(self._resolution),
+            "fps": self._fps,
+            "n_frames": self._n_frames,
+            "flies_per_roi": self._flies_per_roi,
+            "fly_size": [self._fly_length, self._fly_width],
+            "light_drift": self._light_drift,
+            "noise": self._noise,
+            "seed": self._seed,
+            "reference_points": self._reference_points.tolist(),
+            "rois": [
+                {"idx": roi.idx, "polygon": roi.polygon.reshape(-1, 2).tolist()}
+                for roi in self._rois
+            ],
+            "flies": flies,
+        }
+
+    def write(self, path, fourcc="MJPG"):
+        """
+        Write the video and its ground truth (``<path>.json``).
+
+        :param path: the video file to write, e.g. ``arena.avi``
+        :type path: str
+        :param fourcc: the codec of the video
+        :type fourcc: str
+        :return: the ground truth, see :meth:`ground_truth`
+        :rtype: dict
+        """
+        writer = cv2.VideoWriter(
+            path, cv2.VideoWriter_fourcc(*fourcc), self._fps, self._resolution
+        )
+        if not writer.isOpened():
+            raise OSError(f"Could not open {path} for writing with codec {fourcc}")
+        try:
+            for frame in self.frames():
+                writer.write(cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR))
+        finally:
+            writer.release()
+
+        ground_truth = self.ground_truth()
+        with open(f"{path}.json", "w") as f:
+            json.dump(ground_truth, f)
+        logging.info(
+            f"Wrote {self._n_frames} frames of {len(ground_truth['flies'])} flies to {path}"
+        )
+        return ground_truth
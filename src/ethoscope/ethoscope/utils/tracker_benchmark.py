@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+Accuracy and speed benchmark of the trackers, on synthetic arena videos.
+
+Renders one video per scenario with :mod:`ethoscope.utils.synthetic_arena`, runs
+each tracker over it through a :class:`~ethoscope.core.monitor.Monitor`, and
+compares the positions written by the monitor with the ground truth:
+
+* positional error: distance between each detection and the fly it is matched to
+* missed: fly-frames without a detection within ``match_distance``
+* false positives: detections not matched to any fly
+* identity swaps: times a fly is matched to a different detection slot of its ROI
+  than in the previous frame where it was matched
+* fps: frames tracked per second of wall time
+
+Results are written as JSON with sorted keys and rounded values, so the files
+of two commits can be diffed. Only ``fps`` depends on the machine.
+
+Examples:
+    ethoscope-tracker-benchmark -o benchmark.json
+    ethoscope-tracker-benchmark -o benchmark.json --frames 250 --flies 1 --trackers AdaptiveBGModel
+    ethoscope-tracker-benchmark -o benchmark.json --haar-cascade fly_cascade.xml
+"""
+
+import argparse
+import importlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from ethoscope.core.monitor import Monitor
+from ethoscope.core.roi import ROI
+from ethoscope.hardware.input.cameras import MovieVirtualCamera
+from ethoscope.utils.synthetic_arena import DEFAULT_TEMPLATE, SyntheticArena
+
+# Imported when run, so one tracker missing a dependency does not stop the others
+TRACKERS = {
+    "AdaptiveBGModel": "ethoscope.trackers.adaptive_bg_tracker",
+    "MultiFlyTracker": "ethoscope.trackers.multi_fly_tracker",
+    "HaarTracker": "ethoscope.trackers.multi_fly_tracker",
+}
+
+# Detections further than this many fly lengths from every fly are not matched
+MATCH_DISTANCE = 1.5
+
+RESULTS_VERSION = 1
+
+
+class _PositionRecorder:
+    """Stands in for a result writer, keeping the absolute positions written by the monitor."""
+
+    def __init__(self):
+        self.positions = {}
+        self.n_frames = 0
+
+    def write(self, t, roi, data_rows):
+        self.positions.setdefault(t, {})[roi.idx] = [
+            (
+                row["x"].to_absolute(roi),
+                row["y"].to_absolute(roi),
+                bool(row["is_inferred"]) if "is_inferred" in row else False,
+            )
+            for row in data_rows
+        ]
+
+    def flush(self, t, img=None):
+        self.n_frames += 1
+
+
+class _ColourCamera:
+    """Gives the grey frames of a camera to trackers that expect BGR images."""
+
+    def __init__(self, camera):
+        self._camera = camera
+
+    def __iter__(self):
+        for t, frame in self._camera:
+            yield t, cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+
+
+def _rois(ground_truth):
+    return [
+        ROI(np.array(roi["polygon"], dtype=np.int32).reshape(1, -1, 2), idx=roi["idx"])
+        for roi in ground_truth["rois"]
+    ]
+
+
+def score(ground_truth, positions, match_distance=None):
+    """
+    Compare tracked positions with the ground truth.
+
+    :param ground_truth: the ground truth of a synthetic video, see :meth:`~ethoscope.utils.synthetic_arena.SyntheticArena.ground_truth`
+    :type ground_truth: dict
+    :param positions: for each time stamp in ms, the detections of each ROI as lists of ``(x, y, is_inferred)``
+    :type positions: dict
+    :param match_distance: the distance, in pixels, beyond which a detection is not matched to a fly
+        (default: :data:`MATCH_DISTANCE` fly lengths)
+    :type match_distance: float
+    :return: the metrics listed in the module documentation
+    :rtype: dict
+    """
+    fps = ground_truth["fps"]
+    n_frames = ground_truth["n_frames"]
+    if match_distance is None:
+        match_distance = MATCH_DISTANCE * ground_truth["fly_size"][0]
+
+    flies_by_roi = {}
+    for fly in ground_truth["flies"]:
+        flies_by_roi.setdefault(fly["roi"], []).append(fly)
+
+    frames = {}
+    for t, rois in positions.items():
+        frames[int(round(t * fps / 1000.0))] = rois
+
+    errors = []
+    missed = false_positives = inferred = swaps = 0
+    last_slot = {}
+    for i in range(n_frames):
+        detected = frames.get(i, {})
+        for roi_idx, flies in flies_by_roi.items():
+            detections = detected.get(roi_idx, [])
+            inferred += sum(1 for d in detections if d[2])
+            truth = np.array([fly["positions"][i] for fly in flies])
+            if not detections:
+                missed += len(flies)
+                continue
+            found = np.array([d[:2] for d in detections], dtype=float)
+            distances = np.linalg.norm(truth[:, None, :] - found[None, :, :], axis=2)
+            fly_rows, slots = linear_sum_assignment(distances)
+            matched = 0
+            for fly_row, slot in zip(fly_rows, slots, strict=True):
+                if distances[fly_row, slot] > match_distance:
+                    continue
+                matched += 1
+                errors.append(distances[fly_row, slot])
+                fly_id = flies[fly_row]["id"]
+                if last_slot.get(fly_id, slot) != slot:
+                    swaps += 1
+                last_slot[fly_id] = slot
+            missed += len(flies) - matched
+            false_positives += len(detections) - matched
+
+    n_truth = n_frames * len(ground_truth["flies"])
+    errors = np.array(errors)
+    return {
+        "positional_error_px": {
+            "mean": float(errors.mean()) if errors.size else None,
+            "median": float(np.median(errors)) if errors.size else None,
+            "p95": float(np.percentile(errors, 95)) if errors.size else None,
+        },
+        "matched": int(errors.size),
+        "missed": missed,
+        "missed_fraction": missed / n_truth if n_truth else 0.0,
+        "false_positives": false_positives,
+        "inferred": inferred,
+        "identity_swaps": swaps,
+        "frames_with_positions": len(frames),
+    }
+
+
+def run_tracker(video_path, ground_truth, tracker_class, tracker_kwargs=None):
+    """
+    Track a synthetic video with a tracker, through a Monitor, and score the result.
+
+    :param video_path: the video
+    :type video_path: str
+    :param ground_truth: its ground truth
+    :type ground_truth: dict
+    :param tracker_class: a tracker class, e.g. :class:`~ethoscope.trackers.adaptive_bg_tracker.AdaptiveBGModel`
+    :param tracker_kwargs: keyword arguments of the tracker (e.g. ``data``)
+    :type tracker_kwargs: dict
+    :return: the metrics of :func:`score`, plus ``frames``, ``fps`` and ``seconds``
+    :rtype: dict
+    """
+    camera = MovieVirtualCamera(video_path)
+    colour = tracker_class.__name__ == "HaarTracker"
+    frames = _ColourCamera(camera) if colour else camera
+    monitor = Monitor(
+        frames, tracker_class, _rois(ground_truth), **(tracker_kwargs or {})
+    )
+    recorder = _PositionRecorder()
+    start = time.perf_counter()
+    try:
+        monitor.run(result_writer=recorder)
+    finally:
+        seconds = time.perf_counter() - start
+        camera._close()
+
+    result = score(ground_truth, recorder.positions)
+    result["frames"] = recorder.n_frames
+    result["seconds"] = seconds
+    result["fps"] = recorder.n_frames / seconds if seconds else 0.0
+    return result
+
+
+def _tracker_kwargs(name, haar_cascade=None):
+    if name != "HaarTracker":
+        return {}
+    if haar_cascade is None:
+        return None
+    return {
+        "data": {
+            "maxN": 50,
+            "cascade": haar_cascade,
+            "scaleFactor": 1.1,
+            "minNeighbors": 3,
+            "flags": 0,
+            "minSize": (15, 15),
+            "maxSize": (20, 20),
+            "visualise": False,
+        }
+    }
+
+
+def _rounded(value, digits=3):
+    if isinstance(value, float):
+        return round(value, digits)
+    if isinstance(value, dict):
+        return {k: _rounded(v, digits) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_rounded(v, digits) for v in value]
+    return value
+
+
+def run_benchmark(
+    flies=(1, 3),
+    trackers=tuple(TRACKERS),
+    n_frames=500,
+    resolution=(960, 720),
+    template=DEFAULT_TEMPLATE,
+    seed=0,
+    haar_cascade=None,
+    video_dir=None,
+):
+    """
+    Run every tracker on one synthetic video per number of flies per ROI.
+
+    :param flies: the numbers of flies per ROI, one scenario each
+    :param trackers: names of the trackers to run, keys of :data:`TRACKERS`
+    :param n_frames: number of frames of each video
+    :param resolution: width and height of the videos
+    :param template: the grid ROI template of the arena
+    :param seed: seed of the videos
+    :param haar_cascade: cascade file for :class:`~ethoscope.trackers.multi_fly_tracker.HaarTracker`; it is skipped without one
+    :param video_dir: where to keep the videos and their ground truth (default: a temporary directory)
+    :return: the results, as written by :func:`main`
+    :rtype: dict
+    """
+    results = {
+        "version": RESULTS_VERSION,
+        "opencv": cv2.__version__,
+        "scenarios": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        video_dir = video_dir or tmp_dir
+        os.makedirs(video_dir, exist_ok=True)
+        for n_flies in flies:
+            name = (
+                f"{n_flies}_fly_per_roi" if n_flies == 1 else f"{n_flies}_flies_per_roi"
+            )
+            arena = SyntheticArena(
+                template=template,
+                resolution=resolution,
+                n_frames=n_frames,
+                flies_per_roi=n_flies,
+                seed=seed,
+            )
+            video_path = os.path.join(video_dir, f"{name}.avi")
+            ground_truth = arena.write(video_path)
+
+            scenario = {
+                "parameters": {
+                    key: ground_truth[key]
+                    for key in (
+                        "template",
+                        "resolution",
+                        "fps",
+                        "n_frames",
+                        "flies_per_roi",
+                        "light_drift",
+                        "noise",
+                        "seed",
+                    )
+                },
+                "trackers": {},
+            }
+            for tracker_name in trackers:
+                kwargs = _tracker_kwargs(tracker_name, haar_cascade)
+                if kwargs is None:
+                    scenario["trackers"][tracker_name] = {
+                        "skipped": "no Haar cascade given"
+                    }
+                    continue
+                logging.info(f"Benchmarking {tracker_name} on {name}")
+                try:
+                    tracker_class = getattr(
+                        importlib.import_module(TRACKERS[tracker_name]), tracker_name
+                    )
+                    result = run_tracker(
+                        video_path, ground_truth, tracker_class, kwargs
+                    )
+                except Exception as e:
+                    logging.error(f"{tracker_name} failed on {name}: {e}")
+                    result = {"error": f"{type(e).__name__}: {e}"}
+                scenario["trackers"][tracker_name] = result
+            results["scenarios"][name] = scenario
+    return _rounded(results)
+
+
+def _resolution(value):
+    w, h = value.lower().split("x")
+    return int(w), int(h)
+
+
+def _build_parser():
+    parser = argparse.ArgumentParser(
+        prog="ethoscope-tracker-benchmark",
+        description="Measure tracker accuracy and speed on synthetic arena videos.",
+    )
+    parser.add_argument(
+        "-o", "--output", required=True, help="JSON file to write the results to"
+    )
+    parser.add_argument(
+        "-n", "--frames", type=int, default=500, help="Frames per video (default: 500)"
+    )
+    parser.add_argument(
+        "--flies",
+        type=int,
+        nargs="+",
+        default=[1, 3],
+        help="Flies per ROI; one video each (default: 1 3)",
+    )
+    parser.add_argument(
+        "--trackers",
+        nargs="+",
+        choices=list(TRACKERS),
+        default=list(TRACKERS),
+        help="Trackers to run (default: all)",
+    )
+    parser.add_argument(
+        "--resolution",
+        type=_resolution,
+        default=(960, 720),
+        help="Frame size as WxH (default: 960x720)",
+    )
+    parser.add_argument(
+        "--template",
+        default=DEFAULT_TEMPLATE,
+        help=f"Grid ROI template name or file (default: {DEFAULT_TEMPLATE})",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the videos")
+    parser.add_argument(
+        "--haar-cascade",
+        help="Cascade file for HaarTracker, which is skipped without one",
+    )
+    parser.add_argument(
+        "--keep-videos", metavar="DIR", help="Keep the videos and ground truth in DIR"
+    )
+    return parser
+
+
+def main(argv=None):
+    args = _build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    results = run_benchmark(
+        flies=args.flies,
+        trackers=args.trackers,
+        n_frames=args.frames,
+        resolution=args.resolution,
+        template=args.template,
+        seed=args.seed,
+        haar_cascade=args.haar_cascade,
+        video_dir=args.keep_videos,
+    )
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+    for name, scenario in results["scenarios"].items():
+        for tracker_name, result in scenario["trackers"].items():
+            if "positional_error_px" not in result:
+                print(
+                    f"{name} {tracker_name}: {result.get('skipped') or result.get('error')}"
+                )
+                continue
+            print(
+                f"{name} {tracker_name}: error {result['positional_error_px']['mean']} px, "
+                f"missed {result['missed_fraction']:.1%}, "
+                f"{result['identity_swaps']} swaps, {result['fps']} fps"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
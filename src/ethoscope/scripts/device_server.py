@@ -19,6 +19,8 @@ from ethoscope.control.tracking import ControlThread
 from ethoscope.hardware.interfaces import interfaces
 from ethoscope.io.cache import DatabasesInfo
 from ethoscope.utils import pi
+from ethoscope.utils.logs import log_reader
+from ethoscope.utils.retention import USAGE_TARGET, RetentionManager
 
 try:
     from cheroot.wsgi import Server as WSGIServer  # noqa: F401
@@ -43,6 +45,9 @@ update_machine_json_data = {}
 /data/databases/<id>                    GET     get a comprehensive list of available databases on the machine and their statuses
 /data/listfiles/<category>/<id>         GET     provides a list of files in the ethoscope data folders, that were either uploaded or generated (masks, videos, etc).
 /data/log/<id>                          GET     fetch the journalctl log
+/data/logs/<id>                         GET     one page of log entries, newest first, filtered by ?since=&until=&level=&grep=&limit=&cursor=&source=
+/data/retention/<id>                    GET     dry run of the deletions that would bring disk usage down to ?target=<percent>
+/data/backups/<id>                      POST    the node confirms the data files it holds a backup of
 
 /machine/<id>                           GET     information about the ethoscope that is not changing in time such as hardware specs and configuration parameters
 /module/<id>                            GET
@@ -981,6 +986,56 @@ def user_options(id):
     }
 
 
+def _active_experiment_paths():
+    """
+    Folders of the experiment running on the device, which are never deleted.
+    """
+    info = send_command("info")
+    if not isinstance(info, dict) or info.get("status", "stopped") == "stopped":
+        return []
+
+    if info.get("backup_filename"):
+        # tracking: YYYY-MM-DD_HH-MM-SS_<machine_id>.db
+        stamp = "_".join(info["backup_filename"].split("_")[:2])
+    else:
+        stamp = datetime.datetime.fromtimestamp(info.get("time", 0)).strftime(
+            "%Y-%m-%d_%H-%M-%S"
+        )
+    return [
+        os.path.join(folder, _MACHINE_ID, _MACHINE_NAME, stamp)
+        for folder in (_ETHOSCOPE_TRACKING_DIR, _ETHOSCOPE_VIDEOS_DIR)
+    ]
+
+
+@api.get("/data/retention/<id>")
+@error_decorator
+def retention_plan(id):
+    """
+    Dry run of the retention manager: the backed up files that would be deleted
+    to bring disk usage down to ?target=<percent>, and why other files are kept.
+    """
+    if id != _MACHINE_ID:
+        raise WrongMachineID
+
+    target = float(bottle.request.query.get("target", USAGE_TARGET))
+    return RETENTION.plan(target, protect=_active_experiment_paths())
+
+
+@api.post("/data/backups/<id>")
+@error_decorator
+def confirm_backups(id):
+    """
+    The node confirms the files it holds a copy of, after a backup.
+    Expects {"files": [{"path": "results/...", "size": int, "mtime": float}, ...]}
+    with paths relative to the data folder.
+    """
+    if id != _MACHINE_ID:
+        raise WrongMachineID
+
+    data = bottle.request.json or {}
+    return RETENTION.confirm_backups(data.get("files", []))
+
+
 @api.get("/data/log/<id>")
 @error_decorator
 def get_log(id, service="ethoscope_listener"):
@@ -1011,6 +1066,30 @@ def get_log(id, service="ethoscope_listener"):
     return {"message": output}
 
 
+@api.get("/data/logs/<id>")
+@error_decorator
+def get_log_page(id):
+    """
+    One page of log entries, newest first, from the journal of the ethoscope
+    services or from ?source=light. Filtered by ?since= and ?until= (epoch seconds
+    or ISO dates), ?level= (minimum severity), ?grep= (regular expression) and
+    ?limit=. The returned cursor, passed back as ?cursor=, gives the older entries.
+    """
+    if id != _MACHINE_ID:
+        raise WrongMachineID
+
+    query = bottle.request.query
+    reader = log_reader(query.get("source", "journal"))
+    return reader.page(
+        since=query.get("since"),
+        until=query.get("until"),
+        level=query.get("level"),
+        grep=query.get("grep"),
+        limit=query.get("limit"),
+        cursor=query.get("cursor"),
+    )
+
+
 def close(exit_status=0):
     os._exit(exit_status)
 
@@ -1061,7 +1140,7 @@ if __name__ == "__main__":
         action="store_true",
     )
 
-    (options, args) = parser.parse_args()
+    options, args = parser.parse_args()
     option_dict = vars(options)
 
     PORT = option_dict["port"]
@@ -1144,6 +1223,7 @@ if __name__ == "__main__":
         zc.register_service(serviceInfo)
 
         DB_INFO = DatabasesInfo(device_name=_MACHINE_NAME)
+        RETENTION = RetentionManager(_ETHOSCOPE_DIR)
 
         # the webserver on the ethoscope side is quite basic so we can safely run the original bottle version based on WSGIRefServer()
         bottle.run(api, host="0.0.0.0", port=PORT, debug=DEBUG, quiet=True)
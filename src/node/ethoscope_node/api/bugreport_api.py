@@ -3,30 +3,159 @@ Bug Report API Module
 
 Generates comprehensive bug reports for debugging by collecting system
 information from the node and all connected ethoscope devices.
+
+Each piece of information (node logs, git version, the machine info and log of each
+device, ...) is a source, collected in a thread pool. Every source has its own
+timeout and the whole report a deadline; sources that fail or do not answer in time
+are listed in the errors of the report. The report is streamed as a tar.gz archive
+with one file per source, each added as soon as it is collected.
 """
 
 import datetime
+import io
+import json
 import platform
 import shutil
 import socket
 import subprocess
 import sys
+import tarfile
+import time
+import zlib
+from collections.abc import Callable, Iterator
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from typing import Any
 
 import bottle
 import netifaces
 
+from ethoscope_node.utils.configuration import thaw
+
 from .base import BaseAPI, error_decorator
 
 # Report version for tracking schema changes
-REPORT_VERSION = "1.0"
+REPORT_VERSION = "2.0"
 
 # Default and maximum log lines
 DEFAULT_LOG_LINES = 500
 MAX_LOG_LINES = 5000
 
-# Device request timeout in seconds
-DEVICE_TIMEOUT = 5
+# Seconds each source may take: device requests, node logs, anything else
+DEVICE_TIMEOUT = 15
+LOG_TIMEOUT = 30
+SOURCE_TIMEOUT = 10
+# Seconds after which the report is sent with whatever was collected
+REPORT_DEADLINE = 60
+# Sources collected at the same time
+MAX_WORKERS = 32
+
+# Device statuses for which no detailed information is requested
+OFFLINE_STATUSES = ["offline", "na", "unreachable", "retired"]
+
+
+class _Source:
+    """A piece of the report, stored in the archive as `name`."""
+
+    def __init__(self, name: str, collect: Callable[[], Any], timeout: float):
+        self.name = name
+        self.collect = collect
+        self.timeout = timeout
+        # monotonic time at which collection started, once a worker picked it up
+        self.started = None
+        self.duration = None
+
+    def run(self) -> Any:
+        self.started = time.monotonic()
+        try:
+            return self.collect()
+        finally:
+            self.duration = time.monotonic() - self.started
+
+
+def collect_concurrently(
+    sources: list[_Source], deadline: float, max_workers: int = MAX_WORKERS
+) -> Iterator[tuple[_Source, Any, str | None]]:
+    """
+    Collect sources in a thread pool, yielding them as they complete.
+
+    Sources running for longer than their timeout, or still pending at the deadline,
+    are yielded with an error; their threads are left to finish in the background.
+
+    Args:
+        sources: Sources to collect
+        deadline: Seconds after which collection stops
+        max_workers: Sources collected at the same time
+
+    Yields:
+        tuple: (source, result, error), error being None on success
+    """
+    executor = ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="bugreport"
+    )
+    futures = {executor.submit(source.run): source for source in sources}
+    end = time.monotonic() + deadline
+    pending = set(futures)
+    try:
+        while pending:
+            now = time.monotonic()
+            for future in [
+                f
+                for f in pending
+                if futures[f].started is not None
+                and not f.done()
+                and now - futures[f].started >= futures[f].timeout
+            ]:
+                pending.discard(future)
+                source = futures[future]
+                yield source, None, f"no answer within {source.timeout}s"
+            if not pending or now >= end:
+                break
+
+            # wake up at the deadline or when the next running source times out
+            wake = min(
+                [end]
+                + [
+                    futures[f].started + futures[f].timeout
+                    for f in pending
+                    if futures[f].started is not None
+                ]
+            )
+            done, pending = wait(
+                pending, timeout=max(wake - now, 0), return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                try:
+                    yield futures[future], future.result(), None
+                except Exception as e:
+                    yield futures[future], None, str(e) or type(e).__name__
+
+        for future in pending:
+            yield futures[
+                future
+            ], None, f"not collected within the {deadline}s deadline"
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _StreamSink:
+    """Write-only file object for TarFile whose content is drained after each member."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
 
 
 class BugReportAPI(BaseAPI):
@@ -40,7 +169,7 @@ class BugReportAPI(BaseAPI):
 
     @error_decorator
     def _generate_bug_report(self):
-        """Generate a comprehensive bug report."""
+        """Generate a comprehensive bug report, streamed as a tar.gz archive."""
         # Parse request for optional parameters
         log_lines = DEFAULT_LOG_LINES
         try:
@@ -52,38 +181,104 @@ class BugReportAPI(BaseAPI):
         except Exception:
             pass
 
-        report = {
-            "report_metadata": self._get_report_metadata(),
-            "node": {},
-            "devices": {},
-            "backup_services": {},
-            "configuration": {},
-            "errors": [],
-        }
-
-        # Collect node information
-        report["node"] = self._collect_node_info(report["errors"], log_lines)
-
-        # Collect device information
-        report["devices"] = self._collect_devices_info(report["errors"], log_lines)
-
-        # Collect backup service status
-        report["backup_services"] = self._collect_backup_status(report["errors"])
+        errors = []
+        sources = self._node_sources(errors, log_lines)
+        sources += self._device_sources(errors, log_lines)
 
-        # Collect configuration
-        report["configuration"] = self._collect_configuration(report["errors"])
-
-        # Generate summary
-        report["_summary"] = self._generate_summary(report)
-
-        # Set response headers for download
-        bottle.response.content_type = "application/json"
+        folder = (
+            f"ethoscope-bugreport-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        )
+        bottle.response.content_type = "application/gzip"
         bottle.response.headers["Content-Disposition"] = (
-            f'attachment; filename="ethoscope-bugreport-'
-            f'{datetime.datetime.now().strftime("%Y%m%d-%H%M%S")}.json"'
+            f'attachment; filename="{folder}.tar.gz"'
+        )
+        return self._stream_report(folder, sources, errors)
+
+    def _stream_report(
+        self, folder: str, sources: list[_Source], errors: list[str]
+    ) -> Iterator[bytes]:
+        """
+        Collect the sources and yield the tar.gz archive of the report.
+
+        Each source is written to the archive, and the compressed stream flushed, as
+        soon as it is collected. report.json (sources, timings and errors) and
+        summary.txt come last.
+
+        Args:
+            folder: Top folder of the archive
+            sources: Sources to collect
+            errors: Collection errors, extended with failed and late sources
+
+        Yields:
+            bytes: Chunks of the gzip-compressed archive
+        """
+        start = time.monotonic()
+        metadata = self._get_report_metadata()
+        sink = _StreamSink()
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        tar = tarfile.open(fileobj=sink, mode="w")
+
+        def add(name: str, data: bytes) -> bytes:
+            info = tarfile.TarInfo(f"{folder}/{name}")
+            info.size = len(data)
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(data))
+            return compressor.compress(sink.drain()) + compressor.flush(
+                zlib.Z_SYNC_FLUSH
+            )
+
+        collected = {}
+        sources_status = {}
+        for source, result, error in collect_concurrently(sources, REPORT_DEADLINE):
+            sources_status[source.name] = {
+                "status": "error" if error else "ok",
+                "duration_s": (
+                    round(source.duration, 3) if source.duration is not None else None
+                ),
+            }
+            if error:
+                errors.append(f"{source.name}: {error}")
+                continue
+            collected[source.name] = result
+            yield add(source.name, self._encode_source(source.name, result))
+
+        metadata["duration_s"] = round(time.monotonic() - start, 3)
+        summary = self._generate_summary(
+            {
+                "report_metadata": metadata,
+                "node": {
+                    "disk": collected.get("node/disk.json"),
+                    "memory": collected.get("node/memory.json"),
+                    "git_version": collected.get("node/git.json"),
+                },
+                "devices": {
+                    name.split("/")[1]: value
+                    for name, value in collected.items()
+                    if name.startswith("devices/") and name.endswith("/summary.json")
+                },
+                "errors": errors,
+            }
         )
+        yield add("summary.txt", summary.encode())
+        report = {
+            "report_metadata": metadata,
+            "sources": sources_status,
+            "errors": list(errors),
+        }
+        yield add("report.json", json.dumps(report, indent=2, default=str).encode())
+
+        tar.close()
+        yield compressor.compress(sink.drain()) + compressor.flush()
 
-        return report
+    @staticmethod
+    def _encode_source(name: str, result: Any) -> bytes:
+        """Content of a source in the archive: text for .txt files, JSON otherwise."""
+        if name.endswith(".txt"):
+            if isinstance(result, list):
+                result = "\n".join(str(line) for line in result)
+            if isinstance(result, str):
+                return result.encode()
+        return json.dumps(result, indent=2, default=str).encode()
 
     def _get_report_metadata(self) -> dict[str, Any]:
         """Get report metadata."""
@@ -99,35 +294,52 @@ class BugReportAPI(BaseAPI):
             "hostname": hostname,
         }
 
-    def _collect_node_info(self, errors: list[str], log_lines: int) -> dict[str, Any]:
-        """Collect comprehensive node system information."""
-        node_info = {}
-
-        # System info
-        node_info["system"] = self._get_system_info(errors)
-
-        # Disk usage
-        node_info["disk"] = self._get_disk_info(errors)
-
-        # Memory info
-        node_info["memory"] = self._get_memory_info(errors)
-
-        # Network interfaces
-        node_info["network"] = self._get_network_info(errors)
-
-        # Git version
-        node_info["git_version"] = self._get_git_info(errors)
-
-        # Python version
-        node_info["python_version"] = sys.version
-
-        # Services status
-        node_info["services"] = self._get_services_status(errors)
-
-        # Node logs
-        node_info["log"] = self._get_node_logs(errors, log_lines)
-
-        return node_info
+    def _node_sources(self, errors: list[str], log_lines: int) -> list[_Source]:
+        """Sources of node system information."""
+        return [
+            _Source(
+                "node/system.json",
+                lambda: self._get_system_info(errors),
+                SOURCE_TIMEOUT,
+            ),
+            _Source(
+                "node/disk.json", lambda: self._get_disk_info(errors), SOURCE_TIMEOUT
+            ),
+            _Source(
+                "node/memory.json",
+                lambda: self._get_memory_info(errors),
+                SOURCE_TIMEOUT,
+            ),
+            _Source(
+                "node/network.json",
+                lambda: self._get_network_info(errors),
+                SOURCE_TIMEOUT,
+            ),
+            _Source(
+                "node/git.json", lambda: self._get_git_info(errors), SOURCE_TIMEOUT
+            ),
+            _Source("node/python.txt", lambda: sys.version, SOURCE_TIMEOUT),
+            _Source(
+                "node/services.json",
+                lambda: self._get_services_status(errors),
+                SOURCE_TIMEOUT,
+            ),
+            _Source(
+                "node/log.txt",
+                lambda: self._get_node_logs(errors, log_lines),
+                LOG_TIMEOUT,
+            ),
+            _Source(
+                "backup_services.json",
+                lambda: self._collect_backup_status(errors),
+                SOURCE_TIMEOUT,
+            ),
+            _Source(
+                "configuration.json",
+                lambda: self._collect_configuration(errors),
+                SOURCE_TIMEOUT,
+            ),
+        ]
 
     def _get_system_info(self, errors: list[str]) -> dict[str, Any]:
         """Get system platform information."""
@@ -359,65 +571,60 @@ class BugReportAPI(BaseAPI):
             errors.append(f"Failed to get node logs: {e}")
             return []
 
-    def _collect_devices_info(
-        self, errors: list[str], log_lines: int
-    ) -> dict[str, Any]:
-        """Collect information from all connected devices."""
-        devices_info = {}
-
+    def _device_sources(self, errors: list[str], log_lines: int) -> list[_Source]:
+        """
+        Sources of device information: the scanner's summary of every device, and the
+        machine info and log of online devices.
+        """
         if not self.device_scanner:
             errors.append("Device scanner not available")
-            return devices_info
+            return []
 
         try:
             all_devices = self.device_scanner.get_all_devices_info(
                 include_inactive=True
             )
-
-            for device_id, device_summary in all_devices.items():
-                device_info = {
-                    "status": device_summary.get("status", "unknown"),
-                    "info": device_summary,
-                    "machine_info": None,
-                    "log": None,
-                    "error": None,
-                }
-
-                # Try to get more detailed info for online devices
-                status = device_summary.get("status", "")
-                if status not in ["offline", "na", "unreachable", "retired"]:
-                    device = self.device_scanner.get_device(device_id)
-                    if device:
-                        # Get machine info
-                        try:
-                            machine_info = device.machine_info()
-                            device_info["machine_info"] = machine_info
-                        except Exception as e:
-                            device_info["error"] = f"Failed to get machine info: {e}"
-
-                        # Get device logs
-                        try:
-                            log_data = device.log(log_lines)
-                            if isinstance(log_data, dict) and "log" in log_data:
-                                device_info["log"] = log_data["log"]
-                            else:
-                                device_info["log"] = log_data
-                        except Exception as e:
-                            if not device_info.get("error"):
-                                device_info["error"] = f"Failed to get logs: {e}"
-                            else:
-                                device_info["error"] += f"; Failed to get logs: {e}"
-                else:
-                    device_info["error"] = (
-                        f"Device {status}, cannot retrieve detailed info"
-                    )
-
-                devices_info[device_id] = device_info
-
         except Exception as e:
             errors.append(f"Failed to collect device info: {e}")
+            return []
 
-        return devices_info
+        sources = []
+        for device_id, device_summary in all_devices.items():
+            folder = f"devices/{device_id}"
+            sources.append(
+                _Source(
+                    f"{folder}/summary.json",
+                    lambda summary=device_summary: summary,
+                    SOURCE_TIMEOUT,
+                )
+            )
+
+            if device_summary.get("status", "") in OFFLINE_STATUSES:
+                continue
+            device = self.device_scanner.get_device(device_id)
+            if not device:
+                continue
+            sources.append(
+                _Source(
+                    f"{folder}/machine_info.json", device.machine_info, DEVICE_TIMEOUT
+                )
+            )
+            sources.append(
+                _Source(
+                    f"{folder}/log.txt",
+                    lambda device=device: self._get_device_log(device, log_lines),
+                    DEVICE_TIMEOUT,
+                )
+            )
+        return sources
+
+    @staticmethod
+    def _get_device_log(device, log_lines: int) -> Any:
+        """Get the recent log of a device."""
+        log_data = device.log(log_lines)
+        if isinstance(log_data, dict) and "log" in log_data:
+            return log_data["log"]
+        return log_data
 
     def _collect_backup_status(self, errors: list[str]) -> dict[str, Any]:
         """Collect backup service status."""
@@ -464,7 +671,7 @@ class BugReportAPI(BaseAPI):
         try:
             if self.config:
                 # Folders configuration
-                config_info["folders"] = self.config.content.get("folders", {})
+                config_info["folders"] = thaw(self.config.snapshot().get("folders", {}))
 
                 # Device options
                 try:
@@ -519,9 +726,7 @@ class BugReportAPI(BaseAPI):
         if devices:
             total = len(devices)
             online = sum(
-                1
-                for d in devices.values()
-                if d.get("status") not in ["offline", "na", "unreachable", "retired"]
+                1 for d in devices.values() if d.get("status") not in OFFLINE_STATUSES
             )
             lines.append(f"Devices: {online}/{total} online")
 
@@ -530,4 +735,8 @@ class BugReportAPI(BaseAPI):
         if errors:
             lines.append(f"Collection errors: {len(errors)}")
 
+        duration = report["report_metadata"].get("duration_s")
+        if duration is not None:
+            lines.append(f"Collected in {duration:.1f}s")
+
         return "\n".join(lines)
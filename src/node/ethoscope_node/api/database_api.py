@@ -1,11 +1,13 @@
 """
 Database API Module
 
-Handles database queries for runs and experiments and cached database information.
+Handles database queries for runs and experiments, cached database information and
+the activity rollups of backed-up databases.
 """
 
 import json
 
+from ..utils.activity_rollup import ROLLUP_RESOLUTION, get_activity_rollups
 from .base import BaseAPI, error_decorator
 
 
@@ -19,6 +21,7 @@ class DatabaseAPI(BaseAPI):
         self.app.route("/cached_databases/<device_name>", method="GET")(
             self._cached_databases
         )
+        self.app.route("/rollup/<path:path>", method="GET")(self._rollup)
 
     @error_decorator
     def _runs_list(self):
@@ -100,3 +103,27 @@ class DatabaseAPI(BaseAPI):
         except Exception as e:
             self.logger.error(f"Failed to get databases for device {device_name}: {e}")
             return json.dumps([])  # Return empty list on error
+
+    @error_decorator
+    def _rollup(self, path):
+        """
+        Get the activity of each ROI of a backed-up database, downsampled.
+
+        ``path`` is the database file relative to the results folder. Query parameters:
+        ``resolution`` (seconds per row, a multiple of 60, default 60), ``start`` and
+        ``end`` (seconds from the start of the experiment) and ``rois`` (comma-separated
+        ROI indices). The rollups of the database are brought up to date first.
+        """
+        rollups = get_activity_rollups(self.results_dir)
+        rollups.update(path)
+
+        rois = self.get_query_param("rois")
+        start = self.get_query_param("start")
+        end = self.get_query_param("end")
+        return rollups.query(
+            path,
+            resolution=int(self.get_query_param("resolution", ROLLUP_RESOLUTION)),
+            start=float(start) if start else None,
+            end=float(end) if end else None,
+            rois=[int(r) for r in rois.split(",")] if rois else None,
+        )
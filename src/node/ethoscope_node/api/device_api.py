@@ -12,12 +12,17 @@ import tempfile
 
 import bottle
 
+from ..utils.log_cache import QUERY_KEYS, DeviceLogCache
 from .base import BaseAPI, error_decorator, warning_decorator
 
 
 class DeviceAPI(BaseAPI):
     """API endpoints for device management and control."""
 
+    def __init__(self, server_instance):
+        super().__init__(server_instance)
+        self.log_cache = DeviceLogCache()
+
     def register_routes(self):
         """Register device-related routes."""
         # Device listing and management
@@ -63,6 +68,7 @@ class DeviceAPI(BaseAPI):
             self._post_device_instructions
         )
         self.app.route("/device/<id>/log", method="POST")(self._get_log)
+        self.app.route("/device/<id>/logs", method="GET")(self._get_log_page)
 
         # Firmware management
         self.app.route("/device/<id>/firmware/status", method="GET")(
@@ -511,6 +517,21 @@ class DeviceAPI(BaseAPI):
         device = self.validate_device_exists(id)
         return device.get_log()
 
+    @error_decorator
+    def _get_log_page(self, id):
+        """
+        Get one page of device log entries, newest first, through the log cache.
+
+        Takes the since, until, level, grep, limit, cursor and source filters of the
+        device; the returned cursor gives the next page of older entries.
+        """
+        device = self.validate_device_exists(id)
+        query = {key: bottle.request.query.get(key) for key in QUERY_KEYS}
+        page = self.log_cache.page(id, device.get_log_page, **query)
+        if page is None:
+            self.abort_with_error(502, f"Could not get the log of device {id}")
+        return page
+
     @error_decorator
     def _get_device_batch(self, id):
         """Batched endpoint that returns all critical device data in one request."""
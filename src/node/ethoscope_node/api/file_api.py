@@ -5,38 +5,56 @@ Handles file management operations including browsing, downloading, and file rem
 """
 
 import datetime
-import fnmatch
 import os
+import secrets
 import subprocess
-import zipfile
+import threading
+import time
 
 import bottle
 
+from ..utils.file_index import get_file_index
+from ..utils.zip_stream import ZipStream
 from .base import BaseAPI, error_decorator
 
+# Seconds a prepared download stays available
+DOWNLOAD_TOKEN_TTL = 3600
+
 
 class FileAPI(BaseAPI):
     """API endpoints for file management operations."""
 
+    def __init__(self, server_instance):
+        super().__init__(server_instance)
+        self._downloads = {}
+        self._downloads_lock = threading.Lock()
+
     def register_routes(self):
         """Register file management routes."""
         self.app.route("/resultfiles/<type>", method="GET")(self._result_files)
         self.app.route("/browse/<folder>", method="GET")(self._browse)
         self.app.route("/download/<what>", method="POST")(self._download)
+        self.app.route("/download_zip/<token>/<filename>", method="GET")(
+            self._stream_download
+        )
         self.app.route("/remove_files", method="POST")(self._remove_files)
 
+    @property
+    def file_index(self):
+        """The shared index of the results folder."""
+        return get_file_index(self.results_dir)
+
+    def _is_indexed(self, directory):
+        """Whether a folder is inside the results folder, and so in the index."""
+        root = os.path.abspath(self.results_dir)
+        directory = os.path.abspath(directory)
+        return directory == root or directory.startswith(root + os.sep)
+
     @error_decorator
     def _result_files(self, type):
         """Get result files of specified type."""
-        if type == "all":
-            pattern = "*"
-        else:
-            pattern = f"*.{type}"
-
-        matches = []
-        for root, _dirnames, filenames in os.walk(self.results_dir):
-            for f in fnmatch.filter(filenames, pattern):
-                matches.append(os.path.join(root, f))
+        file_type = None if type == "all" else type
+        matches = [f["path"] for f in self.file_index.files(file_type=file_type)]
 
         return {"files": matches}
 
@@ -46,6 +64,15 @@ class FileAPI(BaseAPI):
         directory = self.results_dir if folder == "null" else f"/{folder}"
         files = {}
 
+        if self._is_indexed(directory):
+            for f in self.file_index.files(prefix=directory):
+                files[os.path.basename(f["path"])] = {
+                    "abs_path": f["path"],
+                    "size": f["size"],
+                    "mtime": f["mtime"],
+                }
+            return {"files": files}
+
         for dirpath, _dirnames, filenames in os.walk(directory):
             for name in filenames:
                 abs_path = os.path.join(dirpath, name)
@@ -61,24 +88,63 @@ class FileAPI(BaseAPI):
 
     @error_decorator
     def _download(self, what):
-        """Create download archives."""
+        """
+        Prepare a zip download of the requested files.
+
+        Nothing is archived here: the returned URL streams the zip when fetched.
+        The request may set "compress" to deflate the entries and "manifest" to
+        append a MANIFEST.json with each file's size and checksums.
+        """
         if what == "files":
             req_files = bottle.request.json
             timestamp = datetime.datetime.now().strftime("%y%m%d_%H%M%S")
-            zip_file_name = os.path.join(self.results_dir, f"results_{timestamp}.zip")
-
-            with zipfile.ZipFile(zip_file_name, mode="a") as zf:
-                self.logger.info(f"Creating archive: {zip_file_name}")
-                for f in req_files["files"]:
-                    try:
-                        zf.write(f["url"])
-                    except Exception as e:
-                        self.logger.warning(f"Failed to add {f['url']} to archive: {e}")
-
-            return {"url": zip_file_name}
+            token = secrets.token_urlsafe(16)
+
+            with self._downloads_lock:
+                self._expire_downloads()
+                self._downloads[token] = {
+                    "paths": [f["url"] for f in req_files["files"]],
+                    "compress": bool(req_files.get("compress", False)),
+                    "manifest": bool(req_files.get("manifest", False)),
+                    "created": time.time(),
+                }
+
+            self.logger.info(
+                f"Prepared download of {len(req_files['files'])} files as {token}"
+            )
+            return {"url": f"/download_zip/{token}/results_{timestamp}.zip"}
         else:
             raise NotImplementedError(f"Download type '{what}' not supported")
 
+    def _stream_download(self, token, filename):
+        """Stream a prepared download as a zip archive."""
+        with self._downloads_lock:
+            self._expire_downloads()
+            download = self._downloads.get(token)
+
+        if download is None:
+            self.abort_with_error(404, "Download not found or expired")
+
+        bottle.response.content_type = "application/zip"
+        bottle.response.headers["Content-Disposition"] = (
+            f'attachment; filename="{filename}"'
+        )
+        return ZipStream(
+            download["paths"],
+            compress=download["compress"],
+            manifest=download["manifest"],
+        )
+
+    def _expire_downloads(self):
+        """Forget prepared downloads older than DOWNLOAD_TOKEN_TTL."""
+        now = time.time()
+        for token in [
+            t
+            for t, d in self._downloads.items()
+            if now - d["created"] > DOWNLOAD_TOKEN_TTL
+        ]:
+            del self._downloads[token]
+
     @error_decorator
     def _remove_files(self):
         """Remove specified files."""
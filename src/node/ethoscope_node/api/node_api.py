@@ -13,6 +13,8 @@ import subprocess
 
 import netifaces
 
+from ethoscope_node.utils.configuration import thaw
+
 from .base import BaseAPI, error_decorator
 
 # System daemons configuration
@@ -107,7 +109,7 @@ class NodeAPI(BaseAPI):
         elif req == "daemons":
             return self._get_daemon_status()
         elif req == "folders":
-            return self.config.content["folders"]
+            return thaw(self.config.snapshot()["folders"])
         elif req == "users":
             # Get users from database instead of configuration
             try:
@@ -135,7 +137,7 @@ class NodeAPI(BaseAPI):
                 else {}
             )
         elif req == "commands":
-            return self.config.content["commands"]
+            return thaw(self.config.snapshot()["commands"])
         elif req == "tunnel":
             # Delegate to tunnel utils
             if hasattr(self.server, "tunnel_utils") and self.server.tunnel_utils:
@@ -380,16 +382,16 @@ class NodeAPI(BaseAPI):
 
     def _update_folders(self, folders):
         """Update folder configuration."""
-        for folder in folders.keys():
-            if os.path.exists(folders[folder]["path"]):
-                self.config.content["folders"][folder]["path"] = folders[folder]["path"]
+        with self.config.transaction() as settings:
+            for folder in folders.keys():
+                if os.path.exists(folders[folder]["path"]):
+                    settings["folders"][folder]["path"] = folders[folder]["path"]
 
-        self.config.save()
-        return self.config.content["folders"]
+        return thaw(self.config.snapshot()["folders"])
 
     def _execute_command(self, cmd_name):
         """Execute a configured command."""
-        cmd = self.config.content["commands"][cmd_name]["command"]
+        cmd = self.config.snapshot()["commands"][cmd_name]["command"]
         self.logger.info(f"Executing command: {cmd}")
 
         try:
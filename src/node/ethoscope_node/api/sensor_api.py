@@ -7,6 +7,7 @@ Handles sensor management including discovery, configuration, and data visualiza
 import json
 import os
 
+from ..utils.sensor_store import CSV_HEADERS, format_time, get_sensor_store, parse_time
 from .base import BaseAPI, error_decorator
 
 
@@ -154,7 +155,19 @@ class SensorAPI(BaseAPI):
 
     @error_decorator
     def _get_csv_data(self, filename):
-        """Read CSV file and return data for plotting."""
+        """Read CSV file and return data for plotting.
+
+        Without query parameters every line of the CSV file is returned. With any
+        of ``start``, ``end`` (POSIX seconds or UTC "YYYY-MM-DD HH:MM:SS") and
+        ``max_points``, the readings are served from the sensor store instead,
+        downsampled to the finest rollup that fits in ``max_points``.
+        """
+        start = self.get_query_param("start")
+        end = self.get_query_param("end")
+        max_points = self.get_query_param("max_points")
+        if start or end or max_points:
+            return self._query_sensor_store(filename, start, end, max_points)
+
         directory = self.sensors_dir
         filepath = os.path.join(directory, filename)
 
@@ -165,3 +178,26 @@ class SensorAPI(BaseAPI):
                 data.append(line.strip().split(","))
 
         return {"headers": headers, "data": data}
+
+    def _query_sensor_store(self, filename, start, end, max_points):
+        """Return a time window of a sensor CSV file, through the sensor store."""
+        filename = os.path.basename(filename)
+        name = filename[:-4] if filename.endswith(".csv") else filename
+        store = get_sensor_store(self.sensors_dir)
+        store.sync(name, os.path.join(self.sensors_dir, filename))
+
+        result = store.query(
+            name,
+            start=parse_time(start),
+            end=parse_time(end),
+            max_points=int(max_points) if max_points else None,
+        )
+        response = {
+            "headers": CSV_HEADERS,
+            "data": [[format_time(r[0]), *r[1:]] for r in result["rows"]],
+            "resolution": result["resolution"],
+        }
+        for kind in ("min", "max"):
+            if kind in result:
+                response[kind] = [[format_time(r[0]), *r[1:]] for r in result[kind]]
+        return response
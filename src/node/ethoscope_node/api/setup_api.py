@@ -109,7 +109,7 @@ class SetupAPI(BaseAPI):
 
         # Get disk usage for important paths
         disk_info = {}
-        for path_name, path_config in self.config.content.get("folders", {}).items():
+        for path_name, path_config in self.config.snapshot().get("folders", {}).items():
             try:
                 path = path_config.get("path", "")
                 if path and os.path.exists(path):
@@ -235,14 +235,15 @@ class SetupAPI(BaseAPI):
         # Update folder paths if provided
         folders = data.get("folders", {})
         if folders:
-            current_folders = self.config.content.get("folders", {})
+            current_folders = self.config.snapshot().get("folders", {})
+            new_paths = {}
 
             for folder_name, folder_path in folders.items():
                 if folder_name in current_folders:
                     # Create directory if it doesn't exist
                     try:
                         Path(folder_path).mkdir(parents=True, exist_ok=True)
-                        current_folders[folder_name]["path"] = folder_path
+                        new_paths[folder_name] = folder_path
                     except Exception as e:
                         self.logger.error(f"Error creating folder {folder_path}: {e}")
                         return {
@@ -251,8 +252,9 @@ class SetupAPI(BaseAPI):
                         }
 
             # Update configuration
-            self.config._settings["folders"] = current_folders
-            self.config.save()
+            with self.config.transaction() as settings:
+                for folder_name, folder_path in new_paths.items():
+                    settings["folders"][folder_name]["path"] = folder_path
 
         # Mark step as completed
         self.config.mark_setup_step_completed("basic_info")
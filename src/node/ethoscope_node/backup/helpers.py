@@ -73,6 +73,7 @@ from contextlib import contextmanager
 from dataclasses import dataclass
 
 from ethoscope_node.backup.mysql import DBNotReadyError, MySQLdbToSQLite
+from ethoscope_node.utils.activity_rollup import get_activity_rollups
 from ethoscope_node.utils.configuration import ensure_ssh_keys
 from ethoscope_node.utils.video_helpers import list_local_video_files
 
@@ -307,6 +308,29 @@ class BaseBackupClass:
         self._logger.info(f"[{self._device_id}] {message}")
         return status_msg
 
+    def _update_rollups(self, path: str) -> None:
+        """
+        Bring the activity rollups of backed-up databases up to date.
+
+        Failures are logged only: the backup itself succeeded.
+
+        Args:
+            path: A database file, or a folder whose databases are all updated
+        """
+        try:
+            rollups = get_activity_rollups(self._results_dir)
+            if os.path.isdir(path):
+                processed = rollups.update_all(path)
+            else:
+                processed = rollups.update(path)
+            self._logger.info(
+                f"[{self._device_id}] Activity rollups updated ({processed} new rows)"
+            )
+        except Exception as e:
+            self._logger.warning(
+                f"[{self._device_id}] Could not update activity rollups: {e}"
+            )
+
     def backup(self) -> Iterator[str]:
         """Abstract method to be implemented by subclasses."""
         raise NotImplementedError("Subclasses must implement backup method")
@@ -377,6 +401,7 @@ class BackupClass(BaseBackupClass):
             elapsed_time = time.time() - start_time
 
             if success:
+                self._update_rollups(backup_path)
                 self._logger.info(
                     f"[{self._device_id}] === DATABASE BACKUP COMPLETED SUCCESSFULLY in {elapsed_time:.1f}s ==="
                 )
@@ -981,6 +1006,8 @@ class UnifiedRsyncBackupClass(BaseBackupClass):
 
     DEFAULT_PORT = 9000
     REQUEST_TIMEOUT = 30
+    # Files per backup confirmation sent to the device
+    CONFIRM_BATCH = 500
 
     def __init__(
         self,
@@ -1077,6 +1104,10 @@ class UnifiedRsyncBackupClass(BaseBackupClass):
                     yield self._yield_status("error", "Results backup failed")
                     return False
                 completed_operations += 1
+                self._update_rollups(os.path.join(self._results_dir, self._device_id))
+                self._confirm_backups(
+                    "results", os.path.join(self._results_dir, self._device_id)
+                )
 
             # Backup videos if requested
             if self._backup_videos:
@@ -1094,6 +1125,9 @@ class UnifiedRsyncBackupClass(BaseBackupClass):
                     yield self._yield_status("error", "Videos backup failed")
                     return False
                 completed_operations += 1
+                self._confirm_backups(
+                    "videos", os.path.join(self._videos_dir, self._device_id)
+                )
 
             elapsed_time = time.time() - start_time
             self._logger.info(
@@ -1357,6 +1391,67 @@ class UnifiedRsyncBackupClass(BaseBackupClass):
             yield self._yield_status("error", error_msg)
             return False
 
+    def _confirm_backups(self, folder: str, local_dir: str) -> int:
+        """
+        Tell the device which of its data files are now backed up on the node.
+
+        The device only deletes files to free space once they are confirmed, and only
+        for as long as they keep the size and modification time reported here (rsync
+        preserves modification times). Failures are logged and do not fail the backup.
+
+        Args:
+            folder: Data folder on the device ("results" or "videos")
+            local_dir: Local copy of <folder>/<device_id>
+
+        Returns:
+            int: Number of files the device accepted as backed up
+        """
+        files = []
+        for root, _dirs, names in os.walk(local_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                relative = os.path.relpath(path, os.path.dirname(local_dir))
+                files.append(
+                    {
+                        "path": os.path.join(folder, relative),
+                        "size": stat.st_size,
+                        "mtime": stat.st_mtime,
+                    }
+                )
+
+        confirmed = 0
+        url = f"{self._device_url}/data/backups/{self._device_id}"
+        try:
+            # the device server refuses request bodies above 100 kB
+            for start in range(0, len(files), self.CONFIRM_BATCH):
+                request = urllib.request.Request(
+                    url,
+                    data=json.dumps(
+                        {"files": files[start : start + self.CONFIRM_BATCH]}
+                    ).encode(),
+                    headers={"Content-Type": "application/json"},
+                    method="POST",
+                )
+                with urllib.request.urlopen(
+                    request, timeout=self.REQUEST_TIMEOUT
+                ) as response:
+                    result = json.loads(response.read())
+                if "error" in result:
+                    raise RuntimeError(result["error"])
+                confirmed += result.get("confirmed", 0)
+        except Exception as e:
+            self._logger.warning(
+                f"[{self._device_id}] Could not confirm {folder} backup to the device: {e}"
+            )
+        self._logger.info(
+            f"[{self._device_id}] Device confirmed {confirmed}/{len(files)} {folder} files as backed up"
+        )
+        return confirmed
+
     def _checkpoint_sqlite_databases(
         self, private_key_path: str, source_dir: str = "/ethoscope_data/results/"
     ) -> Iterator[bool]:
@@ -2919,7 +3014,10 @@ def _get_device_disk_usage(
     device_id: str, base_directory: str, subdirectory: str
 ) -> int:
     """
-    Get disk usage for a specific device directory using du command.
+    Get disk usage for a specific device directory from the file index.
+
+    The index of the subdirectory is refreshed incrementally, so only folders
+    that changed since the last call are listed again.
 
     Args:
         device_id: The ethoscope device ID
@@ -2927,11 +3025,13 @@ def _get_device_disk_usage(
         subdirectory: Subdirectory name ('videos' or 'results')
 
     Returns:
-        int: Size in bytes, 0 if directory doesn't exist or command fails
+        int: Size in bytes, 0 if directory doesn't exist or indexing fails
     """
     import logging
     import os
-    import subprocess
+    import sqlite3
+
+    from ethoscope_node.utils.file_index import get_file_index
 
     device_dir = os.path.join(base_directory, subdirectory, device_id)
 
@@ -2939,29 +3039,14 @@ def _get_device_disk_usage(
         return 0
 
     try:
-        # Use du -sb for size in bytes, -x to stay on same filesystem
-        result = subprocess.run(
-            ["du", "-sbx", device_dir],
-            capture_output=True,
-            text=True,
-            timeout=30,  # 30 second timeout for large directories
+        file_index = get_file_index(os.path.join(base_directory, subdirectory))
+        size_bytes = file_index.total_size(prefix=device_dir)
+        logging.debug(
+            f"Device {device_id} {subdirectory} size: {_format_bytes_simple(size_bytes)}"
         )
+        return size_bytes
 
-        if result.returncode == 0:
-            # du output format: "size_bytes    directory_path"
-            size_bytes = int(result.stdout.split()[0])
-            logging.debug(
-                f"Device {device_id} {subdirectory} size: {_format_bytes_simple(size_bytes)}"
-            )
-            return size_bytes
-        else:
-            logging.warning(f"du command failed for {device_dir}: {result.stderr}")
-            return 0
-
-    except subprocess.TimeoutExpired:
-        logging.warning(f"du command timeout for {device_dir}")
-        return 0
-    except (ValueError, IndexError, OSError) as e:
+    except (sqlite3.Error, OSError) as e:
         logging.warning(f"Error calculating disk usage for {device_dir}: {e}")
         return 0
 
@@ -8,6 +8,7 @@ including email, and future support for telegram, whatsapp, etc.
 """
 
 from .base import NotificationAnalyzer
+from .dispatcher import AlertLedger, NotificationDispatcher
 from .email import EmailNotificationService
 from .manager import NotificationManager
 from .mattermost import MattermostNotificationService
@@ -19,4 +20,6 @@ __all__ = [
     "MattermostNotificationService",
     "SlackNotificationService",
     "NotificationManager",
+    "NotificationDispatcher",
+    "AlertLedger",
 ]
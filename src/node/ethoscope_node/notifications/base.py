@@ -2,13 +2,48 @@
 
 import datetime
 import logging
+import threading
 import time
+from contextlib import contextmanager
 from typing import Any
 
 import requests
 
 from ..utils.configuration import EthoscopeConfiguration
 from ..utils.etho_db import ExperimentalDB
+from ..utils.log_cache import format_log_entry
+
+# Seconds between similar alerts, unless alerts.cooldown_seconds is configured
+DEFAULT_ALERT_COOLDOWN = 3600
+
+_dispatch = threading.local()
+
+
+def alert_key(device_id: str, alert_type: str, run_id: str = None) -> str:
+    """
+    Return the rate limiting key of an alert.
+
+    device_stopped alerts are keyed by run, so that each run is reported once.
+    """
+    if alert_type == "device_stopped" and run_id:
+        return f"{device_id}:{alert_type}:{run_id}"
+    return f"{device_id}:{alert_type}"
+
+
+@contextmanager
+def dispatched_alert():
+    """
+    Mark the alerts sent by this thread as already approved.
+
+    The notification dispatcher decides once, in the shared alert ledger, whether an
+    alert is sent; within this context the services skip their own rate limiting,
+    so that a retry is not suppressed by the first attempt.
+    """
+    _dispatch.approved = True
+    try:
+        yield
+    finally:
+        _dispatch.approved = False
 
 
 class NotificationAnalyzer:
@@ -38,6 +73,68 @@ class NotificationAnalyzer:
         self.db = db or ExperimentalDB()
         self.logger = logging.getLogger(self.__class__.__name__)
 
+        # Rate limiting: track last alert time per device/type
+        self._last_alert_times = {}
+        self._default_cooldown = DEFAULT_ALERT_COOLDOWN
+
+    def _get_alert_config(self) -> dict[str, Any]:
+        """Get alert configuration from settings."""
+        return self.config.content.get("alerts", {})
+
+    def _should_send_alert(
+        self, device_id: str, alert_type: str, run_id: str = None
+    ) -> bool:
+        """
+        Check if we should send an alert based on rate limiting and database history.
+
+        Alerts sent on behalf of the notification dispatcher were approved by it
+        already, see dispatched_alert().
+
+        Args:
+            device_id: Device identifier
+            alert_type: Type of alert (device_stopped, storage_warning, etc.)
+            run_id: Run ID for device_stopped alerts (prevents duplicates for same run)
+
+        Returns:
+            True if alert should be sent
+        """
+        if getattr(_dispatch, "approved", False):
+            return True
+
+        # For device_stopped alerts, check database for duplicates based on run_id
+        if alert_type == "device_stopped" and run_id:
+            has_been_sent = self.db.hasAlertBeenSent(device_id, alert_type, run_id)
+            if has_been_sent:
+                self.logger.debug(
+                    f"Alert {device_id}:{alert_type}:{run_id} already sent - preventing duplicate"
+                )
+                return False
+        elif alert_type == "device_stopped" and not run_id:
+            # For alerts without run_id, use timestamp-based approach to prevent spam
+            self.logger.debug(
+                "No run_id provided for device_stopped alert - using cooldown only"
+            )
+
+        # For other alerts or when no run_id, use traditional cooldown
+        alert_config = self._get_alert_config()
+        cooldown = alert_config.get("cooldown_seconds", self._default_cooldown)
+
+        # Use run_id in key for device_stopped alerts, otherwise use traditional key
+        key = alert_key(device_id, alert_type, run_id)
+
+        current_time = time.time()
+
+        if key in self._last_alert_times:
+            time_since_last = current_time - self._last_alert_times[key]
+            if time_since_last < cooldown:
+                self.logger.debug(
+                    f"Alert {key} suppressed due to cooldown ({time_since_last:.0f}s < {cooldown}s)"
+                )
+                return False
+
+        self._last_alert_times[key] = current_time
+        return True
+
     def analyze_device_failure(self, device_id: str) -> dict[str, Any]:
         """
         Analyze a device failure and gather comprehensive information.
@@ -280,7 +377,22 @@ class NotificationAnalyzer:
                 )
                 return None
 
-            # Try to fetch logs from device
+            # Ask the device for the last lines only
+            try:
+                response = requests.get(
+                    f"http://{ip}:9000/data/logs/{device_id}",
+                    params={"limit": max_lines} if max_lines and max_lines > 0 else {},
+                    timeout=10,
+                )
+                page = response.json() if response.status_code == 200 else None
+                if isinstance(page, dict) and "entries" in page:
+                    return "\n".join(
+                        format_log_entry(entry) for entry in reversed(page["entries"])
+                    )
+            except (requests.RequestException, ValueError) as e:
+                self.logger.debug(f"No paginated logs from device {device_id}: {e}")
+
+            # Devices with older software only give their whole log
             log_url = f"http://{ip}:9000/data/log/{device_id}"
 
             try:
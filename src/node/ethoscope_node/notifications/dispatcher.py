@@ -0,0 +1,385 @@
+#!/usr/bin/env python
+
+"""
+Asynchronous dispatch of notifications.
+
+Alerts raised by the device polling threads are queued and sent by one worker
+thread per notification service, so a slow SMTP server or webhook only delays its
+own messages and never the polling of an ethoscope. Each call to a service is
+bounded by a timeout and retried with a growing delay. Workers are started when
+alerts are queued and stop after a while without any.
+
+Whether an alert is sent at all is decided once, before it is queued, in the alert
+ledger: a small SQLite table of the last time each alert was sent, shared by all
+services and kept across restarts of the node.
+"""
+
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from ..utils import etho_db
+from .base import dispatched_alert
+
+# Alerts waiting for each service; further alerts are dropped
+QUEUE_SIZE = 100
+# Seconds a service may take to send an alert
+SEND_TIMEOUT = 60
+# Attempts after the first failure, and seconds before the first retry (doubled each time)
+RETRIES = 2
+RETRY_DELAY = 10
+# Seconds a worker waits for alerts before stopping
+IDLE_TIMEOUT = 60
+
+# Service method sending each type of alert
+ALERT_METHODS = {
+    "device_stopped": "send_device_stopped_alert",
+    "device_unreachable": "send_device_unreachable_alert",
+    "storage_warning": "send_storage_warning_alert",
+    "temperature": "send_temperature_alert",
+}
+
+_ledgers = {}
+_ledgers_lock = threading.Lock()
+
+
+def get_alert_ledger(db_path: str | None = None) -> "AlertLedger":
+    """
+    Return the shared AlertLedger of a file, creating it on first use.
+
+    Args:
+        db_path: SQLite file of the ledger (default: alert_ledger.db in the node configuration folder)
+
+    Returns:
+        AlertLedger: One instance per file in this process
+    """
+    db_path = os.path.abspath(
+        db_path or os.path.join(etho_db._default_config_dir, "alert_ledger.db")
+    )
+    with _ledgers_lock:
+        if db_path not in _ledgers:
+            _ledgers[db_path] = AlertLedger(db_path)
+        return _ledgers[db_path]
+
+
+class AlertLedger:
+    """Persistent record of the alerts sent, for deduplication and cooldowns."""
+
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path: SQLite file of the ledger
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        # transactions are explicit, so that claims are atomic across processes
+        self._conn = sqlite3.connect(
+            db_path, check_same_thread=False, timeout=30, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS alerts (
+                key TEXT PRIMARY KEY,
+                last_sent REAL NOT NULL,
+                count INTEGER NOT NULL
+            )""")
+
+    def claim(
+        self, key: str, cooldown: float | None = None, now: float | None = None
+    ) -> bool:
+        """
+        Record that an alert is being sent, unless it was sent recently.
+
+        Args:
+            key: Alert key, see base.alert_key()
+            cooldown: Seconds during which the alert is not sent again; None for never again
+            now: Current time (default: time.time())
+
+        Returns:
+            bool: True if the alert should be sent
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT last_sent FROM alerts WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and (cooldown is None or now - row[0] < cooldown):
+                    self._conn.execute("ROLLBACK")
+                    return False
+                self._conn.execute(
+                    """INSERT INTO alerts VALUES (?, ?, 1)
+                    ON CONFLICT (key) DO UPDATE SET
+                        last_sent = excluded.last_sent, count = count + 1""",
+                    (key, now),
+                )
+                self._conn.execute("COMMIT")
+                return True
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def release(self, key: str):
+        """Forget an alert that could not be sent, so that it is not suppressed next time."""
+        with self._lock:
+            self._conn.execute("DELETE FROM alerts WHERE key = ?", (key,))
+
+    def last_sent(self, key: str) -> float | None:
+        """Return the last time an alert was claimed, None if never."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_sent FROM alerts WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        """Close the ledger database."""
+        with self._lock:
+            self._conn.close()
+        with _ledgers_lock:
+            if _ledgers.get(os.path.abspath(self.db_path)) is self:
+                del _ledgers[os.path.abspath(self.db_path)]
+
+
+class _Job:
+    """An alert queued for several services."""
+
+    def __init__(self, alert_type: str, key: str, kwargs: dict, n_services: int):
+        self.alert_type = alert_type
+        self.key = key
+        self.kwargs = kwargs
+        self.pending = n_services
+        self.delivered = False
+
+
+class NotificationDispatcher:
+    """Sends alerts through notification services from per-service worker threads."""
+
+    def __init__(
+        self,
+        services: list[tuple[str, object]],
+        ledger: AlertLedger,
+        queue_size: int = QUEUE_SIZE,
+        timeout: float = SEND_TIMEOUT,
+        retries: int = RETRIES,
+        retry_delay: float = RETRY_DELAY,
+        idle_timeout: float = IDLE_TIMEOUT,
+    ):
+        """
+        Args:
+            services: (name, service) pairs, as held by NotificationManager
+            ledger: Ledger deciding which alerts are sent
+            queue_size: Alerts waiting for each service; further alerts are dropped
+            timeout: Seconds a service may take to send an alert
+            retries: Attempts after the first failure
+            retry_delay: Seconds before the first retry, doubled at each retry
+            idle_timeout: Seconds a worker waits for alerts before stopping
+        """
+        self.ledger = ledger
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._services = list(services)
+        self._timeout = timeout
+        self._retries = retries
+        self._retry_delay = retry_delay
+        self._idle_timeout = idle_timeout
+
+        self._queues = {
+            name: queue.Queue(maxsize=queue_size) for name, _ in self._services
+        }
+        self._workers = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.stats = {
+            name: {"sent": 0, "failed": 0, "timeouts": 0, "dropped": 0}
+            for name, _ in self._services
+        }
+
+    def submit(
+        self, alert_type: str, key: str, cooldown: float | None = None, **kwargs
+    ) -> bool:
+        """
+        Queue an alert for every service, unless the ledger suppresses it.
+
+        Never blocks on the services.
+
+        Args:
+            alert_type: One of ALERT_METHODS
+            key: Alert key in the ledger
+            cooldown: Seconds during which the alert is not sent again; None for never again
+            **kwargs: Arguments of the service method
+
+        Returns:
+            bool: True if the alert was queued
+        """
+        if alert_type not in ALERT_METHODS:
+            raise ValueError(f"Unknown alert type: {alert_type}")
+        if not self._services or self._stopped.is_set():
+            self.logger.warning("No notification services to send the alert through")
+            return False
+        if not self.ledger.claim(key, cooldown):
+            self.logger.debug(f"Alert {key} suppressed by the alert ledger")
+            return False
+
+        job = _Job(alert_type, key, kwargs, len(self._services))
+        queued = 0
+        with self._lock:
+            if self._stopped.is_set():
+                # stop() already emptied the queues
+                self.ledger.release(key)
+                return False
+            for name, service in self._services:
+                try:
+                    self._queues[name].put_nowait(job)
+                except queue.Full:
+                    self.stats[name]["dropped"] += 1
+                    job.pending -= 1
+                    self.logger.error(f"Alert queue of {name} is full, dropping {key}")
+                    continue
+                queued += 1
+                self._ensure_worker(name, service)
+            if not queued:
+                self.ledger.release(key)
+        return queued > 0
+
+    def _ensure_worker(self, name: str, service):
+        """Start the worker of a service if it is not running. Called with the lock held."""
+        worker = self._workers.get(name)
+        if worker is not None and worker.is_alive():
+            return
+        worker = threading.Thread(
+            target=self._work,
+            args=(name, service),
+            name=f"notifications-{name}",
+            daemon=True,
+        )
+        self._workers[name] = worker
+        worker.start()
+
+    def _work(self, name: str, service):
+        jobs = self._queues[name]
+        while not self._stopped.is_set():
+            try:
+                job = jobs.get(timeout=self._idle_timeout)
+            except queue.Empty:
+                with self._lock:
+                    # submit() starts a new worker for alerts queued after this
+                    if jobs.empty():
+                        self._workers.pop(name, None)
+                        return
+                continue
+            if job is None:
+                jobs.task_done()
+                return
+            try:
+                self._finish(job, self._deliver(name, service, job))
+            finally:
+                jobs.task_done()
+
+    def _deliver(self, name: str, service, job: _Job) -> bool:
+        method = getattr(service, ALERT_METHODS[job.alert_type])
+        for attempt in range(self._retries + 1):
+            if attempt and self._stopped.wait(self._retry_delay * 2 ** (attempt - 1)):
+                break
+            sent = self._call(name, method, job.kwargs)
+            if sent:
+                self.stats[name]["sent"] += 1
+                return True
+            if sent is None:
+                self.stats[name]["timeouts"] += 1
+                self.logger.warning(
+                    f"{name} did not send {job.key} within {self._timeout}s (attempt {attempt + 1})"
+                )
+            else:
+                self.logger.warning(
+                    f"{name} failed to send {job.key} (attempt {attempt + 1})"
+                )
+        self.stats[name]["failed"] += 1
+        return False
+
+    def _call(self, name: str, method, kwargs: dict) -> bool | None:
+        """Call a service method in its own thread; None if it did not return in time."""
+        result = {}
+
+        def send():
+            with dispatched_alert():
+                try:
+                    result["sent"] = bool(method(**kwargs))
+                except Exception as e:
+                    self.logger.error(f"Error sending alert via {name}: {e}")
+                    result["sent"] = False
+
+        # a service stuck past the timeout is left to finish in the background
+        thread = threading.Thread(
+            target=send, name=f"notifications-{name}-send", daemon=True
+        )
+        thread.start()
+        thread.join(self._timeout)
+        return result.get("sent") if not thread.is_alive() else None
+
+    def _finish(self, job: _Job, sent: bool):
+        with self._lock:
+            job.pending -= 1
+            job.delivered = job.delivered or sent
+            done = job.pending == 0
+        if done and not job.delivered:
+            self.logger.error(f"Alert {job.key} could not be sent by any service")
+            self.ledger.release(job.key)
+        elif done:
+            self.logger.info(f"Alert {job.key} sent")
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        Wait until every queued alert was sent or given up.
+
+        Args:
+            timeout: Seconds to wait at most (default: no limit)
+
+        Returns:
+            bool: True if the queues are empty
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for jobs in self._queues.values():
+            with jobs.all_tasks_done:
+                while jobs.unfinished_tasks:
+                    remaining = (
+                        None if deadline is None else deadline - time.monotonic()
+                    )
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    jobs.all_tasks_done.wait(remaining)
+        return True
+
+    def stop(self, timeout: float | None = None):
+        """
+        Stop the workers once their current alert is handled.
+
+        Alerts still waiting in the queues are not sent: those that no service
+        delivered are released from the ledger, so that they are raised again,
+        e.g. through the dispatcher replacing this one.
+
+        Args:
+            timeout: Seconds to wait for each worker
+        """
+        self._stopped.set()
+        dropped = []
+        with self._lock:
+            workers = list(self._workers.values())
+            for jobs in self._queues.values():
+                while True:
+                    try:
+                        job = jobs.get_nowait()
+                    except queue.Empty:
+                        break
+                    jobs.task_done()
+                    if job is not None:
+                        dropped.append(job)
+                # wakes up an idle worker; a busy one stops after its current alert
+                jobs.put_nowait(None)
+        for job in dropped:
+            self._finish(job, False)
+        for worker in workers:
+            worker.join(timeout)
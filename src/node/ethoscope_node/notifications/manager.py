@@ -6,18 +6,28 @@ Unified notification manager for Ethoscope system alerts.
 This manager handles all notification services (email, Mattermost, etc.) internally,
 providing a simple interface for the scanner to send notifications without caring
 about which specific services are configured or enabled.
+
+The send_* methods call every service in turn and wait for them; queue_alert()
+hands the alert to a NotificationDispatcher instead and returns immediately.
 """
 
 import datetime
+import threading
 from typing import Any
 
-from ..utils.configuration import EthoscopeConfiguration
+from ..utils.configuration import EthoscopeConfiguration, freeze
 from ..utils.etho_db import ExperimentalDB
-from .base import NotificationAnalyzer
+from .base import NotificationAnalyzer, alert_key
+from .dispatcher import AlertLedger, NotificationDispatcher, get_alert_ledger
 from .email import EmailNotificationService
 from .mattermost import MattermostNotificationService
 from .slack import SlackNotificationService
 
+# Configuration sections of the notification services
+SERVICE_SECTIONS = ("smtp", "mattermost", "slack")
+# Seconds to wait for each worker of a replaced dispatcher
+RESTART_TIMEOUT = 1
+
 
 class NotificationManager(NotificationAnalyzer):
     """
@@ -31,6 +41,7 @@ class NotificationManager(NotificationAnalyzer):
         self,
         config: EthoscopeConfiguration | None = None,
         db: ExperimentalDB | None = None,
+        ledger: AlertLedger | None = None,
     ):
         """
         Initialize notification manager.
@@ -38,22 +49,36 @@ class NotificationManager(NotificationAnalyzer):
         Args:
             config: Configuration instance, will create new one if None
             db: Database instance, will create new one if None
+            ledger: Alert ledger of queued alerts, the shared one if None
         """
         super().__init__(config, db)
 
         # Initialize all notification services
-        self._services = []
+        self._channels = None
         self._initialize_services()
 
+        self._ledger = ledger
+        self._dispatcher = None
+        self._dispatcher_lock = threading.Lock()
+
+        # Restart the services when their settings are changed, e.g. from the UI
+        self.config.add_listener(self._on_configuration_change)
+
     def _initialize_services(self):
         """Initialize all available notification services based on configuration."""
+        # A new list, as the dispatcher or another thread may be using the old one
+        self._services = services = []
         try:
+            self._channels = freeze(
+                {name: self.config.content.get(name, {}) for name in SERVICE_SECTIONS}
+            )
+
             # Initialize email service
             email_config = self.config.content.get("smtp", {})
             if email_config.get("enabled", False):
                 try:
                     email_service = EmailNotificationService(self.config, self.db)
-                    self._services.append(("email", email_service))
+                    services.append(("email", email_service))
                     self.logger.info("Email notification service initialized")
                 except Exception as e:
                     self.logger.error(f"Failed to initialize email service: {e}")
@@ -67,7 +92,7 @@ class NotificationManager(NotificationAnalyzer):
                     mattermost_service = MattermostNotificationService(
                         self.config, self.db
                     )
-                    self._services.append(("mattermost", mattermost_service))
+                    services.append(("mattermost", mattermost_service))
                     self.logger.info("Mattermost notification service initialized")
                 except Exception as e:
                     self.logger.error(f"Failed to initialize Mattermost service: {e}")
@@ -79,7 +104,7 @@ class NotificationManager(NotificationAnalyzer):
             if slack_config.get("enabled", False):
                 try:
                     slack_service = SlackNotificationService(self.config, self.db)
-                    self._services.append(("slack", slack_service))
+                    services.append(("slack", slack_service))
                     self.logger.info("Slack notification service initialized")
                 except Exception as e:
                     self.logger.error(f"Failed to initialize Slack service: {e}")
@@ -95,6 +120,47 @@ class NotificationManager(NotificationAnalyzer):
         except Exception as e:
             self.logger.error(f"Error initializing notification services: {e}")
 
+    @property
+    def dispatcher(self) -> NotificationDispatcher:
+        """The dispatcher of queued alerts, created on first use."""
+        with self._dispatcher_lock:
+            if self._dispatcher is None:
+                self._dispatcher = NotificationDispatcher(
+                    self._services, self._ledger or get_alert_ledger()
+                )
+            return self._dispatcher
+
+    def queue_alert(self, alert_type: str, **kwargs) -> bool:
+        """
+        Queue an alert for all enabled services, without waiting for them.
+
+        The alert ledger decides once for all services whether the alert is sent:
+        a device_stopped alert with a run_id is sent once per run, other alerts
+        once per cooldown period (alerts.cooldown_seconds).
+
+        Args:
+            alert_type: "device_stopped", "device_unreachable", "storage_warning" or "temperature"
+            **kwargs: Arguments of the matching send_* method
+
+        Returns:
+            True if the alert was queued, False if it was suppressed or no service is enabled
+        """
+        run_id = kwargs.get("run_id")
+        if alert_type == "temperature":
+            key = alert_key(
+                kwargs["sensor_id"], f"temperature_{kwargs['violation_type']}"
+            )
+        else:
+            key = alert_key(kwargs["device_id"], alert_type, run_id)
+
+        if alert_type == "device_stopped" and run_id:
+            cooldown = None
+        else:
+            cooldown = self._get_alert_config().get(
+                "cooldown_seconds", self._default_cooldown
+            )
+        return self.dispatcher.submit(alert_type, key, cooldown, **kwargs)
+
     def send_device_stopped_alert(
         self,
         device_id: str,
@@ -369,6 +435,29 @@ class NotificationManager(NotificationAnalyzer):
         """
         return [service_name for service_name, _ in self._services]
 
+    def _restart_services(self):
+        """Reinitialize the services from the configuration and stop the old dispatcher."""
+        with self._dispatcher_lock:
+            old_dispatcher = self._dispatcher
+            self._dispatcher = None
+            self._initialize_services()
+        # Stopped without the lock, as a worker may be in the middle of a slow send:
+        # alerts are queued on the new dispatcher meanwhile
+        if old_dispatcher is not None:
+            old_dispatcher.stop(timeout=RESTART_TIMEOUT)
+
+    def _on_configuration_change(self, settings):
+        """
+        Restart the services if their settings changed.
+
+        Args:
+            settings: Snapshot of the new configuration
+        """
+        channels = freeze({name: settings.get(name, {}) for name in SERVICE_SECTIONS})
+        if channels != self._channels:
+            self.logger.info("Notification settings changed, restarting services")
+            self._restart_services()
+
     def reload_configuration(self):
         """
         Reload configuration and reinitialize services.
@@ -376,9 +465,12 @@ class NotificationManager(NotificationAnalyzer):
         This is useful if configuration changes at runtime.
         """
         self.logger.info("Reloading notification configuration...")
-        self._services.clear()
+        # Forget the current settings, so that the services are restarted by the
+        # configuration listener when the file is loaded, or here otherwise
+        self._channels = None
         self.config.load()  # Reload configuration from file
-        self._initialize_services()
+        if self._channels is None:
+            self._restart_services()
         self.logger.info(
             f"Configuration reloaded with {len(self._services)} active services"
         )
@@ -40,6 +40,7 @@ class Ethoscope(BaseDevice):
         "stream": "stream.mjpg",
         "user_options": "user_options",
         "log": "data/log",
+        "logs": "data/logs",
         "static": "static",
         "controls": "controls",
         "machine_info": "machine",
@@ -286,6 +287,27 @@ class Ethoscope(BaseDevice):
         except ScanException:
             return None
 
+    def get_log_page(self, **query: Any) -> dict[str, Any] | None:
+        """
+        Get one page of log entries from ethoscope, newest first.
+
+        Args:
+            **query: since, until, level, grep, limit, cursor and source filters
+
+        Returns:
+            Page with its entries and the cursor of the next (older) page, or None
+            if the device cannot be reached
+        """
+        try:
+            url = (
+                f"http://{self._ip}:{self._port}/{self.REMOTE_PAGES['logs']}/{self._id}"
+            )
+            if query:
+                url += "?" + urllib.parse.urlencode(query)
+            return self._get_json(url)
+        except ScanException:
+            return None
+
     def dump_sql_db(self) -> dict[str, Any] | None:
         """Trigger SQL database dump on ethoscope."""
         try:
@@ -1115,29 +1137,28 @@ class Ethoscope(BaseDevice):
                 self._logger.info(
                     f"Sending device stopped alert for {device_name} (run_id: {run_id})"
                 )
-                success = self._notification_manager.send_device_stopped_alert(
+                # Alerts are sent from the dispatcher's threads, not this polling thread
+                queued = self._notification_manager.queue_alert(
+                    "device_stopped",
                     device_id=self._id,
                     device_name=device_name,
                     run_id=run_id,
                     last_seen=last_seen,
                 )
-                if success:
-                    self._logger.info(
-                        f"Device stopped alert sent successfully for {device_name}"
-                    )
+                if queued:
+                    self._logger.info(f"Device stopped alert queued for {device_name}")
                 else:
-                    self._logger.error(
-                        f"Failed to send device stopped alert for {device_name}"
+                    self._logger.info(
+                        f"Device stopped alert for {device_name} not queued (already sent or no service enabled)"
                     )
             elif new_status == "unreached":
                 # Send unreachable alert (DeviceStatus already checked timeout)
-                success = self._notification_manager.send_device_unreachable_alert(
-                    device_id=self._id, device_name=device_name, last_seen=last_seen
+                self._notification_manager.queue_alert(
+                    "device_unreachable",
+                    device_id=self._id,
+                    device_name=device_name,
+                    last_seen=last_seen,
                 )
-                if not success:
-                    self._logger.error(
-                        f"Failed to send device unreachable alert for {device_name}"
-                    )
 
         except Exception as e:
             self._logger.error(f"Error sending state transition alerts: {e}")
@@ -1170,17 +1191,14 @@ class Ethoscope(BaseDevice):
                         if isinstance(available_space, (int, float)):
                             available_space = f"{available_space / (1024**3):.1f} GB"
 
-                        # Send storage warning alert
-                        success = self._notification_manager.send_storage_warning_alert(
+                        # Queue storage warning alert
+                        self._notification_manager.queue_alert(
+                            "storage_warning",
                             device_id=self._id,
                             device_name=device_name,
                             storage_percent=used_percent,
                             available_space=str(available_space),
                         )
-                        if not success:
-                            self._logger.error(
-                                f"Failed to send storage warning alert for {device_name}"
-                            )
 
         except Exception as e:
             self._logger.error(f"Error checking storage warnings: {e}")
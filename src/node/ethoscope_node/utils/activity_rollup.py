@@ -0,0 +1,370 @@
+"""
+Activity Rollups
+
+Keeps per-ROI per-minute summaries of the tracking tables (ROI_n) of the backed-up
+SQLite databases, so plots of whole experiments do not have to fetch and
+aggregate every row.
+
+For each minute of each ROI the rollup stores the number of readings, the distance
+moved, the maximal velocity, the number of readings where the animal was moving
+and the sums of x and y. Distances are in pixels; a reading counts as moving when
+its velocity exceeds MOVING_SPEED ROI widths per second.
+
+The rollups live in one SQLite file next to the results folder
+(<results>/../.cache/results_rollups.db) rather than in the backups themselves,
+which rsync replaces on every cycle. Each database is processed from the last
+row id seen in each of its ROI tables; partial minutes are completed by adding to
+their sums. If the last row seen is no longer the same, the database was replaced
+by a different one and its rollups are rebuilt.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+# Seconds summarised by a row of the rollup
+ROLLUP_RESOLUTION = 60
+# Velocity, in ROI widths per second, above which a reading counts as moving
+MOVING_SPEED = 0.02
+# Rows read from a ROI table at once
+CHUNK_SIZE = 100000
+
+COLUMNS = ["t", "n", "distance", "max_velocity", "moving_fraction", "x", "y"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime_ns INTEGER NOT NULL DEFAULT 0,
+    size INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS progress (
+    source INTEGER NOT NULL,
+    roi INTEGER NOT NULL,
+    last_id INTEGER NOT NULL,
+    last_t INTEGER NOT NULL,
+    last_x REAL,
+    last_y REAL,
+    PRIMARY KEY (source, roi)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup (
+    source INTEGER NOT NULL,
+    roi INTEGER NOT NULL,
+    t INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    distance REAL NOT NULL,
+    max_velocity REAL NOT NULL,
+    moving INTEGER NOT NULL,
+    x_sum REAL NOT NULL,
+    y_sum REAL NOT NULL,
+    PRIMARY KEY (source, roi, t)
+) WITHOUT ROWID;
+"""
+
+_UPSERT = """
+INSERT INTO rollup VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (source, roi, t) DO UPDATE SET
+    n = n + excluded.n,
+    distance = distance + excluded.distance,
+    max_velocity = MAX(max_velocity, excluded.max_velocity),
+    moving = moving + excluded.moving,
+    x_sum = x_sum + excluded.x_sum,
+    y_sum = y_sum + excluded.y_sum
+"""
+
+_rollups = {}
+_rollups_lock = threading.Lock()
+
+
+def get_activity_rollups(results_dir, db_path=None):
+    """
+    Return the shared ActivityRollups of a results folder, creating it on first use.
+
+    Args:
+        results_dir: Folder of the backed-up databases, e.g. /ethoscope_data/results
+        db_path: SQLite file of the rollups (default: <results_dir>/../.cache/<name>_rollups.db)
+
+    Returns:
+        ActivityRollups: One instance per folder in this process
+    """
+    results_dir = os.path.abspath(results_dir)
+    with _rollups_lock:
+        if results_dir not in _rollups:
+            _rollups[results_dir] = ActivityRollups(results_dir, db_path)
+        return _rollups[results_dir]
+
+
+def _default_db_path(results_dir):
+    parent, name = os.path.split(results_dir.rstrip(os.sep))
+    return os.path.join(parent, ".cache", f"{name}_rollups.db")
+
+
+class ActivityRollups:
+    """Incrementally maintained per-minute activity summaries of backed-up databases."""
+
+    def __init__(self, results_dir, db_path=None, moving_speed=MOVING_SPEED):
+        """
+        Args:
+            results_dir: Folder of the backed-up databases
+            db_path: SQLite file of the rollups (default: <results_dir>/../.cache/<name>_rollups.db)
+            moving_speed: Velocity, in ROI widths per second, above which a reading counts as moving
+        """
+        self.results_dir = os.path.abspath(results_dir)
+        self.db_path = db_path or _default_db_path(self.results_dir)
+        self.moving_speed = moving_speed
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.RLock()
+
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def _relative_path(self, path):
+        """Return the path of a database relative to the results folder."""
+        full_path = os.path.abspath(os.path.join(self.results_dir, path))
+        relative = os.path.relpath(full_path, self.results_dir)
+        if relative.startswith(os.pardir):
+            raise ValueError(f"{path} is not in {self.results_dir}")
+        return relative
+
+    def _source_id(self, relative):
+        self._conn.execute(
+            "INSERT OR IGNORE INTO sources (path) VALUES (?)", (relative,)
+        )
+        return self._conn.execute(
+            "SELECT id FROM sources WHERE path = ?", (relative,)
+        ).fetchone()[0]
+
+    def _clear(self, source):
+        self._conn.execute("DELETE FROM progress WHERE source = ?", (source,))
+        self._conn.execute("DELETE FROM rollup WHERE source = ?", (source,))
+        self._conn.execute(
+            "UPDATE sources SET mtime_ns = 0, size = 0 WHERE id = ?", (source,)
+        )
+
+    def update(self, path, rebuild=False):
+        """
+        Bring the rollups of a database up to date, from the last row processed.
+
+        Args:
+            path: Database file, absolute or relative to the results folder
+            rebuild: Discard the rollups of the database and process it from the start
+
+        Returns:
+            int: Number of tracking rows processed
+        """
+        relative = self._relative_path(path)
+        full_path = os.path.join(self.results_dir, relative)
+        st = os.stat(full_path)
+
+        with self._lock, self._conn:
+            source = self._source_id(relative)
+            if rebuild:
+                self._clear(source)
+            mtime_ns, size = self._conn.execute(
+                "SELECT mtime_ns, size FROM sources WHERE id = ?", (source,)
+            ).fetchone()
+            if (mtime_ns, size) == (st.st_mtime_ns, st.st_size):
+                return 0
+
+            src = sqlite3.connect(f"file:{full_path}?mode=ro", uri=True, timeout=30)
+            try:
+                widths = self._roi_widths(src)
+                if not self._is_continuation(src, source, widths):
+                    self.logger.info(f"Rebuilding the rollups of {relative}")
+                    self._clear(source)
+                processed = sum(
+                    self._update_roi(src, source, roi, width)
+                    for roi, width in widths.items()
+                )
+            finally:
+                src.close()
+
+            self._conn.execute(
+                "UPDATE sources SET mtime_ns = ?, size = ? WHERE id = ?",
+                (st.st_mtime_ns, st.st_size, source),
+            )
+        if processed:
+            self.logger.debug(f"Rolled up {processed} rows of {relative}")
+        return processed
+
+    def update_all(self, directory=None):
+        """
+        Update the rollups of every database below a folder.
+
+        Args:
+            directory: Folder to search (default: the whole results folder)
+
+        Returns:
+            int: Number of tracking rows processed
+        """
+        processed = 0
+        for dirpath, _, filenames in os.walk(directory or self.results_dir):
+            for filename in sorted(filenames):
+                if not filename.endswith(".db"):
+                    continue
+                try:
+                    processed += self.update(os.path.join(dirpath, filename))
+                except (sqlite3.Error, OSError, ValueError) as e:
+                    self.logger.warning(f"Could not roll up {filename}: {e}")
+        return processed
+
+    @staticmethod
+    def _roi_widths(src):
+        """Return the width of each ROI with a tracking table, the largest side of its rectangle."""
+        tables = {
+            row[0]
+            for row in src.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'ROI\\_%' ESCAPE '\\'"
+            )
+        }
+        widths = {}
+        for roi, w, h in src.execute("SELECT roi_idx, w, h FROM ROI_MAP"):
+            if f"ROI_{roi}" in tables:
+                widths[int(roi)] = float(max(w, h))
+        return widths
+
+    def _is_continuation(self, src, source, widths):
+        """Whether the rows processed so far are still the first rows of the database."""
+        for roi, last_id, last_t in self._conn.execute(
+            "SELECT roi, last_id, last_t FROM progress WHERE source = ?", (source,)
+        ).fetchall():
+            if roi not in widths:
+                return False
+            row = src.execute(
+                f"SELECT t FROM ROI_{roi} WHERE id = ?", (last_id,)
+            ).fetchone()
+            if row is None or row[0] != last_t:
+                return False
+        return True
+
+    def _update_roi(self, src, source, roi, width):
+        progress = self._conn.execute(
+            "SELECT last_id, last_t, last_x, last_y FROM progress WHERE source = ? AND roi = ?",
+            (source, roi),
+        ).fetchone()
+        last_id, last = (progress[0], progress[1:]) if progress else (-1, None)
+        moving_speed = self.moving_speed * width
+        processed = 0
+
+        while True:
+            rows = src.execute(
+                f"SELECT id, t, x, y FROM ROI_{roi} WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, CHUNK_SIZE),
+            ).fetchall()
+            if not rows:
+                break
+            data = np.array(rows, dtype=float)
+            t, x, y = data[:, 1], data[:, 2], data[:, 3]
+
+            # each reading is compared with the one before it, possibly from the last update
+            previous = np.empty((len(rows), 3))
+            previous[1:] = data[:-1, 1:]
+            previous[0] = last if last is not None else data[0, 1:]
+            distance = np.hypot(x - previous[:, 1], y - previous[:, 2])
+            dt = (t - previous[:, 0]) / 1000.0
+            velocity = np.divide(
+                distance, dt, out=np.zeros_like(distance), where=dt > 0
+            )
+
+            minutes = (data[:, 1] // (ROLLUP_RESOLUTION * 1000)).astype(np.int64)
+            keys, inverse = np.unique(minutes, return_inverse=True)
+            n = np.bincount(inverse)
+            max_velocity = np.zeros(len(keys))
+            np.maximum.at(max_velocity, inverse, velocity)
+            self._conn.executemany(
+                _UPSERT,
+                zip(
+                    [source] * len(keys),
+                    [roi] * len(keys),
+                    (keys * ROLLUP_RESOLUTION).tolist(),
+                    n.tolist(),
+                    np.bincount(inverse, distance).tolist(),
+                    max_velocity.tolist(),
+                    np.bincount(inverse, velocity > moving_speed).astype(int).tolist(),
+                    np.bincount(inverse, x).tolist(),
+                    np.bincount(inverse, y).tolist(),
+                    strict=True,
+                ),
+            )
+
+            last_id = int(data[-1, 0])
+            last = tuple(data[-1, 1:].tolist())
+            processed += len(rows)
+
+        if processed:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO progress VALUES (?, ?, ?, ?, ?, ?)",
+                (source, roi, last_id, int(last[0]), last[1], last[2]),
+            )
+        return processed
+
+    def query(
+        self, path, resolution=ROLLUP_RESOLUTION, start=None, end=None, rois=None
+    ):
+        """
+        Return the activity of each ROI of a database, aggregated at a resolution.
+
+        Args:
+            path: Database file, absolute or relative to the results folder
+            resolution: Seconds per row, a multiple of ROLLUP_RESOLUTION
+            start: First second of the window, from the start of the experiment
+            end: Second after the window, from the start of the experiment
+            rois: Indices of the ROIs to return (default: all)
+
+        Returns:
+            dict: ``resolution``, ``columns`` (see COLUMNS) and ``rois``, mapping each ROI index
+            to its rows; ``t`` is the first second of each row, ``distance`` is in pixels and
+            ``max_velocity`` in pixels per second
+        """
+        resolution = int(resolution)
+        if resolution <= 0 or resolution % ROLLUP_RESOLUTION:
+            raise ValueError(
+                f"Resolution must be a positive multiple of {ROLLUP_RESOLUTION} seconds"
+            )
+        relative = self._relative_path(path)
+
+        where = ["s.path = ?"]
+        params = [resolution, resolution, relative]
+        if start is not None:
+            where.append("r.t >= ?")
+            params.append(int(start) // ROLLUP_RESOLUTION * ROLLUP_RESOLUTION)
+        if end is not None:
+            where.append("r.t < ?")
+            params.append(int(end))
+        if rois:
+            where.append(f"r.roi IN ({', '.join('?' * len(rois))})")
+            params.extend(int(roi) for roi in rois)
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT r.roi, r.t / ? * ? AS bucket, SUM(r.n), SUM(r.distance),
+                       MAX(r.max_velocity), SUM(r.moving), SUM(r.x_sum), SUM(r.y_sum)
+                FROM rollup r JOIN sources s ON s.id = r.source
+                WHERE {' AND '.join(where)}
+                GROUP BY r.roi, bucket
+                ORDER BY r.roi, bucket
+                """,
+                params,
+            ).fetchall()
+
+        result = {}
+        for roi, t, n, distance, max_velocity, moving, x_sum, y_sum in rows:
+            result.setdefault(roi, []).append(
+                [t, n, distance, max_velocity, moving / n, x_sum / n, y_sum / n]
+            )
+        return {"resolution": resolution, "columns": COLUMNS, "rois": result}
+
+    def close(self):
+        """Close the rollups database."""
+        with self._lock:
+            self._conn.close()
+        with _rollups_lock:
+            if _rollups.get(self.results_dir) is self:
+                del _rollups[self.results_dir]
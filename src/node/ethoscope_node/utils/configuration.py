@@ -1,3 +1,4 @@
+import copy
 import datetime
 import json
 import logging
@@ -5,7 +6,12 @@ import os
 import shutil
 import socket
 import subprocess
+import tempfile
+import threading
+from collections.abc import Callable, Iterator, Mapping
+from contextlib import contextmanager
 from pathlib import Path
+from types import MappingProxyType
 from typing import Any
 
 # Configuration validation constants
@@ -40,6 +46,43 @@ def set_default_config_file(path: str) -> None:
     _default_config_file = path
 
 
+def freeze(value: Any) -> Any:
+    """
+    Return a read-only deep copy of a configuration value.
+
+    Dictionaries become MappingProxyType views of new dictionaries and lists become
+    tuples, so the copy can be shared between threads.
+
+    Args:
+        value: Configuration value (as loaded from JSON)
+
+    Returns:
+        Read-only copy of the value
+    """
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """
+    Return a mutable deep copy of a value returned by freeze().
+
+    Args:
+        value: Read-only configuration value
+
+    Returns:
+        Copy made of dictionaries and lists, which can be serialised to JSON
+    """
+    if isinstance(value, Mapping):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
+
+
 class ConfigurationError(Exception):
     """Custom exception for configuration-related errors."""
 
@@ -95,8 +138,21 @@ class EthoscopeConfiguration:
 
     Data are stored in and retrieved from a JSON configuration file with automatic
     migration support and comprehensive validation.
+
+    Settings are versioned: changes are made on a copy in a transaction(), under a
+    lock, and the copy replaces the published settings once it has been written to
+    disk. Readers either use snapshot(), an immutable view of one version, or the
+    published dictionary, which writers no longer change in place. Listeners added
+    with add_listener() are called with the new snapshot after each change.
     """
 
+    # Store state, also valid for instances created without __init__
+    _version = 0
+    _snapshot = None
+    _listeners = ()
+    _working = None
+    _owner = None
+
     DEFAULT_SETTINGS = {
         "folders": {
             "results": {
@@ -333,32 +389,161 @@ class EthoscopeConfiguration:
 
         return merged
 
+    @property
+    def lock(self) -> threading.RLock:
+        """Lock held while the settings are changed and written."""
+        lock = self.__dict__.get("_lock")
+        if lock is None:
+            lock = self.__dict__.setdefault("_lock", threading.RLock())
+        return lock
+
+    @property
+    def version(self) -> int:
+        """Number of changes published since the configuration was created."""
+        return self._version
+
     @property
     def content(self) -> dict[str, Any]:
-        """Get configuration content."""
+        """
+        Get configuration content.
+
+        Within a transaction of the calling thread, this is the working copy of the
+        transaction; otherwise the published settings.
+        """
+        if self._owner == threading.get_ident():
+            return self._working
         return self._settings
 
-    @property
-    def file_exists(self) -> bool:
-        """Check if configuration file exists."""
-        return self._config_file.exists()
+    def snapshot(self) -> Mapping[str, Any]:
+        """
+        Get an immutable view of the current settings.
 
-    def save(self) -> None:
+        The view is built once per version and shared by all readers, who do not
+        wait for writers.
+
+        Returns:
+            Read-only mapping of the published settings
         """
-        Save settings to configuration file.
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self.lock:
+                if self._snapshot is None:
+                    self._snapshot = freeze(self._settings)
+                snapshot = self._snapshot
+        return snapshot
+
+    @contextmanager
+    def transaction(self, save: bool = True) -> Iterator[dict[str, Any]]:
+        """
+        Change the settings atomically.
+
+        Yields a copy of the settings to modify. When the block exits normally, the
+        copy is written to disk (if save is True), published as a new version and
+        listeners are notified; if it raises, the copy is discarded. Transactions
+        opened in the same thread while one is active join it.
+
+        Args:
+            save: Whether to write the new settings to the configuration file
+
+        Yields:
+            Working copy of the settings
 
         Raises:
-            ConfigurationError: If saving fails
+            ConfigurationError: If writing the configuration file fails
         """
+        with self.lock:
+            if self._owner == threading.get_ident():
+                yield self._working
+                return
+
+            working = copy.deepcopy(self._settings)
+            self._working, self._owner = working, threading.get_ident()
+            try:
+                yield working
+            finally:
+                self._working = self._owner = None
+            if save:
+                self._write(working)
+            snapshot = self._publish(working)
+        self._notify(snapshot)
+
+    def add_listener(self, callback: Callable[[Mapping[str, Any]], None]) -> None:
+        """
+        Register a function called with the new snapshot after each change.
+
+        Listeners are called outside of the lock, in the thread making the change.
+
+        Args:
+            callback: Function taking the snapshot of the new settings
+        """
+        with self.lock:
+            self._listeners = (*self._listeners, callback)
+
+    def remove_listener(self, callback: Callable[[Mapping[str, Any]], None]) -> None:
+        """
+        Unregister a function added with add_listener().
+
+        Args:
+            callback: Function to remove
+        """
+        with self.lock:
+            self._listeners = tuple(
+                listener for listener in self._listeners if listener != callback
+            )
+
+    def _publish(self, settings: dict[str, Any]) -> Mapping[str, Any]:
+        """Make settings the current version; returns its snapshot. Lock held."""
+        snapshot = freeze(settings)
+        self._settings, self._snapshot = settings, snapshot
+        self._version += 1
+        return snapshot
+
+    def _notify(self, snapshot: Mapping[str, Any]) -> None:
+        """Call the listeners with a new snapshot."""
+        for listener in self._listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                self._logger.error(f"Configuration listener {listener!r} failed: {e}")
+
+    def _write(self, settings: dict[str, Any]) -> None:
+        """
+        Write settings to the configuration file atomically.
+
+        The JSON is written and fsync'ed to a temporary file in the same folder,
+        which then replaces the configuration file, so a crash leaves either the old
+        or the new file in place, never a partial one.
+
+        Raises:
+            ConfigurationError: If writing fails
+        """
+        temporary = None
         try:
+            text = json.dumps(settings, indent=4, sort_keys=True, ensure_ascii=False)
+
             # Ensure directory exists
-            self._config_file.parent.mkdir(parents=True, exist_ok=True)
+            folder = self._config_file.parent
+            folder.mkdir(parents=True, exist_ok=True)
 
-            # Write configuration file
-            with open(self._config_file, "w", encoding="utf-8") as f:
-                json.dump(
-                    self._settings, f, indent=4, sort_keys=True, ensure_ascii=False
-                )
+            fd, temporary = tempfile.mkstemp(
+                prefix=f".{self._config_file.name}.", suffix=".tmp", dir=folder
+            )
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, self._config_file)
+            temporary = None
+
+            # Persist the rename itself; not supported on every filesystem
+            try:
+                dir_fd = os.open(folder, os.O_RDONLY)
+                try:
+                    os.fsync(dir_fd)
+                finally:
+                    os.close(dir_fd)
+            except OSError:
+                pass
 
             self._logger.info(f"Saved ethoscope configuration to {self._config_file}")
 
@@ -366,6 +551,35 @@ class EthoscopeConfiguration:
             raise ConfigurationError(
                 f"Failed to write configuration file {self._config_file}: {e}"
             ) from e
+        finally:
+            if temporary is not None:
+                try:
+                    os.unlink(temporary)
+                except OSError:
+                    pass
+
+    @property
+    def file_exists(self) -> bool:
+        """Check if configuration file exists."""
+        return self._config_file.exists()
+
+    def save(self) -> None:
+        """
+        Save settings to configuration file.
+
+        Within a transaction, the settings are saved when it ends. Otherwise the
+        published settings are written, for callers that changed content in place,
+        and published again as a new version.
+
+        Raises:
+            ConfigurationError: If saving fails
+        """
+        with self.lock:
+            if self._owner == threading.get_ident():
+                return
+            self._write(self._settings)
+            snapshot = self._publish(self._settings)
+        self._notify(snapshot)
 
     def load(self) -> dict[str, Any]:
         """
@@ -380,8 +594,9 @@ class EthoscopeConfiguration:
         # If file doesn't exist, save defaults
         if not self.file_exists:
             self._logger.info("Configuration file not found, creating with defaults")
-            self._settings = self.DEFAULT_SETTINGS.copy()
-            self.save()
+            with self.transaction() as settings:
+                settings.clear()
+                settings.update(copy.deepcopy(self.DEFAULT_SETTINGS))
             return self._settings
 
         try:
@@ -400,13 +615,15 @@ class EthoscopeConfiguration:
                     ) from e
 
             # Merge with defaults first to ensure all sections are present
-            self._settings = self._merge_with_defaults(loaded_config)
+            merged = self._merge_with_defaults(loaded_config)
 
             # Validate the merged configuration
-            self._validate_configuration(self._settings)
+            self._validate_configuration(merged)
 
             # Save merged configuration back to file
-            self.save()
+            with self.transaction() as settings:
+                settings.clear()
+                settings.update(merged)
 
             self._logger.info(
                 f"Configuration loaded successfully from {self._config_file}"
@@ -431,10 +648,11 @@ class EthoscopeConfiguration:
         Raises:
             ValueError: If section already exists
         """
-        if section in self._settings:
-            raise ValueError(f"Section '{section}' already exists")
+        with self.transaction(save=False) as settings:
+            if section in settings:
+                raise ValueError(f"Section '{section}' already exists")
 
-        self._settings[section] = {}
+            settings[section] = {}
         self._logger.info(f"Added new section: {section}")
 
     def list_sections(self) -> list[str]:
@@ -463,10 +681,11 @@ class EthoscopeConfiguration:
             section: Section name
             obj: Dictionary to merge into section
         """
-        if section not in self._settings:
-            self.add_section(section)
+        with self.transaction(save=False) as settings:
+            if section not in settings:
+                self.add_section(section)
 
-        self._settings[section].update(obj)
+            settings[section].update(obj)
         self._logger.info(
             f"Updated section '{section}' with new keys: {list(obj.keys())}"
         )
@@ -648,11 +867,8 @@ class EthoscopeConfiguration:
         name = sensordata["name"]
 
         try:
-            if "sensors" not in self._settings:
-                self._settings["sensors"] = {}
-
-            self._settings["sensors"][name] = sensordata
-            self.save()
+            with self.transaction() as settings:
+                settings.setdefault("sensors", {})[name] = sensordata
 
             self._logger.info(f"Added sensor: {name}")
             return {"result": "success", "data": self._settings["sensors"]}
@@ -680,20 +896,19 @@ class EthoscopeConfiguration:
         Raises:
             ValueError: If sensor not found or data is invalid
         """
-        sensors = self._settings.get("sensors", {})
-        if original_name not in sensors:
+        if original_name not in self._settings.get("sensors", {}):
             raise ValueError(f"Sensor '{original_name}' not found")
 
         new_name = sensordata.get("name", original_name)
 
         try:
-            # If name changed, remove old key
-            if new_name != original_name:
-                del sensors[original_name]
+            with self.transaction() as settings:
+                sensors = settings.setdefault("sensors", {})
+                # If name changed, remove old key
+                if new_name != original_name:
+                    sensors.pop(original_name, None)
 
-            sensors[new_name] = sensordata
-            self._settings["sensors"] = sensors
-            self.save()
+                sensors[new_name] = sensordata
 
             self._logger.info(f"Updated sensor: {original_name} -> {new_name}")
             return {"result": "success", "data": self._settings["sensors"]}
@@ -716,14 +931,12 @@ class EthoscopeConfiguration:
         Raises:
             ValueError: If sensor not found
         """
-        sensors = self._settings.get("sensors", {})
-        if name not in sensors:
+        if name not in self._settings.get("sensors", {}):
             raise ValueError(f"Sensor '{name}' not found")
 
         try:
-            del sensors[name]
-            self._settings["sensors"] = sensors
-            self.save()
+            with self.transaction() as settings:
+                settings.setdefault("sensors", {}).pop(name, None)
 
             self._logger.info(f"Deleted sensor: {name}")
             return {"result": "success", "data": self._settings["sensors"]}
@@ -763,11 +976,8 @@ class EthoscopeConfiguration:
             name: Custom variable name
             value: New value
         """
-        if "custom" not in self._settings:
-            self._settings["custom"] = {}
-
-        self._settings["custom"][name] = value
-        self.save()
+        with self.transaction() as settings:
+            settings.setdefault("custom", {})[name] = value
         self._logger.info(f"Updated custom setting '{name}'")
 
     def remove_user(self, username: str) -> bool:
@@ -937,42 +1147,40 @@ class EthoscopeConfiguration:
         Args:
             step: Name of the completed step
         """
-        if "setup" not in self._settings:
-            self._settings["setup"] = self.DEFAULT_SETTINGS["setup"].copy()
+        with self.transaction() as settings:
+            if "setup" not in settings:
+                settings["setup"] = copy.deepcopy(self.DEFAULT_SETTINGS["setup"])
 
-        steps_completed = self._settings["setup"].get("steps_completed", [])
-        if step not in steps_completed:
-            steps_completed.append(step)
-            self._settings["setup"]["steps_completed"] = steps_completed
+            steps_completed = settings["setup"].get("steps_completed", [])
+            if step not in steps_completed:
+                steps_completed.append(step)
+                settings["setup"]["steps_completed"] = steps_completed
 
-        # Mark setup as started if this is the first step
-        if not self._settings["setup"].get("setup_started"):
-            self._settings["setup"][
-                "setup_started"
-            ] = datetime.datetime.now().isoformat()
+            # Mark setup as started if this is the first step
+            if not settings["setup"].get("setup_started"):
+                settings["setup"]["setup_started"] = datetime.datetime.now().isoformat()
 
-        self.save()
         self._logger.info(f"Setup step completed: {step}")
 
     def complete_setup(self) -> None:
         """
         Mark the entire setup process as completed.
         """
-        if "setup" not in self._settings:
-            self._settings["setup"] = self.DEFAULT_SETTINGS["setup"].copy()
+        with self.transaction() as settings:
+            if "setup" not in settings:
+                settings["setup"] = copy.deepcopy(self.DEFAULT_SETTINGS["setup"])
 
-        self._settings["setup"]["completed"] = True
-        self._settings["setup"]["setup_completed"] = datetime.datetime.now().isoformat()
+            settings["setup"]["completed"] = True
+            settings["setup"]["setup_completed"] = datetime.datetime.now().isoformat()
 
-        self.save()
         self._logger.info("Setup process marked as completed")
 
     def reset_setup(self) -> None:
         """
         Reset setup status (for testing or re-setup).
         """
-        self._settings["setup"] = self.DEFAULT_SETTINGS["setup"].copy()
-        self.save()
+        with self.transaction() as settings:
+            settings["setup"] = copy.deepcopy(self.DEFAULT_SETTINGS["setup"])
         self._logger.info("Setup status reset")
 
     def get_tunnel_node_id(self) -> str:
@@ -1032,9 +1240,6 @@ class EthoscopeConfiguration:
         Raises:
             ValueError: If configuration data is invalid
         """
-        if "tunnel" not in self._settings:
-            self._settings["tunnel"] = self.DEFAULT_SETTINGS["tunnel"].copy()
-
         # Validate and update tunnel settings
         allowed_keys = [
             "enabled",
@@ -1047,19 +1252,22 @@ class EthoscopeConfiguration:
             "last_connected",
         ]
 
-        for key, value in config_data.items():
-            if key in allowed_keys:
-                self._settings["tunnel"][key] = value
-            else:
-                self._logger.warning(f"Unknown tunnel configuration key: {key}")
+        with self.transaction() as settings:
+            if "tunnel" not in settings:
+                settings["tunnel"] = self.DEFAULT_SETTINGS["tunnel"].copy()
+
+            for key, value in config_data.items():
+                if key in allowed_keys:
+                    settings["tunnel"][key] = value
+                else:
+                    self._logger.warning(f"Unknown tunnel configuration key: {key}")
 
-        # Update last modified timestamp if status changed
-        if "status" in config_data:
-            self._settings["tunnel"][
-                "last_connected"
-            ] = datetime.datetime.now().isoformat()
+            # Update last modified timestamp if status changed
+            if "status" in config_data:
+                settings["tunnel"][
+                    "last_connected"
+                ] = datetime.datetime.now().isoformat()
 
-        self.save()
         self._logger.info(f"Updated tunnel configuration: {list(config_data.keys())}")
 
         return self._settings["tunnel"]
@@ -1114,21 +1322,23 @@ class EthoscopeConfiguration:
         Raises:
             ValueError: If configuration data is invalid
         """
-        if "authentication" not in self._settings:
-            self._settings["authentication"] = self.DEFAULT_SETTINGS[
-                "authentication"
-            ].copy()
-
         # Validate and update authentication settings
         allowed_keys = ["enabled"]
 
-        for key, value in config_data.items():
-            if key in allowed_keys:
-                self._settings["authentication"][key] = value
-            else:
-                self._logger.warning(f"Unknown authentication configuration key: {key}")
+        with self.transaction() as settings:
+            if "authentication" not in settings:
+                settings["authentication"] = self.DEFAULT_SETTINGS[
+                    "authentication"
+                ].copy()
+
+            for key, value in config_data.items():
+                if key in allowed_keys:
+                    settings["authentication"][key] = value
+                else:
+                    self._logger.warning(
+                        f"Unknown authentication configuration key: {key}"
+                    )
 
-        self.save()
         self._logger.info(
             f"Updated authentication configuration: {list(config_data.keys())}"
         )
@@ -1259,21 +1469,21 @@ class EthoscopeConfiguration:
         Returns:
             Updated device options configuration
         """
-        if "device_options" not in self._settings:
-            self._settings["device_options"] = self.DEFAULT_SETTINGS[
-                "device_options"
-            ].copy()
-
         # Validate and update device options
         allowed_keys = ["enable_mysql_result_writer"]
 
-        for key, value in config_data.items():
-            if key in allowed_keys:
-                self._settings["device_options"][key] = value
-            else:
-                self._logger.warning(f"Unknown device option key: {key}")
+        with self.transaction() as settings:
+            if "device_options" not in settings:
+                settings["device_options"] = self.DEFAULT_SETTINGS[
+                    "device_options"
+                ].copy()
+
+            for key, value in config_data.items():
+                if key in allowed_keys:
+                    settings["device_options"][key] = value
+                else:
+                    self._logger.warning(f"Unknown device option key: {key}")
 
-        self.save()
         self._logger.info(f"Updated device options: {list(config_data.keys())}")
 
         return self._settings["device_options"]
@@ -1308,9 +1518,6 @@ class EthoscopeConfiguration:
         Returns:
             Updated temperature alert configuration
         """
-        if "alerts" not in self._settings:
-            self._settings["alerts"] = self.DEFAULT_SETTINGS["alerts"].copy()
-
         # Map external keys to internal config keys
         key_mapping = {
             "enabled": "temperature_alerts_enabled",
@@ -1318,21 +1525,24 @@ class EthoscopeConfiguration:
             "max_threshold": "temperature_max_threshold",
         }
 
-        for ext_key, int_key in key_mapping.items():
-            if ext_key in config_data:
-                value = config_data[ext_key]
-                # Validate threshold values
-                if ext_key in ("min_threshold", "max_threshold"):
-                    try:
-                        value = float(value)
-                    except (ValueError, TypeError):
-                        self._logger.warning(
-                            f"Invalid temperature threshold value: {value}"
-                        )
-                        continue
-                self._settings["alerts"][int_key] = value
-
-        self.save()
+        with self.transaction() as settings:
+            if "alerts" not in settings:
+                settings["alerts"] = self.DEFAULT_SETTINGS["alerts"].copy()
+
+            for ext_key, int_key in key_mapping.items():
+                if ext_key in config_data:
+                    value = config_data[ext_key]
+                    # Validate threshold values
+                    if ext_key in ("min_threshold", "max_threshold"):
+                        try:
+                            value = float(value)
+                        except (ValueError, TypeError):
+                            self._logger.warning(
+                                f"Invalid temperature threshold value: {value}"
+                            )
+                            continue
+                    settings["alerts"][int_key] = value
+
         self._logger.info(
             f"Updated temperature alert config: {list(config_data.keys())}"
         )
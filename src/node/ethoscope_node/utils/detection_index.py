@@ -0,0 +1,440 @@
+"""
+Target Detection Index
+
+Keeps an SQLite index of the target detection attempts reported by the ethoscopes,
+so the analyses of the diagnostics folder do not have to open and parse every
+metadata file each time they run.
+
+Devices save one <timestamp>_<device>_metadata.json file per attempt, in the
+"success" or "failed" folder of the diagnostics folder. The index stores one row
+per attempt with the device, the time, whether it succeeded, the number of targets
+found, the brightness and contrast of the image and the reason of a failure.
+A refresh only lists the folders whose mtime changed since they were last listed,
+and only parses the files that are new or whose mtime or size changed; rows of
+deleted files are dropped. Metadata files are written once by the devices and
+copied by rsync through temporary files, so any change renames a file in its
+folder. Files that cannot be parsed are remembered, so they are not parsed again
+until they change.
+
+The summaries of TargetDetectionAnalyzer are computed by SQL aggregates over the
+attempts of the analysed period.
+"""
+
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# Folders of the diagnostics folder holding the metadata of attempts
+FOLDERS = ("success", "failed")
+METADATA_SUFFIX = "_metadata.json"
+# Folders modified less than this many seconds before their last listing are
+# listed again, as files added in the same tick do not change their mtime
+MTIME_RESOLUTION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    listed_ns INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    folder TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS attempts (
+    path TEXT PRIMARY KEY,
+    device_id TEXT,
+    time REAL NOT NULL,
+    success INTEGER NOT NULL,
+    targets_expected INTEGER,
+    targets_found,
+    brightness REAL,
+    contrast REAL,
+    failure_reason TEXT
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS attempts_time ON attempts (time, success);
+CREATE INDEX IF NOT EXISTS attempts_device ON attempts (device_id, time);
+"""
+
+
+def failure_reason(metadata):
+    """
+    Describe why a detection attempt failed.
+
+    Args:
+        metadata: Metadata of the attempt, as saved by the device
+
+    Returns:
+        str: The reason given by the device, or "no_targets", "too_few_targets"
+            or "too_many_targets" from the number of targets found
+    """
+    if metadata.get("failure_reason"):
+        return str(metadata["failure_reason"])
+    found = metadata.get("targets_found", 0)
+    expected = metadata.get("targets_expected", 3)
+    try:
+        if found == 0:
+            return "no_targets"
+        if found < expected:
+            return "too_few_targets"
+        if found > expected:
+            return "too_many_targets"
+    except TypeError:
+        pass
+    return "unknown"
+
+
+class DetectionIndex:
+    """SQLite index of the detection attempts of a diagnostics folder."""
+
+    def __init__(self, base_path, db_path=None):
+        """
+        Args:
+            base_path: Diagnostics folder, holding the "success" and "failed" folders
+            db_path: SQLite file of the index (default: <base_path>/detection_index.db)
+        """
+        self.base_path = os.path.abspath(base_path)
+        self.db_path = db_path or os.path.join(self.base_path, "detection_index.db")
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.RLock()
+
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def refresh(self):
+        """
+        Bring the index up to date with the metadata files.
+
+        Returns:
+            dict: Numbers of files parsed ("parsed"), that could not be parsed
+                ("invalid") and that were removed from the index ("removed")
+        """
+        stats = {"parsed": 0, "invalid": 0, "removed": 0}
+        with self._lock, self._conn:
+            for folder in FOLDERS:
+                self._refresh_folder(folder, stats)
+        if stats["parsed"] or stats["removed"]:
+            self.logger.debug(f"Refreshed detection index: {stats}")
+        return stats
+
+    def _refresh_folder(self, folder, stats):
+        full_path = os.path.join(self.base_path, folder)
+        try:
+            mtime_ns = os.stat(full_path).st_mtime_ns
+            entries = [
+                entry
+                for entry in os.scandir(full_path)
+                if entry.name.endswith(METADATA_SUFFIX)
+            ]
+        except FileNotFoundError:
+            stats["removed"] += self._forget(folder, keep=())
+            self._conn.execute("DELETE FROM folders WHERE path = ?", (folder,))
+            return
+
+        listed = self._conn.execute(
+            "SELECT mtime_ns, listed_ns FROM folders WHERE path = ?", (folder,)
+        ).fetchone()
+        if (
+            listed is not None
+            and listed[0] == mtime_ns
+            and listed[1] - mtime_ns > MTIME_RESOLUTION * 1e9
+        ):
+            return
+        listed_ns = time.time_ns()
+
+        known = {
+            path: (mtime_ns, size)
+            for path, mtime_ns, size in self._conn.execute(
+                "SELECT path, mtime_ns, size FROM files WHERE folder = ?", (folder,)
+            )
+        }
+        present = set()
+        for entry in entries:
+            path = f"{folder}/{entry.name}"
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            present.add(path)
+            if known.get(path) == (st.st_mtime_ns, st.st_size):
+                continue
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                (path, folder, st.st_mtime_ns, st.st_size),
+            )
+            row = self._parse(entry.path, path, folder == "success")
+            if row is None:
+                stats["invalid"] += 1
+                self._conn.execute("DELETE FROM attempts WHERE path = ?", (path,))
+            else:
+                stats["parsed"] += 1
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO attempts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    row,
+                )
+
+        stats["removed"] += self._forget(folder, keep=present)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO folders VALUES (?, ?, ?)",
+            (folder, mtime_ns, listed_ns),
+        )
+
+    def _forget(self, folder, keep):
+        """Drop the files of a folder that are not in keep; return how many."""
+        gone = [
+            (path,)
+            for (path,) in self._conn.execute(
+                "SELECT path FROM files WHERE folder = ?", (folder,)
+            )
+            if path not in keep
+        ]
+        self._conn.executemany("DELETE FROM files WHERE path = ?", gone)
+        self._conn.executemany("DELETE FROM attempts WHERE path = ?", gone)
+        return len(gone)
+
+    def _parse(self, full_path, path, success):
+        """Return the row of attempts for a metadata file, or None if it is invalid."""
+        try:
+            with open(full_path) as f:
+                metadata = json.load(f)
+            timestamp = datetime.fromisoformat(metadata.get("timestamp", ""))
+            image_quality = metadata.get("image_quality") or {}
+            return (
+                path,
+                metadata.get("device_id", "unknown"),
+                timestamp.timestamp(),
+                int(success),
+                metadata.get("targets_expected"),
+                metadata.get("targets_found", 0),
+                image_quality.get("mean_brightness"),
+                image_quality.get("contrast_rms"),
+                None if success else failure_reason(metadata),
+            )
+        except (
+            json.JSONDecodeError,
+            ValueError,
+            KeyError,
+            TypeError,
+            AttributeError,
+            OSError,
+        ) as e:
+            self.logger.warning(f"Skipping invalid metadata file {full_path}: {e}")
+            return None
+
+    def _query(self, sql, since):
+        with self._lock:
+            return self._conn.execute(sql, (since,)).fetchall()
+
+    def summary(self, since):
+        """
+        Count the attempts since a time.
+
+        Args:
+            since: Unix timestamp of the start of the analysed period
+
+        Returns:
+            dict: As TargetDetectionAnalyzer._generate_summary_stats()
+        """
+        rows = self._query(
+            """SELECT device_id, SUM(success), SUM(NOT success) FROM attempts
+            WHERE time >= ? GROUP BY device_id""",
+            since,
+        )
+        successes = sum(row[1] for row in rows)
+        failures = sum(row[2] for row in rows)
+        total = successes + failures
+        return {
+            "total_detection_attempts": total,
+            "successful_detections": successes,
+            "failed_detections": failures,
+            "overall_success_rate": successes / total if total > 0 else 0,
+            "devices_with_failures": sum(1 for row in rows if row[2]),
+            "devices_with_successes": sum(1 for row in rows if row[1]),
+            "total_devices": len(rows),
+            "devices_analyzed": sorted(row[0] for row in rows),
+        }
+
+    def failure_patterns(self, since):
+        """
+        Describe the failed attempts since a time.
+
+        Missing brightness counts as 128 and missing contrast as 0.
+
+        Args:
+            since: Unix timestamp of the start of the analysed period
+
+        Returns:
+            dict: As TargetDetectionAnalyzer._analyze_failure_patterns(), with the
+                number of failures of each reason in "failure_reasons"
+        """
+        counts = self._query(
+            """SELECT targets_found, COUNT(*) AS n FROM attempts
+            WHERE time >= ? AND NOT success
+            GROUP BY targets_found ORDER BY n DESC, targets_found""",
+            since,
+        )
+        if not counts:
+            return {"no_failures": True}
+
+        total, *brightness, low_contrast = self._query(
+            """SELECT COUNT(*),
+                SUM(b < 30), SUM(b >= 30 AND b < 80), SUM(b >= 80 AND b < 180),
+                SUM(b >= 180 AND b < 220), SUM(b >= 220), SUM(c < 20)
+            FROM (
+                SELECT COALESCE(brightness, 128) AS b, COALESCE(contrast, 0) AS c
+                FROM attempts WHERE time >= ? AND NOT success
+            )""",
+            since,
+        )[0]
+        reasons = self._query(
+            """SELECT failure_reason, COUNT(*) FROM attempts
+            WHERE time >= ? AND NOT success GROUP BY failure_reason""",
+            since,
+        )
+        return {
+            "total_failures": total,
+            "targets_found_distribution": dict(counts),
+            "most_common_targets_found": counts[0][0],
+            "brightness_distribution": dict(
+                zip(
+                    ("very_dark", "dark", "normal", "bright", "very_bright"),
+                    brightness,
+                    strict=True,
+                )
+            ),
+            "low_contrast_failures": low_contrast,
+            "low_contrast_percentage": low_contrast / total * 100,
+            "failure_reasons": dict(reasons),
+        }
+
+    def device_performance(self, since):
+        """
+        Compare the success rates of the devices since a time.
+
+        Args:
+            since: Unix timestamp of the start of the analysed period
+
+        Returns:
+            dict: As TargetDetectionAnalyzer._analyze_device_performance()
+        """
+        device_performance = {}
+        problematic_devices = []
+        for device_id, successful, failed in self._query(
+            """SELECT device_id, SUM(success), SUM(NOT success) FROM attempts
+            WHERE time >= ? GROUP BY device_id""",
+            since,
+        ):
+            total = successful + failed
+            success_rate = successful / total
+            device_performance[device_id] = {
+                "total_attempts": total,
+                "successful": successful,
+                "failed": failed,
+                "success_rate": success_rate,
+            }
+            # Flag devices with low success rates (< 80%) and sufficient data (>= 5 attempts)
+            if success_rate < 0.8 and total >= 5:
+                problematic_devices.append(
+                    {
+                        "device_id": device_id,
+                        "success_rate": success_rate,
+                        "total_attempts": total,
+                    }
+                )
+
+        return {
+            "device_performance": device_performance,
+            "problematic_devices": sorted(
+                problematic_devices, key=lambda x: (x["success_rate"], x["device_id"])
+            ),
+            "total_devices_analyzed": len(device_performance),
+        }
+
+    def lighting_stats(self, since):
+        """
+        Summarise the brightness and contrast of the attempts since a time.
+
+        Args:
+            since: Unix timestamp of the start of the analysed period
+
+        Returns:
+            dict: {"success": stats, "failed": stats}, where stats has the mean,
+                (population) standard deviation, minimum, maximum and count of
+                "brightness" and "contrast", all 0 without values
+        """
+        empty = {"mean": 0, "std": 0, "min": 0, "max": 0, "count": 0}
+        stats = {
+            result: {"brightness": dict(empty), "contrast": dict(empty)}
+            for result in ("success", "failed")
+        }
+        columns = ", ".join(
+            f"COUNT({c}), AVG({c}), AVG({c} * {c}), MIN({c}), MAX({c})"
+            for c in ("brightness", "contrast")
+        )
+        for success, *values in self._query(
+            f"SELECT success, {columns} FROM attempts WHERE time >= ? GROUP BY success",
+            since,
+        ):
+            result = "success" if success else "failed"
+            for i, name in enumerate(("brightness", "contrast")):
+                count, mean, mean_square, minimum, maximum = values[5 * i : 5 * i + 5]
+                if count:
+                    stats[result][name] = {
+                        "mean": mean,
+                        "std": math.sqrt(max(0.0, mean_square - mean * mean)),
+                        "min": minimum,
+                        "max": maximum,
+                        "count": count,
+                    }
+        return stats
+
+    def failure_counts(self, since):
+        """
+        Count the attempts behind the recommendations of the analyzer.
+
+        Args:
+            since: Unix timestamp of the start of the analysed period
+
+        Returns:
+            dict: Numbers of "attempts" and "failures", and of failures that were
+                "dark" (brightness < 80), "bright" (> 200), "low_contrast" (< 20),
+                "partial" (1 or 2 targets found) or found "no_targets"
+        """
+        row = self._query(
+            """SELECT COUNT(*), SUM(NOT success),
+                SUM(NOT success AND b < 80), SUM(NOT success AND b > 200),
+                SUM(NOT success AND c < 20),
+                SUM(NOT success AND targets_found > 0 AND targets_found < 3),
+                SUM(NOT success AND targets_found = 0)
+            FROM (
+                SELECT success, targets_found, COALESCE(brightness, 128) AS b,
+                    COALESCE(contrast, 0) AS c
+                FROM attempts WHERE time >= ?
+            )""",
+            since,
+        )[0]
+        keys = (
+            "attempts",
+            "failures",
+            "dark",
+            "bright",
+            "low_contrast",
+            "partial",
+            "no_targets",
+        )
+        return {key: value or 0 for key, value in zip(keys, row, strict=True)}
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
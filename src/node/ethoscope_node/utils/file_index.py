@@ -0,0 +1,388 @@
+"""
+Results File Index
+
+Keeps an SQLite index of the files below a data folder (e.g. /ethoscope_data/results),
+so listing pages and size reports do not have to walk years of data on every call.
+
+The index stores one row per file (path, size, mtime, type, device, date) and one
+row per directory with the directory's mtime. A refresh only lists directories
+whose mtime changed, which is when files were added, removed or renamed in them.
+Files in unchanged directories are re-examined only if they were modified
+recently, as databases still being written grow without touching their directory.
+
+If the optional inotify_simple package is installed, start_watching() refreshes
+the index as soon as the filesystem changes; otherwise it refreshes periodically.
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+try:
+    from inotify_simple import INotify
+    from inotify_simple import flags as inotify_flags
+except ImportError:
+    INotify = None
+
+# Files modified less than this many seconds ago are re-examined on every refresh
+ACTIVE_WINDOW = 24 * 3600
+# Listings refresh the index if it is older than this many seconds
+DEFAULT_MAX_AGE = 5
+# Seconds between refreshes of the watcher thread without inotify
+WATCH_INTERVAL = 60
+
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    dir TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    type TEXT NOT NULL,
+    device TEXT NOT NULL,
+    date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_dir ON files (dir);
+CREATE INDEX IF NOT EXISTS files_type ON files (type);
+CREATE INDEX IF NOT EXISTS files_device ON files (device);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    mtime_ns INTEGER NOT NULL
+);
+"""
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_file_index(root, db_path=None):
+    """
+    Return the shared FileIndex of a data folder, creating it on first use.
+
+    Args:
+        root: Folder to index, e.g. /ethoscope_data/results
+        db_path: SQLite file of the index (default: <root>/../.cache/<name>_index.db)
+
+    Returns:
+        FileIndex: One instance per root in this process
+    """
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        if root not in _indexes:
+            _indexes[root] = FileIndex(root, db_path)
+        return _indexes[root]
+
+
+def _default_db_path(root):
+    parent, name = os.path.split(root.rstrip(os.sep))
+    return os.path.join(parent, ".cache", f"{name}_index.db")
+
+
+class FileIndex:
+    """Incrementally maintained SQLite index of the files below a folder."""
+
+    def __init__(self, root, db_path=None):
+        """
+        Args:
+            root: Folder to index
+            db_path: SQLite file of the index (default: <root>/../.cache/<name>_index.db)
+        """
+        self.root = os.path.abspath(root)
+        self.db_path = db_path or _default_db_path(self.root)
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.RLock()
+        self._last_refresh = 0.0
+        self._watch_thread = None
+        self._stop_watching = threading.Event()
+
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    @property
+    def last_refresh(self):
+        """Time of the last completed refresh, 0 if none."""
+        return self._last_refresh
+
+    def _describe(self, path):
+        """Return (type, device, date) of a file from its name and location."""
+        name = os.path.basename(path)
+        file_type = name.rsplit(".", 1)[1] if "." in name else ""
+        relative = os.path.relpath(path, self.root)
+        parts = relative.split(os.sep)
+        # results are stored as <machine_id>/<machine_name>/<date>/<file>
+        device = parts[0] if len(parts) > 1 else ""
+        match = _DATE_RE.search(relative)
+        return file_type, device, match.group(0) if match else ""
+
+    def refresh(self, max_age=0):
+        """
+        Bring the index up to date with the filesystem.
+
+        Args:
+            max_age: Skip the refresh if the index was refreshed less than max_age
+                seconds ago.
+
+        Returns:
+            int: Number of file rows added, updated or removed
+        """
+        with self._lock:
+            if max_age and time.time() - self._last_refresh < max_age:
+                return 0
+            started = time.time()
+            with self._conn:
+                changes = self._refresh()
+            self._last_refresh = started
+            if changes:
+                self.logger.debug(
+                    f"Indexed {changes} file changes in {self.root} "
+                    f"in {time.time() - started:.2f}s"
+                )
+            return changes
+
+    def _refresh(self):
+        conn = self._conn
+        now = time.time()
+        known_dirs = {
+            row["path"]: row["mtime_ns"]
+            for row in conn.execute("SELECT path, mtime_ns FROM dirs")
+        }
+        children = {}
+        for row in conn.execute("SELECT path, parent FROM dirs"):
+            children.setdefault(row["parent"], []).append(row["path"])
+
+        changes = 0
+        seen = set()
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+            seen.add(directory)
+
+            if known_dirs.get(directory) == mtime_ns:
+                stack.extend(children.get(directory, []))
+                changes += self._refresh_active_files(directory, now)
+                continue
+
+            subdirs, dir_changes = self._scan_directory(directory)
+            changes += dir_changes
+            stack.extend(subdirs)
+            # a directory modified within the last second may change again within
+            # the same mtime tick, so it is listed again on the next refresh
+            if now - mtime_ns / 1e9 < 1:
+                mtime_ns = -1
+            conn.execute(
+                "INSERT OR REPLACE INTO dirs (path, parent, mtime_ns) VALUES (?, ?, ?)",
+                (
+                    directory,
+                    None if directory == self.root else os.path.dirname(directory),
+                    mtime_ns,
+                ),
+            )
+
+        for directory in set(known_dirs) - seen:
+            conn.execute("DELETE FROM dirs WHERE path = ?", (directory,))
+            changes += conn.execute(
+                "DELETE FROM files WHERE dir = ?", (directory,)
+            ).rowcount
+        return changes
+
+    def _scan_directory(self, directory):
+        """List a directory, updating its file rows. Returns (subdirs, changes)."""
+        conn = self._conn
+        indexed = {
+            row["path"]: (row["size"], row["mtime"])
+            for row in conn.execute(
+                "SELECT path, size, mtime FROM files WHERE dir = ?", (directory,)
+            )
+        }
+        subdirs = []
+        changes = 0
+        try:
+            entries = list(os.scandir(directory))
+        except OSError as e:
+            self.logger.warning(f"Cannot list {directory}: {e}")
+            return [], 0
+
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                    continue
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue
+            if indexed.pop(entry.path, None) != (st.st_size, st.st_mtime):
+                self._upsert(entry.path, directory, st)
+                changes += 1
+
+        for path in indexed:
+            conn.execute("DELETE FROM files WHERE path = ?", (path,))
+            changes += 1
+        return subdirs, changes
+
+    def _refresh_active_files(self, directory, now):
+        """Re-stat the recently modified files of an unchanged directory."""
+        changes = 0
+        rows = self._conn.execute(
+            "SELECT path, size, mtime FROM files WHERE dir = ? AND mtime > ?",
+            (directory, now - ACTIVE_WINDOW),
+        ).fetchall()
+        for row in rows:
+            try:
+                st = os.stat(row["path"])
+            except OSError:
+                self._conn.execute("DELETE FROM files WHERE path = ?", (row["path"],))
+                changes += 1
+                continue
+            if (st.st_size, st.st_mtime) != (row["size"], row["mtime"]):
+                self._upsert(row["path"], directory, st)
+                changes += 1
+        return changes
+
+    def _upsert(self, path, directory, st):
+        file_type, device, date = self._describe(path)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO files (path, dir, size, mtime, type, device, date) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (path, directory, st.st_size, st.st_mtime, file_type, device, date),
+        )
+
+    def _where(self, file_type=None, device=None, prefix=None):
+        clauses, args = [], []
+        if file_type:
+            if "." in file_type:
+                clauses.append("path GLOB ?")
+                args.append(f"*.{file_type}")
+            else:
+                clauses.append("type = ?")
+                args.append(file_type)
+        if device:
+            clauses.append("device = ?")
+            args.append(device)
+        if prefix:
+            prefix = os.path.abspath(prefix).rstrip(os.sep)
+            clauses.append("(dir = ? OR substr(dir, 1, ?) = ?)")
+            args.extend([prefix, len(prefix) + 1, prefix + os.sep])
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, args
+
+    def files(self, file_type=None, device=None, prefix=None, max_age=DEFAULT_MAX_AGE):
+        """
+        List indexed files, refreshing the index first if it is older than max_age.
+
+        Args:
+            file_type: Only files with this extension, e.g. "db"
+            device: Only files of this device (first folder below root)
+            prefix: Only files below this folder
+            max_age: Maximum age of the index in seconds, None to skip refreshing
+
+        Returns:
+            list: dicts with path, size, mtime, type, device and date, sorted by path
+        """
+        if max_age is not None:
+            self.refresh(max_age)
+        where, args = self._where(file_type, device, prefix)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, size, mtime, type, device, date FROM files"
+                f"{where} ORDER BY path",
+                args,
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def total_size(
+        self, file_type=None, device=None, prefix=None, max_age=DEFAULT_MAX_AGE
+    ):
+        """Return the total size in bytes of the matching files, see files()."""
+        if max_age is not None:
+            self.refresh(max_age)
+        where, args = self._where(file_type, device, prefix)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT COALESCE(SUM(size), 0) FROM files{where}", args
+            ).fetchone()
+        return row[0]
+
+    def start_watching(self, interval=WATCH_INTERVAL):
+        """Keep the index current from a background thread."""
+        if self._watch_thread is not None and self._watch_thread.is_alive():
+            return
+        self._stop_watching.clear()
+        self._watch_thread = threading.Thread(
+            target=self._watch, args=(interval,), name="FileIndexWatcher", daemon=True
+        )
+        self._watch_thread.start()
+
+    def stop_watching(self):
+        """Stop the background thread started by start_watching()."""
+        self._stop_watching.set()
+        if self._watch_thread is not None:
+            self._watch_thread.join(timeout=5)
+            self._watch_thread = None
+
+    def _watch(self, interval):
+        inotify = None
+        watched = set()
+        if INotify is not None:
+            try:
+                inotify = INotify()
+            except OSError as e:
+                self.logger.warning(f"inotify unavailable, polling instead: {e}")
+        mask = 0
+        if inotify is not None:
+            mask = (
+                inotify_flags.CREATE
+                | inotify_flags.DELETE
+                | inotify_flags.MOVED_FROM
+                | inotify_flags.MOVED_TO
+                | inotify_flags.CLOSE_WRITE
+            )
+
+        while not self._stop_watching.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                self.logger.error(f"Failed to refresh file index of {self.root}: {e}")
+
+            if inotify is None:
+                self._stop_watching.wait(interval)
+                continue
+
+            with self._lock:
+                directories = [
+                    row[0] for row in self._conn.execute("SELECT path FROM dirs")
+                ]
+            for directory in directories:
+                if directory not in watched:
+                    try:
+                        inotify.add_watch(directory, mask)
+                        watched.add(directory)
+                    except OSError:
+                        pass
+            # wake up on the first change, then let a burst of changes settle
+            if inotify.read(timeout=interval * 1000):
+                time.sleep(1)
+                inotify.read(timeout=0)
+
+        if inotify is not None:
+            inotify.close()
+
+    def close(self):
+        """Stop watching and close the database connection."""
+        self.stop_watching()
+        with self._lock:
+            self._conn.close()
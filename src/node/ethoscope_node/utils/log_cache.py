@@ -0,0 +1,140 @@
+"""
+Device Log Cache
+
+Keeps the pages of device logs recently fetched from the paginated data/logs
+endpoint of the devices, so that paging back and forth in the web UI, or several
+users looking at the same device, do not ask the device for the same entries again.
+
+The newest page of a query changes while the device keeps logging, so it is only kept
+for a few seconds. Older pages, asked for with a cursor, and pages ending at a fixed
+"until" time do not change, and are kept until newer pages of the same device push
+them out.
+"""
+
+import datetime
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+# Filters of the data/logs endpoint of the devices
+QUERY_KEYS = ("since", "until", "level", "grep", "limit", "cursor", "source")
+# Seconds the newest page of a query is kept
+TAIL_TTL = 10
+# Seconds older pages are kept
+PAGE_TTL = 600
+# Pages kept per device
+MAX_PAGES = 32
+
+
+def format_log_entry(entry: dict[str, Any]) -> str:
+    """
+    Format a device log entry as a text line.
+
+    Args:
+        entry: Entry of a log page, with time, level, message and optionally unit
+
+    Returns:
+        Line such as "2025-03-01 08:00:00 [err] ethoscope_device.service: message"
+    """
+    parts = []
+    if entry.get("time") is not None:
+        when = datetime.datetime.fromtimestamp(entry["time"])
+        parts.append(f"{when:%Y-%m-%d %H:%M:%S}")
+    if entry.get("level"):
+        parts.append(f"[{entry['level']}]")
+    if entry.get("unit"):
+        parts.append(f"{entry['unit']}:")
+    parts.append(entry.get("message", ""))
+    return " ".join(parts)
+
+
+class DeviceLogCache:
+    """
+    Recent pages of device logs, per device.
+
+    Args:
+        max_pages: Pages kept per device, the least recently used are dropped first
+        tail_ttl: Seconds the newest page of a query is kept
+        page_ttl: Seconds older pages are kept
+        clock: Function returning the current time in seconds
+    """
+
+    def __init__(
+        self,
+        max_pages: int = MAX_PAGES,
+        tail_ttl: float = TAIL_TTL,
+        page_ttl: float = PAGE_TTL,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_pages = max_pages
+        self.tail_ttl = tail_ttl
+        self.page_ttl = page_ttl
+        self._clock = clock
+        self._pages = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def page(
+        self,
+        device_id: str,
+        fetch: Callable[..., dict[str, Any] | None],
+        **query: Any,
+    ) -> dict[str, Any] | None:
+        """
+        Get a page of a device log, from the cache or from the device.
+
+        Args:
+            device_id: Device identifier
+            fetch: Function fetching a page from the device, called with the query
+            **query: Filters of the data/logs endpoint (see QUERY_KEYS); empty
+                values are ignored
+
+        Returns:
+            Page with its entries and the cursor of the next one, or what fetch
+            returned if it failed (which is not cached)
+        """
+        query = {
+            key: str(value)
+            for key, value in query.items()
+            if key in QUERY_KEYS and value not in (None, "")
+        }
+        key = tuple(sorted(query.items()))
+        changing = "cursor" not in query and "until" not in query
+        ttl = self.tail_ttl if changing else self.page_ttl
+
+        with self._lock:
+            pages = self._pages.setdefault(device_id, OrderedDict())
+            cached = pages.get(key)
+            if cached is not None and self._clock() - cached[0] < ttl:
+                pages.move_to_end(key)
+                self.stats["hits"] += 1
+                return cached[1]
+            self.stats["misses"] += 1
+
+        # fetched without the lock, as the device may be slow to answer
+        page = fetch(**query)
+        if not isinstance(page, dict) or "entries" not in page:
+            return page
+
+        with self._lock:
+            pages = self._pages.setdefault(device_id, OrderedDict())
+            pages[key] = (self._clock(), page)
+            pages.move_to_end(key)
+            while len(pages) > self.max_pages:
+                pages.popitem(last=False)
+        return page
+
+    def invalidate(self, device_id: str | None = None) -> None:
+        """
+        Forget the pages of a device, or of all devices.
+
+        Args:
+            device_id: Device identifier, None for all devices
+        """
+        with self._lock:
+            if device_id is None:
+                self._pages.clear()
+            else:
+                self._pages.pop(device_id, None)
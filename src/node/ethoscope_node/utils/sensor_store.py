@@ -0,0 +1,420 @@
+"""
+Sensor Data Store
+
+Keeps the readings of the sensor CSV files (e.g. /ethoscope_data/sensors/*.csv) in
+an SQLite database indexed by sensor and timestamp, with min/mean/max rollups at
+several resolutions, so charts can ask for a time window and a maximum number of
+points instead of downloading every reading ever recorded.
+
+The CSV files stay the primary record and the export format: the store remembers
+how many bytes of each file it has read and imports only what was appended since,
+then recomputes the rollup buckets covering the new readings. A file that shrank
+or was replaced is imported again from the start.
+"""
+
+import calendar
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+FIELDS = ("temperature", "humidity", "pressure", "light")
+CSV_HEADERS = ["Time", "Temperature", "Humidity", "Pressure", "Light"]
+
+# Rollup bucket sizes in seconds; each one must divide the next
+RESOLUTIONS = (60, 600, 3600, 21600, 86400)
+
+# Readings parsed before they are written to the database
+IMPORT_BATCH = 50000
+
+_RAW = 0
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _rollup_table(resolution):
+    return f"rollup_{resolution}"
+
+
+def _schema():
+    field_columns = ", ".join(f"{f} REAL" for f in FIELDS)
+    statements = [
+        """
+        CREATE TABLE IF NOT EXISTS sensors (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL,
+            inode INTEGER NOT NULL DEFAULT 0,
+            offset INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        f"""
+        CREATE TABLE IF NOT EXISTS readings (
+            sensor INTEGER NOT NULL,
+            t INTEGER NOT NULL,
+            {field_columns},
+            PRIMARY KEY (sensor, t)
+        ) WITHOUT ROWID
+        """,
+    ]
+    rollup_columns = ", ".join(
+        f"{f}_n INTEGER, {f}_sum REAL, {f}_min REAL, {f}_max REAL" for f in FIELDS
+    )
+    for resolution in RESOLUTIONS:
+        statements.append(f"""
+            CREATE TABLE IF NOT EXISTS {_rollup_table(resolution)} (
+                sensor INTEGER NOT NULL,
+                t INTEGER NOT NULL,
+                n INTEGER NOT NULL,
+                {rollup_columns},
+                PRIMARY KEY (sensor, t)
+            ) WITHOUT ROWID
+            """)
+    return ";".join(statements)
+
+
+def get_sensor_store(sensors_dir, db_path=None):
+    """
+    Return the shared SensorStore of a sensors folder, creating it on first use.
+
+    Args:
+        sensors_dir: Folder of the sensor CSV files, e.g. /ethoscope_data/sensors
+        db_path: SQLite file of the store (default: <sensors_dir>/../.cache/<name>_store.db)
+
+    Returns:
+        SensorStore: One instance per folder in this process
+    """
+    sensors_dir = os.path.abspath(sensors_dir)
+    with _indexes_lock:
+        if sensors_dir not in _indexes:
+            _indexes[sensors_dir] = SensorStore(sensors_dir, db_path)
+        return _indexes[sensors_dir]
+
+
+def _default_db_path(sensors_dir):
+    parent, name = os.path.split(sensors_dir.rstrip(os.sep))
+    return os.path.join(parent, ".cache", f"{name}_store.db")
+
+
+def parse_time(value):
+    """
+    Parse a query time bound.
+
+    Args:
+        value: POSIX seconds, or a UTC date as "YYYY-MM-DD" or "YYYY-MM-DD HH:MM:SS"
+            (a "T" separator is accepted too)
+
+    Returns:
+        int: POSIX seconds, or None if value is empty
+
+    Raises:
+        ValueError: If value is neither a number nor a supported date
+    """
+    if value is None or value == "":
+        return None
+    try:
+        return int(float(value))
+    except ValueError:
+        pass
+    value = value.replace("T", " ")
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return calendar.timegm(time.strptime(value, fmt))
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid time: {value}")
+
+
+def format_time(timestamp):
+    """Format POSIX seconds like the sensor CSV files do (UTC)."""
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(timestamp))
+
+
+class _TimeParser:
+    """Parses the CSV timestamps, converting each distinct day only once."""
+
+    def __init__(self):
+        self._days = {}
+
+    def __call__(self, text):
+        day = self._days.get(text[:10])
+        if day is None:
+            day = calendar.timegm(time.strptime(text[:10], "%Y-%m-%d"))
+            self._days[text[:10]] = day
+        return day + int(text[11:13]) * 3600 + int(text[14:16]) * 60 + int(text[17:19])
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class SensorStore:
+    """SQLite store of sensor readings with precomputed rollups."""
+
+    def __init__(self, sensors_dir, db_path=None):
+        """
+        Args:
+            sensors_dir: Folder of the sensor CSV files
+            db_path: SQLite file of the store (default: <sensors_dir>/../.cache/<name>_store.db)
+        """
+        self.sensors_dir = os.path.abspath(sensors_dir)
+        self.db_path = db_path or _default_db_path(self.sensors_dir)
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.RLock()
+
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_schema())
+
+    def _sensor_row(self, name, create=True):
+        row = self._conn.execute(
+            "SELECT id, inode, offset FROM sensors WHERE name = ?", (name,)
+        ).fetchone()
+        if row is None and create:
+            cursor = self._conn.execute(
+                "INSERT INTO sensors (name) VALUES (?)", (name,)
+            )
+            row = (cursor.lastrowid, 0, 0)
+        return row
+
+    def _clear(self, sensor_id):
+        self._conn.execute("DELETE FROM readings WHERE sensor = ?", (sensor_id,))
+        for resolution in RESOLUTIONS:
+            self._conn.execute(
+                f"DELETE FROM {_rollup_table(resolution)} WHERE sensor = ?",
+                (sensor_id,),
+            )
+
+    def sync(self, name, csv_path=None):
+        """
+        Import the lines appended to a sensor CSV file since the last sync.
+
+        Args:
+            name: Sensor name, the CSV file name without extension
+            csv_path: CSV file (default: <sensors_dir>/<name>.csv)
+
+        Returns:
+            int: Number of readings imported
+
+        Raises:
+            OSError: If the CSV file cannot be read
+        """
+        csv_path = csv_path or os.path.join(self.sensors_dir, f"{name}.csv")
+        with self._lock, self._conn:
+            st = os.stat(csv_path)
+            sensor_id, inode, offset = self._sensor_row(name)
+            if inode != st.st_ino or st.st_size < offset:
+                self._clear(sensor_id)
+                offset = 0
+            if st.st_size == offset:
+                return 0
+
+            started = time.time()
+            count = 0
+            parse_time = _TimeParser()
+            rows = []
+            with open(csv_path, "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    # a line still being written is read on the next sync
+                    if not line.endswith(b"\n"):
+                        break
+                    offset += len(line)
+                    row = self._parse_line(line, parse_time)
+                    if row is not None:
+                        rows.append(row)
+                    if len(rows) >= IMPORT_BATCH:
+                        count += self._append(sensor_id, rows)
+                        rows = []
+            count += self._append(sensor_id, rows)
+
+            self._conn.execute(
+                "UPDATE sensors SET inode = ?, offset = ? WHERE id = ?",
+                (st.st_ino, offset, sensor_id),
+            )
+        if count:
+            self.logger.debug(
+                f"Imported {count} readings of {name} in {time.time() - started:.2f}s"
+            )
+        return count
+
+    @staticmethod
+    def _parse_line(line, parse_time):
+        """Return (t, temperature, humidity, pressure, light), or None to skip."""
+        values = line.decode("utf-8", errors="replace").strip().split(",")
+        if len(values) < 1 + len(FIELDS) or values[0].startswith("#"):
+            return None
+        try:
+            t = parse_time(values[0])
+        except ValueError:
+            # column header or corrupted line
+            return None
+        return (t, *(_to_float(v) for v in values[1 : 1 + len(FIELDS)]))
+
+    def append(self, name, rows):
+        """
+        Add readings to the store directly, bypassing the CSV files.
+
+        Args:
+            name: Sensor name
+            rows: Iterable of (t, temperature, humidity, pressure, light) tuples,
+                with t in POSIX seconds and None for missing values
+
+        Returns:
+            int: Number of readings added
+        """
+        with self._lock, self._conn:
+            sensor_id = self._sensor_row(name)[0]
+            count = 0
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= IMPORT_BATCH:
+                    count += self._append(sensor_id, batch)
+                    batch = []
+            return count + self._append(sensor_id, batch)
+
+    def _append(self, sensor_id, rows):
+        if not rows:
+            return 0
+        placeholders = ", ".join("?" * (2 + len(FIELDS)))
+        self._conn.executemany(
+            f"INSERT OR REPLACE INTO readings VALUES ({placeholders})",
+            ((sensor_id, *row) for row in rows),
+        )
+        self._update_rollups(
+            sensor_id, min(r[0] for r in rows), max(r[0] for r in rows)
+        )
+        return len(rows)
+
+    def _update_rollups(self, sensor_id, first, last):
+        """Recompute the rollup buckets containing readings from first to last."""
+        source = None
+        for resolution in RESOLUTIONS:
+            low = first // resolution * resolution
+            high = last // resolution * resolution + resolution
+            if source is None:
+                columns = ", ".join(
+                    f"COUNT({f}), SUM({f}), MIN({f}), MAX({f})" for f in FIELDS
+                )
+                select = f"SELECT sensor, t / {resolution} * {resolution}, COUNT(*), {columns} FROM readings"
+            else:
+                columns = ", ".join(
+                    f"SUM({f}_n), SUM({f}_sum), MIN({f}_min), MAX({f}_max)"
+                    for f in FIELDS
+                )
+                select = f"SELECT sensor, t / {resolution} * {resolution}, SUM(n), {columns} FROM {source}"
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {_rollup_table(resolution)} {select} "
+                "WHERE sensor = ? AND t >= ? AND t < ? GROUP BY 2",
+                (sensor_id, low, high),
+            )
+            source = _rollup_table(resolution)
+
+    def sensors(self):
+        """Return the names of the sensors in the store."""
+        with self._lock:
+            return [
+                row[0]
+                for row in self._conn.execute("SELECT name FROM sensors ORDER BY name")
+            ]
+
+    def _count(self, sensor_id, resolution, start, end):
+        """Return the number of points a query would return at a resolution."""
+        if resolution == _RAW:
+            # the finest rollup knows how many readings each minute holds
+            table, column = _rollup_table(RESOLUTIONS[0]), "COALESCE(SUM(n), 0)"
+            start = start // RESOLUTIONS[0] * RESOLUTIONS[0]
+        else:
+            table, column = _rollup_table(resolution), "COUNT(*)"
+            start = start // resolution * resolution
+        return self._conn.execute(
+            f"SELECT {column} FROM {table} WHERE sensor = ? AND t >= ? AND t <= ?",
+            (sensor_id, start, end),
+        ).fetchone()[0]
+
+    def choose_resolution(self, sensor_id, start, end, max_points):
+        """
+        Return the finest resolution returning at most max_points points.
+
+        Coarser levels are counted first, as they have the fewest rows, and the
+        search stops at the first level that would return too many points. If even
+        the coarsest level exceeds max_points, it is returned anyway.
+        """
+        if max_points is None:
+            return _RAW
+        levels = (_RAW, *RESOLUTIONS)
+        chosen = levels[-1]
+        for resolution in reversed(levels):
+            if self._count(sensor_id, resolution, start, end) > max_points:
+                break
+            chosen = resolution
+        return chosen
+
+    def query(self, name, start=None, end=None, max_points=None):
+        """
+        Return the readings of a sensor in a time window.
+
+        Args:
+            name: Sensor name
+            start: First time to include, POSIX seconds (default: first reading)
+            end: Last time to include, POSIX seconds (default: last reading)
+            max_points: Maximum number of points; when the window holds more
+                readings, the finest rollup returning at most max_points buckets
+                is used instead. None returns every reading.
+
+        Returns:
+            dict: "resolution" (bucket size in seconds, 0 for raw readings),
+                "fields", and "rows" as (t, temperature, humidity, pressure, light)
+                tuples. For rollups the values are bucket means, t is the bucket
+                start, and "min"/"max" hold the bucket extremes in the same layout.
+        """
+        with self._lock:
+            result = {"resolution": _RAW, "fields": list(FIELDS), "rows": []}
+            row = self._sensor_row(name, create=False)
+            if row is None:
+                return result
+            sensor_id = row[0]
+            if start is None:
+                start = 0
+            if end is None:
+                end = 2**62
+            if start > end:
+                return result
+
+            resolution = self.choose_resolution(sensor_id, start, end, max_points)
+            result["resolution"] = resolution
+            if resolution == _RAW:
+                result["rows"] = self._conn.execute(
+                    f"SELECT t, {', '.join(FIELDS)} FROM readings "
+                    "WHERE sensor = ? AND t >= ? AND t <= ? ORDER BY t",
+                    (sensor_id, start, end),
+                ).fetchall()
+                return result
+
+            columns = ", ".join(
+                f"CASE WHEN {f}_n > 0 THEN {f}_sum / {f}_n END, {f}_min, {f}_max"
+                for f in FIELDS
+            )
+            rows = self._conn.execute(
+                f"SELECT t, {columns} FROM {_rollup_table(resolution)} "
+                "WHERE sensor = ? AND t >= ? AND t <= ? ORDER BY t",
+                (sensor_id, start // resolution * resolution, end),
+            ).fetchall()
+
+        for kind, position in (("rows", 1), ("min", 2), ("max", 3)):
+            result[kind] = [
+                (r[0], *(r[position + 3 * i] for i in range(len(FIELDS)))) for r in rows
+            ]
+        return result
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
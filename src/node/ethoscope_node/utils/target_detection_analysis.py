@@ -4,6 +4,10 @@ Target Detection Analysis Module for Node
 This module provides node-side analysis capabilities for target detection data
 collected from ethoscope devices, including failure pattern analysis, dataset
 management, and reporting functionality.
+
+Analyses run as SQL aggregates over a DetectionIndex of the metadata files, which
+is refreshed incrementally before each analysis. If the index cannot be opened,
+the metadata files are loaded and analysed in memory instead.
 """
 
 __author__ = "giorgio"
@@ -11,12 +15,15 @@ __author__ = "giorgio"
 import json
 import logging
 import shutil
+import sqlite3
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Any
 
 import numpy as np
 
+from .detection_index import DetectionIndex
+
 
 class TargetDetectionAnalyzer:
     """
@@ -37,11 +44,28 @@ class TargetDetectionAnalyzer:
         """
         self.base_path = Path(base_path)
         self.logger = logging.getLogger(__name__)
+        self._index = None
 
         # Ensure analysis directory exists
         self.reports_dir = self.base_path / "analysis_reports"
         self.reports_dir.mkdir(parents=True, exist_ok=True)
 
+    @property
+    def index(self) -> DetectionIndex:
+        """Index of the detection attempts, opened on first use."""
+        if self._index is None:
+            self._index = DetectionIndex(str(self.base_path))
+        return self._index
+
+    def ingest(self) -> dict[str, int]:
+        """
+        Add the metadata files that arrived or changed since the last call to the index.
+
+        Returns:
+            Numbers of files parsed, invalid and removed, as DetectionIndex.refresh()
+        """
+        return self.index.refresh()
+
     def analyze_detection_logs(self, days_back: int = 30) -> dict[str, Any]:
         """
         Analyze detection logs from the last N days.
@@ -54,8 +78,13 @@ class TargetDetectionAnalyzer:
         """
         cutoff_date = datetime.now() - timedelta(days=days_back)
 
-        failed_data = self._load_detection_data("failed", cutoff_date)
-        success_data = self._load_detection_data("success", cutoff_date)
+        try:
+            results = self._analyze_index(cutoff_date)
+        except (sqlite3.Error, OSError) as e:
+            self.logger.warning(
+                f"Detection index unavailable, analysing metadata files: {e}"
+            )
+            results = self._analyze_files(cutoff_date)
 
         analysis = {
             "analysis_period": {
@@ -63,6 +92,37 @@ class TargetDetectionAnalyzer:
                 "end_date": datetime.now().isoformat(),
                 "days_analyzed": days_back,
             },
+            **results,
+        }
+
+        summary = results["summary"]
+        self.logger.info(
+            f"Analyzed {summary['failed_detections']} failed and "
+            f"{summary['successful_detections']} successful detections"
+        )
+        return analysis
+
+    def _analyze_index(self, cutoff_date: datetime) -> dict[str, Any]:
+        """Analyse the attempts since cutoff_date with SQL aggregates over the index."""
+        self.ingest()
+        since = cutoff_date.timestamp()
+        lighting = self.index.lighting_stats(since)
+        return {
+            "summary": self.index.summary(since),
+            "failure_patterns": self.index.failure_patterns(since),
+            "device_performance": self.index.device_performance(since),
+            "lighting_analysis": self._lighting_analysis(
+                lighting["failed"], lighting["success"]
+            ),
+            "recommendations": self._recommendations(self.index.failure_counts(since)),
+        }
+
+    def _analyze_files(self, cutoff_date: datetime) -> dict[str, Any]:
+        """Analyse the attempts since cutoff_date by loading every metadata file."""
+        failed_data = self._load_detection_data("failed", cutoff_date)
+        success_data = self._load_detection_data("success", cutoff_date)
+
+        return {
             "summary": self._generate_summary_stats(failed_data, success_data),
             "failure_patterns": self._analyze_failure_patterns(failed_data),
             "device_performance": self._analyze_device_performance(
@@ -76,11 +136,6 @@ class TargetDetectionAnalyzer:
             ),
         }
 
-        self.logger.info(
-            f"Analyzed {len(failed_data)} failed and {len(success_data)} successful detections"
-        )
-        return analysis
-
     def _load_detection_data(
         self, subdir: str, cutoff_date: datetime
     ) -> list[dict[str, Any]]:
@@ -278,9 +333,15 @@ class TargetDetectionAnalyzer:
                 },
             }
 
-        success_lighting = extract_lighting_stats(success_data)
-        failed_lighting = extract_lighting_stats(failed_data)
+        return self._lighting_analysis(
+            extract_lighting_stats(failed_data), extract_lighting_stats(success_data)
+        )
 
+    @staticmethod
+    def _lighting_analysis(
+        failed_lighting: dict[str, Any], success_lighting: dict[str, Any]
+    ) -> dict[str, Any]:
+        """Derive the optimal lighting ranges from the brightness and contrast stats."""
         # Identify optimal ranges
         optimal_brightness_range = None
         optimal_contrast_range = None
@@ -312,16 +373,43 @@ class TargetDetectionAnalyzer:
         self, failed_data: list[dict], success_data: list[dict]
     ) -> list[str]:
         """Generate actionable recommendations based on analysis."""
+
+        def brightness(f):
+            return f.get("image_quality", {}).get("mean_brightness", 128)
+
+        return self._recommendations(
+            {
+                "attempts": len(failed_data) + len(success_data),
+                "failures": len(failed_data),
+                "dark": sum(1 for f in failed_data if brightness(f) < 80),
+                "bright": sum(1 for f in failed_data if brightness(f) > 200),
+                "low_contrast": sum(
+                    1
+                    for f in failed_data
+                    if f.get("image_quality", {}).get("contrast_rms", 0) < 20
+                ),
+                "partial": sum(
+                    1 for f in failed_data if 0 < f.get("targets_found", 0) < 3
+                ),
+                "no_targets": sum(
+                    1 for f in failed_data if f.get("targets_found", 0) == 0
+                ),
+            }
+        )
+
+    @staticmethod
+    def _recommendations(counts: dict[str, int]) -> list[str]:
+        """Recommendations from the failure counts of DetectionIndex.failure_counts()."""
         recommendations = []
+        failures = counts["failures"]
 
-        if not failed_data:
+        if not failures:
             recommendations.append(
                 "No failures detected in the analyzed period - system performing well"
             )
             return recommendations
 
-        total_attempts = len(failed_data) + len(success_data)
-        failure_rate = len(failed_data) / total_attempts if total_attempts > 0 else 0
+        failure_rate = failures / counts["attempts"]
 
         # High failure rate
         if failure_rate > 0.3:
@@ -330,51 +418,30 @@ class TargetDetectionAnalyzer:
             )
 
         # Brightness issues
-        dark_failures = sum(
-            1
-            for f in failed_data
-            if f.get("image_quality", {}).get("mean_brightness", 128) < 80
-        )
-        bright_failures = sum(
-            1
-            for f in failed_data
-            if f.get("image_quality", {}).get("mean_brightness", 128) > 200
-        )
-
-        if dark_failures > len(failed_data) * 0.3:
+        if counts["dark"] > failures * 0.3:
             recommendations.append(
                 "Many failures due to low lighting. Increase illumination or check for obstructions"
             )
 
-        if bright_failures > len(failed_data) * 0.3:
+        if counts["bright"] > failures * 0.3:
             recommendations.append(
                 "Many failures due to excessive brightness. Reduce illumination or add diffusion"
             )
 
         # Contrast issues
-        low_contrast_failures = sum(
-            1
-            for f in failed_data
-            if f.get("image_quality", {}).get("contrast_rms", 0) < 20
-        )
-
-        if low_contrast_failures > len(failed_data) * 0.3:
+        if counts["low_contrast"] > failures * 0.3:
             recommendations.append(
                 "Low contrast contributing to failures. Check target visibility and arena cleanliness"
             )
 
         # Partial detection patterns
-        partial_detections = sum(
-            1 for f in failed_data if 0 < f.get("targets_found", 0) < 3
-        )
-        if partial_detections > len(failed_data) * 0.5:
+        if counts["partial"] > failures * 0.5:
             recommendations.append(
                 "Many partial detections (1-2 targets found). Check target placement and visibility"
             )
 
         # Zero detections
-        zero_detections = sum(1 for f in failed_data if f.get("targets_found", 0) == 0)
-        if zero_detections > len(failed_data) * 0.3:
+        if counts["no_targets"] > failures * 0.3:
             recommendations.append(
                 "Many complete detection failures. Verify targets are present and properly positioned"
             )
@@ -0,0 +1,389 @@
+"""
+Streaming Zip Archives
+
+Builds zip archives on the fly, as an iterator of byte chunks that can be handed
+straight to a WSGI response. Nothing is written to disk and only one chunk of
+each file is held in memory at a time.
+
+Entries are written with a data descriptor after their content, so the CRC and
+sizes do not need to be known before streaming starts. ZIP64 records are used for
+files, offsets and entry counts beyond the limits of the original format, so
+archives of multi-GB databases open with any modern unzip tool.
+"""
+
+import datetime
+import hashlib
+import json
+import logging
+import os
+import struct
+import time
+import zlib
+
+CHUNK_SIZE = 1024 * 1024
+
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP_MAX_ENTRIES = 0xFFFF
+
+MANIFEST_NAME = "MANIFEST.json"
+
+_STORED = 0
+_DEFLATED = 8
+# bit 3: sizes and CRC follow in a data descriptor, bit 11: UTF-8 names
+_FLAGS = 0x08 | 0x800
+_VERSION_DEFAULT = 20
+_VERSION_ZIP64 = 45
+# made by: unix, so external attributes carry the file mode
+_MADE_BY_UNIX = 3 << 8
+
+
+def _dos_datetime(timestamp):
+    """Return (dos_time, dos_date) for a POSIX timestamp."""
+    t = time.localtime(timestamp)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+class _Entry:
+    """Bookkeeping for one archive member, used to write the central directory."""
+
+    __slots__ = (
+        "name",
+        "offset",
+        "method",
+        "mtime",
+        "mode",
+        "zip64",
+        "crc",
+        "compressed_size",
+        "size",
+    )
+
+    def __init__(self, name, offset, method, mtime, mode, zip64):
+        self.name = name.encode("utf-8")
+        self.offset = offset
+        self.method = method
+        self.mtime = mtime
+        self.mode = mode
+        self.zip64 = zip64
+        self.crc = 0
+        self.compressed_size = 0
+        self.size = 0
+
+
+class ZipStream:
+    """
+    Iterate over this object to get the bytes of a zip archive of the given files.
+
+    Example:
+        stream = ZipStream(["/data/a.db", "/data/b.db"], manifest=True)
+        return stream  # as a bottle response body
+
+    Files that cannot be read are skipped with a warning, and listed in the
+    manifest. Iteration stops early if ``cancel_event`` is set, and closing the
+    iterator (what WSGI servers do when the client disconnects) closes the file
+    being read.
+    """
+
+    def __init__(
+        self,
+        paths,
+        compress=False,
+        manifest=False,
+        chunk_size=CHUNK_SIZE,
+        cancel_event=None,
+        force_zip64=False,
+    ):
+        """
+        Args:
+            paths: Files to add. Items are paths, or (path, arcname) pairs; by default
+                the arcname is the path without its leading slash.
+            compress: Deflate entries instead of storing them.
+            manifest: Append a MANIFEST.json listing each file's size and checksums.
+            chunk_size: Number of bytes read from disk at a time.
+            cancel_event: Optional threading.Event; when set, streaming stops.
+            force_zip64: Write ZIP64 records even for small archives.
+        """
+        self._paths = list(paths)
+        self._compress = compress
+        self._manifest = manifest
+        self._chunk_size = chunk_size
+        self._cancel_event = cancel_event
+        self._force_zip64 = force_zip64
+        self._offset = 0
+        self._entries = []
+        self._manifest_files = []
+        self._errors = []
+        self.cancelled = False
+        self.completed = False
+        self._generator = None
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    @property
+    def bytes_sent(self):
+        """Number of bytes produced so far."""
+        return self._offset
+
+    def __iter__(self):
+        self._generator = self._generate()
+        return self._generator
+
+    def close(self):
+        """Stop streaming and release the open file; called by WSGI servers."""
+        if self._generator is not None:
+            self._generator.close()
+
+    def _generate(self):
+        try:
+            for item in self._paths:
+                path, arcname = item if isinstance(item, tuple) else (item, None)
+                for chunk in self._file_entry(path, arcname):
+                    if self._is_cancelled():
+                        return
+                    yield self._emit(chunk)
+
+            if self._manifest:
+                for chunk in self._bytes_entry(MANIFEST_NAME, self._manifest_bytes()):
+                    yield self._emit(chunk)
+
+            yield self._emit(self._central_directory())
+            self.completed = True
+        except GeneratorExit:
+            self.cancelled = True
+            self.logger.info(
+                f"Zip download cancelled by the client after {self._offset} bytes"
+            )
+            raise
+
+    def _is_cancelled(self):
+        if self._cancel_event is not None and self._cancel_event.is_set():
+            self.cancelled = True
+            self.logger.info(f"Zip download cancelled after {self._offset} bytes")
+        return self.cancelled
+
+    def _emit(self, chunk):
+        self._offset += len(chunk)
+        return chunk
+
+    def _file_entry(self, path, arcname=None):
+        try:
+            st = os.stat(path)
+            f = open(path, "rb")
+        except OSError as e:
+            self.logger.warning(f"Failed to add {path} to archive: {e}")
+            self._errors.append({"path": path, "error": str(e)})
+            return
+
+        if arcname is None:
+            arcname = os.path.normpath(path).lstrip("/")
+
+        # only what was there when the download started is sent, so a file
+        # that is still growing cannot outgrow the entry's ZIP64 decision
+        remaining = st.st_size
+        # deflate can grow incompressible data by a few bytes per block
+        zip64 = self._force_zip64 or remaining + remaining // 1000 + 1024 > ZIP64_LIMIT
+        entry = self._start_entry(arcname, st.st_mtime, st.st_mode, zip64)
+        yield self._local_header(entry)
+
+        sha256 = hashlib.sha256() if self._manifest else None
+        compressor = self._compressor()
+        with f:
+            while remaining > 0:
+                data = f.read(min(self._chunk_size, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                chunk = self._update_entry(entry, data, compressor, sha256)
+                if chunk:
+                    yield chunk
+
+        tail = compressor.flush() if compressor is not None else b""
+        entry.compressed_size += len(tail)
+        yield tail + self._data_descriptor(entry)
+
+        if self._manifest:
+            self._manifest_files.append(
+                {
+                    "name": arcname,
+                    "path": path,
+                    "size": entry.size,
+                    "mtime": st.st_mtime,
+                    "crc32": f"{entry.crc:08x}",
+                    "sha256": sha256.hexdigest(),
+                }
+            )
+
+    def _bytes_entry(self, arcname, data):
+        entry = self._start_entry(arcname, time.time(), 0o100644, self._force_zip64)
+        yield self._local_header(entry)
+        compressor = self._compressor()
+        chunk = self._update_entry(entry, data, compressor)
+        tail = compressor.flush() if compressor is not None else b""
+        entry.compressed_size += len(tail)
+        yield chunk + tail + self._data_descriptor(entry)
+
+    def _manifest_bytes(self):
+        manifest = {
+            "created": datetime.datetime.now().isoformat(),
+            "files": self._manifest_files,
+            "errors": self._errors,
+        }
+        return json.dumps(manifest, indent=2).encode("utf-8")
+
+    def _compressor(self):
+        if not self._compress:
+            return None
+        return zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+
+    def _start_entry(self, arcname, mtime, mode, zip64):
+        method = _DEFLATED if self._compress else _STORED
+        entry = _Entry(arcname, self._offset, method, mtime, mode, zip64)
+        self._entries.append(entry)
+        return entry
+
+    @staticmethod
+    def _update_entry(entry, data, compressor, sha256=None):
+        entry.crc = zlib.crc32(data, entry.crc)
+        entry.size += len(data)
+        if sha256 is not None:
+            sha256.update(data)
+        if compressor is not None:
+            data = compressor.compress(data)
+        entry.compressed_size += len(data)
+        return data
+
+    @staticmethod
+    def _local_header(entry):
+        dos_time, dos_date = _dos_datetime(entry.mtime)
+        if entry.zip64:
+            # sizes are in the data descriptor; the extra field marks the entry ZIP64
+            extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0)
+            sizes = ZIP64_LIMIT
+            version = _VERSION_ZIP64
+        else:
+            extra = b""
+            sizes = 0
+            version = _VERSION_DEFAULT
+        header = struct.pack(
+            "<IHHHHHIIIHH",
+            0x04034B50,
+            version,
+            _FLAGS,
+            entry.method,
+            dos_time,
+            dos_date,
+            0,
+            sizes,
+            sizes,
+            len(entry.name),
+            len(extra),
+        )
+        return header + entry.name + extra
+
+    @staticmethod
+    def _data_descriptor(entry):
+        if entry.zip64:
+            return struct.pack(
+                "<IIQQ", 0x08074B50, entry.crc, entry.compressed_size, entry.size
+            )
+        return struct.pack(
+            "<IIII", 0x08074B50, entry.crc, entry.compressed_size, entry.size
+        )
+
+    def _central_directory(self):
+        records = []
+        for entry in self._entries:
+            dos_time, dos_date = _dos_datetime(entry.mtime)
+            size, compressed_size, offset = (
+                entry.size,
+                entry.compressed_size,
+                entry.offset,
+            )
+            # ZIP64 extra fields only carry the values that do not fit, in this order
+            zip64_fields = []
+            if entry.zip64 or size >= ZIP64_LIMIT:
+                zip64_fields.append(size)
+                size = ZIP64_LIMIT
+            if entry.zip64 or compressed_size >= ZIP64_LIMIT:
+                zip64_fields.append(compressed_size)
+                compressed_size = ZIP64_LIMIT
+            if self._force_zip64 or offset >= ZIP64_LIMIT:
+                zip64_fields.append(offset)
+                offset = ZIP64_LIMIT
+            extra = b""
+            if zip64_fields:
+                extra = struct.pack(
+                    f"<HH{len(zip64_fields)}Q",
+                    0x0001,
+                    8 * len(zip64_fields),
+                    *zip64_fields,
+                )
+            version = _VERSION_ZIP64 if extra else _VERSION_DEFAULT
+            records.append(
+                struct.pack(
+                    "<IHHHHHHIIIHHHHHII",
+                    0x02014B50,
+                    _MADE_BY_UNIX | version,
+                    version,
+                    _FLAGS,
+                    entry.method,
+                    dos_time,
+                    dos_date,
+                    entry.crc,
+                    compressed_size,
+                    size,
+                    len(entry.name),
+                    len(extra),
+                    0,
+                    0,
+                    0,
+                    (entry.mode & 0xFFFF) << 16,
+                    offset,
+                )
+                + entry.name
+                + extra
+            )
+
+        directory = b"".join(records)
+        cd_offset = self._offset
+        cd_size = len(directory)
+        count = len(self._entries)
+
+        end = b""
+        if (
+            self._force_zip64
+            or count >= ZIP_MAX_ENTRIES
+            or cd_offset >= ZIP64_LIMIT
+            or cd_size >= ZIP64_LIMIT
+        ):
+            zip64_end_offset = cd_offset + cd_size
+            end += struct.pack(
+                "<IQHHIIQQQQ",
+                0x06064B50,
+                44,
+                _MADE_BY_UNIX | _VERSION_ZIP64,
+                _VERSION_ZIP64,
+                0,
+                0,
+                count,
+                count,
+                cd_size,
+                cd_offset,
+            )
+            end += struct.pack("<IIQI", 0x07064B50, 0, zip64_end_offset, 1)
+
+        end += struct.pack(
+            "<IHHHHIIH",
+            0x06054B50,
+            0,
+            0,
+            min(count, ZIP_MAX_ENTRIES),
+            min(count, ZIP_MAX_ENTRIES),
+            min(cd_size, ZIP64_LIMIT),
+            min(cd_offset, ZIP64_LIMIT),
+            0,
+        )
+        return directory + end
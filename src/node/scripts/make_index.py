@@ -1,24 +1,21 @@
 #!/bin/env python
 
-import fnmatch
 import os
 
+from ethoscope_node.utils.file_index import get_file_index
+
 
 def make_index_file(path="/ethoscope_data/results/"):
 
     index_file = os.path.join(path, "index.txt")
 
-    matches = []
-    for root, _dirnames, filenames in os.walk(path):
-        for filename in fnmatch.filter(filenames, "*.db"):
-            matches.append(os.path.join(root, filename))
+    matches = get_file_index(path).files(file_type="db", max_age=0)
 
     with open(index_file, "w") as ind:
 
         for db in matches:
-            fp = os.path.relpath(db, path)
-            fs = os.stat(fp).st_size
-            ind.write(f'"{fp}", {fs}\n')
+            fp = os.path.relpath(db["path"], path)
+            ind.write(f'"{fp}", {db["size"]}\n')
 
 
 if __name__ == "__main__":
@@ -27,6 +27,7 @@ from ethoscope_node.scanner.ethoscope_scanner import EthoscopeScanner
 from ethoscope_node.scanner.sensor_scanner import SensorScanner
 from ethoscope_node.utils.configuration import EthoscopeConfiguration, ensure_ssh_keys
 from ethoscope_node.utils.etho_db import ExperimentalDB
+from ethoscope_node.utils.file_index import FileIndex, get_file_index
 
 # Constants
 DEFAULT_PORT = 80
@@ -138,6 +139,7 @@ class EthoscopeNodeServer:
         self.sensor_scanner: SensorScanner | None = None
         self.database: ExperimentalDB | None = None
         self.tunnel_utils: TunnelUtils | None = None
+        self.file_index: FileIndex | None = None
 
         # Paths and directories
         self.tmp_imgs_dir: str | None = None
@@ -372,6 +374,14 @@ class EthoscopeNodeServer:
 
             self._setup_api_modules()
 
+            # Keep the results file index current in the background
+            try:
+                self.file_index = get_file_index(self.results_dir)
+                self.file_index.start_watching()
+                self.logger.info(f"Watching {self.results_dir} for the file index")
+            except Exception as e:
+                self.logger.warning(f"Failed to start results file index: {e}")
+
             # Ensure tunnel environment file is up to date (after API modules are setup)
             self._update_tunnel_environment()
 
@@ -407,6 +417,12 @@ class EthoscopeNodeServer:
             except Exception as e:
                 self.logger.warning(f"Error stopping sensor scanner: {e}")
 
+        if self.file_index:
+            try:
+                self.file_index.stop_watching()
+            except Exception as e:
+                self.logger.warning(f"Error stopping file index watcher: {e}")
+
         if self.tmp_imgs_dir and os.path.exists(self.tmp_imgs_dir):
             try:
                 shutil.rmtree(self.tmp_imgs_dir)
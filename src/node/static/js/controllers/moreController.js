@@ -154,9 +154,9 @@ function maxLengthCheck(object) {
                 var spinner= new Spinner(opts).spin();
                 var loadingContainer = document.getElementById('loading');
                 loadingContainer.appendChild(spinner.el);
-                $http.post('/request_download/files', data=$scope.selected)
+                $http.post('/download/files', data=$scope.selected)
                      .then(function(response) { var res = response.data;
-                         $scope.browse.download_url = '/download'+res.url;
+                         $scope.browse.download_url = res.url;
                          spinner.stop();
                          $scope.selected = {'files':[]};
                          $('#downloadModal').modal('show');
@@ -334,12 +334,12 @@ function maxLengthCheck(object) {
             $scope.bugReportStatus = 'generating';
             $scope.bugReportError = null;
 
-            $http.get('/bugreport/generate')
+            // The report is streamed as a tar.gz archive, one file per node and device source
+            $http.get('/bugreport/generate', {responseType: 'blob'})
                 .then(function(response) {
-                    // Create blob and trigger download
-                    var blob = new Blob([JSON.stringify(response.data, null, 2)], {type: 'application/json'});
-                    var url = window.URL.createObjectURL(blob);
-                    var filename = 'ethoscope-bugreport-' + new Date().toISOString().replace(/[:.]/g, '-') + '.json';
+                    // Trigger download of the archive
+                    var url = window.URL.createObjectURL(response.data);
+                    var filename = 'ethoscope-bugreport-' + new Date().toISOString().replace(/[:.]/g, '-') + '.tar.gz';
 
                     // Create temporary anchor element for download
                     var a = document.createElement('a');
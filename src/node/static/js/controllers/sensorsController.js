@@ -53,7 +53,7 @@
 
             $scope.selectedSensors[filename].loading = true;
 
-            $http.get('/get_sensor_csv_data/' + filename + '.csv')
+            $http.get('/get_sensor_csv_data/' + filename + '.csv', { params: { max_points: 10000 } })
                 .then(function(response) {
                     var data = response.data;
                     $scope.selectedSensors[filename].data = {
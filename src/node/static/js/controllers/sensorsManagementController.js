@@ -276,7 +276,7 @@
         function fetchSensorData(filename) {
             if (!filename || $scope.csvSensors[filename].loading) return;
             $scope.csvSensors[filename].loading = true;
-            $http.get('/get_sensor_csv_data/' + filename + '.csv')
+            $http.get('/get_sensor_csv_data/' + filename + '.csv', { params: { max_points: 10000 } })
                 .then(function(response) {
                     $scope.csvSensors[filename].data = {
                         headers: response.data.headers,
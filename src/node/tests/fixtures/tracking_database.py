@@ -0,0 +1,59 @@
+"""
+Synthetic tracking databases for testing.
+
+This module provides ethoscope SQLite result databases with a ROI_MAP and
+ROI_n tracking tables that grow on demand, for tests of code reading results.
+"""
+
+import os
+import random
+import sqlite3
+
+DB_PATH = os.path.join("001aaa", "ETHOSCOPE_001", "2025-01-01_10-00-00", "test.db")
+ROI_SIZES = {1: (120, 20), 2: (120, 20), 3: (60, 30)}
+
+
+class SyntheticDatabase:
+    """An ethoscope SQLite database whose ROI tables grow on demand."""
+
+    def __init__(self, path, seed=0):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.rng = random.Random(seed)
+        self.t = dict.fromkeys(ROI_SIZES, 0)
+        self.rows = {roi: [] for roi in ROI_SIZES}
+        with sqlite3.connect(path) as conn:
+            conn.execute(
+                "CREATE TABLE ROI_MAP (roi_idx INTEGER, roi_value INTEGER, x INTEGER, y INTEGER, w INTEGER, h INTEGER)"
+            )
+            for roi, (w, h) in ROI_SIZES.items():
+                conn.execute(
+                    "INSERT INTO ROI_MAP VALUES (?, ?, ?, ?, ?, ?)",
+                    (roi, roi, 10, 30 * roi, w, h),
+                )
+                conn.execute(
+                    f"CREATE TABLE ROI_{roi} (id INTEGER PRIMARY KEY AUTOINCREMENT, t INTEGER, "
+                    "x INTEGER, y INTEGER, w INTEGER, h INTEGER, phi INTEGER, "
+                    "xy_dist_log10x1000 INTEGER, is_inferred INTEGER, has_interacted INTEGER)"
+                )
+        conn.close()
+
+    def grow(self, seconds):
+        """Append readings at irregular intervals, with bursts of movement."""
+        conn = sqlite3.connect(self.path)
+        with conn:
+            for roi, (w, h) in ROI_SIZES.items():
+                x, y = self.rows[roi][-1][2:4] if self.rows[roi] else (w // 2, h // 2)
+                end = self.t[roi] + seconds * 1000
+                while self.t[roi] < end:
+                    self.t[roi] += self.rng.randint(150, 900)
+                    if self.rng.random() < 0.3:
+                        x = min(max(x + self.rng.randint(-8, 8), 0), w)
+                        y = min(max(y + self.rng.randint(-2, 2), 0), h)
+                    cursor = conn.execute(
+                        f"INSERT INTO ROI_{roi} (t, x, y, w, h, phi, xy_dist_log10x1000, "
+                        "is_inferred, has_interacted) VALUES (?, ?, ?, 10, 4, 0, 0, 0, 0)",
+                        (self.t[roi], x, y),
+                    )
+                    self.rows[roi].append((cursor.lastrowid, self.t[roi], x, y))
+        conn.close()
@@ -328,8 +328,8 @@ class TestNotificationIntegration:
         assert "Network connection lost" in logs
         assert "Device stopped responding" in logs
 
-        # Verify API call
-        mock_get.assert_called_once_with(
+        # Verify API call, to the whole log as the mocked device has no pages
+        mock_get.assert_called_with(
             "http://192.168.1.100:9000/data/log/ETHOSCOPE_001", timeout=10
         )
 
@@ -6,7 +6,12 @@ device information collection, and error handling.
 """
 
 import datetime
+import io
+import json
+import tarfile
+import time
 import unittest
+import zlib
 from unittest.mock import MagicMock, Mock, patch
 
 from ethoscope_node.api.bugreport_api import (
@@ -14,7 +19,9 @@ from ethoscope_node.api.bugreport_api import (
     MAX_LOG_LINES,
     REPORT_VERSION,
     BugReportAPI,
+    _Source,
 )
+from ethoscope_node.utils.configuration import freeze
 
 
 class TestBugReportAPI(unittest.TestCase):
@@ -28,6 +35,9 @@ class TestBugReportAPI(unittest.TestCase):
         self.mock_server.config.content = {
             "folders": {"results": {"path": "/tmp/results"}},
         }
+        self.mock_server.config.snapshot.side_effect = lambda: freeze(
+            self.mock_server.config.content
+        )
         self.mock_server.config.get_device_options.return_value = {"option1": "value1"}
         self.mock_server.config.is_setup_required.return_value = False
         self.mock_server.device_scanner = Mock()
@@ -303,19 +313,22 @@ Buffers:         1000000 kB
         self.assertEqual(len(errors), 1)
         self.assertIn("Failed to get node logs", errors[0])
 
-    def test_collect_devices_info_no_scanner(self):
-        """Test device collection when scanner not available."""
+    def _source_names(self, sources):
+        return [source.name for source in sources]
+
+    def test_device_sources_no_scanner(self):
+        """Test device sources when scanner not available."""
         self.api.device_scanner = None
         errors = []
 
-        result = self.api._collect_devices_info(errors, 500)
+        result = self.api._device_sources(errors, 500)
 
-        self.assertEqual(result, {})
+        self.assertEqual(result, [])
         self.assertEqual(len(errors), 1)
         self.assertIn("Device scanner not available", errors[0])
 
-    def test_collect_devices_info_offline_device(self):
-        """Test device collection with offline device."""
+    def test_device_sources_offline_device(self):
+        """Test that only the summary of an offline device is collected."""
         self.api.device_scanner.get_all_devices_info.return_value = {
             "ETHOSCOPE_001": {
                 "status": "offline",
@@ -324,14 +337,16 @@ Buffers:         1000000 kB
         }
         errors = []
 
-        result = self.api._collect_devices_info(errors, 500)
+        result = self.api._device_sources(errors, 500)
 
-        self.assertIn("ETHOSCOPE_001", result)
-        self.assertEqual(result["ETHOSCOPE_001"]["status"], "offline")
-        self.assertIn("offline", result["ETHOSCOPE_001"]["error"])
+        self.assertEqual(
+            self._source_names(result), ["devices/ETHOSCOPE_001/summary.json"]
+        )
+        self.assertEqual(result[0].run()["status"], "offline")
+        self.api.device_scanner.get_device.assert_not_called()
 
-    def test_collect_devices_info_online_device(self):
-        """Test device collection with online device."""
+    def test_device_sources_online_device(self):
+        """Test device sources of an online device."""
         self.api.device_scanner.get_all_devices_info.return_value = {
             "ETHOSCOPE_001": {
                 "status": "running",
@@ -346,35 +361,46 @@ Buffers:         1000000 kB
 
         errors = []
 
-        result = self.api._collect_devices_info(errors, 500)
+        result = self.api._device_sources(errors, 500)
 
-        self.assertIn("ETHOSCOPE_001", result)
-        self.assertEqual(result["ETHOSCOPE_001"]["status"], "running")
         self.assertEqual(
-            result["ETHOSCOPE_001"]["machine_info"], {"hostname": "eth001"}
+            self._source_names(result),
+            [
+                "devices/ETHOSCOPE_001/summary.json",
+                "devices/ETHOSCOPE_001/machine_info.json",
+                "devices/ETHOSCOPE_001/log.txt",
+            ],
+        )
+        self.assertEqual(result[1].run(), {"hostname": "eth001"})
+        self.assertEqual(result[2].run(), "Some log data")
+        mock_device.log.assert_called_once_with(500)
+
+    def test_device_sources_scanner_error(self):
+        """Test device sources handle scanner errors."""
+        self.api.device_scanner.get_all_devices_info.side_effect = Exception(
+            "Scanner error"
         )
-        self.assertEqual(result["ETHOSCOPE_001"]["log"], "Some log data")
-
-    def test_collect_devices_info_device_error(self):
-        """Test device collection handles device errors."""
-        self.api.device_scanner.get_all_devices_info.return_value = {
-            "ETHOSCOPE_001": {
-                "status": "running",
-                "id": "ETHOSCOPE_001",
-            }
-        }
-
-        mock_device = Mock()
-        mock_device.machine_info.side_effect = Exception("Connection error")
-        mock_device.log.side_effect = Exception("Log error")
-        self.api.device_scanner.get_device.return_value = mock_device
-
         errors = []
 
-        result = self.api._collect_devices_info(errors, 500)
+        result = self.api._device_sources(errors, 500)
 
-        self.assertIn("ETHOSCOPE_001", result)
-        self.assertIn("Failed to get machine info", result["ETHOSCOPE_001"]["error"])
+        self.assertEqual(result, [])
+        self.assertIn("Failed to collect device info", errors[0])
+
+    def test_node_sources(self):
+        """Test node sources and their archive names."""
+        names = self._source_names(self.api._node_sources([], 500))
+
+        for name in (
+            "node/system.json",
+            "node/git.json",
+            "node/services.json",
+            "node/log.txt",
+            "backup_services.json",
+            "configuration.json",
+        ):
+            self.assertIn(name, names)
+        self.assertEqual(len(names), len(set(names)))
 
     @patch("subprocess.run")
     def test_collect_backup_status(self, mock_run):
@@ -446,112 +472,187 @@ Buffers:         1000000 kB
         self.assertIn("1/2 online", result)
         self.assertIn("1", result)  # Collection errors
 
-    @patch.object(BugReportAPI, "_get_report_metadata")
-    @patch.object(BugReportAPI, "_collect_node_info")
-    @patch.object(BugReportAPI, "_collect_devices_info")
-    @patch.object(BugReportAPI, "_collect_backup_status")
-    @patch.object(BugReportAPI, "_collect_configuration")
-    @patch.object(BugReportAPI, "_generate_summary")
+    def _sources(self, errors, log_lines):
+        return [
+            _Source("node/git.json", lambda: {"branch": "main"}, 1),
+            _Source("node/log.txt", lambda: ["line 1", "line 2"], 1),
+        ]
+
+    @patch.object(BugReportAPI, "_device_sources", return_value=[])
     @patch("ethoscope_node.api.bugreport_api.bottle")
-    def test_generate_bug_report(
-        self,
-        mock_bottle,
-        mock_summary,
-        mock_config,
-        mock_backup,
-        mock_devices,
-        mock_node,
-        mock_metadata,
-    ):
+    def test_generate_bug_report(self, mock_bottle, mock_devices):
         """Test full bug report generation."""
-        mock_metadata.return_value = {"version": "1.0", "hostname": "test"}
-        mock_node.return_value = {"system": {}}
-        mock_devices.return_value = {}
-        mock_backup.return_value = {}
-        mock_config.return_value = {}
-        mock_summary.return_value = "Summary"
-
         mock_bottle.request.json = None
+        mock_bottle.response.headers = {}
+
+        with patch.object(BugReportAPI, "_node_sources", side_effect=self._sources):
+            result = self.api._generate_bug_report()
+            members = read_archive(result)
 
-        result = self.api._generate_bug_report()
+        self.assertEqual(mock_bottle.response.content_type, "application/gzip")
+        self.assertIn(".tar.gz", mock_bottle.response.headers["Content-Disposition"])
+        self.assertEqual(
+            set(members),
+            {"node/git.json", "node/log.txt", "summary.txt", "report.json"},
+        )
+        self.assertEqual(json.loads(members["node/git.json"]), {"branch": "main"})
+        self.assertEqual(members["node/log.txt"], b"line 1\nline 2")
+        self.assertIn(b"Git: main", members["summary.txt"])
 
-        self.assertIn("report_metadata", result)
-        self.assertIn("node", result)
-        self.assertIn("devices", result)
-        self.assertIn("backup_services", result)
-        self.assertIn("configuration", result)
-        self.assertIn("_summary", result)
-        self.assertIn("errors", result)
+        report = json.loads(members["report.json"])
+        self.assertEqual(report["report_metadata"]["version"], REPORT_VERSION)
+        self.assertEqual(report["errors"], [])
+        self.assertEqual(report["sources"]["node/git.json"]["status"], "ok")
 
     @patch.object(BugReportAPI, "get_request_json")
-    @patch.object(BugReportAPI, "_get_report_metadata")
-    @patch.object(BugReportAPI, "_collect_node_info")
-    @patch.object(BugReportAPI, "_collect_devices_info")
-    @patch.object(BugReportAPI, "_collect_backup_status")
-    @patch.object(BugReportAPI, "_collect_configuration")
-    @patch.object(BugReportAPI, "_generate_summary")
+    @patch.object(BugReportAPI, "_device_sources", return_value=[])
+    @patch.object(BugReportAPI, "_node_sources", return_value=[])
     @patch("ethoscope_node.api.bugreport_api.bottle")
     def test_generate_bug_report_with_custom_log_lines(
-        self,
-        mock_bottle,
-        mock_summary,
-        mock_config,
-        mock_backup,
-        mock_devices,
-        mock_node,
-        mock_metadata,
-        mock_get_json,
+        self, mock_bottle, mock_node, mock_devices, mock_get_json
     ):
         """Test bug report with custom log lines parameter."""
         mock_get_json.return_value = {"log_lines": 1000}
-        mock_metadata.return_value = {"version": "1.0", "hostname": "test"}
-        mock_node.return_value = {"system": {}}
-        mock_devices.return_value = {}
-        mock_backup.return_value = {}
-        mock_config.return_value = {}
-        mock_summary.return_value = "Summary"
 
         self.api._generate_bug_report()
 
-        # Verify _collect_node_info was called with 1000 log lines
-        mock_node.assert_called_once()
-        call_args = mock_node.call_args[0]
-        self.assertEqual(call_args[1], 1000)
+        # Verify sources were created with 1000 log lines
+        self.assertEqual(mock_node.call_args[0][1], 1000)
+        self.assertEqual(mock_devices.call_args[0][1], 1000)
 
     @patch.object(BugReportAPI, "get_request_json")
-    @patch.object(BugReportAPI, "_get_report_metadata")
-    @patch.object(BugReportAPI, "_collect_node_info")
-    @patch.object(BugReportAPI, "_collect_devices_info")
-    @patch.object(BugReportAPI, "_collect_backup_status")
-    @patch.object(BugReportAPI, "_collect_configuration")
-    @patch.object(BugReportAPI, "_generate_summary")
+    @patch.object(BugReportAPI, "_device_sources", return_value=[])
+    @patch.object(BugReportAPI, "_node_sources", return_value=[])
     @patch("ethoscope_node.api.bugreport_api.bottle")
     def test_generate_bug_report_max_log_lines(
-        self,
-        mock_bottle,
-        mock_summary,
-        mock_config,
-        mock_backup,
-        mock_devices,
-        mock_node,
-        mock_metadata,
-        mock_get_json,
+        self, mock_bottle, mock_node, mock_devices, mock_get_json
     ):
         """Test bug report enforces max log lines."""
         mock_get_json.return_value = {"log_lines": 10000}  # Over max
-        mock_metadata.return_value = {"version": "1.0", "hostname": "test"}
-        mock_node.return_value = {"system": {}}
-        mock_devices.return_value = {}
-        mock_backup.return_value = {}
-        mock_config.return_value = {}
-        mock_summary.return_value = "Summary"
 
         self.api._generate_bug_report()
 
-        # Verify _collect_node_info was called with MAX_LOG_LINES
-        mock_node.assert_called_once()
-        call_args = mock_node.call_args[0]
-        self.assertEqual(call_args[1], MAX_LOG_LINES)
+        # Verify sources were created with MAX_LOG_LINES
+        self.assertEqual(mock_node.call_args[0][1], MAX_LOG_LINES)
+
+
+class FakeDevice:
+    """An online ethoscope answering after `latency` seconds."""
+
+    def __init__(self, latency, fail=False):
+        self.latency = latency
+        self.fail = fail
+
+    def machine_info(self):
+        time.sleep(self.latency)
+        if self.fail:
+            raise ConnectionError("Connection refused")
+        return {"latency": self.latency}
+
+    def log(self, log_lines):
+        time.sleep(self.latency)
+        return {"log": f"{log_lines} lines"}
+
+
+class FakeScanner:
+    """Device scanner of FakeDevices."""
+
+    def __init__(self, devices):
+        self.devices = devices
+
+    def get_all_devices_info(self, include_inactive=False):
+        return {device_id: {"status": "running"} for device_id in self.devices}
+
+    def get_device(self, device_id):
+        return self.devices[device_id]
+
+
+def read_archive(chunks):
+    """Members of a streamed tar.gz report, keyed by name within the report folder."""
+    data = b"".join(chunks)
+    with tarfile.open(fileobj=io.BytesIO(data), mode="r:gz") as tar:
+        return {
+            member.name.split("/", 1)[1]: tar.extractfile(member).read()
+            for member in tar.getmembers()
+        }
+
+
+class TestConcurrentCollection(unittest.TestCase):
+    """Test that sources are collected concurrently, within their time limits."""
+
+    def setUp(self):
+        self.server = Mock()
+        self.server.config = None
+        self.api = BugReportAPI(self.server)
+        # node sources answer at once
+        patcher = patch.object(BugReportAPI, "_node_sources", return_value=[])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _report(self, devices):
+        self.api.device_scanner = FakeScanner(devices)
+        start = time.monotonic()
+        with patch("ethoscope_node.api.bugreport_api.bottle"):
+            members = read_archive(self.api._generate_bug_report())
+        return members, time.monotonic() - start
+
+    def test_total_time_close_to_slowest_device(self):
+        devices = {f"{i:03d}": FakeDevice(0.05 + 0.01 * i) for i in range(30)}
+        members, elapsed = self._report(devices)
+
+        # 60 requests of 0.05-0.34s would take ~12s one after the other
+        self.assertLess(elapsed, 0.34 * 3)
+        for device_id in devices:
+            for name in ("summary.json", "machine_info.json", "log.txt"):
+                self.assertIn(f"devices/{device_id}/{name}", members)
+        self.assertEqual(members["devices/000/log.txt"], b"500 lines")
+        self.assertIn(b"Devices: 30/30 online", members["summary.txt"])
+
+    @patch("ethoscope_node.api.bugreport_api.DEVICE_TIMEOUT", 0.2)
+    def test_slow_and_failing_devices_are_reported(self):
+        devices = {
+            "fast": FakeDevice(0.01),
+            "hung": FakeDevice(2),
+            "broken": FakeDevice(0.01, fail=True),
+        }
+        members, elapsed = self._report(devices)
+
+        self.assertLess(elapsed, 1)
+        self.assertIn("devices/fast/machine_info.json", members)
+        self.assertNotIn("devices/hung/machine_info.json", members)
+        self.assertNotIn("devices/broken/machine_info.json", members)
+        self.assertIn("devices/broken/log.txt", members)
+
+        report = json.loads(members["report.json"])
+        errors = "\n".join(report["errors"])
+        self.assertIn("devices/hung/machine_info.json: no answer within 0.2s", errors)
+        self.assertIn("devices/hung/log.txt", errors)
+        self.assertIn("devices/broken/machine_info.json: Connection refused", errors)
+        self.assertEqual(report["sources"]["devices/hung/log.txt"]["status"], "error")
+
+    @patch("ethoscope_node.api.bugreport_api.REPORT_DEADLINE", 0.3)
+    def test_deadline(self):
+        devices = {f"{i:03d}": FakeDevice(2) for i in range(5)}
+        members, elapsed = self._report(devices)
+
+        self.assertLess(elapsed, 1)
+        report = json.loads(members["report.json"])
+        self.assertEqual(len(report["errors"]), 10)
+        self.assertIn("devices/000/summary.json", members)
+
+    def test_archive_is_streamed(self):
+        """Collected sources are sent before the slowest device answers."""
+        self.api.device_scanner = FakeScanner({"slow": FakeDevice(0.5)})
+        with patch("ethoscope_node.api.bugreport_api.bottle"):
+            chunks = self.api._generate_bug_report()
+            start = time.monotonic()
+            first = next(chunks)
+            self.assertLess(time.monotonic() - start, 0.4)
+            rest = list(chunks)
+
+        decompressed = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(first)
+        self.assertIn(b"devices/slow/summary.json", decompressed)
+        self.assertIn("devices/slow/log.txt", read_archive([first, *rest]))
 
 
 class TestBugReportAPIConstants(unittest.TestCase):
@@ -559,7 +660,7 @@ class TestBugReportAPIConstants(unittest.TestCase):
 
     def test_report_version(self):
         """Test report version is set."""
-        self.assertEqual(REPORT_VERSION, "1.0")
+        self.assertEqual(REPORT_VERSION, "2.0")
 
     def test_default_log_lines(self):
         """Test default log lines."""
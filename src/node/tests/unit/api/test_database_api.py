@@ -5,10 +5,16 @@ Tests database queries for runs, experiments, and cached database information.
 """
 
 import json
+import os
+import shutil
+import tempfile
 import unittest
 from unittest.mock import Mock, patch
 
 from ethoscope_node.api.database_api import DatabaseAPI
+from ethoscope_node.utils.activity_rollup import get_activity_rollups
+
+from ...fixtures.tracking_database import DB_PATH, SyntheticDatabase
 
 
 class TestDatabaseAPI(unittest.TestCase):
@@ -47,14 +53,15 @@ class TestDatabaseAPI(unittest.TestCase):
         # Register routes
         self.api.register_routes()
 
-        # Verify all 3 routes were registered
-        self.assertEqual(len(route_calls), 3)
+        # Verify all 4 routes were registered
+        self.assertEqual(len(route_calls), 4)
 
         # Check specific routes
         paths = [call[0] for call in route_calls]
         self.assertIn("/runs_list", paths)
         self.assertIn("/experiments_list", paths)
         self.assertIn("/cached_databases/<device_name>", paths)
+        self.assertIn("/rollup/<path:path>", paths)
 
     def test_runs_list_success(self):
         """Test getting runs list successfully."""
@@ -336,6 +343,41 @@ class TestDatabaseAPI(unittest.TestCase):
         self.assertEqual(parsed[1]["name"], "m_middle.db")
         self.assertEqual(parsed[2]["name"], "a_first.db")
 
+    def _use_results_dir(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.api.results_dir = os.path.join(tmpdir, "results")
+        self.addCleanup(get_activity_rollups(self.api.results_dir).close)
+
+    def test_rollup(self):
+        """Test the rollup endpoint updates the rollups and applies the query."""
+        self._use_results_dir()
+        db = SyntheticDatabase(os.path.join(self.api.results_dir, DB_PATH))
+        db.grow(300)
+
+        params = {"resolution": "120", "start": "0", "end": "240", "rois": "1,3"}
+        with patch.object(
+            self.api,
+            "get_query_param",
+            side_effect=lambda name, default=None: params.get(name, default),
+        ):
+            result = self.api._rollup(DB_PATH)
+
+        self.assertEqual(result["resolution"], 120)
+        self.assertEqual(sorted(result["rois"]), [1, 3])
+        self.assertEqual([row[0] for row in result["rois"][1]], [0, 120])
+        self.assertEqual(
+            sum(row[1] for row in result["rois"][3]),
+            sum(1 for row in db.rows[3] if row[1] < 240000),
+        )
+
+    def test_rollup_outside_results_dir(self):
+        """Test the rollup endpoint refuses databases outside the results folder."""
+        self._use_results_dir()
+        with patch.object(self.api, "get_query_param", return_value=None):
+            result = self.api._rollup("../elsewhere.db")
+        self.assertIn("error", result)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -62,8 +62,8 @@ class TestDeviceAPI(unittest.TestCase):
         self.api.app.route = mock_route
         self.api.register_routes()
 
-        # Should register 24 routes (including firmware status and update)
-        self.assertEqual(len(route_calls), 24)
+        # Should register 25 routes (including firmware status and update)
+        self.assertEqual(len(route_calls), 25)
 
         # Check specific routes
         paths = [call[0] for call in route_calls]
@@ -85,6 +85,7 @@ class TestDeviceAPI(unittest.TestCase):
         self.assertIn("/device/<id>/retire", paths)
         self.assertIn("/device/<id>/controls/<instruction>", paths)
         self.assertIn("/device/<id>/log", paths)
+        self.assertIn("/device/<id>/logs", paths)
         self.assertIn("/device/<id>/batch", paths)
         self.assertIn("/device/<id>/batch-critical", paths)
 
@@ -673,6 +674,33 @@ class TestDeviceAPI(unittest.TestCase):
         self.assertEqual(result["log"], "device log content")
         mock_device.get_log.assert_called_once()
 
+    @patch("bottle.request")
+    def test_get_log_page_is_cached(self, mock_request):
+        """Test that log pages are fetched from the device once."""
+        page = {"entries": [{"time": 1.0, "level": "err", "message": "x"}]}
+        mock_device = Mock()
+        mock_device.get_log_page.return_value = page
+        self.api.device_scanner.get_device.return_value = mock_device
+        mock_request.query = {"level": "err", "limit": "50", "other": "ignored"}
+
+        self.assertEqual(self.api._get_log_page("device1"), page)
+        self.assertEqual(self.api._get_log_page("device1"), page)
+
+        mock_device.get_log_page.assert_called_once_with(level="err", limit="50")
+
+    @patch("bottle.request")
+    def test_get_log_page_unreachable_device(self, mock_request):
+        """Test the log page of a device that does not answer."""
+        mock_device = Mock()
+        mock_device.get_log_page.return_value = None
+        self.api.device_scanner.get_device.return_value = mock_device
+        mock_request.query = {}
+
+        result = self.api._get_log_page("device1")
+
+        self.assertIn("error", result)
+        self.assertEqual(mock_device.get_log_page.call_count, 1)
+
     def test_get_device_batch_success(self):
         """Test getting batched device data successfully."""
         mock_device = Mock()
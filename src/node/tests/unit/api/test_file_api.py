@@ -5,13 +5,16 @@ Tests file management including browsing, downloading, and file removal.
 """
 
 import datetime
+import io
 import os
+import tempfile
 import unittest
+import zipfile
 from unittest.mock import Mock, call, mock_open, patch
 
 import bottle
 
-from ethoscope_node.api.file_api import FileAPI
+from ethoscope_node.api.file_api import DOWNLOAD_TOKEN_TTL, FileAPI
 
 
 class TestFileAPI(unittest.TestCase):
@@ -49,90 +52,124 @@ class TestFileAPI(unittest.TestCase):
         # Register routes
         self.api.register_routes()
 
-        # Verify all 4 routes were registered
-        self.assertEqual(len(route_calls), 4)
+        # Verify all 5 routes were registered
+        self.assertEqual(len(route_calls), 5)
 
         # Check specific routes
         paths = [call[0] for call in route_calls]
         self.assertIn("/resultfiles/<type>", paths)
         self.assertIn("/browse/<folder>", paths)
         self.assertIn("/download/<what>", paths)
+        self.assertIn("/download_zip/<token>/<filename>", paths)
         self.assertIn("/remove_files", paths)
 
-    @patch("os.walk")
-    def test_result_files_all(self, mock_walk):
-        """Test getting all result files."""
-        # Setup mock file tree
-        mock_walk.return_value = [
-            ("/tmp/results", [], ["data1.csv", "data2.db", "video.h264"]),
-            ("/tmp/results/subfolder", [], ["data3.csv"]),
+    def _mock_index(self, mock_get_index, files):
+        """Make get_file_index return an index listing the given (path, size, mtime)."""
+        index = Mock()
+        index.files.return_value = [
+            {"path": path, "size": size, "mtime": mtime} for path, size, mtime in files
         ]
+        mock_get_index.return_value = index
+        return index
+
+    @patch("ethoscope_node.api.file_api.get_file_index")
+    def test_result_files_all(self, mock_get_index):
+        """Test getting all result files."""
+        index = self._mock_index(
+            mock_get_index,
+            [
+                ("/tmp/results/data1.csv", 1, 0),
+                ("/tmp/results/data2.db", 1, 0),
+                ("/tmp/results/subfolder/data3.csv", 1, 0),
+            ],
+        )
 
         result = self.api._result_files("all")
 
-        # Should return all files with full paths
-        self.assertEqual(len(result["files"]), 4)
-        self.assertIn("/tmp/results/data1.csv", result["files"])
-        self.assertIn("/tmp/results/data2.db", result["files"])
-        self.assertIn("/tmp/results/video.h264", result["files"])
+        # Should query the results index without a type filter
+        mock_get_index.assert_called_once_with("/tmp/results")
+        index.files.assert_called_once_with(file_type=None)
+        self.assertEqual(len(result["files"]), 3)
         self.assertIn("/tmp/results/subfolder/data3.csv", result["files"])
 
-    @patch("os.walk")
-    def test_result_files_by_type(self, mock_walk):
+    @patch("ethoscope_node.api.file_api.get_file_index")
+    def test_result_files_by_type(self, mock_get_index):
         """Test getting result files filtered by type."""
-        mock_walk.return_value = [
-            ("/tmp/results", [], ["data1.csv", "data2.db", "video.h264"]),
-            ("/tmp/results/subfolder", [], ["data3.csv", "other.txt"]),
-        ]
+        index = self._mock_index(mock_get_index, [("/tmp/results/data1.csv", 1, 0)])
 
         result = self.api._result_files("csv")
 
-        # Should only return CSV files
-        self.assertEqual(len(result["files"]), 2)
-        self.assertIn("/tmp/results/data1.csv", result["files"])
-        self.assertIn("/tmp/results/subfolder/data3.csv", result["files"])
-        # Should not include non-CSV files
-        self.assertNotIn("/tmp/results/data2.db", result["files"])
-        self.assertNotIn("/tmp/results/video.h264", result["files"])
+        index.files.assert_called_once_with(file_type="csv")
+        self.assertEqual(result["files"], ["/tmp/results/data1.csv"])
 
-    @patch("os.walk")
-    def test_result_files_no_matches(self, mock_walk):
+    @patch("ethoscope_node.api.file_api.get_file_index")
+    def test_result_files_no_matches(self, mock_get_index):
         """Test getting result files when no files match pattern."""
-        mock_walk.return_value = [("/tmp/results", [], ["data.csv", "video.h264"])]
+        self._mock_index(mock_get_index, [])
 
         result = self.api._result_files("txt")
 
         # Should return empty list
         self.assertEqual(result["files"], [])
 
-    @patch("os.walk")
-    def test_result_files_empty_directory(self, mock_walk):
-        """Test getting result files from empty directory."""
-        mock_walk.return_value = [("/tmp/results", [], [])]
-
-        result = self.api._result_files("all")
-
-        self.assertEqual(result["files"], [])
+    def test_result_files_from_directory_tree(self):
+        """Test listing a real results tree through the index."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            results = os.path.join(tmpdir, "results")
+            os.makedirs(os.path.join(results, "subfolder"))
+            for name in (
+                "data1.csv",
+                "data2.db",
+                os.path.join("subfolder", "data3.csv"),
+            ):
+                with open(os.path.join(results, name), "w") as f:
+                    f.write("x")
+            self.api.results_dir = results
+
+            all_files = self.api._result_files("all")["files"]
+            csv_files = self.api._result_files("csv")["files"]
+            browsed = self.api._browse("null")["files"]
+
+        self.assertEqual(len(all_files), 3)
+        self.assertEqual(
+            csv_files,
+            [
+                os.path.join(results, "data1.csv"),
+                os.path.join(results, "subfolder", "data3.csv"),
+            ],
+        )
+        self.assertEqual(browsed["data2.db"]["size"], 1)
 
-    @patch("os.walk")
-    @patch("os.path.getsize")
-    @patch("os.path.getmtime")
-    def test_browse_null_folder(self, mock_mtime, mock_getsize, mock_walk):
+    @patch("ethoscope_node.api.file_api.get_file_index")
+    def test_browse_null_folder(self, mock_get_index):
         """Test browsing with null folder (uses results_dir)."""
-        mock_walk.return_value = [("/tmp/results", [], ["file1.csv", "file2.db"])]
-        mock_getsize.side_effect = [1000, 2000]
-        mock_mtime.side_effect = [1234567890.0, 1234567891.0]
+        index = self._mock_index(
+            mock_get_index,
+            [
+                ("/tmp/results/file1.csv", 1000, 1234567890.0),
+                ("/tmp/results/file2.db", 2000, 1234567891.0),
+            ],
+        )
 
         result = self.api._browse("null")
 
-        # Should use results_dir
-        mock_walk.assert_called_once_with("/tmp/results")
+        # Should use the results index
+        index.files.assert_called_once_with(prefix="/tmp/results")
         # Should return file metadata
         self.assertEqual(len(result["files"]), 2)
         self.assertIn("file1.csv", result["files"])
         self.assertEqual(result["files"]["file1.csv"]["size"], 1000)
         self.assertEqual(result["files"]["file1.csv"]["mtime"], 1234567890.0)
 
+    @patch("ethoscope_node.api.file_api.get_file_index")
+    def test_browse_results_subfolder(self, mock_get_index):
+        """Test browsing a folder inside results_dir uses the index."""
+        index = self._mock_index(mock_get_index, [])
+
+        self.api._browse("tmp/results/ETHOSCOPE_001")
+
+        index.files.assert_called_once_with(prefix="/tmp/results/ETHOSCOPE_001")
+
     @patch("os.walk")
     @patch("os.path.getsize")
     @patch("os.path.getmtime")
@@ -156,23 +193,23 @@ class TestFileAPI(unittest.TestCase):
     ):
         """Test browse skips files that raise exceptions."""
         mock_walk.return_value = [
-            ("/tmp/results", [], ["accessible.csv", "restricted.csv"])
+            ("/custom/path", [], ["accessible.csv", "restricted.csv"])
         ]
         # First file accessible, second raises exception
         mock_getsize.side_effect = [1000, PermissionError("Access denied")]
         mock_mtime.side_effect = [1234567890.0, 1234567891.0]
 
-        result = self.api._browse("null")
+        result = self.api._browse("custom/path")
 
         # Should only include accessible file
         self.assertEqual(len(result["files"]), 1)
         self.assertIn("accessible.csv", result["files"])
         self.assertNotIn("restricted.csv", result["files"])
 
-    @patch("os.walk")
-    def test_browse_empty_directory(self, mock_walk):
+    @patch("ethoscope_node.api.file_api.get_file_index")
+    def test_browse_empty_directory(self, mock_get_index):
         """Test browsing empty directory."""
-        mock_walk.return_value = [("/tmp/results", [], [])]
+        self._mock_index(mock_get_index, [])
 
         result = self.api._browse("null")
 
@@ -180,15 +217,15 @@ class TestFileAPI(unittest.TestCase):
 
     @patch("bottle.request")
     @patch("datetime.datetime")
-    @patch("zipfile.ZipFile")
-    def test_download_files_success(self, mock_zipfile, mock_datetime, mock_request):
-        """Test creating download archive successfully."""
+    def test_download_files_success(self, mock_datetime, mock_request):
+        """Test preparing a streamed download archive."""
         # Setup mock request
         mock_request.json = {
             "files": [
                 {"url": "/tmp/results/file1.csv"},
                 {"url": "/tmp/results/file2.db"},
-            ]
+            ],
+            "manifest": True,
         }
 
         # Setup mock datetime
@@ -196,53 +233,66 @@ class TestFileAPI(unittest.TestCase):
         mock_now.strftime.return_value = "240101_120000"
         mock_datetime.now.return_value = mock_now
 
-        # Setup mock zipfile
-        mock_zf = Mock()
-        mock_zipfile.return_value.__enter__.return_value = mock_zf
-
         result = self.api._download("files")
 
-        # Should create zip file with timestamp
-        expected_path = "/tmp/results/results_240101_120000.zip"
-        self.assertEqual(result["url"], expected_path)
-        # Should write both files
-        self.assertEqual(mock_zf.write.call_count, 2)
-        mock_zf.write.assert_any_call("/tmp/results/file1.csv")
-        mock_zf.write.assert_any_call("/tmp/results/file2.db")
+        # Should return a streaming URL named after the timestamp
+        self.assertTrue(result["url"].startswith("/download_zip/"))
+        self.assertTrue(result["url"].endswith("/results_240101_120000.zip"))
+        # Nothing is written to the results directory
+        token = result["url"].split("/")[2]
+        download = self.api._downloads[token]
+        self.assertEqual(
+            download["paths"], ["/tmp/results/file1.csv", "/tmp/results/file2.db"]
+        )
+        self.assertTrue(download["manifest"])
+        self.assertFalse(download["compress"])
 
     @patch("bottle.request")
-    @patch("datetime.datetime")
-    @patch("zipfile.ZipFile")
-    def test_download_files_with_write_errors(
-        self, mock_zipfile, mock_datetime, mock_request
-    ):
-        """Test download handles file write errors gracefully."""
-        mock_request.json = {
-            "files": [
-                {"url": "/tmp/results/good.csv"},
-                {"url": "/tmp/results/bad.csv"},
-            ]
-        }
-
-        mock_now = Mock()
-        mock_now.strftime.return_value = "240101_120000"
-        mock_datetime.now.return_value = mock_now
+    def test_stream_download(self, mock_request):
+        """Test a prepared download streams a valid zip archive."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            good = os.path.join(tmpdir, "good.csv")
+            with open(good, "w") as f:
+                f.write("a,b\n1,2\n")
+            mock_request.json = {
+                "files": [{"url": good}, {"url": os.path.join(tmpdir, "bad.csv")}]
+            }
+            url = self.api._download("files")["url"]
+            _, _, token, filename = url.split("/")
+
+            with patch.object(bottle, "response") as mock_response:
+                mock_response.headers = {}
+                stream = self.api._stream_download(token, filename)
+                with self.assertLogs("ZipStream", level="WARNING") as logs:
+                    data = b"".join(stream)
+
+            self.assertEqual(mock_response.content_type, "application/zip")
+            self.assertIn(filename, mock_response.headers["Content-Disposition"])
+            # Missing files are skipped with a warning
+            self.assertIn("bad.csv", str(logs.output))
+            with zipfile.ZipFile(io.BytesIO(data)) as zf:
+                self.assertEqual(zf.read(good.lstrip("/")), b"a,b\n1,2\n")
+                self.assertEqual(len(zf.namelist()), 1)
+
+    def test_stream_download_unknown_token(self):
+        """Test unknown or expired downloads are rejected."""
+        with self.assertRaises(bottle.HTTPError) as ctx:
+            self.api._stream_download("nope", "results.zip")
+        self.assertEqual(ctx.exception.status_code, 404)
 
-        mock_zf = Mock()
-        mock_zf.write.side_effect = [
-            None,  # First file succeeds
-            OSError("File not found"),  # Second file fails
-        ]
-        mock_zipfile.return_value.__enter__.return_value = mock_zf
-
-        with patch.object(self.api.logger, "warning") as mock_log:
-            result = self.api._download("files")
-
-            # Should still return zip path
-            self.assertIn("url", result)
-            # Should log warning for failed file
-            mock_log.assert_called_once()
-            self.assertIn("bad.csv", str(mock_log.call_args))
+    @patch("bottle.request")
+    @patch("ethoscope_node.api.file_api.time.time")
+    def test_prepared_downloads_expire(self, mock_time, mock_request):
+        """Test prepared downloads are forgotten after DOWNLOAD_TOKEN_TTL."""
+        mock_request.json = {"files": [{"url": "/tmp/results/file1.csv"}]}
+        mock_time.return_value = 1000.0
+        first = self.api._download("files")["url"].split("/")[2]
+
+        mock_time.return_value = 1000.0 + DOWNLOAD_TOKEN_TTL + 1
+        second = self.api._download("files")["url"].split("/")[2]
+
+        self.assertNotIn(first, self.api._downloads)
+        self.assertIn(second, self.api._downloads)
 
     @patch("bottle.request")
     def test_download_unsupported_type(self, mock_request):
@@ -9,9 +9,11 @@ import datetime
 import os
 import subprocess
 import unittest
+from contextlib import nullcontext
 from unittest.mock import MagicMock, Mock, mock_open, patch
 
 from ethoscope_node.api.node_api import SYSTEM_DAEMONS, NodeAPI
+from ethoscope_node.utils.configuration import freeze
 
 
 class TestNodeAPI(unittest.TestCase):
@@ -27,6 +29,12 @@ class TestNodeAPI(unittest.TestCase):
             "incubators": [{"name": "incubator1"}],
             "commands": {"test_cmd": {"command": "echo test"}},
         }
+        self.mock_server.config.snapshot.side_effect = lambda: freeze(
+            self.mock_server.config.content
+        )
+        self.mock_server.config.transaction.side_effect = lambda: nullcontext(
+            self.mock_server.config.content
+        )
         self.mock_server.device_scanner = Mock()
         self.mock_server.sensor_scanner = Mock()
         self.mock_server.database = Mock()
@@ -743,7 +751,7 @@ class TestNodeAPI(unittest.TestCase):
         result = self.api._update_folders(folders)
 
         self.assertEqual(result["results"]["path"], "/new/results")
-        self.api.config.save.assert_called_once()
+        self.api.config.transaction.assert_called_once()
 
     @patch("os.path.exists")
     def test_update_folders_invalid_paths(self, mock_exists):
@@ -11,6 +11,7 @@ import unittest
 from unittest.mock import Mock, mock_open, patch
 
 from ethoscope_node.api.sensor_api import SensorAPI
+from ethoscope_node.utils.sensor_store import get_sensor_store
 
 
 class TestSensorAPI(unittest.TestCase):
@@ -294,6 +295,58 @@ class TestSensorAPI(unittest.TestCase):
         self.assertEqual(result["headers"], ["timestamp  ", "  temp  ", "  humid"])
         self.assertEqual(result["data"][0], ["2024-01-01  ", "  22.5  ", "  45"])
 
+    def _query_csv(self, filename, **params):
+        """Call _get_csv_data with query parameters on a real sensors folder."""
+        with patch.object(
+            self.api, "get_query_param", side_effect=lambda name: params.get(name)
+        ):
+            return self.api._get_csv_data(filename)
+
+    def test_get_csv_data_time_window(self):
+        """Test that start/end/max_points are served from the sensor store."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.api.sensors_dir = os.path.join(tmpdir, "sensors")
+            os.makedirs(self.api.sensors_dir)
+            with open(os.path.join(self.api.sensors_dir, "incubator.csv"), "w") as f:
+                f.write("# Name: incubator\nTime,Temperature,Humidity,Pressure,Light\n")
+                for minute in range(120):
+                    for second in (0, 30):
+                        f.write(
+                            f"2025-01-01 {minute // 60:02d}:{minute % 60:02d}:"
+                            f"{second:02d},{20 + second / 30},50,1013,N/A\n"
+                        )
+
+            result = self._query_csv(
+                "incubator.csv", start="2025-01-01 00:10:00", end="2025-01-01 00:11:00"
+            )
+            self.assertEqual(result["resolution"], 0)
+            self.assertEqual(
+                result["data"],
+                [
+                    ["2025-01-01 00:10:00", 20.0, 50.0, 1013.0, None],
+                    ["2025-01-01 00:10:30", 21.0, 50.0, 1013.0, None],
+                    ["2025-01-01 00:11:00", 20.0, 50.0, 1013.0, None],
+                ],
+            )
+
+            result = self._query_csv("incubator.csv", max_points="200")
+            self.assertEqual(result["resolution"], 60)
+            self.assertEqual(len(result["data"]), 120)
+            self.assertEqual(
+                result["data"][0], ["2025-01-01 00:00:00", 20.5, 50.0, 1013.0, None]
+            )
+            self.assertEqual(result["min"][0][1], 20.0)
+            self.assertEqual(result["max"][0][1], 21.0)
+            self.assertEqual(
+                result["headers"],
+                ["Time", "Temperature", "Humidity", "Pressure", "Light"],
+            )
+
+            result = self._query_csv("incubator.csv", start="last week")
+            self.assertIn("error", result)
+
+            get_sensor_store(self.api.sensors_dir).close()
+
     @patch("ethoscope_node.api.sensor_api.SensorAPI.get_request_data")
     def test_edit_sensor_missing_fields(self, mock_get_data):
         """Test editing sensor with missing required fields."""
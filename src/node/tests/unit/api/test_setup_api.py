@@ -9,11 +9,13 @@ import json
 import socket
 import tempfile
 import unittest
+from contextlib import nullcontext
 from unittest.mock import MagicMock, Mock, call, mock_open, patch
 
 import bottle
 
 from ethoscope_node.api.setup_api import SetupAPI
+from ethoscope_node.utils.configuration import freeze
 
 
 class TestSetupAPI(unittest.TestCase):
@@ -37,6 +39,12 @@ class TestSetupAPI(unittest.TestCase):
             "authentication": {},
             "virtual_sensor": {},
         }
+        self.mock_server.config.snapshot.side_effect = lambda: freeze(
+            self.mock_server.config.content
+        )
+        self.mock_server.config.transaction.side_effect = lambda: nullcontext(
+            self.mock_server.config.content
+        )
         self.mock_server.device_scanner = Mock()
         self.mock_server.sensor_scanner = Mock()
         self.mock_server.database = Mock()
@@ -289,19 +297,20 @@ class TestSetupAPI(unittest.TestCase):
             }
         }
 
-        # Set up config.content (which is read) AND config._settings
         self.api.config.content = {
             "folders": {
                 "results": {"path": "/tmp/old_results"},
                 "videos": {"path": "/tmp/old_videos"},
             }
         }
-        self.api.config._settings["folders"] = self.api.config.content["folders"]
 
         result = self.api._setup_basic_info()
 
         self.assertEqual(result["result"], "success")
-        self.api.config.save.assert_called_once()
+        self.api.config.transaction.assert_called_once()
+        self.assertEqual(
+            self.api.config.content["folders"]["results"]["path"], "/tmp/results"
+        )
         self.api.config.mark_setup_step_completed.assert_called_once_with("basic_info")
 
     @patch("bottle.request")
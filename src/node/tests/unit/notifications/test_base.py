@@ -222,10 +222,43 @@ class TestNotificationAnalyzer:
         result = analyzer.get_device_logs(device_id, max_lines=10)
 
         assert result == log_content
-        mock_get.assert_called_once_with(
+        # devices without paginated logs give their whole log
+        mock_get.assert_called_with(
             f"http://192.168.1.100:9000/data/log/{device_id}", timeout=10
         )
 
+    @patch("ethoscope_node.notifications.base.requests.get")
+    def test_get_device_logs_paginated(self, mock_get, analyzer):
+        """Test that only the last lines are asked for, and given oldest first."""
+        device_id = "test_device_001"
+        analyzer.db.getEthoscope.return_value = {
+            device_id: {"ethoscope_name": "ETHOSCOPE_001", "last_ip": "192.168.1.100"}
+        }
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {
+            "entries": [
+                {"time": None, "level": "err", "message": "camera lost"},
+                {
+                    "time": None,
+                    "level": "info",
+                    "unit": "ethoscope_device.service",
+                    "message": "tracking",
+                },
+            ],
+            "cursor": "s=1;i=2",
+        }
+        mock_get.return_value = mock_response
+
+        result = analyzer.get_device_logs(device_id, max_lines=2)
+
+        assert result == "[info] ethoscope_device.service: tracking\n[err] camera lost"
+        mock_get.assert_called_once_with(
+            f"http://192.168.1.100:9000/data/logs/{device_id}",
+            params={"limit": 2},
+            timeout=10,
+        )
+
     @patch("ethoscope_node.notifications.base.requests.get")
     def test_get_device_logs_request_failure(self, mock_get, analyzer):
         """Test device log retrieval when HTTP request fails."""
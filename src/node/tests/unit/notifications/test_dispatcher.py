@@ -0,0 +1,376 @@
+#!/usr/bin/env python
+
+"""
+Unit tests for the asynchronous notification dispatcher and the alert ledger.
+
+Services are replaced by fakes that block, fail or raise, to check that queuing an
+alert never waits for them and that the ledger decides once for all services.
+"""
+
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from ethoscope_node.notifications import manager as manager_module
+from ethoscope_node.notifications.base import NotificationAnalyzer
+from ethoscope_node.notifications.dispatcher import (
+    AlertLedger,
+    NotificationDispatcher,
+    get_alert_ledger,
+)
+from ethoscope_node.notifications.manager import NotificationManager
+
+
+class FakeService:
+    """Records the alerts it sends; fails the first `failures` calls."""
+
+    def __init__(self, failures=0, raises=False):
+        self.failures = failures
+        self.raises = raises
+        self.calls = []
+
+    def send_device_stopped_alert(self, **kwargs):
+        self.calls.append(kwargs)
+        if len(self.calls) <= self.failures:
+            if self.raises:
+                raise RuntimeError("SMTP server went away")
+            return False
+        return True
+
+    send_device_unreachable_alert = send_device_stopped_alert
+    send_storage_warning_alert = send_device_stopped_alert
+
+
+class BlockingService(FakeService):
+    """Does not return until released."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def send_device_stopped_alert(self, **kwargs):
+        self.calls.append(kwargs)
+        self.release.wait()
+        return True
+
+    send_device_unreachable_alert = send_device_stopped_alert
+    send_storage_warning_alert = send_device_stopped_alert
+
+
+class RateLimitedService(NotificationAnalyzer):
+    """Checks its own cooldown like the real services, and fails the first call."""
+
+    def __init__(self):
+        config = Mock()
+        config.content = {"alerts": {"cooldown_seconds": 3600}}
+        super().__init__(config, Mock())
+        self.sent = 0
+        self.attempts = 0
+
+    def send_device_unreachable_alert(self, device_id, **kwargs):
+        if not self._should_send_alert(device_id, "device_unreachable"):
+            return False
+        self.attempts += 1
+        if self.attempts == 1:
+            return False
+        self.sent += 1
+        return True
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = AlertLedger(str(tmp_path / "alert_ledger.db"))
+    yield ledger
+    ledger.close()
+
+
+def make_dispatcher(services, ledger, **kwargs):
+    kwargs = {"timeout": 0.5, "retries": 1, "retry_delay": 0.01, **kwargs}
+    return NotificationDispatcher(list(services.items()), ledger, **kwargs)
+
+
+class TestAlertLedger:
+    """Test cases for AlertLedger."""
+
+    def test_cooldown(self, ledger):
+        assert ledger.claim("dev:storage_warning", cooldown=60, now=1000)
+        assert not ledger.claim("dev:storage_warning", cooldown=60, now=1059)
+        assert ledger.claim("dev:storage_warning", cooldown=60, now=1060)
+        assert ledger.last_sent("dev:storage_warning") == 1060
+        assert ledger.last_sent("other") is None
+
+    def test_no_cooldown_means_once(self, ledger):
+        assert ledger.claim("dev:device_stopped:run1", cooldown=None, now=0)
+        assert not ledger.claim("dev:device_stopped:run1", cooldown=None, now=1e9)
+
+    def test_release(self, ledger):
+        assert ledger.claim("key", cooldown=None)
+        ledger.release("key")
+        assert ledger.claim("key", cooldown=None)
+
+    def test_persistent(self, tmp_path):
+        path = str(tmp_path / "alert_ledger.db")
+        first = AlertLedger(path)
+        assert first.claim("key", cooldown=60)
+        first.close()
+
+        second = AlertLedger(path)
+        assert not second.claim("key", cooldown=60)
+        second.close()
+
+    def test_shared_instances(self, tmp_path):
+        path = str(tmp_path / "alert_ledger.db")
+        ledger = get_alert_ledger(path)
+        assert get_alert_ledger(path) is ledger
+        ledger.close()
+        assert get_alert_ledger(path) is not ledger
+        get_alert_ledger(path).close()
+
+
+class TestNotificationDispatcher:
+    """Test cases for NotificationDispatcher."""
+
+    def test_delivers_to_every_service(self, ledger):
+        services = {"email": FakeService(), "slack": FakeService()}
+        dispatcher = make_dispatcher(services, ledger)
+
+        assert dispatcher.submit(
+            "device_stopped", "dev:device_stopped", device_id="dev"
+        )
+        assert dispatcher.wait(5)
+        for service in services.values():
+            assert service.calls == [{"device_id": "dev"}]
+        assert dispatcher.stats["email"]["sent"] == 1
+        dispatcher.stop()
+
+    def test_suppressed_by_ledger(self, ledger):
+        service = FakeService()
+        dispatcher = make_dispatcher({"email": service}, ledger)
+
+        assert dispatcher.submit("storage_warning", "k", cooldown=60, device_id="dev")
+        assert not dispatcher.submit(
+            "storage_warning", "k", cooldown=60, device_id="dev"
+        )
+        assert dispatcher.wait(5)
+        assert len(service.calls) == 1
+        dispatcher.stop()
+
+    def test_unknown_alert_type(self, ledger):
+        dispatcher = make_dispatcher({"email": FakeService()}, ledger)
+        with pytest.raises(ValueError):
+            dispatcher.submit("coffee_machine_empty", "k")
+
+    def test_no_services(self, ledger):
+        dispatcher = make_dispatcher({}, ledger)
+        assert not dispatcher.submit("device_stopped", "k", device_id="dev")
+        assert ledger.last_sent("k") is None
+
+    def test_blocking_service_does_not_delay_others(self, ledger):
+        slow, fast = BlockingService(), FakeService()
+        dispatcher = make_dispatcher({"slow": slow, "fast": fast}, ledger, timeout=5)
+
+        start = time.monotonic()
+        assert dispatcher.submit("device_stopped", "k", device_id="dev")
+        assert time.monotonic() - start < 0.1
+
+        deadline = time.monotonic() + 2
+        while time.monotonic() < deadline and not (
+            slow.calls and dispatcher.stats["fast"]["sent"]
+        ):
+            time.sleep(0.01)
+        assert dispatcher.stats["fast"]["sent"] == 1
+        assert not dispatcher.wait(0.1)
+
+        slow.release.set()
+        assert dispatcher.wait(5)
+        assert dispatcher.stats["slow"]["sent"] == 1
+        dispatcher.stop()
+
+    def test_timeout_and_retry(self, ledger):
+        slow = BlockingService()
+        dispatcher = make_dispatcher({"slow": slow}, ledger, timeout=0.05, retries=2)
+
+        assert dispatcher.submit("device_stopped", "k", device_id="dev")
+        assert dispatcher.wait(5)
+        assert len(slow.calls) == 3
+        assert dispatcher.stats["slow"] == {
+            "sent": 0,
+            "failed": 1,
+            "timeouts": 3,
+            "dropped": 0,
+        }
+        # nothing was sent, so the alert is not suppressed next time
+        assert ledger.last_sent("k") is None
+        slow.release.set()
+        dispatcher.stop()
+
+    def test_failures_are_retried(self, ledger):
+        flaky = FakeService(failures=2, raises=True)
+        dispatcher = make_dispatcher({"flaky": flaky}, ledger, retries=2)
+
+        assert dispatcher.submit("device_unreachable", "k", device_id="dev")
+        assert dispatcher.wait(5)
+        assert len(flaky.calls) == 3
+        assert dispatcher.stats["flaky"]["sent"] == 1
+        assert ledger.last_sent("k") is not None
+        dispatcher.stop()
+
+    def test_one_delivery_keeps_the_claim(self, ledger):
+        dispatcher = make_dispatcher(
+            {"broken": FakeService(failures=10), "ok": FakeService()}, ledger
+        )
+        assert dispatcher.submit("device_stopped", "k", device_id="dev")
+        assert dispatcher.wait(5)
+        assert dispatcher.stats["broken"]["failed"] == 1
+        assert ledger.last_sent("k") is not None
+        dispatcher.stop()
+
+    def test_retry_bypasses_service_cooldown(self, ledger):
+        service = RateLimitedService()
+        dispatcher = make_dispatcher({"mattermost": service}, ledger)
+
+        assert dispatcher.submit("device_unreachable", "k", device_id="dev")
+        assert dispatcher.wait(5)
+        assert service.attempts == 2
+        assert service.sent == 1
+        dispatcher.stop()
+
+    def test_full_queue_drops_alerts(self, ledger):
+        slow = BlockingService()
+        dispatcher = make_dispatcher({"slow": slow}, ledger, queue_size=2, timeout=5)
+
+        queued = [
+            dispatcher.submit("storage_warning", f"dev{i}", device_id=f"dev{i}")
+            for i in range(5)
+        ]
+        # the first alert is being sent, two are waiting
+        assert queued.count(True) in (2, 3)
+        assert dispatcher.stats["slow"]["dropped"] == queued.count(False)
+        # dropped alerts are released, to be raised again later
+        dropped = [f"dev{i}" for i, q in enumerate(queued) if not q]
+        assert all(ledger.last_sent(key) is None for key in dropped)
+
+        slow.release.set()
+        assert dispatcher.wait(5)
+        dispatcher.stop()
+
+    def test_workers_stop_when_idle(self, ledger):
+        service = FakeService()
+        dispatcher = make_dispatcher({"email": service}, ledger, idle_timeout=0.05)
+
+        assert dispatcher.submit("device_stopped", "a", device_id="dev")
+        assert dispatcher.wait(5)
+        deadline = time.monotonic() + 2
+        while dispatcher._workers and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert not dispatcher._workers
+
+        assert dispatcher.submit("device_stopped", "b", device_id="dev")
+        assert dispatcher.wait(5)
+        assert len(service.calls) == 2
+        dispatcher.stop()
+
+    def test_stop_releases_queued_alerts(self, ledger):
+        slow = BlockingService()
+        dispatcher = make_dispatcher({"slow": slow}, ledger, timeout=5)
+
+        assert dispatcher.submit("device_stopped", "run1", device_id="dev1")
+        assert dispatcher.submit("device_stopped", "run2", device_id="dev2")
+        deadline = time.monotonic() + 2
+        while not slow.calls and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        # the first alert is being sent, the second is still queued
+        threading.Timer(0.1, slow.release.set).start()
+        dispatcher.stop(timeout=5)
+        assert [call["device_id"] for call in slow.calls] == ["dev1"]
+        assert ledger.last_sent("run1") is not None
+        assert ledger.last_sent("run2") is None
+
+        # a new dispatcher, e.g. after a change of settings, sends it
+        service = FakeService()
+        replacement = make_dispatcher({"email": service}, ledger)
+        assert replacement.submit("device_stopped", "run2", device_id="dev2")
+        assert replacement.wait(5)
+        assert len(service.calls) == 1
+        replacement.stop()
+
+    def test_stopped_dispatcher_refuses_alerts(self, ledger):
+        dispatcher = make_dispatcher({"email": FakeService()}, ledger)
+        dispatcher.stop()
+        assert not dispatcher.submit("device_stopped", "k", device_id="dev")
+
+
+class TestQueueAlert:
+    """Test cases for NotificationManager.queue_alert()."""
+
+    @pytest.fixture
+    def manager(self, ledger):
+        config = Mock()
+        config.content = {"alerts": {"cooldown_seconds": 300}}
+        manager = NotificationManager(config=config, db=Mock(), ledger=ledger)
+        yield manager
+        if manager._dispatcher is not None:
+            manager._dispatcher.stop()
+
+    def test_device_stopped_once_per_run(self, manager):
+        service = FakeService()
+        manager._services = [("email", service)]
+
+        assert manager.queue_alert("device_stopped", device_id="dev", run_id="r1")
+        assert not manager.queue_alert("device_stopped", device_id="dev", run_id="r1")
+        assert manager.queue_alert("device_stopped", device_id="dev", run_id="r2")
+        assert manager.dispatcher.wait(5)
+        assert [call["run_id"] for call in service.calls] == ["r1", "r2"]
+
+    def test_cooldown_from_configuration(self, manager, ledger):
+        manager._services = [("email", FakeService())]
+        assert manager.queue_alert("storage_warning", device_id="dev", used_percent=95)
+        assert not manager.queue_alert(
+            "storage_warning", device_id="dev", used_percent=96
+        )
+        assert manager.dispatcher.wait(5)
+
+        past = time.time() - 301
+        ledger._conn.execute("UPDATE alerts SET last_sent = ?", (past,))
+        assert manager.queue_alert("storage_warning", device_id="dev", used_percent=97)
+        assert manager.dispatcher.wait(5)
+
+    def test_restart_does_not_block_alerts(self, manager, monkeypatch):
+        monkeypatch.setattr(manager_module, "RESTART_TIMEOUT", 0.2)
+        slow = BlockingService()
+        manager._services = [("email", slow)]
+        assert manager.queue_alert("device_stopped", device_id="dev", run_id="r1")
+        deadline = time.monotonic() + 2
+        while not slow.calls and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        # the settings change while the service is stuck sending
+        restart = threading.Thread(target=manager._restart_services)
+        restart.start()
+        time.sleep(0.05)
+        start = time.monotonic()
+        manager.queue_alert("device_stopped", device_id="dev", run_id="r2")
+        assert time.monotonic() - start < 0.1
+        restart.join(2)
+        assert not restart.is_alive()
+        slow.release.set()
+
+    def test_polling_latency_stays_flat(self, manager):
+        """A polling loop raising alerts is not slowed down by stuck services."""
+        stuck, failing = BlockingService(), FakeService(failures=1000, raises=True)
+        manager._services = [("email", stuck), ("slack", failing)]
+
+        latencies = []
+        for poll in range(50):
+            start = time.monotonic()
+            manager.queue_alert("device_unreachable", device_id=f"dev{poll % 10}")
+            manager.queue_alert("device_stopped", device_id="dev", run_id=f"r{poll}")
+            latencies.append(time.monotonic() - start)
+
+        assert max(latencies) < 0.1
+        # the later polls are no slower than the first ones, though alerts pile up
+        assert sum(latencies[-10:]) < sum(latencies[:10]) + 0.1
+        stuck.release.set()
@@ -991,3 +991,28 @@ class TestNotificationManager:
             assert "No test method available" in results["email"]["error"]
             assert not results["mattermost"]["success"]
             assert "No test method available" in results["mattermost"]["error"]
+
+    def test_services_restart_when_settings_change(self, tmp_path, mock_db):
+        """Changing the notification settings restarts the services."""
+        from ethoscope_node.utils.configuration import EthoscopeConfiguration
+
+        config = EthoscopeConfiguration(str(tmp_path / "ethoscope.conf"))
+        with patch(
+            "ethoscope_node.notifications.manager.SlackNotificationService"
+        ) as mock_slack_cls:
+            manager = NotificationManager(config=config, db=mock_db)
+            dispatcher = manager.dispatcher
+            assert manager.get_active_services() == []
+
+            # unrelated changes leave the services running
+            config.update_custom("TEST_KEY", "value")
+            assert manager._dispatcher is dispatcher
+
+            with config.transaction() as settings:
+                settings["slack"]["enabled"] = True
+                settings["slack"]["webhook_url"] = "https://hooks.example.com/x"
+
+            assert manager.get_active_services() == ["slack"]
+            assert manager._dispatcher is None
+            mock_slack_cls.assert_called_once_with(config, mock_db)
+            dispatcher.stop()
@@ -129,6 +129,31 @@ class TestEthoscope:
         result = device.videofiles()
         assert result == ["video1.mp4", "video2.mp4"]
 
+    @patch("ethoscope_node.scanner.ethoscope_scanner.ExperimentalDB")
+    @patch("ethoscope_node.scanner.ethoscope_scanner.EthoscopeConfiguration")
+    @patch("urllib.request.urlopen")
+    def test_get_log_page(self, mock_urlopen, mock_config_class, mock_db_class):
+        """Test get_log_page passes the filters to the device."""
+        device = Ethoscope("192.168.1.100")
+        device._id = "test_device"
+
+        page = {
+            "entries": [{"time": 1.0, "level": "err", "message": "x"}],
+            "cursor": None,
+        }
+        mock_response = MagicMock()
+        mock_response.__enter__.return_value = mock_response
+        mock_response.read.return_value = json.dumps(page).encode()
+        mock_urlopen.return_value = mock_response
+
+        assert device.get_log_page(level="err", grep="camera lost", limit=50) == page
+        request = mock_urlopen.call_args[0][0]
+        url = request.full_url if hasattr(request, "full_url") else request
+        assert url == (
+            "http://192.168.1.100:9000/data/logs/test_device"
+            "?level=err&grep=camera+lost&limit=50"
+        )
+
     @patch("ethoscope_node.scanner.ethoscope_scanner.ExperimentalDB")
     @patch("ethoscope_node.scanner.ethoscope_scanner.EthoscopeConfiguration")
     @patch("urllib.request.urlopen")
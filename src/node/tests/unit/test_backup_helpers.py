@@ -14,6 +14,7 @@ import sys
 import tempfile
 import time
 import unittest
+import urllib.error
 from unittest.mock import MagicMock, mock_open, patch
 
 # Add the source path for imports
@@ -728,6 +729,79 @@ class TestSQLiteCheckpoint(unittest.TestCase):
         self.assertIn(custom_dir, checkpoint_script)
 
 
+class TestBackupConfirmation(unittest.TestCase):
+    """Test the confirmation of backed up files to the device."""
+
+    def setUp(self):
+        self.device_id = "001aaa"
+        self.test_dir = tempfile.mkdtemp()
+        self.results_dir = os.path.join(self.test_dir, "results")
+        self.addCleanup(shutil.rmtree, self.test_dir)
+
+        self.files = {}
+        for name in ("a.db", "b.db", "c.db"):
+            path = os.path.join(
+                self.results_dir, self.device_id, "ETHOSCOPE_001", "2024", name
+            )
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(b"\0" * len(self.files))
+            self.files[f"results/{self.device_id}/ETHOSCOPE_001/2024/{name}"] = path
+
+    def _create_backup_instance(self):
+        from ethoscope_node.backup.helpers import UnifiedRsyncBackupClass
+
+        backup = UnifiedRsyncBackupClass(
+            {"id": self.device_id, "name": "ETHOSCOPE_001", "ip": "192.168.1.100"},
+            self.results_dir,
+            backup_videos=False,
+        )
+        backup.CONFIRM_BATCH = 2
+        return backup
+
+    @patch("urllib.request.urlopen")
+    def test_confirm_backups(self, mock_urlopen):
+        payloads = []
+
+        def respond(request, timeout):
+            payloads.append(json.loads(request.data))
+            response = MagicMock()
+            response.__enter__.return_value.read.return_value = json.dumps(
+                {"confirmed": len(payloads[-1]["files"]), "rejected": 0}
+            )
+            return response
+
+        mock_urlopen.side_effect = respond
+        backup = self._create_backup_instance()
+        confirmed = backup._confirm_backups(
+            "results", os.path.join(self.results_dir, self.device_id)
+        )
+
+        self.assertEqual(confirmed, 3)
+        # sent in batches of CONFIRM_BATCH files
+        self.assertEqual([len(p["files"]) for p in payloads], [2, 1])
+        request = mock_urlopen.call_args[0][0]
+        self.assertEqual(
+            request.full_url, f"http://192.168.1.100:9000/data/backups/{self.device_id}"
+        )
+        self.assertEqual(request.get_method(), "POST")
+
+        sent = {f["path"]: f for p in payloads for f in p["files"]}
+        self.assertEqual(set(sent), set(self.files))
+        for path, local in self.files.items():
+            self.assertEqual(sent[path]["size"], os.path.getsize(local))
+            self.assertEqual(sent[path]["mtime"], os.path.getmtime(local))
+
+    @patch("urllib.request.urlopen")
+    def test_unreachable_device_does_not_fail_backup(self, mock_urlopen):
+        mock_urlopen.side_effect = urllib.error.URLError("Connection refused")
+        backup = self._create_backup_instance()
+        confirmed = backup._confirm_backups(
+            "results", os.path.join(self.results_dir, self.device_id)
+        )
+        self.assertEqual(confirmed, 0)
+
+
 if __name__ == "__main__":
     # Create test suite
     loader = unittest.TestLoader()
@@ -741,6 +815,7 @@ if __name__ == "__main__":
         TestDeviceBackupInfo,
         TestCachePerformance,
         TestSQLiteCheckpoint,
+        TestBackupConfirmation,
     ]
 
     for test_class in test_classes:
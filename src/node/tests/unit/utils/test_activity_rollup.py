@@ -0,0 +1,165 @@
+"""
+Unit tests for the activity rollups of backed-up databases.
+
+Tests incremental updates against a full recomputation, the rollup values against
+values computed from the raw rows, the detection of replaced databases and the
+aggregation of queries at coarser resolutions.
+"""
+
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+from ethoscope_node.utils.activity_rollup import (
+    MOVING_SPEED,
+    ActivityRollups,
+    get_activity_rollups,
+)
+
+from ...fixtures.tracking_database import DB_PATH, ROI_SIZES, SyntheticDatabase
+
+
+class TestActivityRollups(unittest.TestCase):
+    """Test suite for ActivityRollups."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.results_dir = os.path.join(self.tmpdir, "results")
+        self.db = SyntheticDatabase(os.path.join(self.results_dir, DB_PATH))
+        self.rollups = ActivityRollups(self.results_dir)
+        self.addCleanup(self.rollups.close)
+
+    def _full(self):
+        """Rollups of the database computed from scratch, in a separate store."""
+        full = ActivityRollups(
+            self.results_dir, db_path=os.path.join(self.tmpdir, "full.db")
+        )
+        self.addCleanup(full.close)
+        full.update(DB_PATH)
+        return full
+
+    def _assert_same(self, result, expected):
+        self.assertEqual(result["rois"].keys(), expected["rois"].keys())
+        for roi, rows in result["rois"].items():
+            self.assertEqual(len(rows), len(expected["rois"][roi]))
+            for row, expected_row in zip(rows, expected["rois"][roi], strict=True):
+                self.assertEqual(row[:2], expected_row[:2])
+                for value, expected_value in zip(row, expected_row, strict=True):
+                    self.assertAlmostEqual(value, expected_value, places=6)
+
+    def test_default_db_path_is_outside_results_dir(self):
+        self.assertEqual(
+            self.rollups.db_path,
+            os.path.join(self.tmpdir, ".cache", "results_rollups.db"),
+        )
+
+    def test_incremental_updates_equal_full_recomputation(self):
+        processed = 0
+        # updates land in the middle of minutes
+        for seconds in (95, 30, 1, 250, 61):
+            self.db.grow(seconds)
+            processed += self.rollups.update(DB_PATH)
+        self.assertEqual(processed, sum(len(rows) for rows in self.db.rows.values()))
+        self.assertEqual(self.rollups.update(DB_PATH), 0)
+
+        for resolution in (60, 120, 300):
+            self._assert_same(
+                self.rollups.query(DB_PATH, resolution=resolution),
+                self._full().query(DB_PATH, resolution=resolution),
+            )
+
+    def test_rollup_values(self):
+        self.db.grow(600)
+        self.rollups.update(os.path.join(self.results_dir, DB_PATH))
+        result = self.rollups.query(DB_PATH)
+
+        for roi, rows in self.db.rows.items():
+            width = max(ROI_SIZES[roi])
+            minutes = {}
+            previous = rows[0]
+            for row in rows:
+                distance = math.hypot(row[2] - previous[2], row[3] - previous[3])
+                dt = (row[1] - previous[1]) / 1000
+                velocity = distance / dt if dt else 0.0
+                minute = minutes.setdefault(row[1] // 60000 * 60, [])
+                minute.append((distance, velocity, row[2], row[3]))
+                previous = row
+
+            expected = []
+            for t in sorted(minutes):
+                values = minutes[t]
+                n = len(values)
+                expected.append(
+                    [
+                        t,
+                        n,
+                        sum(v[0] for v in values),
+                        max(v[1] for v in values),
+                        sum(v[1] > MOVING_SPEED * width for v in values) / n,
+                        sum(v[2] for v in values) / n,
+                        sum(v[3] for v in values) / n,
+                    ]
+                )
+            self._assert_same(
+                {"rois": {roi: result["rois"][roi]}}, {"rois": {roi: expected}}
+            )
+
+    def test_replaced_database_is_rebuilt(self):
+        self.db.grow(300)
+        self.rollups.update(DB_PATH)
+
+        path = os.path.join(self.results_dir, DB_PATH)
+        os.remove(path)
+        self.db = SyntheticDatabase(path, seed=1)
+        self.db.grow(120)
+        self.rollups.update(DB_PATH)
+        self._assert_same(self.rollups.query(DB_PATH), self._full().query(DB_PATH))
+
+    def test_query_window_and_rois(self):
+        self.db.grow(600)
+        self.rollups.update(DB_PATH)
+        everything = self.rollups.query(DB_PATH)
+
+        result = self.rollups.query(DB_PATH, start=130, end=300, rois=[2])
+        self.assertEqual(list(result["rois"]), [2])
+        self.assertEqual([row[0] for row in result["rois"][2]], [120, 180, 240])
+        self.assertEqual(result["rois"][2], everything["rois"][2][2:5])
+
+        coarse = self.rollups.query(DB_PATH, resolution=600)
+        self.assertEqual([row[0] for row in coarse["rois"][1]], [0, 600])
+        self.assertEqual(
+            sum(row[1] for row in coarse["rois"][1]),
+            sum(row[1] for row in everything["rois"][1]),
+        )
+
+        with self.assertRaises(ValueError):
+            self.rollups.query(DB_PATH, resolution=90)
+        with self.assertRaises(ValueError):
+            self.rollups.update(os.path.join(self.tmpdir, "elsewhere.db"))
+
+    def test_update_all(self):
+        self.db.grow(120)
+        other = SyntheticDatabase(
+            os.path.join(self.results_dir, "002bbb", "ETHOSCOPE_002", "x", "y.db")
+        )
+        other.grow(60)
+        with open(os.path.join(self.results_dir, "002bbb", "broken.db"), "w") as f:
+            f.write("not a database")
+
+        processed = self.rollups.update_all(os.path.join(self.results_dir, "002bbb"))
+        self.assertEqual(processed, sum(len(rows) for rows in other.rows.values()))
+        self.assertEqual(self.rollups.query(DB_PATH)["rois"], {})
+
+    def test_shared_instances(self):
+        self.assertIs(
+            get_activity_rollups(self.results_dir + "/"),
+            get_activity_rollups(self.results_dir),
+        )
+        get_activity_rollups(self.results_dir).close()
+
+
+if __name__ == "__main__":
+    unittest.main()
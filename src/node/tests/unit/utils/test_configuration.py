@@ -384,11 +384,11 @@ class TestEthoscopeConfigurationLoadSave:
             config._logger = MagicMock()
             config._settings = {}
 
-            with patch.object(config, "save") as mock_save:
+            with patch.object(config, "_write") as mock_write:
                 result = config.load()
 
                 assert result == EthoscopeConfiguration.DEFAULT_SETTINGS
-                mock_save.assert_called_once()
+                mock_write.assert_called_once()
 
     def test_load_reads_existing_config(self):
         """Test load reads existing configuration file."""
@@ -781,8 +781,8 @@ class TestEthoscopeConfigurationSensors:
         config._settings = {"sensors": {}}
         config._logger = MagicMock()
 
-        # Mock save to raise exception
-        with patch.object(config, "save", side_effect=Exception("Save failed")):
+        # Mock the file write to raise exception
+        with patch.object(config, "_write", side_effect=Exception("Save failed")):
             with pytest.raises(ValueError) as exc_info:
                 config.add_sensor({"name": "sensor1"})
 
@@ -1907,6 +1907,7 @@ class TestConfigurationIntegration:
             config1 = EthoscopeConfiguration(str(config_file))
             config1.update_custom("TEST_KEY", "test_value")
             config1.add_key("commands", {"test_cmd": {"name": "Test"}})
+            config1.save()
 
             # Reload into new instance
             config2 = EthoscopeConfiguration(str(config_file))
@@ -0,0 +1,241 @@
+"""
+Unit tests for the versioned store of ethoscope_node.utils.configuration.
+
+Checks that readers get immutable snapshots, that transactions are published
+atomically while threads read and write concurrently, that the configuration
+file is never left half written, and that listeners are told of each change.
+"""
+
+import json
+import threading
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from ethoscope_node.utils import configuration
+from ethoscope_node.utils.configuration import (
+    ConfigurationError,
+    EthoscopeConfiguration,
+    freeze,
+    thaw,
+)
+
+
+@pytest.fixture
+def config(tmp_path):
+    return EthoscopeConfiguration(str(tmp_path / "ethoscope.conf"))
+
+
+def on_disk(config):
+    return json.loads(Path(config._config_file).read_text())
+
+
+class TestSnapshots:
+    """Test the immutable views given to readers."""
+
+    def test_snapshot_is_read_only(self, config):
+        snapshot = config.snapshot()
+        with pytest.raises(TypeError):
+            snapshot["custom"]["UPDATE_SERVICE_URL"] = "http://elsewhere"
+        with pytest.raises(AttributeError):
+            snapshot["setup"]["steps_completed"].append("admin_user")
+        assert thaw(snapshot) == config.content
+
+    def test_snapshot_is_shared_until_a_change(self, config):
+        first = config.snapshot()
+        assert config.snapshot() is first
+
+        version = config.version
+        config.update_custom("TEST_KEY", "value")
+        assert config.version == version + 1
+        assert config.snapshot() is not first
+        assert config.snapshot()["custom"]["TEST_KEY"] == "value"
+        assert "TEST_KEY" not in first["custom"]
+
+    def test_published_settings_are_not_changed_in_place(self, config):
+        published = config.content
+        config.add_sensor({"name": "sensor1", "URL": "http://sensor1"})
+        assert "sensor1" not in published["sensors"]
+        assert "sensor1" in config.content["sensors"]
+
+    def test_freeze_thaw(self):
+        value = {"a": [1, {"b": [2, 3]}], "c": None}
+        frozen = freeze(value)
+        assert frozen["a"][1]["b"] == (2, 3)
+        assert thaw(frozen) == value
+
+
+class TestTransactions:
+    """Test changes made through transaction()."""
+
+    def test_changes_are_published_and_saved_once(self, config):
+        with patch.object(config, "_write", wraps=config._write) as write:
+            with config.transaction() as settings:
+                settings["custom"]["A"] = 1
+                config.update_custom("B", 2)
+                # the working copy is only visible to the writing thread
+                assert config.content["custom"]["B"] == 2
+                assert "A" not in config.snapshot()["custom"]
+        write.assert_called_once()
+        assert on_disk(config)["custom"]["A"] == 1
+        assert on_disk(config)["custom"]["B"] == 2
+
+    def test_failed_transaction_is_discarded(self, config):
+        version = config.version
+        with pytest.raises(RuntimeError):
+            with config.transaction() as settings:
+                settings["custom"]["A"] = 1
+                raise RuntimeError("validation failed")
+        assert config.version == version
+        assert "A" not in config.content["custom"]
+        assert "A" not in on_disk(config)["custom"]
+
+    def test_unsaved_transaction(self, config):
+        config.add_key("commands", {"test_cmd": {"name": "Test"}})
+        assert "test_cmd" in config.snapshot()["commands"]
+        assert "test_cmd" not in on_disk(config)["commands"]
+
+
+class TestConcurrency:
+    """Threads read and write the configuration at the same time."""
+
+    WRITERS = 8
+    WRITES = 25
+
+    def test_concurrent_reads_and_writes(self, config):
+        stop = threading.Event()
+        errors = []
+
+        def write(n):
+            try:
+                for i in range(self.WRITES):
+                    # two values changed together, and a read-modify-write
+                    with config.transaction() as settings:
+                        custom = settings["custom"]
+                        custom["pair"] = [n, i]
+                        custom["pair_copy"] = [n, i]
+                        custom["counter"] = custom.get("counter", 0) + 1
+                    config.update_custom(f"writer_{n}", i)
+            except Exception as e:
+                errors.append(e)
+
+        def read():
+            try:
+                while not stop.is_set():
+                    custom = config.snapshot()["custom"]
+                    if custom.get("pair") != custom.get("pair_copy"):
+                        errors.append(AssertionError(f"torn snapshot {custom}"))
+                    custom = config.content["custom"]
+                    if custom.get("pair") != custom.get("pair_copy"):
+                        errors.append(AssertionError(f"torn settings {custom}"))
+            except Exception as e:
+                errors.append(e)
+
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        writers = [
+            threading.Thread(target=write, args=(n,)) for n in range(self.WRITERS)
+        ]
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        stop.set()
+        for thread in readers:
+            thread.join()
+
+        assert errors == []
+        custom = config.snapshot()["custom"]
+        assert custom["counter"] == self.WRITERS * self.WRITES
+        for n in range(self.WRITERS):
+            assert custom[f"writer_{n}"] == self.WRITES - 1
+        assert on_disk(config) == config.content
+        assert list(Path(config._config_file).parent.glob("*.tmp")) == []
+
+
+class TestAtomicWrites:
+    """A crash while saving never leaves a partial configuration file."""
+
+    def test_crash_between_write_and_rename(self, config):
+        config.update_custom("TEST_KEY", "before")
+        before = Path(config._config_file).read_text()
+        version = config.version
+
+        with patch.object(
+            configuration.os, "replace", side_effect=OSError("power cut")
+        ):
+            with pytest.raises(ConfigurationError, match="power cut"):
+                config.update_custom("TEST_KEY", "after")
+
+        assert Path(config._config_file).read_text() == before
+        assert config.get_custom("TEST_KEY") == "before"
+        assert config.version == version
+        assert list(Path(config._config_file).parent.glob("*.tmp")) == []
+
+        # the next load finds the last complete configuration
+        reloaded = EthoscopeConfiguration(str(config._config_file))
+        assert reloaded.get_custom("TEST_KEY") == "before"
+
+    def test_temporary_file_is_synced_before_rename(self, config):
+        calls = []
+        with (
+            patch.object(
+                configuration.os, "fsync", side_effect=lambda fd: calls.append("fsync")
+            ),
+            patch.object(
+                configuration.os,
+                "replace",
+                side_effect=lambda *args: calls.append("replace"),
+            ),
+        ):
+            config.update_custom("TEST_KEY", "value")
+        assert calls[:2] == ["fsync", "replace"]
+
+
+class TestListeners:
+    """Test the notification of changes."""
+
+    def test_listener_gets_new_snapshot(self, config):
+        received = []
+        config.add_listener(received.append)
+        config.update_custom("TEST_KEY", "value")
+        assert received == [config.snapshot()]
+
+        config.remove_listener(received.append)
+        config.update_custom("TEST_KEY", "other")
+        assert len(received) == 1
+
+    def test_no_notification_for_failed_change(self, config):
+        received = []
+        config.add_listener(received.append)
+        with patch.object(config, "_write", side_effect=ConfigurationError("full")):
+            with pytest.raises(ValueError):
+                config.add_sensor({"name": "sensor1"})
+        assert received == []
+
+    def test_failing_listener_does_not_stop_others(self, config):
+        received = []
+
+        def broken(snapshot):
+            raise RuntimeError("listener bug")
+
+        config.add_listener(broken)
+        config.add_listener(received.append)
+        config.update_custom("TEST_KEY", "value")
+        assert len(received) == 1
+
+    def test_listener_may_read_and_write(self, config):
+        """Listeners are called without the lock held."""
+
+        def listener(snapshot):
+            if snapshot["custom"].get("TEST_KEY") == "value":
+                config.update_custom("SEEN", True)
+
+        config.add_listener(listener)
+        thread = threading.Thread(
+            target=config.update_custom, args=("TEST_KEY", "value")
+        )
+        thread.start()
+        thread.join(5)
+        assert not thread.is_alive()
+        assert config.get_custom("SEEN") is True
@@ -0,0 +1,269 @@
+"""
+Unit tests for ethoscope_node.utils.detection_index.
+
+Thousands of synthetic metadata files are generated in a temporary diagnostics
+folder, to check that the SQL aggregates of the index give the same reports as
+the analyses of the loaded files, and that the index only parses new files.
+"""
+
+import json
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+
+from ethoscope_node.utils import detection_index
+from ethoscope_node.utils.detection_index import DetectionIndex, failure_reason
+from ethoscope_node.utils.target_detection_analysis import TargetDetectionAnalyzer
+
+DEVICES = [f"{i:03d}c6ba5795f2487a8f2e5f4cd0c3ad4b" for i in range(12)]
+
+
+def write_attempt(base_path, when, device_id, success, rng, name=None):
+    """Write the metadata of one detection attempt, as a device saves it."""
+    folder = base_path / ("success" if success else "failed")
+    folder.mkdir(exist_ok=True)
+    # the first devices struggle more, and mostly find no targets
+    if success:
+        found = 3
+    elif DEVICES.index(device_id) < 3:
+        found = rng.choice([0, 0, 0, 1, 2])
+    else:
+        found = rng.choice([0, 1, 1, 2, 4])
+    metadata = {
+        "timestamp": when.isoformat(),
+        "device_id": device_id,
+        "detection_success": success,
+        "targets_expected": 3,
+        "targets_found": found,
+    }
+    if rng.random() < 0.95:
+        metadata["image_quality"] = {
+            "mean_brightness": rng.uniform(0, 255),
+            "contrast_rms": rng.uniform(0, 60),
+        }
+    name = name or f"{when:%Y-%m-%d_%H-%M-%S-%f}_{device_id}_metadata.json"
+    path = folder / name
+    path.write_text(json.dumps(metadata, indent=2))
+    return path
+
+
+def generate(base_path, count, seed=47, days=60):
+    """Write `count` attempts spread over the last `days` days, and a few bad files."""
+    rng = random.Random(seed)
+    now = datetime.now()
+    for _ in range(count):
+        device_id = rng.choice(DEVICES)
+        rate = 0.5 if DEVICES.index(device_id) < 3 else 0.9
+        when = now - timedelta(seconds=rng.uniform(0, days * 24 * 3600))
+        write_attempt(base_path, when, device_id, rng.random() < rate, rng)
+    (base_path / "failed" / "empty_metadata.json").write_text("")
+    (base_path / "failed" / "broken_metadata.json").write_text("not json {")
+    (base_path / "success" / "notime_metadata.json").write_text('{"device_id": "x"}')
+    # images are not indexed
+    (base_path / "failed" / "image_original.png").write_bytes(b"png")
+
+
+@pytest.fixture
+def analyzer(tmp_path):
+    analyzer = TargetDetectionAnalyzer(str(tmp_path))
+    yield analyzer
+    if analyzer._index is not None:
+        analyzer._index.close()
+
+
+def comparable(results):
+    """Report sections as saved in JSON, with ties between devices or failure types
+    made comparable."""
+    results = json.loads(json.dumps(results, default=float))
+    patterns = results["failure_patterns"]
+    patterns.pop("failure_reasons", None)
+    if "most_common_targets_found" in patterns:
+        # any of the most frequent numbers of targets found
+        patterns["most_common_targets_found"] = patterns["targets_found_distribution"][
+            str(patterns["most_common_targets_found"])
+        ]
+    results["device_performance"]["problematic_devices"].sort(
+        key=lambda d: (d["success_rate"], d["device_id"])
+    )
+    return results
+
+
+def assert_close(actual, expected, path="report"):
+    """Compare nested reports, floats to a relative 1e-6."""
+    if isinstance(expected, dict):
+        assert isinstance(actual, dict) and actual.keys() == expected.keys(), path
+        for key in expected:
+            assert_close(actual[key], expected[key], f"{path}.{key}")
+    elif isinstance(expected, list):
+        assert isinstance(actual, list) and len(actual) == len(expected), path
+        for i, (a, e) in enumerate(zip(actual, expected, strict=True)):
+            assert_close(a, e, f"{path}[{i}]")
+    elif isinstance(expected, float):
+        assert actual == pytest.approx(expected, rel=1e-6, abs=1e-9), path
+    else:
+        assert actual == expected, path
+
+
+class TestAgainstFileAnalysis:
+    """The index gives the reports of the analyses of the loaded files."""
+
+    @pytest.mark.parametrize("days_back", [1, 7, 30, 90])
+    def test_same_reports(self, tmp_path, analyzer, days_back):
+        generate(tmp_path, 3000)
+        cutoff = datetime.now() - timedelta(days=days_back)
+
+        expected = comparable(analyzer._analyze_files(cutoff))
+        actual = comparable(analyzer._analyze_index(cutoff))
+
+        assert expected["summary"]["total_detection_attempts"] > 0
+        assert_close(actual, expected)
+
+    def test_failure_reasons(self, tmp_path, analyzer):
+        generate(tmp_path, 500)
+        patterns = analyzer.analyze_detection_logs(days_back=90)["failure_patterns"]
+        reasons = patterns["failure_reasons"]
+        assert set(reasons) == {"no_targets", "too_few_targets", "too_many_targets"}
+        assert sum(reasons.values()) == patterns["total_failures"]
+        assert reasons["no_targets"] == patterns["targets_found_distribution"][0]
+
+    def test_no_data(self, analyzer):
+        cutoff = datetime.now() - timedelta(days=7)
+        assert comparable(analyzer._analyze_index(cutoff)) == comparable(
+            analyzer._analyze_files(cutoff)
+        )
+
+    @pytest.mark.slow
+    def test_report_is_faster(self, tmp_path, analyzer):
+        generate(tmp_path, 3000)
+        analyzer.ingest()
+
+        start = time.perf_counter()
+        analyzer._analyze_files(datetime.now() - timedelta(days=30))
+        files = time.perf_counter() - start
+        start = time.perf_counter()
+        analyzer.analyze_detection_logs(days_back=30)
+        index = time.perf_counter() - start
+
+        assert index < files, f"{files:.3f}s from files, {index:.3f}s indexed"
+
+    def test_falls_back_to_files(self, tmp_path, analyzer):
+        generate(tmp_path, 100)
+        with patch(
+            "ethoscope_node.utils.target_detection_analysis.DetectionIndex",
+            side_effect=sqlite3.OperationalError("unable to open database file"),
+        ):
+            analysis = analyzer.analyze_detection_logs(days_back=90)
+        assert analysis["summary"]["total_detection_attempts"] == 100
+        assert "failure_reasons" not in analysis["failure_patterns"]
+
+
+class TestIncrementalIngest:
+    """The index only parses the metadata files that are new or changed."""
+
+    @pytest.fixture
+    def index(self, tmp_path):
+        index = DetectionIndex(str(tmp_path))
+        yield index
+        index.close()
+
+    def count_rows(self, index):
+        return index._conn.execute("SELECT COUNT(*) FROM attempts").fetchone()[0]
+
+    def test_unchanged_files_are_not_parsed(self, tmp_path, index, monkeypatch):
+        generate(tmp_path, 1000)
+        assert index.refresh() == {"parsed": 1000, "invalid": 3, "removed": 0}
+
+        # folders listed long after their last change are not listed again
+        monkeypatch.setattr(detection_index, "MTIME_RESOLUTION", 0)
+        with patch.object(detection_index.json, "load") as load:
+            assert index.refresh() == {"parsed": 0, "invalid": 0, "removed": 0}
+        load.assert_not_called()
+
+    def test_new_changed_and_removed_files(self, tmp_path, index):
+        generate(tmp_path, 200)
+        index.refresh()
+        rng = random.Random(1)
+        when = datetime.now()
+
+        changed = sorted((tmp_path / "failed").glob("2*_metadata.json"))[-1]
+        metadata = json.loads(changed.read_text())
+        metadata["device_id"] = "moved"
+        changed.write_text(json.dumps(metadata))
+        removed = sorted((tmp_path / "success").glob("2*_metadata.json"))[-1]
+        removed.unlink()
+        write_attempt(tmp_path, when, DEVICES[0], True, rng)
+
+        with patch.object(
+            detection_index.json, "load", wraps=detection_index.json.load
+        ) as load:
+            stats = index.refresh()
+        assert stats == {"parsed": 2, "invalid": 0, "removed": 1}
+        assert load.call_count == 2
+        assert self.count_rows(index) == 200
+        devices = index.summary(0)["devices_analyzed"]
+        assert "moved" in devices
+
+    def test_removed_folder(self, tmp_path, index):
+        generate(tmp_path, 50)
+        index.refresh()
+        for path in (tmp_path / "failed").iterdir():
+            path.unlink()
+        (tmp_path / "failed").rmdir()
+
+        assert index.refresh()["removed"] > 0
+        assert index.summary(0)["failed_detections"] == 0
+
+    def test_fixed_invalid_file_is_parsed(self, tmp_path, index):
+        generate(tmp_path, 10)
+        index.refresh()
+        broken = tmp_path / "failed" / "broken_metadata.json"
+        broken.write_text(
+            json.dumps({"timestamp": datetime.now().isoformat(), "device_id": "fixed"})
+        )
+        assert index.refresh()["parsed"] == 1
+        assert "fixed" in index.summary(0)["devices_analyzed"]
+
+    def test_index_persists(self, tmp_path):
+        generate(tmp_path, 100)
+        first = DetectionIndex(str(tmp_path))
+        first.refresh()
+        first.close()
+
+        second = DetectionIndex(str(tmp_path))
+        assert second.summary(0)["total_detection_attempts"] == 100
+        second.close()
+
+    def test_cleanup_is_reflected(self, tmp_path, analyzer):
+        generate(tmp_path, 100, days=20)
+        analyzer.ingest()
+        old = datetime.now() - timedelta(days=40)
+        for path in sorted((tmp_path / "success").glob("2*_metadata.json"))[:10]:
+            os.utime(path, (old.timestamp(), old.timestamp()))
+
+        removed = analyzer.cleanup_old_logs(days_to_keep=30)["files_removed"]
+        summary = analyzer.analyze_detection_logs(days_back=30)["summary"]
+        assert summary["total_detection_attempts"] == 100 - removed
+
+
+class TestFailureReason:
+    """Test failure_reason() descriptions."""
+
+    @pytest.mark.parametrize(
+        "metadata, reason",
+        [
+            ({"targets_found": 0}, "no_targets"),
+            ({}, "no_targets"),
+            ({"targets_found": 2}, "too_few_targets"),
+            ({"targets_found": 4, "targets_expected": 3}, "too_many_targets"),
+            ({"targets_found": 3}, "unknown"),
+            ({"targets_found": "two"}, "unknown"),
+            ({"failure_reason": "camera_timeout"}, "camera_timeout"),
+        ],
+    )
+    def test_reason(self, metadata, reason):
+        assert failure_reason(metadata) == reason
@@ -0,0 +1,169 @@
+"""
+Unit tests for the results file index.
+
+Tests that the index converges to the filesystem as a temporary results tree is
+changed, the columns derived from the path, and the filtered queries.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from ethoscope_node.utils.file_index import FileIndex, get_file_index
+
+DB_DIR = os.path.join("0123abcd", "ETHOSCOPE_001", "2025-01-02_10-00-00")
+
+
+class TestFileIndex(unittest.TestCase):
+    """Test suite for FileIndex."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.root = os.path.join(self.tmpdir, "results")
+        os.makedirs(self.root)
+        self.index = FileIndex(self.root)
+        self.addCleanup(self.index.close)
+
+    def _write(self, relative, data=b"x"):
+        path = os.path.join(self.root, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def _walk(self):
+        files = {}
+        for dirpath, _dirnames, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                files[path] = os.path.getsize(path)
+        return files
+
+    def _assert_converged(self):
+        self.index.refresh()
+        indexed = {f["path"]: f["size"] for f in self.index.files(max_age=None)}
+        self.assertEqual(indexed, self._walk())
+
+    def test_default_db_path_is_outside_root(self):
+        self.assertEqual(
+            self.index.db_path, os.path.join(self.tmpdir, ".cache", "results_index.db")
+        )
+
+    def test_converges_while_tree_changes(self):
+        self._write(os.path.join(DB_DIR, "2025-01-02_10-00-00_0123abcd.db"))
+        self._write(os.path.join(DB_DIR, "snapshot.png"))
+        self._write("index.txt")
+        self._assert_converged()
+
+        # new experiment folder
+        self._write(
+            os.path.join("0123abcd", "ETHOSCOPE_001", "2025-02-01_09-00-00", "b.db")
+        )
+        self._assert_converged()
+
+        # a database growing in place leaves its directory mtime unchanged
+        self._write(os.path.join(DB_DIR, "2025-01-02_10-00-00_0123abcd.db"), b"x" * 100)
+        self._assert_converged()
+
+        # removed file, renamed file, removed folder
+        os.remove(os.path.join(self.root, DB_DIR, "snapshot.png"))
+        os.rename(
+            os.path.join(self.root, "index.txt"), os.path.join(self.root, "old.txt")
+        )
+        shutil.rmtree(
+            os.path.join(self.root, "0123abcd", "ETHOSCOPE_001", "2025-02-01_09-00-00")
+        )
+        self._assert_converged()
+
+        # whole device removed
+        shutil.rmtree(os.path.join(self.root, "0123abcd"))
+        self._assert_converged()
+
+    def test_unchanged_directories_are_not_listed_again(self):
+        for i in range(5):
+            self._write(os.path.join(f"device{i}", "a.db"))
+        # make every directory look older than the racy window
+        for dirpath, _dirnames, _filenames in os.walk(self.root):
+            os.utime(dirpath, (time.time() - 10, time.time() - 10))
+        self.index.refresh()
+
+        self._write(os.path.join("device3", "b.db"))
+        # a growing database is picked up without listing its folder
+        with open(os.path.join(self.root, "device1", "a.db"), "ab") as f:
+            f.write(b"more rows")
+        with patch(
+            "ethoscope_node.utils.file_index.os.scandir", wraps=os.scandir
+        ) as scandir:
+            self.index.refresh()
+        self.assertEqual(
+            [c.args[0] for c in scandir.call_args_list],
+            [os.path.join(self.root, "device3")],
+        )
+        self._assert_converged()
+
+    def test_columns(self):
+        path = self._write(
+            os.path.join(DB_DIR, "2025-01-02_10-00-00_0123abcd.db"), b"abc"
+        )
+        self._write("loose.txt")
+
+        files = {f["path"]: f for f in self.index.files()}
+        self.assertEqual(files[path]["size"], 3)
+        self.assertEqual(files[path]["type"], "db")
+        self.assertEqual(files[path]["device"], "0123abcd")
+        self.assertEqual(files[path]["date"], "2025-01-02_10-00-00")
+        self.assertEqual(files[path]["mtime"], os.path.getmtime(path))
+        loose = files[os.path.join(self.root, "loose.txt")]
+        self.assertEqual((loose["device"], loose["date"]), ("", ""))
+
+    def test_queries(self):
+        self._write(os.path.join("dev1", "exp", "a.db"), b"1" * 10)
+        self._write(os.path.join("dev1", "exp", "a.png"), b"1" * 5)
+        self._write(os.path.join("dev2", "exp", "b.db"), b"1" * 20)
+        self._write(os.path.join("dev22", "c.db"), b"1" * 40)
+
+        names = [os.path.basename(f["path"]) for f in self.index.files(file_type="db")]
+        self.assertEqual(names, ["a.db", "b.db", "c.db"])
+        self.assertEqual(len(self.index.files(device="dev1")), 2)
+        # a prefix does not match sibling folders sharing its name
+        prefix = os.path.join(self.root, "dev2")
+        self.assertEqual(self.index.total_size(prefix=prefix), 20)
+        self.assertEqual(self.index.total_size(file_type="db"), 70)
+        self.assertEqual(self.index.total_size(), 75)
+
+    def test_index_persists_across_instances(self):
+        self._write(os.path.join("dev1", "a.db"))
+        self.index.refresh()
+
+        other = FileIndex(self.root)
+        self.addCleanup(other.close)
+        self.assertEqual(len(other.files(max_age=None)), 1)
+
+    def test_max_age_skips_refresh(self):
+        self.index.refresh()
+        self._write(os.path.join("dev1", "a.db"))
+        self.assertEqual(self.index.files(max_age=3600), [])
+        self.assertEqual(len(self.index.files(max_age=0)), 1)
+
+    def test_watcher_keeps_index_current(self):
+        self.index.start_watching(interval=0.05)
+        self.addCleanup(self.index.stop_watching)
+        self._write(os.path.join("dev1", "a.db"))
+
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            if self.index.files(max_age=None):
+                break
+            time.sleep(0.05)
+        self.assertEqual(len(self.index.files(max_age=None)), 1)
+
+    def test_shared_instances(self):
+        self.assertIs(get_file_index(self.root + "/"), get_file_index(self.root))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+"""
+Unit tests for ethoscope_node.utils.log_cache.
+
+A fake device serves pages of its log, to check which pages are fetched again and
+which are served from the cache.
+"""
+
+import datetime
+
+import pytest
+
+from ethoscope_node.utils.log_cache import DeviceLogCache, format_log_entry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeDevice:
+    """Answers log page requests, counting them."""
+
+    def __init__(self):
+        self.queries = []
+
+    def get_log_page(self, **query):
+        self.queries.append(query)
+        cursor = int(query.get("cursor", 100))
+        limit = int(query.get("limit", 10))
+        entries = [
+            {"time": i, "message": f"event {i}"}
+            for i in range(cursor, cursor - limit, -1)
+        ]
+        return {"entries": entries, "cursor": str(cursor - limit)}
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def cache(clock):
+    return DeviceLogCache(max_pages=3, tail_ttl=10, page_ttl=600, clock=clock)
+
+
+class TestDeviceLogCache:
+    """Test the pages kept per device."""
+
+    def test_newest_page_expires_quickly(self, cache, clock):
+        device = FakeDevice()
+        first = cache.page("dev1", device.get_log_page, limit=5)
+        assert cache.page("dev1", device.get_log_page, limit="5") is first
+        assert len(device.queries) == 1
+
+        clock.now += 11
+        cache.page("dev1", device.get_log_page, limit=5)
+        assert len(device.queries) == 2
+        assert cache.stats == {"hits": 1, "misses": 2}
+
+    def test_older_pages_are_kept(self, cache, clock):
+        device = FakeDevice()
+        cursor = cache.page("dev1", device.get_log_page)["cursor"]
+        older = cache.page("dev1", device.get_log_page, cursor=cursor)
+        clock.now += 300
+        assert cache.page("dev1", device.get_log_page, cursor=cursor) is older
+        assert len(device.queries) == 2
+
+    def test_empty_filters_are_ignored(self, cache):
+        device = FakeDevice()
+        cache.page("dev1", device.get_log_page, grep="", level=None, other="x")
+        cache.page("dev1", device.get_log_page)
+        assert device.queries == [{}]
+
+    def test_pages_per_device(self, cache):
+        devices = {"dev1": FakeDevice(), "dev2": FakeDevice()}
+        for device_id, device in devices.items():
+            for cursor in (100, 90, 80, 70):
+                cache.page(device_id, device.get_log_page, cursor=cursor)
+        # the least recently used page of each device was dropped
+        cache.page("dev1", devices["dev1"].get_log_page, cursor=90)
+        cache.page("dev1", devices["dev1"].get_log_page, cursor=100)
+        assert len(devices["dev1"].queries) == 5
+        assert len(devices["dev2"].queries) == 4
+
+        cache.invalidate("dev1")
+        cache.page("dev1", devices["dev1"].get_log_page, cursor=90)
+        cache.page("dev2", devices["dev2"].get_log_page, cursor=90)
+        assert len(devices["dev1"].queries) == 6
+        assert len(devices["dev2"].queries) == 4
+
+    @pytest.mark.parametrize("answer", [None, {"error": "Traceback ..."}])
+    def test_failures_are_not_cached(self, cache, answer):
+        calls = []
+
+        def fetch(**query):
+            calls.append(query)
+            return answer
+
+        assert cache.page("dev1", fetch) == answer
+        assert cache.page("dev1", fetch) == answer
+        assert len(calls) == 2
+
+
+def test_format_log_entry():
+    when = datetime.datetime(2025, 3, 1, 8, 0, 0)
+    entry = {
+        "time": when.timestamp(),
+        "level": "err",
+        "unit": "ethoscope_device.service",
+        "message": "camera lost",
+    }
+    assert format_log_entry(entry) == (
+        "2025-03-01 08:00:00 [err] ethoscope_device.service: camera lost"
+    )
+    assert format_log_entry({"time": None, "level": None, "message": "x"}) == "x"
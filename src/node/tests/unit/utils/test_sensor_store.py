@@ -0,0 +1,192 @@
+"""
+Unit tests for the sensor data store.
+
+Tests the incremental import of sensor CSV files, the rollups against values
+computed from the raw readings, and the choice of resolution for a query.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from ethoscope_node.utils.sensor_store import (
+    RESOLUTIONS,
+    SensorStore,
+    format_time,
+    get_sensor_store,
+    parse_time,
+)
+
+T0 = parse_time("2025-01-01 00:00:00")
+
+CSV_HEADER = (
+    "# Sensor ID: abc\n"
+    "# IP: 192.168.1.50\n"
+    "# Name: incubator\n"
+    "# Location: lab\n"
+    "Time,Temperature,Humidity,Pressure,Light\n"
+)
+
+
+def _line(t, temperature, humidity="50.0", pressure="1013.0", light="100"):
+    return f"{format_time(t)},{temperature},{humidity},{pressure},{light}\n"
+
+
+class TestSensorStore(unittest.TestCase):
+    """Test suite for SensorStore."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.sensors_dir = os.path.join(self.tmpdir, "sensors")
+        os.makedirs(self.sensors_dir)
+        self.store = SensorStore(self.sensors_dir)
+        self.addCleanup(self.store.close)
+        self.csv_path = os.path.join(self.sensors_dir, "incubator.csv")
+
+    def _write(self, text, mode="a"):
+        with open(self.csv_path, mode) as f:
+            f.write(text)
+
+    def test_default_db_path_is_outside_sensors_dir(self):
+        self.assertEqual(
+            self.store.db_path,
+            os.path.join(self.tmpdir, ".cache", "sensors_store.db"),
+        )
+
+    def test_parse_and_format_time(self):
+        self.assertEqual(T0, 1735689600)
+        self.assertEqual(parse_time(str(T0)), T0)
+        self.assertEqual(parse_time("2025-01-01T00:01:00"), T0 + 60)
+        self.assertEqual(parse_time("2025-01-01"), T0)
+        self.assertIsNone(parse_time(""))
+        self.assertEqual(format_time(T0 + 61), "2025-01-01 00:01:01")
+        with self.assertRaises(ValueError):
+            parse_time("yesterday")
+
+    def test_sync_imports_only_appended_lines(self):
+        self._write(CSV_HEADER + _line(T0, "20.5") + _line(T0 + 1, "N/A"), mode="w")
+        self.assertEqual(self.store.sync("incubator"), 2)
+        self.assertEqual(self.store.sync("incubator"), 0)
+
+        # a line still being written is left for the next sync
+        self._write(_line(T0 + 2, "21.0") + format_time(T0 + 3) + ",21")
+        self.assertEqual(self.store.sync("incubator"), 1)
+        self._write(".5,50.0,1013.0,100\n")
+        self.assertEqual(self.store.sync("incubator"), 1)
+
+        rows = self.store.query("incubator")["rows"]
+        self.assertEqual([r[0] for r in rows], [T0, T0 + 1, T0 + 2, T0 + 3])
+        self.assertEqual(rows[0], (T0, 20.5, 50.0, 1013.0, 100.0))
+        self.assertIsNone(rows[1][1])
+        self.assertEqual(rows[3][1], 21.5)
+        self.assertEqual(self.store.sensors(), ["incubator"])
+
+    def test_replaced_csv_is_imported_again(self):
+        self._write(CSV_HEADER + "".join(_line(T0 + i, "20") for i in range(5)))
+        self.store.sync("incubator")
+
+        os.remove(self.csv_path)
+        self._write(CSV_HEADER + _line(T0 + 100, "25"), mode="w")
+        self.store.sync("incubator")
+        rows = self.store.query("incubator")["rows"]
+        self.assertEqual(rows, [(T0 + 100, 25.0, 50.0, 1013.0, 100.0)])
+
+    def test_rollups_match_raw_readings(self):
+        # two days at 1 reading every 7s, with a gap and missing temperatures
+        rows = []
+        for i in range(0, 2 * 86400, 7):
+            if 30000 < i < 40000:
+                continue
+            temperature = None if i % 91 == 0 else 20 + (i % 1000) / 100
+            rows.append((T0 + i, temperature, 50.0, 1013.0, float(i % 3)))
+        self.store.append("incubator", rows[: len(rows) // 2])
+        self.store.append("incubator", rows[len(rows) // 2 :])
+
+        for resolution in RESOLUTIONS:
+            buckets = {}
+            for row in rows:
+                buckets.setdefault(row[0] // resolution * resolution, []).append(row)
+            expected_mean, expected_min, expected_max = [], [], []
+            for t in sorted(buckets):
+                values = [r[1] for r in buckets[t] if r[1] is not None]
+                expected_mean.append(sum(values) / len(values) if values else None)
+                expected_min.append(min(values) if values else None)
+                expected_max.append(max(values) if values else None)
+
+            result = self.store.query(
+                "incubator", max_points=len(buckets), start=T0, end=T0 + 2 * 86400
+            )
+            # coarser levels would fit too, but the finest that fits is used
+            self.assertEqual(result["resolution"], resolution)
+            self.assertEqual([r[0] for r in result["rows"]], sorted(buckets))
+            for got, expected in zip(
+                [r[1] for r in result["rows"]], expected_mean, strict=True
+            ):
+                if expected is None:
+                    self.assertIsNone(got)
+                else:
+                    self.assertAlmostEqual(got, expected)
+            self.assertEqual([r[1] for r in result["min"]], expected_min)
+            self.assertEqual([r[1] for r in result["max"]], expected_max)
+
+    def test_resolution_choice(self):
+        self.store.append(
+            "incubator", ((T0 + i, 20.0, 50.0, 1013.0, 0.0) for i in range(0, 86400, 5))
+        )
+
+        # everything fits
+        result = self.store.query("incubator", max_points=17280)
+        self.assertEqual(result["resolution"], 0)
+        self.assertEqual(len(result["rows"]), 17280)
+        self.assertNotIn("min", result)
+
+        self.assertEqual(
+            self.store.query("incubator", max_points=1440)["resolution"], 60
+        )
+        self.assertEqual(
+            self.store.query("incubator", max_points=1000)["resolution"], 600
+        )
+        self.assertEqual(
+            self.store.query("incubator", max_points=24)["resolution"], 3600
+        )
+        self.assertEqual(
+            self.store.query("incubator", max_points=1)["resolution"], 86400
+        )
+        # nothing fits: the coarsest level is returned anyway
+        self.store.append("incubator", [(T0 + 86400, 20.0, 50.0, 1013.0, 0.0)])
+        result = self.store.query("incubator", max_points=1)
+        self.assertEqual((result["resolution"], len(result["rows"])), (86400, 2))
+
+        # a narrow window is served raw
+        result = self.store.query("incubator", T0 + 3600, T0 + 3660, max_points=100)
+        self.assertEqual(result["resolution"], 0)
+        self.assertEqual(
+            [r[0] for r in result["rows"]][::6], [T0 + 3600, T0 + 3630, T0 + 3660]
+        )
+
+    def test_unknown_sensor_and_empty_window(self):
+        self.assertEqual(self.store.query("missing")["rows"], [])
+        self.store.append("incubator", [(T0, 20.0, 50.0, 1013.0, 0.0)])
+        self.assertEqual(self.store.query("incubator", start=T0 + 1)["rows"], [])
+        self.assertEqual(self.store.query("incubator", T0 + 10, T0)["rows"], [])
+
+    def test_store_persists_across_instances(self):
+        self._write(CSV_HEADER + _line(T0, "20.5"))
+        self.store.sync("incubator")
+
+        other = SensorStore(self.sensors_dir)
+        self.addCleanup(other.close)
+        self.assertEqual(other.sync("incubator"), 0)
+        self.assertEqual(len(other.query("incubator")["rows"]), 1)
+
+    def test_shared_instances(self):
+        self.assertIs(
+            get_sensor_store(self.sensors_dir + "/"), get_sensor_store(self.sensors_dir)
+        )
+        get_sensor_store(self.sensors_dir).close()
+
+
+if __name__ == "__main__":
+    unittest.main()
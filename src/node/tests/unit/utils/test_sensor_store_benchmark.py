@@ -0,0 +1,61 @@
+"""
+Benchmark of sensor data queries over one year of 1 Hz readings.
+
+Compares reading raw readings, as the former whole-CSV endpoint did, with the
+downsampled queries charts now make. A week of raw readings is the baseline, as a
+year of them (31.5M rows) does not fit comfortably in memory.
+"""
+
+import math
+import time
+
+import pytest
+
+from ethoscope_node.utils.sensor_store import SensorStore, parse_time
+
+T0 = parse_time("2025-01-01")
+YEAR = 365 * 86400
+
+
+def _readings():
+    for i in range(YEAR):
+        phase = math.sin(i * 2 * math.pi / 86400)
+        yield (T0 + i, 24 + 2 * phase, 60 - 10 * phase, 1013.0, 500.0 * (phase > 0))
+
+
+@pytest.fixture(scope="module")
+def year_store(tmp_path_factory):
+    store = SensorStore(str(tmp_path_factory.mktemp("sensors")))
+    store.append("incubator", _readings())
+    yield store
+    store.close()
+
+
+def _timed(store, **kwargs):
+    start = time.perf_counter()
+    result = store.query("incubator", **kwargs)
+    return result, time.perf_counter() - start
+
+
+@pytest.mark.slow
+def test_year_of_1hz_readings(year_store):
+    """Time a raw week, the whole year downsampled, a month and a one-hour window."""
+    raw, raw_time = _timed(year_store, start=T0, end=T0 + 7 * 86400 - 1)
+    assert len(raw["rows"]) == 7 * 86400
+
+    year, year_time = _timed(year_store, max_points=1000)
+    month, month_time = _timed(
+        year_store, start=T0 + 180 * 86400, end=T0 + 210 * 86400, max_points=1000
+    )
+    hour, hour_time = _timed(
+        year_store, start=T0 + 100 * 86400, end=T0 + 100 * 86400 + 3599, max_points=5000
+    )
+
+    assert (year["resolution"], len(year["rows"])) == (86400, 365)
+    assert (month["resolution"], len(month["rows"])) == (3600, 721)
+    assert (hour["resolution"], len(hour["rows"])) == (0, 3600)
+    # daily means of a sine over whole days
+    assert abs(year["rows"][0][1] - 24) < 0.5
+    assert year_time < raw_time / 20, (year_time, raw_time)
+    assert month_time < raw_time / 20, (month_time, raw_time)
+    assert hour_time < raw_time / 20, (hour_time, raw_time)
@@ -0,0 +1,156 @@
+"""
+Unit tests for the streaming zip writer.
+
+Tests archives built from files larger than the chunk size, deflated and ZIP64
+entries, the manifest, cancellation and the memory held while streaming.
+"""
+
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import tracemalloc
+import unittest
+import zipfile
+
+from ethoscope_node.utils.zip_stream import MANIFEST_NAME, ZipStream
+
+CHUNK = 64 * 1024
+
+
+class TestZipStream(unittest.TestCase):
+    """Test suite for ZipStream."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.files = {}
+        for name, size in (("a.db", 5 * CHUNK + 123), ("b.txt", 10), ("empty", 0)):
+            path = os.path.join(self.tmpdir.name, name)
+            with open(path, "wb") as f:
+                f.write(os.urandom(size // 2) + b"x" * (size - size // 2))
+            self.files[path] = size
+
+    def _archive(self, **kwargs):
+        stream = ZipStream(list(self.files), chunk_size=CHUNK, **kwargs)
+        return b"".join(stream), stream
+
+    def _assert_contents(self, data):
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            self.assertIsNone(zf.testzip())
+            for path in self.files:
+                with open(path, "rb") as f:
+                    self.assertEqual(zf.read(path.lstrip("/")), f.read())
+            return zf.namelist()
+
+    def test_stored_archive(self):
+        data, stream = self._archive()
+        names = self._assert_contents(data)
+        self.assertEqual(names, [p.lstrip("/") for p in self.files])
+        self.assertTrue(stream.completed)
+        self.assertEqual(stream.bytes_sent, len(data))
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            self.assertTrue(
+                all(i.compress_type == zipfile.ZIP_STORED for i in zf.infolist())
+            )
+
+    def test_deflated_archive(self):
+        data, _ = self._archive(compress=True)
+        self._assert_contents(data)
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            self.assertTrue(
+                all(i.compress_type == zipfile.ZIP_DEFLATED for i in zf.infolist())
+            )
+        # half of a.db is a run of "x"
+        self.assertLess(len(data), sum(self.files.values()))
+
+    def test_zip64_archive(self):
+        data, _ = self._archive(force_zip64=True, compress=True)
+        self._assert_contents(data)
+        # the ZIP64 end of central directory record is present
+        self.assertIn(b"PK\x06\x06", data)
+
+    def test_manifest(self):
+        data, _ = self._archive(manifest=True)
+        self._assert_contents(data)
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            self.assertEqual(zf.namelist()[-1], MANIFEST_NAME)
+            manifest = json.loads(zf.read(MANIFEST_NAME))
+
+        self.assertEqual(len(manifest["files"]), 3)
+        for item in manifest["files"]:
+            with open(item["path"], "rb") as f:
+                content = f.read()
+            self.assertEqual(item["size"], self.files[item["path"]])
+            self.assertEqual(item["sha256"], hashlib.sha256(content).hexdigest())
+        self.assertEqual(manifest["errors"], [])
+
+    def test_missing_files_are_skipped(self):
+        missing = os.path.join(self.tmpdir.name, "missing.db")
+        stream = ZipStream([missing, *self.files], chunk_size=CHUNK, manifest=True)
+        with self.assertLogs("ZipStream", level="WARNING"):
+            data = b"".join(stream)
+
+        self._assert_contents(data)
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            manifest = json.loads(zf.read(MANIFEST_NAME))
+        self.assertEqual([e["path"] for e in manifest["errors"]], [missing])
+
+    def test_arcnames(self):
+        path = next(iter(self.files))
+        data = b"".join(ZipStream([(path, "renamed/a.db")], chunk_size=CHUNK))
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            self.assertEqual(zf.namelist(), ["renamed/a.db"])
+
+    def test_cancel_event_stops_streaming(self):
+        cancel = threading.Event()
+        stream = ZipStream(list(self.files), chunk_size=CHUNK, cancel_event=cancel)
+        chunks = []
+        for chunk in stream:
+            chunks.append(chunk)
+            if len(chunks) == 2:
+                cancel.set()
+
+        self.assertEqual(len(chunks), 2)
+        self.assertTrue(stream.cancelled)
+        self.assertFalse(stream.completed)
+
+    def test_close_on_client_disconnect(self):
+        stream = ZipStream(list(self.files), chunk_size=CHUNK)
+        iterator = iter(stream)
+        next(iterator)
+        next(iterator)
+        stream.close()
+
+        self.assertTrue(stream.cancelled)
+        self.assertFalse(stream.completed)
+        with self.assertRaises(StopIteration):
+            next(iterator)
+
+    def test_memory_stays_bounded(self):
+        path = os.path.join(self.tmpdir.name, "large.db")
+        size = 16 * 1024 * 1024
+        with open(path, "wb") as f:
+            for _ in range(size // CHUNK):
+                f.write(os.urandom(CHUNK))
+
+        out = os.path.join(self.tmpdir.name, "out.zip")
+        tracemalloc.start()
+        try:
+            with open(out, "wb") as f:
+                for chunk in ZipStream([path], chunk_size=CHUNK, manifest=True):
+                    f.write(chunk)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertLess(peak, 8 * CHUNK)
+        with zipfile.ZipFile(out) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.getinfo(path.lstrip("/")).file_size, size)
+
+
+if __name__ == "__main__":
+    unittest.main()
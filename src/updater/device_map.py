@@ -0,0 +1,323 @@
+"""
+Device map of the update server.
+
+Rebuilding the map for every page load asked each device for its id, its data, its
+active branch and whether it is up to date - the latter being a git fetch on the
+device - in three passes one after the other. The DeviceMap instead keeps what it
+learnt of each device, on disk so that it survives restarts, and a refresh only
+probes the devices whose entry is stale:
+
+- devices it has not seen yet, or that were marked with invalidate() (e.g. because
+  they were updated or switched branch)
+- devices whose IP changed
+- entries older than max_age
+- entries whose origin commit is no longer the head of their branch in the bare
+  repository of the node, which the devices fetch from
+
+The list of devices, their IP and their state come from the node, which already
+polls the devices. All stale devices are then probed in one pass over a thread pool,
+and the refresh returns by a global deadline whatever it has: devices that did not
+answer in time keep their previous entry and are probed again on the next refresh.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import traceback
+import urllib.error
+from concurrent import futures
+
+from helpers import receive_device_hints, updates_api_wrapper
+
+# Fields of an entry kept between refreshes, and in the cache file
+CACHED_FIELDS = (
+    "id",
+    "ip",
+    "name",
+    "active_branch",
+    "up_to_date",
+    "local_commit",
+    "origin_commit",
+    "last_seen",
+)
+DEFAULT_CACHE_FILE = "/var/cache/ethoscope/updater_devices.json"
+# Seconds after which an entry is probed again anyway
+MAX_AGE = 600
+# Seconds a refresh may take
+DEADLINE = 15
+# Seconds a single request to a device may take
+TIMEOUT = 10
+MAX_WORKERS = 128
+# Ports of the update server and of the device server of the devices
+UPDATER_PORT = 8888
+DATA_PORT = 9000
+
+
+class DeviceMap:
+    """
+    The devices the update server can act on, with their branch and commits.
+
+    :param cache_file: JSON file where the entries are kept between restarts, None
+        to keep them in memory only
+    :param max_age: seconds after which an entry is probed again
+    :param deadline: seconds a refresh may take
+    :param timeout: seconds a single request to a device may take
+    :param max_workers: number of devices probed at the same time
+    :param port: port of the update server of the devices
+    :param data_port: port of the device server of the devices
+    :param hints: function returning the devices known to the node, by id, or None
+        if the node cannot be reached
+    :param branch_heads: function returning the commit at the head of each branch
+        of the bare repository, or None if there is no bare repository
+    """
+
+    def __init__(
+        self,
+        cache_file=DEFAULT_CACHE_FILE,
+        max_age=MAX_AGE,
+        deadline=DEADLINE,
+        timeout=TIMEOUT,
+        max_workers=MAX_WORKERS,
+        port=UPDATER_PORT,
+        data_port=DATA_PORT,
+        hints=receive_device_hints,
+        branch_heads=None,
+    ):
+        self._cache_file = cache_file
+        self.max_age = max_age
+        self.deadline = deadline
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.port = port
+        self.data_port = data_port
+        self._hints = hints
+        self._branch_heads = branch_heads
+
+        self._entries = {}
+        self._invalidated = set()
+        self._lock = threading.Lock()
+        # a single refresh at a time, the others wait and find its entries fresh
+        self._refresh_lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self._cache_file or not os.path.exists(self._cache_file):
+            return
+        try:
+            with open(self._cache_file) as f:
+                entries = json.load(f)
+            self._entries = {
+                device_id: entry
+                for device_id, entry in entries.items()
+                if isinstance(entry, dict)
+            }
+            logging.info(f"Loaded {len(self._entries)} devices from {self._cache_file}")
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not load the device cache {self._cache_file}: {e}")
+
+    def _save(self):
+        if not self._cache_file:
+            return
+        with self._lock:
+            content = json.dumps(self._entries, indent=2)
+        try:
+            directory = os.path.dirname(os.path.abspath(self._cache_file))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    f.write(content)
+                os.replace(tmp_path, self._cache_file)
+            except OSError:
+                os.unlink(tmp_path)
+                raise
+        except OSError as e:
+            logging.warning(f"Could not save the device cache {self._cache_file}: {e}")
+
+    def invalidate(self, device_ids=None):
+        """
+        Marks devices to be probed on the next refresh.
+
+        :param device_ids: ids of the devices, None for all of them
+        """
+        with self._lock:
+            if device_ids is None:
+                self._invalidated.update(self._entries)
+            else:
+                self._invalidated.update(device_ids)
+
+    def is_stale(self, device_id, ip, heads, now=None):
+        """
+        Whether a device has to be probed again.
+
+        :param device_id: the device id
+        :param ip: the current IP of the device, as http://<ip>
+        :param heads: the commit at the head of each branch of the bare repository
+        :param now: the current time, in seconds since the epoch
+        :return: True if the device is unknown, invalidated, changed IP, was last
+            seen more than max_age ago or is behind the head of its branch
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._entries.get(device_id)
+            if entry is None or device_id in self._invalidated:
+                return True
+        if entry.get("ip") != ip or now - entry.get("last_seen", 0) > self.max_age:
+            return True
+        head = heads.get(str(entry.get("active_branch")))
+        origin = (entry.get("origin_commit") or {}).get("id")
+        return head is not None and head != origin
+
+    def refresh(self):
+        """
+        Probes the stale devices and returns the device map.
+
+        :return: the devices, by id, with the information the node has on them, their
+            active branch and their local and origin commits
+        """
+        with self._refresh_lock:
+            hints = self._hints()
+            heads = {}
+            if self._branch_heads is not None:
+                try:
+                    heads = self._branch_heads()
+                except Exception:
+                    logging.warning("Could not read the heads of the bare repository")
+                    logging.debug(traceback.format_exc())
+
+            if hints is None:
+                # without the node, fall back on the devices seen before, and ask
+                # them for their data ourselves
+                with self._lock:
+                    targets = {
+                        device_id: {"id": device_id, "ip": entry["ip"]}
+                        for device_id, entry in self._entries.items()
+                        if entry.get("ip")
+                    }
+                stale = list(targets)
+            else:
+                targets = {
+                    device_id: {**info, "id": device_id, "ip": f"http://{info['ip']}"}
+                    for device_id, info in hints.items()
+                }
+                now = time.time()
+                stale = [
+                    device_id
+                    for device_id, target in targets.items()
+                    if self.is_stale(device_id, target["ip"], heads, now)
+                ]
+
+            probed = self._probe_all(stale, targets, with_data=hints is None)
+
+            devices_map = {}
+            with self._lock:
+                for device_id, target in targets.items():
+                    devices_map[device_id] = {
+                        **self._entries.get(device_id, {}),
+                        **target,
+                        **probed.get(device_id, {}),
+                    }
+            if devices_map:
+                logging.info(
+                    f"Device map of {len(devices_map)} devices, {len(stale)} probed"
+                )
+            else:
+                logging.warning("No device detected")
+            return devices_map
+
+    def _probe_all(self, device_ids, targets, with_data):
+        """
+        Probes devices concurrently, until the deadline.
+
+        :return: what was learnt of each device that answered, or its status if it
+            could not be probed
+        """
+        if not device_ids:
+            return {}
+
+        deadline = time.monotonic() + self.deadline
+        executor = futures.ThreadPoolExecutor(
+            max_workers=min(self.max_workers, len(device_ids))
+        )
+        fs = {
+            executor.submit(
+                self._probe, device_id, targets[device_id]["ip"], with_data, deadline
+            ): device_id
+            for device_id in device_ids
+        }
+        done, not_done = futures.wait(fs, timeout=self.deadline)
+        # the requests still running end with their own timeout
+        executor.shutdown(wait=False, cancel_futures=True)
+        if not_done:
+            logging.warning(
+                f"{len(not_done)} devices did not answer within {self.deadline}s: "
+                f"{sorted(fs[f] for f in not_done)}"
+            )
+
+        probed = {}
+        seen = time.time()
+        with self._lock:
+            for f in done:
+                device_id = fs[f]
+                try:
+                    result, ok = f.result()
+                except Exception:
+                    logging.error(f"Could not probe device {device_id}:")
+                    logging.error(traceback.format_exc())
+                    result, ok = {"status": "Software broken"}, False
+                probed[device_id] = result
+                if ok:
+                    entry = {
+                        **self._entries.get(device_id, {}),
+                        **targets[device_id],
+                        **result,
+                        "last_seen": seen,
+                    }
+                    self._entries[device_id] = {
+                        field: entry[field] for field in CACHED_FIELDS if field in entry
+                    }
+                    self._invalidated.discard(device_id)
+        self._save()
+        return probed
+
+    def _probe(self, device_id, ip, with_data, deadline):
+        """
+        Asks a device for its active branch and commits, and its data if with_data.
+
+        :return: what was learnt of the device, and whether all the requests succeeded
+        """
+        result = {}
+        requests = [
+            ("device/active_branch", self.port),
+            ("device/check_update", self.port),
+        ]
+        if with_data:
+            requests.insert(0, ("data", self.data_port))
+
+        for what, port in requests:
+            timeout = min(self.timeout, deadline - time.monotonic())
+            if timeout <= 0:
+                return result, False
+            try:
+                response = updates_api_wrapper(
+                    ip, device_id, what=what, port=port, timeout=timeout
+                )
+            except (urllib.error.URLError, OSError) as e:
+                # an HTTP error means the server answered, but not as expected
+                broken = isinstance(e, urllib.error.HTTPError)
+                result["status"] = "Software broken" if broken else "Unreachable"
+                logging.warning(f"Could not get {what} from device {device_id}: {e}")
+                return result, False
+
+            if isinstance(response, dict) and "error" in response:
+                logging.error(f"Could not get {what} from device {device_id}:")
+                logging.error(response["error"])
+                result["status"] = "Software broken"
+                return result, False
+            if isinstance(response, dict):
+                # devices give their bare IP, the map keeps http://<ip>
+                result.update({k: v for k, v in response.items() if k != "ip"})
+        return result, True
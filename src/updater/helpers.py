@@ -23,11 +23,6 @@ try:
     pass
 except Exception:
     logging.warning("Could not load netifaces. This is needed for node stuff")
-try:
-    import concurrent
-    import concurrent.futures as futures
-except Exception:
-    logging.warning("Could not load concurrent. This is needed for node stuff")
 
 
 class UnexpectedAction(Exception):
@@ -73,249 +68,32 @@ def get_machine_name(path="/etc/machine-name"):
         return "VIRTUASCOPE_" + str(random.randint(100, 999))
 
 
-def scan_one_device(ip, timeout=2, port=8888, page="id"):
-    """
-    :param url: the url to parse
-    :param timeout: the timeout of the url request
-    :param port: the port to request
-    :return: The message, parsed as dictionary. the "ip" field is also added to the result.
-    If the url could not be reached/parsed, (None,None) is returned
-    """
-
-    url = f"{ip}:{port}/{page}"
-    try:
-        req = urllib.request.Request(url)
-        f = urllib.request.urlopen(req, timeout=timeout)
-        message = f.read()
-
-        if not message:
-            logging.error(f"URL error whist scanning url: {url}. No message back.")
-            raise urllib.error.URLError("No message back")
-        try:
-            resp = json.loads(message)
-            return (resp["id"], ip)
-        except ValueError:
-            logging.error(f"Could not parse response from {url} as JSON object")
-
-    except urllib.error.URLError:
-        pass
-        # logging.error("URL error whist scanning url: %s. Server down?" % url )
-
-    except Exception as e:
-        logging.error(f"Unexpected error whilst scanning url: {url}")
-        raise e
-
-    return None, ip
-
-
-def update_dev_map_wrapped(
-    devices_map,
-    id,
-    what="data",
-    type=None,
-    port=9000,
-    data=None,
-    result_main_dir="/ethoscope_data/results",
-):
-    """
-    Just a routine to format our GET urls. This improves readability whilst allowing us to change convention (e.g. port) without rewriting everything.
-
-    :param id: machine unique identifier
-    :param what: e.g. /data, /control
-    :param type: the type of request for POST
-    :param port:
-    :return:
+def receive_device_hints(url="http://localhost/devices", timeout=10):
     """
+    Interrogates the NODE on its current knowledge of devices, thus piggybacking on the
+    node's knowledge of the subnet
 
-    ip = devices_map[id]["ip"]
-
-    request_url = f"{ip}:{port}/{what}/{id}"
-    if type is not None:
-        request_url = request_url + "/" + type
-
-    req = urllib.request.Request(
-        url=request_url, data=data, headers={"Content-Type": "application/json"}
-    )
-
-    logging.info(f"requesting {request_url}")
-
-    try:
-        f = urllib.request.urlopen(req, timeout=10)
-        message = f.read()
-
-        if message:
-            data = json.loads(message)
-
-            if id not in devices_map:
-                logging.warning(
-                    f"Device {id} is not in device map. Rescanning subnet..."
-                )
-                generate_new_device_map(result_main_dir=result_main_dir)
-            try:
-                devices_map[id].update(data)
-                return data
-
-            except KeyError as e:
-                logging.error(f"Device {id} is not detected")
-                raise KeyError(f"Device {id} is not detected") from e
-
-    except http.client.BadStatusLine as e:
-        logging.error("BadlineSatus, most probably due to update device and auto-reset")
-        raise e
-
-    except (urllib.error.URLError, TimeoutError) as e:
-        if hasattr(e, "reason"):
-            logging.error("We failed to reach a server.")
-            logging.error("Reason: " + str(e.reason))
-            raise e
-        elif hasattr(e, "code"):
-            logging.error("The server couldn't fulfill the request.")
-            logging.error("Error code: " + str(e.code))
-            raise e
-        elif isinstance(e, TimeoutError):
-            logging.error("Request timed out.")
-            raise e
-
-    return devices_map
-
-
-def receive_device_IPs():
+    :param url: the devices page of the node
+    :param timeout: the timeout of the request
+    :return: what the node knows of each device that is not offline and has an IP, by
+    device id. None if the node could not be reached
     """
-    Interrogates the NODE on its current knowledge of devices, then extracts from the JSON record
-    only the IPs
-    """
-    devices = []
     try:
-        url = "http://localhost/devices"
         req = urllib.request.Request(url, headers={"Content-Type": "application/json"})
-        f = urllib.request.urlopen(req, timeout=10)
-        js = json.load(f)
-        for key in js:
-            if js[key]["status"] != "offline" and "ip" in js[key]:
-                devices.append("http://{}".format(js[key]["ip"]))
-        # devices = [ "http://" + js[key]['ip'] for key in js.keys() if js[key]['status'] != "offline" ]
+        with urllib.request.urlopen(req, timeout=timeout) as f:
+            js = json.load(f)
     except Exception:
         logging.error(
             "The node ethoscope server is not running or cannot be reached. A list of available ethoscopes could not be found."
         )
         logging.error(traceback.format_exc())
+        return None
 
-    return devices
-
-
-def generate_new_device_map():
-    """
-    Generate the device map as JSON dictionary
-    Interrogates only IPs passed on by the NODE, thus piggybacking on the node's knowledge of the subnet
-    """
-    devices_map = {}
-    urls = receive_device_IPs()
-
-    # We can use a with statement to ensure threads are cleaned up promptly
-    with futures.ThreadPoolExecutor(max_workers=128) as executor:
-        # Start the load operations and mark each future with its URL
-
-        fs = [executor.submit(scan_one_device, url) for url in urls]
-        for f in concurrent.futures.as_completed(fs):
-
-            try:
-                id, ip = f.result()
-                if id is None:
-                    continue
-                devices_map[id] = {"ip": ip, "status": "Software broken", "id": id}
-
-            except Exception:
-                logging.error("Error whilst pinging url")
-                logging.error(traceback.format_exc())
-
-    if len(devices_map) < 1:
-        logging.warning("No device detected")
-        return devices_map
-
-    logging.info(f"Detected {len(devices_map)} devices:\n{list(devices_map.keys())}")
-
-    # We can use a with statement to ensure threads are cleaned up promptly
-    with futures.ThreadPoolExecutor(max_workers=128) as executor:
-        # Start the load operations and mark each future with its URL
-        fs = {}
-        for id in list(devices_map.keys()):
-            fs[executor.submit(update_dev_map_wrapped, devices_map, id)] = id
-
-        for f in concurrent.futures.as_completed(fs):
-            id = fs[f]
-            try:
-                data = f.result()
-                devices_map[id].update(data)
-            except Exception as e:
-                if isinstance(e.__cause__, (TimeoutError, urllib.error.URLError)):
-                    devices_map[id]["status"] = "Unreachable"
-                    logging.warning(
-                        f"Device {id} is unreachable (timeout/network error)"
-                    )
-                else:
-                    devices_map[id]["status"] = "Software broken"
-                    logging.error(f"Could not get data from device {id} :")
-                    logging.error(traceback.format_exc())
-
-    # Adds the active_branch to devices_,map
-    with futures.ThreadPoolExecutor(max_workers=128) as executor:
-        # Start the load operations and mark each future with its URL
-        fs = {}
-        for id in list(devices_map.keys()):
-            fs[
-                executor.submit(
-                    update_dev_map_wrapped,
-                    devices_map,
-                    id,
-                    what="device/active_branch",
-                    port="8888",
-                )
-            ] = id
-        for f in concurrent.futures.as_completed(fs):
-            id = fs[f]
-            try:
-                data = f.result()
-                devices_map[id].update(data)
-            except Exception as e:
-                if isinstance(e.__cause__, (TimeoutError, urllib.error.URLError)):
-                    devices_map[id]["status"] = "Unreachable"
-                    logging.warning(
-                        f"Device {id} is unreachable (timeout/network error)"
-                    )
-                else:
-                    logging.error(f"Could not get data from device {id} :")
-                    logging.error(traceback.format_exc())
-
-    # Adds the check_update to devices_,map
-    with futures.ThreadPoolExecutor(max_workers=128) as executor:
-        # Start the load operations and mark each future with its URL
-        fs = {}
-        for id in list(devices_map.keys()):
-            fs[
-                executor.submit(
-                    update_dev_map_wrapped,
-                    devices_map,
-                    id,
-                    what="device/check_update",
-                    port="8888",
-                )
-            ] = id
-        for f in concurrent.futures.as_completed(fs):
-            id = fs[f]
-            try:
-                data = f.result()
-                devices_map[id].update(data)
-            except Exception as e:
-                if isinstance(e.__cause__, (TimeoutError, urllib.error.URLError)):
-                    devices_map[id]["status"] = "Unreachable"
-                    logging.warning(
-                        f"Device {id} is unreachable (timeout/network error)"
-                    )
-                else:
-                    logging.error(f"Could not get data from device {id} :")
-                    logging.error(traceback.format_exc())
-
-    return devices_map
+    return {
+        key: info
+        for key, info in js.items()
+        if info.get("status") != "offline" and info.get("ip")
+    }
 
 
 def updates_api_wrapper(
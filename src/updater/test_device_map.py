@@ -0,0 +1,273 @@
+"""
+Tests for the DeviceMap of the update server against fake devices.
+
+Each fake device is an HTTP server on its own loopback address (127.0.0.N), all on the
+same port, answering the requests of the update server and of the device server.
+
+Usage:
+    python -m pytest src/updater/test_device_map.py
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from device_map import DeviceMap  # noqa: E402
+
+N_DEVICES = 40
+DEADLINE = 2
+# seconds the fake check_update takes, as a git fetch on the device
+FETCH_TIME = 0.2
+
+
+class FakeDevices:
+    """
+    Fake devices, with their branch and commits, counting the requests they receive.
+    """
+
+    def __init__(self, n):
+        self.branch = "dev"
+        self.heads = {"dev": "c1", "main": "m1"}
+        self.slow = set()
+        self.requests = []
+        self.hints = {}
+        self._servers = []
+        self._lock = threading.Lock()
+
+        self.port = 0
+        for i in range(2, n + 2):
+            ip = f"127.0.0.{i}"
+            device_id = f"{i:032x}"
+            server = ThreadingHTTPServer((ip, self.port), self._handler(device_id))
+            server.daemon_threads = True
+            self.port = server.server_address[1]
+            self._servers.append(server)
+            threading.Thread(
+                target=server.serve_forever, args=(0.05,), daemon=True
+            ).start()
+            self.hints[device_id] = {
+                "ip": ip,
+                "status": "stopped",
+                "name": f"ETHOSCOPE_{i:03d}",
+            }
+
+    def _handler(self, device_id):
+        devices = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with devices._lock:
+                    devices.requests.append((device_id, self.path))
+                if device_id in devices.slow:
+                    time.sleep(DEADLINE + 1)
+                if self.path.startswith("/device/active_branch"):
+                    body = {"active_branch": devices.branch}
+                elif self.path.startswith("/device/check_update"):
+                    time.sleep(FETCH_TIME)
+                    head = devices.heads[devices.branch]
+                    body = {
+                        "up_to_date": True,
+                        "local_commit": {"id": head},
+                        "origin_commit": {"id": head},
+                    }
+                else:
+                    body = {
+                        "id": device_id,
+                        "status": "running",
+                        "ip": devices.hints[device_id]["ip"],
+                    }
+                content = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(content)
+
+        return Handler
+
+    def take_requests(self):
+        with self._lock:
+            requests, self.requests = self.requests, []
+        return requests
+
+    def close(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+
+
+@pytest.fixture
+def devices():
+    try:
+        devices = FakeDevices(N_DEVICES)
+    except OSError as e:
+        pytest.skip(f"Cannot bind the loopback addresses of the fake devices: {e}")
+    yield devices
+    devices.close()
+
+
+@pytest.fixture
+def node(devices):
+    """The node: up, and knowing all the devices."""
+    return {"up": True}
+
+
+def make_map(devices, node, cache_file=None, **kwargs):
+    return DeviceMap(
+        cache_file=cache_file,
+        deadline=DEADLINE,
+        timeout=DEADLINE,
+        port=devices.port,
+        data_port=devices.port,
+        hints=lambda: dict(devices.hints) if node["up"] else None,
+        branch_heads=lambda: dict(devices.heads),
+        **kwargs,
+    )
+
+
+def test_converges_in_one_pass(devices, node):
+    devices_map = make_map(devices, node)
+
+    start = time.monotonic()
+    result = devices_map.refresh()
+    elapsed = time.monotonic() - start
+
+    assert set(result) == set(devices.hints)
+    for device_id, entry in result.items():
+        assert entry["active_branch"] == "dev"
+        assert entry["origin_commit"] == {"id": "c1"}
+        assert entry["ip"] == f"http://{devices.hints[device_id]['ip']}"
+    # the node gave the data, so each device is only asked for its branch and commits
+    requests = devices.take_requests()
+    assert len(requests) == 2 * N_DEVICES
+    assert {device_id for device_id, _ in requests} == set(devices.hints)
+    # all the devices are probed at once, not one after the other
+    assert elapsed < DEADLINE
+
+
+def test_repeat_load_sends_no_request(devices, node):
+    devices_map = make_map(devices, node)
+    first = devices_map.refresh()
+    devices.take_requests()
+
+    assert devices_map.refresh() == first
+    assert devices.take_requests() == []
+
+
+def test_refresh_probes_only_stale_devices(devices, node):
+    devices_map = make_map(devices, node)
+    devices_map.refresh()
+    devices.take_requests()
+    ids = sorted(devices.hints)
+
+    # invalidated
+    devices_map.invalidate([ids[0]])
+    devices_map.refresh()
+    assert {device_id for device_id, _ in devices.take_requests()} == {ids[0]}
+
+    # IP changed: two devices swapped their addresses
+    ip_1, ip_2 = devices.hints[ids[1]]["ip"], devices.hints[ids[2]]["ip"]
+    devices.hints[ids[1]]["ip"], devices.hints[ids[2]]["ip"] = ip_2, ip_1
+    devices_map.refresh()
+    assert {device_id for device_id, _ in devices.take_requests()} == {ids[1], ids[2]}
+
+    # too old
+    devices_map.max_age = 0
+    devices_map.refresh()
+    assert len(devices.take_requests()) == 2 * N_DEVICES
+    devices_map.max_age = 600
+
+    # the head of their branch moved in the bare repository
+    devices.heads["dev"] = "c2"
+    result = devices_map.refresh()
+    assert len(devices.take_requests()) == 2 * N_DEVICES
+    assert all(entry["origin_commit"] == {"id": "c2"} for entry in result.values())
+    devices_map.refresh()
+    assert devices.take_requests() == []
+
+
+def test_node_hints(devices, node):
+    ids = sorted(devices.hints)
+    devices.hints[ids[0]]["status"] = "recording"
+    devices_map = make_map(devices, node)
+
+    result = devices_map.refresh()
+    # name and state come from the node
+    assert result[ids[0]]["status"] == "recording"
+    assert result[ids[1]]["name"] == "ETHOSCOPE_003"
+    assert not any(path.startswith("/data") for _, path in devices.take_requests())
+
+    # without the node, the devices seen before are asked for their data
+    node["up"] = False
+    result = devices_map.refresh()
+    assert set(result) == set(devices.hints)
+    assert result[ids[0]]["status"] == "running"
+    assert result[ids[1]]["name"] == "ETHOSCOPE_003"
+    requests = devices.take_requests()
+    assert len(requests) == 3 * N_DEVICES
+    assert sum(path.startswith("/data") for _, path in requests) == N_DEVICES
+
+
+def test_deadline_cuts_slow_devices_off(devices, node):
+    ids = sorted(devices.hints)
+    devices.slow.add(ids[0])
+    devices_map = make_map(devices, node)
+
+    start = time.monotonic()
+    result = devices_map.refresh()
+    elapsed = time.monotonic() - start
+
+    assert elapsed < DEADLINE + 0.5
+    assert "active_branch" not in result[ids[0]]
+    assert all(result[device_id]["active_branch"] == "dev" for device_id in ids[1:])
+
+    # the slow device is probed again on the next refresh, and only it
+    devices.slow.clear()
+    time.sleep(DEADLINE + 1 - elapsed)
+    devices.take_requests()
+    result = devices_map.refresh()
+    assert result[ids[0]]["active_branch"] == "dev"
+    assert {device_id for device_id, _ in devices.take_requests()} == {ids[0]}
+
+
+def test_cache_file_survives_restart(devices, node, tmp_path):
+    cache_file = str(tmp_path / "cache" / "devices.json")
+    first = make_map(devices, node, cache_file=cache_file).refresh()
+    devices.take_requests()
+
+    assert make_map(devices, node, cache_file=cache_file).refresh() == first
+    assert devices.take_requests() == []
+
+
+def test_invalidate_after_a_refresh_during_an_action(devices, node):
+    devices_map = make_map(devices, node)
+    devices_map.refresh()
+    device_id = sorted(devices.hints)[0]
+
+    # a refresh during a branch switch still sees the former branch, whose head did
+    # not move: the device has to be invalidated again once the switch is done
+    devices_map.invalidate([device_id])
+    devices_map.refresh()
+    devices.branch = "main"
+    assert devices_map.refresh()[device_id]["active_branch"] == "dev"
+    devices_map.invalidate([device_id])
+    assert devices_map.refresh()[device_id]["active_branch"] == "main"
+
+
+def test_unreachable_device(devices, node):
+    # nothing listens on 127.0.0.1, the fake devices are on the other addresses
+    devices.hints["dead"] = {"ip": "127.0.0.1", "status": "running"}
+    devices_map = make_map(devices, node)
+
+    result = devices_map.refresh()
+    assert result["dead"]["status"] == "Unreachable"
+    assert devices_map.is_stale("dead", "http://127.0.0.1", {})
@@ -6,10 +6,10 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from optparse import OptionParser
 
 import bottle
+from device_map import DEFAULT_CACHE_FILE, DeviceMap
 from helpers import (
     WrongMachineID,
     assert_node,
-    generate_new_device_map,
     get_commit_version,
     reload_device_daemon,
     reload_node_daemon,
@@ -362,8 +362,7 @@ def node_info():  # , device):
 def scan_subnet():
     try:
         assert_node(is_node)
-        devices_map = generate_new_device_map()
-        return devices_map
+        return devices_map.refresh()
 
     except Exception:
         logging.error("Unexpected exception when scanning for devices:")
@@ -373,11 +372,18 @@ def scan_subnet():
 
 @app.post("/group/<what>")
 def group(what):
+    device_ids = []
     try:
         responses = []
         data = bottle.request.json
         if not data or "devices" not in data:
             return {"error": "Missing required field: devices"}
+        # their branch, commits or state are about to change
+        device_ids = [
+            device["id"] for device in data["devices"] if device["id"] != "node"
+        ]
+        if devices_map is not None:
+            devices_map.invalidate(device_ids)
         if what == ACTION_UPDATE:
             # Separate node and devices for different processing
             node_devices = [
@@ -537,6 +543,12 @@ def group(what):
         logging.error(traceback.format_exc())
         return {"error": traceback.format_exc()}
 
+    finally:
+        # a refresh while the actions ran may have stored the former branch, commits
+        # or state of the devices
+        if devices_map is not None:
+            devices_map.invalidate(device_ids)
+
 
 def close(exit_status=0):
     logging.info("Closing server")
@@ -610,6 +622,13 @@ if __name__ == "__main__":
         dest="port",
         help="The port to run the server on. Default 8888",
     )
+    parser.add_option(
+        "-c",
+        "--device-cache",
+        dest="device_cache",
+        default=DEFAULT_CACHE_FILE,
+        help="File where the node keeps what it knows of the devices between restarts",
+    )
     parser.add_option(
         "-D",
         "--debug",
@@ -630,12 +649,17 @@ if __name__ == "__main__":
         is_node = True
         bare_repo_updater = updater.BareRepoUpdater(options.bare_repo)
         device_id = "node"
+        devices_map = DeviceMap(
+            cache_file=options.device_cache,
+            branch_heads=bare_repo_updater.branch_heads,
+        )
 
     else:
         is_node = False
         from ethoscope.utils import pi
 
         bare_repo_updater = None
+        devices_map = None
         device_id = pi.get_machine_id()
 
     ethoscope_updater = updater.DeviceUpdater(options.local_repo)
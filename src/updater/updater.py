@@ -553,6 +553,14 @@ class BareRepoUpdater:
 
         return update_results
 
+    def branch_heads(self) -> dict[str, str]:
+        """
+        Retrieves the commit at the head of each branch of the bare repository.
+
+        :return: A dictionary mapping branch names to commit hashes.
+        """
+        return {head.name: head.commit.hexsha for head in self._working_repo.heads}
+
     def update_all_branches(self):
         self._working_repo.git.fetch()
 